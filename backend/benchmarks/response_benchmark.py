@@ -0,0 +1,103 @@
+"""
+接口响应序列化与压缩基准测试
+构造一个包含大量步骤的执行记录，对比步骤列表在不同序列化方式下的耗时，以及不同压缩方式下的响应体大小
+
+用法（在 backend 目录下）：
+    python benchmarks/response_benchmark.py --steps 1000
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from src.autotest.compression import brotli
+from src.autotest.database import TestStep, beijing_now
+from src.autotest.models import TestStepResponse
+from src.autotest.responses import dumps
+from src.autotest.services.projection_service import STEP_PROJECTION
+
+
+def make_steps(count: int) -> List[TestStep]:
+    """构造步骤记录，字段内容的长度接近真实执行"""
+    started = beijing_now()
+    return [
+        TestStep(
+            id=index, execution_id=1, step_name=f"步骤 {index}", step_order=index, status="PASSED",
+            description="点击登录按钮并等待页面跳转到首页", screenshot_path=f"artifact://{index:064x}",
+            duration_seconds=1.25, started_at=started + timedelta(seconds=index), completed_at=started + timedelta(seconds=index + 1),
+            url=f"https://example.com/pages/{index}?from=login", evaluation="成功 - 页面已跳转",
+            actions=[{"click_element_by_index": {"index": index % 40}}, {"input_text": {"index": 3, "text": "admin"}}],
+            memory="已完成登录表单填写，下一步验证首页的用户名显示是否正确。" * 4,
+            next_goal="验证首页显示的用户名", screenshot_data=f"artifact://{index:064x}",
+            event_timestamp=started, step_metadata={"model": "deepseek-chat", "tokens": 1532},
+        )
+        for index in range(1, count + 1)
+    ]
+
+
+def timed(function: Callable[[], bytes], repeat: int) -> tuple:
+    """返回 (平均耗时毫秒, 输出)"""
+    output = function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="接口响应序列化与压缩基准测试")
+    parser.add_argument("--steps", type=int, default=1000, help="执行记录的步骤数")
+    parser.add_argument("--repeat", type=int, default=20, help="每种方式重复次数")
+    args = parser.parse_args()
+
+    steps = make_steps(args.steps)
+    full_names = STEP_PROJECTION.resolve(exclude="")
+    light_names = STEP_PROJECTION.resolve()
+    adapter = TypeAdapter(List[TestStepResponse])
+
+    def default_encoder():
+        # 旧实现：校验为响应模型后用 jsonable_encoder + json.dumps 序列化
+        models = [TestStepResponse.model_validate(step) for step in steps]
+        return json.dumps(jsonable_encoder(models), ensure_ascii=False).encode("utf-8")
+
+    def pydantic_dump_json():
+        # 新版 FastAPI 对声明了响应模型的接口使用的路径
+        return adapter.dump_json(adapter.validate_python(steps, from_attributes=True))
+
+    cases = [
+        ("jsonable_encoder + json", default_encoder),
+        ("pydantic dump_json", pydantic_dump_json),
+        ("orjson 全部字段", lambda: dumps(STEP_PROJECTION.dump(steps, full_names))),
+        ("orjson 列表默认字段", lambda: dumps(STEP_PROJECTION.dump(steps, light_names))),
+    ]
+
+    print(f"步骤数: {args.steps}")
+    print(f"{'序列化方式':<24}{'耗时(毫秒)':>12}{'大小(KB)':>12}")
+    for name, function in cases:
+        elapsed, output = timed(function, args.repeat)
+        print(f"{name:<24}{elapsed:>12.2f}{len(output) / 1024:>12.1f}")
+
+    print()
+    print(f"{'压缩方式':<24}{'耗时(毫秒)':>12}{'大小(KB)':>12}")
+    for label, names in (("全部字段", full_names), ("列表默认字段", light_names)):
+        body = dumps(STEP_PROJECTION.dump(steps, names))
+        compressors = [("不压缩", lambda: body), ("gzip-6", lambda: gzip.compress(body, compresslevel=6))]
+        if brotli is not None:
+            compressors.append(("brotli-4", lambda: brotli.compress(body, quality=4)))
+        for name, function in compressors:
+            elapsed, output = timed(function, args.repeat)
+            print(f"{label + ' ' + name:<24}{elapsed:>12.2f}{len(output) / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+SQLite 并发写入基准测试
+模拟多个事件收集器同时写入步骤数据，对比默认配置与生产配置（WAL + 单连接写入引擎）的写入吞吐和锁冲突次数
+
+用法（在 backend 目录下）：
+    python benchmarks/sqlite_write_benchmark.py --collectors 20 --steps 50
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from src.autotest.database import Base, TestStep, beijing_now, create_sqlite_engine
+
+
+def run_profile(profile: str, collectors: int, steps: int) -> dict:
+    """在临时数据库上运行一个配置，返回吞吐统计"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = f"sqlite:///{Path(tmp_dir) / 'benchmark.db'}"
+        if profile == "default":
+            write_engine = create_engine(url, connect_args={"check_same_thread": False})
+            read_engine = write_engine
+        else:
+            write_engine = create_sqlite_engine(url, role="writer")
+            read_engine = create_sqlite_engine(url, role="reader")
+        Base.metadata.create_all(write_engine)
+        WriteSession = sessionmaker(bind=write_engine)
+        ReadSession = sessionmaker(bind=read_engine)
+
+        lock_errors = 0
+        written = 0
+        counter_lock = threading.Lock()
+        stop_reading = threading.Event()
+
+        def collector(execution_id: int):
+            nonlocal lock_errors, written
+            for step_order in range(1, steps + 1):
+                # 每个步骤一次插入、两次更新，与事件收集器的写入模式一致
+                for phase in ("insert", "running", "passed"):
+                    db = WriteSession()
+                    try:
+                        if phase == "insert":
+                            db.add(TestStep(execution_id=execution_id, step_order=step_order, step_name=f"步骤 {step_order}",
+                                            status="RUNNING", started_at=beijing_now()))
+                        else:
+                            db.query(TestStep).filter(
+                                TestStep.execution_id == execution_id, TestStep.step_order == step_order
+                            ).update({"status": phase.upper(), "url": "https://example.com"})
+                        db.commit()
+                        with counter_lock:
+                            written += 1
+                    except OperationalError:
+                        db.rollback()
+                        with counter_lock:
+                            lock_errors += 1
+                    finally:
+                        db.close()
+
+        def reader():
+            # 模拟接口轮询执行详情
+            while not stop_reading.is_set():
+                db = ReadSession()
+                try:
+                    db.query(func.count(TestStep.id)).scalar()
+                except OperationalError:
+                    pass
+                finally:
+                    db.close()
+                time.sleep(0.01)
+
+        read_thread = threading.Thread(target=reader)
+        read_thread.start()
+        threads = [threading.Thread(target=collector, args=(execution_id,)) for execution_id in range(1, collectors + 1)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop_reading.set()
+        read_thread.join()
+
+        write_engine.dispose()
+        read_engine.dispose()
+        return {
+            "profile": profile,
+            "writes": written,
+            "lock_errors": lock_errors,
+            "seconds": round(elapsed, 2),
+            "writes_per_second": round(written / elapsed, 1) if elapsed else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 并发写入基准测试")
+    parser.add_argument("--collectors", type=int, default=20, help="并发写入的收集器数量")
+    parser.add_argument("--steps", type=int, default=50, help="每个收集器写入的步骤数")
+    args = parser.parse_args()
+
+    print(f"{'配置':<12}{'写入次数':>10}{'锁冲突':>10}{'耗时(秒)':>12}{'写入/秒':>12}")
+    for profile in ("default", "production"):
+        result = run_profile(profile, args.collectors, args.steps)
+        print(f"{result['profile']:<12}{result['writes']:>10}{result['lock_errors']:>10}"
+              f"{result['seconds']:>12}{result['writes_per_second']:>12}")
+
+
+if __name__ == "__main__":
+    main()
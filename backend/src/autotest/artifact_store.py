@@ -0,0 +1,490 @@
+"""
+制品存储
+按内容哈希存储 history、截图等执行产物：相同内容只存一份，JSON 使用 zstd 压缩，
+总大小超过上限时按最近最少使用淘汰，最近若干次执行的产物和仍被 history 缓存引用的产物不参与淘汰。
+索引变更以追加日志的形式写入，日志过长时再压缩为快照
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖，缺失时不压缩
+    zstandard = None
+
+from .config_manager import ConfigManager
+from .metrics import metrics_registry
+
+# 制品引用前缀，写入数据库的路径字段时使用
+ARTIFACT_REF_PREFIX = "artifact://"
+
+# 需要压缩的内容类型（图片本身已压缩，不再处理）
+COMPRESSIBLE_CONTENT_TYPES = {"application/json", "text/plain", "text/html", "application/xml"}
+
+
+@dataclass
+class ArtifactRef:
+    """制品引用"""
+    digest: str
+    size: int
+    stored_size: int
+    content_type: str
+    encoding: str
+
+    @property
+    def ref(self) -> str:
+        return make_ref(self.digest)
+
+
+def make_ref(digest: str) -> str:
+    """生成制品引用字符串"""
+    return f"{ARTIFACT_REF_PREFIX}{digest}"
+
+
+def parse_ref(value: Optional[str]) -> Optional[str]:
+    """从制品引用字符串中解析内容哈希，不是制品引用时返回None"""
+    if value and value.startswith(ARTIFACT_REF_PREFIX):
+        return value[len(ARTIFACT_REF_PREFIX):]
+    return None
+
+
+def decode_image(value: str) -> Tuple[Optional[bytes], Optional[str]]:
+    """将截图（data URI、文件路径或裸 base64）解码为 (二进制内容, 内容类型)，无法解码时返回 (None, None)"""
+    if value.startswith("data:image"):
+        header, data = value.split(",", 1)
+        content_type = "image/jpeg" if ("jpeg" in header or "jpg" in header) else "image/png"
+        return base64.b64decode(data), content_type
+
+    if len(value) < 4096:
+        source_path = Path(value)
+        if source_path.is_file():
+            content_type = "image/jpeg" if source_path.suffix.lower() in (".jpg", ".jpeg") else "image/png"
+            return source_path.read_bytes(), content_type
+
+    # browser-use 的 history.screenshots() 返回不带前缀的 base64
+    try:
+        data = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None, None
+    content_type = "image/jpeg" if data[:3] == b"\xff\xd8\xff" else "image/png"
+    return data, content_type
+
+
+class ArtifactBackend(ABC):
+    """制品存储后端接口"""
+
+    @abstractmethod
+    def put(self, digest: str, data: bytes) -> None:
+        """写入制品（同一哈希重复写入应为幂等操作）"""
+
+    @abstractmethod
+    def get(self, digest: str) -> Optional[bytes]:
+        """读取制品，不存在时返回None"""
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        """检查制品是否存在"""
+
+    @abstractmethod
+    def delete(self, digest: str) -> None:
+        """删除制品"""
+
+    @abstractmethod
+    def iter_digests(self) -> Iterator[str]:
+        """遍历后端中的所有制品哈希"""
+
+
+class LocalFileSystemBackend(ArtifactBackend):
+    """本地文件系统后端，按哈希前缀分两级目录存放"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def delete(self, digest: str) -> None:
+        try:
+            self._path(digest).unlink()
+        except FileNotFoundError:
+            pass
+
+    def iter_digests(self) -> Iterator[str]:
+        for path in self.root.glob("*/*/*"):
+            if path.is_file() and not path.name.endswith(".tmp"):
+                yield path.name
+
+
+class ArtifactStore:
+    """内容寻址的制品存储，维护 LRU 索引和引用计数"""
+
+    INDEX_FILE = "index.json"
+    # 日志记录数超过 max(此值, 索引项数) 时压缩为快照，写入的均摊开销为 O(1)
+    COMPACT_MIN_RECORDS = 1000
+
+    def __init__(self, backend: ArtifactBackend, index_path: Path, max_bytes: int, pinned_executions: int = 20):
+        self.backend = backend
+        self.index_path = Path(index_path)
+        self.journal_path = self.index_path.with_suffix(".journal")
+        self.max_bytes = max_bytes
+        self.pinned_executions = pinned_executions
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # 内容哈希 -> 元数据，按最近访问时间排序（最久未访问的在前）
+        self._index: Optional["OrderedDict[str, Dict[str, Any]]"] = None
+        # 正在写入后端的内容哈希 -> 写入完成事件，同一内容的并发写入只有一个执行
+        self._writing: Dict[str, threading.Event] = {}
+        # ID 最大的若干次执行，其产物不参与淘汰；补写旧执行的截图不会挤掉最近的执行
+        self._pinned: Set[int] = set()
+        self._journal_records = 0
+        self._total_bytes = 0
+
+    # ==================== 索引 ====================
+
+    def _ensure_index(self) -> "OrderedDict[str, Dict[str, Any]]":
+        """首次访问时加载快照并回放追加日志（调用方需持有锁）"""
+        if self._index is None:
+            data: Dict[str, Any] = {}
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.warning(f"读取制品索引失败，将重建: {e}")
+            entries = dict(data.get("entries", {})) if isinstance(data, dict) else {}
+            for execution_id in data.get("pinned_executions", []) if isinstance(data, dict) else []:
+                self._pin(execution_id)
+            self._journal_records = self._replay_journal(entries)
+            self._index = OrderedDict(sorted(entries.items(), key=lambda item: item[1].get("last_access", 0)))
+            self._total_bytes = sum(entry.get("stored_size", 0) for entry in self._index.values())
+        return self._index
+
+    def _replay_journal(self, entries: Dict[str, Dict[str, Any]]) -> int:
+        """将追加日志应用到快照上，返回日志记录数；末尾写了一半的记录忽略"""
+        records = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    records += 1
+                    if record.get("op") == "set":
+                        entries[record["digest"]] = record["entry"]
+                    elif record.get("op") == "del":
+                        entries.pop(record["digest"], None)
+                    elif record.get("op") == "pin":
+                        self._pin(record["execution_id"])
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _journal(self, op: str, **fields: Any):
+        """向追加日志写入一条索引变更，日志过长时压缩为快照（调用方需持有锁）"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        record = {"op": op, **fields}
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._journal_records += 1
+        if self._journal_records > max(self.COMPACT_MIN_RECORDS, len(self._index)):
+            self._compact_locked()
+        metrics_registry.set_gauge("artifact_store.total_bytes", self._total_bytes)
+        metrics_registry.set_gauge("artifact_store.entries", len(self._index))
+
+    def _compact_locked(self):
+        """原子写入索引快照并清空追加日志（调用方需持有锁）"""
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self._index, "pinned_executions": sorted(self._pinned)}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self._journal_records = 0
+
+    def _pin(self, execution_id: int) -> bool:
+        """
+        将执行加入固定集合，超出数量时移出 ID 最小的执行
+
+        Returns:
+            固定集合是否发生变化
+        """
+        if execution_id in self._pinned:
+            return False
+        self._pinned.add(execution_id)
+        if len(self._pinned) > self.pinned_executions:
+            oldest = min(self._pinned)
+            self._pinned.discard(oldest)
+            return oldest != execution_id
+        return True
+
+    def _record_locked(self, digest: str, size: int, stored_size: int, content_type: str, encoding: str,
+                       execution_id: Optional[int], holder: Optional[str]) -> Dict[str, Any]:
+        """写入或更新索引项，合并已有的引用（调用方需持有锁）"""
+        previous = self._index.pop(digest, None)
+        if previous is not None:
+            self._total_bytes -= previous.get("stored_size", 0)
+        executions = set(previous.get("executions", [])) if previous else set()
+        holders = set(previous.get("holders", [])) if previous else set()
+        if execution_id is not None:
+            executions.add(execution_id)
+        if holder is not None:
+            holders.add(holder)
+        entry = {
+            "size": size,
+            "stored_size": stored_size,
+            "content_type": content_type,
+            "encoding": encoding,
+            "last_access": time.time(),
+            "executions": sorted(executions),
+            "holders": sorted(holders)
+        }
+        self._index[digest] = entry
+        self._total_bytes += stored_size
+        self._journal("set", digest=digest, entry=entry)
+        if execution_id is not None and self._pin(execution_id):
+            self._journal("pin", execution_id=execution_id)
+        return entry
+
+    def _remove_locked(self, digest: str) -> Optional[Dict[str, Any]]:
+        """移除索引项并删除制品（调用方需持有锁）；正在重新写入的制品保留文件，由写入方重建索引"""
+        entry = self._index.pop(digest, None)
+        if entry is not None:
+            self._total_bytes -= entry.get("stored_size", 0)
+            self._journal("del", digest=digest)
+        if digest not in self._writing:
+            self.backend.delete(digest)
+        return entry
+
+    # ==================== 读写 ====================
+
+    @staticmethod
+    def _compress(data: bytes, content_type: str) -> Tuple[bytes, str]:
+        if zstandard is not None and content_type in COMPRESSIBLE_CONTENT_TYPES:
+            return zstandard.ZstdCompressor(level=10).compress(data), "zstd"
+        return data, "identity"
+
+    @staticmethod
+    def _decompress(data: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            if zstandard is None:
+                raise RuntimeError("读取 zstd 压缩的制品需要安装 zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def put(self, data: bytes, content_type: str, execution_id: Optional[int] = None, holder: Optional[str] = None) -> ArtifactRef:
+        """
+        存储制品，返回引用；内容相同的制品只存一份
+
+        execution_id 表示制品被该执行的记录引用，最近若干次执行的制品不会被淘汰；
+        holder 表示被其他持有方（如 history 缓存项）引用，所有持有方释放前不会被淘汰。
+        """
+        digest = hashlib.sha256(data).hexdigest()
+
+        # 在同一个锁内完成"是否已存在"的判断和写入占位
+        while True:
+            with self._lock:
+                index = self._ensure_index()
+                writing = self._writing.get(digest)
+                if writing is None:
+                    entry = index.get(digest)
+                    if entry is not None and self.backend.exists(digest):
+                        entry = self._record_locked(digest, entry["size"], entry["stored_size"], entry["content_type"],
+                                                    entry["encoding"], execution_id, holder)
+                        metrics_registry.increment("artifact_store.dedup_hits")
+                        return ArtifactRef(digest, entry["size"], entry["stored_size"], entry["content_type"], entry["encoding"])
+                    self._writing[digest] = threading.Event()
+                    break
+            # 同一内容正在由其他线程写入，等待完成后按已存在处理
+            writing.wait()
+
+        try:
+            stored, encoding = self._compress(data, content_type)
+            self.backend.put(digest, stored)
+            with self._lock:
+                self._record_locked(digest, len(data), len(stored), content_type, encoding, execution_id, holder)
+                self._evict_locked()
+        finally:
+            with self._lock:
+                self._writing.pop(digest).set()
+
+        metrics_registry.increment("artifact_store.bytes_written", len(stored))
+        metrics_registry.increment("artifact_store.bytes_saved", len(data) - len(stored))
+        return ArtifactRef(digest, len(data), len(stored), content_type, encoding)
+
+    def retain(self, digest: str, holder: str) -> bool:
+        """为已存在的制品登记持有方，制品不存在时返回False"""
+        with self._lock:
+            entry = self._ensure_index().get(digest)
+            if entry is None:
+                return False
+            if holder not in entry.get("holders", []):
+                self._record_locked(digest, entry["size"], entry["stored_size"], entry["content_type"],
+                                    entry["encoding"], None, holder)
+            return True
+
+    def release(self, digest: str, holder: str) -> bool:
+        """
+        释放持有方对制品的引用
+
+        没有其他持有方且没有执行记录引用时删除制品，返回是否已删除；
+        仍被执行记录引用的制品保留，由 LRU 淘汰处理。
+        """
+        with self._lock:
+            entry = self._ensure_index().get(digest)
+            if entry is None:
+                return False
+            holders = [item for item in entry.get("holders", []) if item != holder]
+            if holders or entry.get("executions"):
+                if len(holders) != len(entry.get("holders", [])):
+                    entry["holders"] = holders
+                    self._journal("set", digest=digest, entry=entry)
+                return False
+            self._remove_locked(digest)
+            return True
+
+    def get(self, digest: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """读取制品，返回 (解压后的内容, 元数据)；访问时间只更新内存索引，随下次写入或压缩落盘"""
+        with self._lock:
+            index = self._ensure_index()
+            entry = index.get(digest)
+            if entry is None:
+                return None
+            entry["last_access"] = time.time()
+            index.move_to_end(digest)
+            entry = dict(entry)
+
+        stored = self.backend.get(digest)
+        if stored is None:
+            with self._lock:
+                if digest not in self._writing and digest in self._index:
+                    self._remove_locked(digest)
+            return None
+        return self._decompress(stored, entry["encoding"]), entry
+
+    def get_metadata(self, digest: str) -> Optional[Dict[str, Any]]:
+        """获取制品元数据（不读取内容）"""
+        with self._lock:
+            entry = self._ensure_index().get(digest)
+            return dict(entry) if entry else None
+
+    def exists(self, digest: str) -> bool:
+        """检查制品是否存在（索引查找 + 后端检查）"""
+        with self._lock:
+            if digest not in self._ensure_index():
+                return False
+        return self.backend.exists(digest)
+
+    def materialize(self, digest: str, dest: Path) -> Optional[Path]:
+        """将制品解压写出到文件，供只接受文件路径的接口使用"""
+        result = self.get(digest)
+        if result is None:
+            return None
+        data, _ = result
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        with open(dest, "wb") as f:
+            f.write(data)
+        return dest
+
+    def delete(self, digest: str) -> bool:
+        """无视引用强制删除制品"""
+        with self._lock:
+            self._ensure_index()
+            return self._remove_locked(digest) is not None
+
+    # ==================== 淘汰 ====================
+
+    def _is_referenced(self, entry: Dict[str, Any]) -> bool:
+        """制品属于固定的最近执行，或仍被其他持有方引用；较早执行的制品按 LRU 淘汰"""
+        return bool(entry.get("holders")) or any(execution_id in self._pinned for execution_id in entry.get("executions", []))
+
+    def _evict_locked(self) -> int:
+        """总大小超过上限时，从最久未访问的未固定制品开始淘汰（调用方需持有锁）"""
+        if self._total_bytes <= self.max_bytes:
+            return 0
+        evicted = 0
+        for digest in list(self._index.keys()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if digest in self._writing or self._is_referenced(self._index[digest]):
+                continue
+            self._remove_locked(digest)
+            evicted += 1
+        if evicted:
+            metrics_registry.increment("artifact_store.evictions", evicted)
+            self.logger.info(f"制品存储超过上限，已淘汰 {evicted} 个制品，当前 {self._total_bytes} 字节")
+        if self._total_bytes > self.max_bytes:
+            self.logger.warning(f"制品存储超过上限且剩余制品均被引用，当前 {self._total_bytes} 字节")
+        return evicted
+
+    def evict(self) -> int:
+        """手动触发淘汰"""
+        with self._lock:
+            self._ensure_index()
+            return self._evict_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        """存储统计"""
+        with self._lock:
+            index = self._ensure_index()
+            return {
+                "entries": len(index),
+                "stored_bytes": self._total_bytes,
+                "original_bytes": sum(entry.get("size", 0) for entry in index.values()),
+                "max_bytes": self.max_bytes,
+                "referenced_entries": sum(1 for entry in index.values() if self._is_referenced(entry)),
+                "pinned_executions": sorted(self._pinned),
+                "compression": "zstd" if zstandard is not None else "identity"
+            }
+
+
+def _create_artifact_store() -> ArtifactStore:
+    config_manager = ConfigManager()
+    artifacts_dir = config_manager.get_artifacts_directory()
+    max_bytes = int(float(os.getenv("AUTOTEST_ARTIFACT_MAX_MB", "2048")) * 1024 * 1024)
+    pinned_executions = int(os.getenv("AUTOTEST_ARTIFACT_PINNED_EXECUTIONS", "20"))
+    return ArtifactStore(
+        LocalFileSystemBackend(artifacts_dir / "blobs"),
+        artifacts_dir / ArtifactStore.INDEX_FILE,
+        max_bytes=max_bytes,
+        pinned_executions=pinned_executions
+    )
+
+
+# 全局制品存储实例
+artifact_store = _create_artifact_store()
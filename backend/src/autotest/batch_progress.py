@@ -0,0 +1,73 @@
+"""
+批量执行进度计数
+批量执行器在内存中维护各状态的用例数量，每次状态迁移 O(1) 更新，
+只在批量任务开始和结束时与数据库中的分组统计对账
+"""
+
+import threading
+from typing import Dict, Optional
+
+# BatchExecution 上的计数字段 -> 计入该字段的用例状态
+# 已取消的用例没有单独的计数字段，统一计入 failed_count，保证各计数之和等于 total_count
+COUNTER_FIELD_STATUSES = {
+    "success_count": ("completed",),
+    "failed_count": ("failed", "cancelled"),
+    "running_count": ("running",),
+    "pending_count": ("pending",),
+}
+
+BATCH_TEST_CASE_STATUSES = ("pending", "running", "completed", "failed", "cancelled")
+
+
+def counter_fields_from_counts(counts: Dict[str, int]) -> Dict[str, int]:
+    """按各状态的用例数量计算 BatchExecution 的计数字段，执行器和停止接口共用同一规则"""
+    return {field: sum(counts.get(status, 0) for status in statuses) for field, statuses in COUNTER_FIELD_STATUSES.items()}
+
+
+class BatchProgress:
+    """批量执行任务的进度计数器"""
+
+    def __init__(self, total_count: int, counts: Optional[Dict[str, int]] = None):
+        self._lock = threading.Lock()
+        self.total_count = total_count
+        self._counts: Dict[str, int] = {status: 0 for status in BATCH_TEST_CASE_STATUSES}
+        if counts:
+            self._counts.update(counts)
+
+    def transition(self, from_status: str, to_status: str) -> Dict[str, int]:
+        """将一个用例从 from_status 迁移到 to_status，返回迁移后的计数字段"""
+        with self._lock:
+            if from_status != to_status:
+                self._counts[from_status] = max(0, self._counts.get(from_status, 0) - 1)
+                self._counts[to_status] = self._counts.get(to_status, 0) + 1
+            return self._counter_fields()
+
+    def reconcile(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        用数据库分组统计结果覆盖内存计数
+
+        Returns:
+            内存计数与统计结果的差异（统计值 - 内存值），一致时为空
+        """
+        with self._lock:
+            drift = {}
+            for status in set(self._counts) | set(counts):
+                difference = counts.get(status, 0) - self._counts.get(status, 0)
+                if difference:
+                    drift[status] = difference
+            self._counts = {status: 0 for status in BATCH_TEST_CASE_STATUSES}
+            self._counts.update(counts)
+            return drift
+
+    def counter_fields(self) -> Dict[str, int]:
+        """BatchExecution 上的计数字段"""
+        with self._lock:
+            return self._counter_fields()
+
+    def get(self, status: str) -> int:
+        """获取某个状态的用例数量"""
+        with self._lock:
+            return self._counts.get(status, 0)
+
+    def _counter_fields(self) -> Dict[str, int]:
+        return counter_fields_from_counts(self._counts)
@@ -17,6 +17,8 @@ from browser_use.browser.profile import BrowserProfile
 from playwright.async_api import async_playwright, Browser, Page
 from dotenv import load_dotenv
 
+from .browser_process_manager import browser_process_registry
+
 # 加载环境变量
 load_dotenv()
 
@@ -108,7 +110,9 @@ class BrowserAgent:
         """启动浏览器"""
         try:
             self.playwright = await async_playwright().start()
-            self.browser = await self.playwright.chromium.launch(
+            self.browser = await browser_process_registry.launch(
+                self.playwright,
+                execution_id=None,
                 headless=headless,
                 args=[
                     '--no-sandbox',
@@ -10,7 +10,8 @@ import time
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional, Callable
 from dataclasses import dataclass
-from .database import SessionLocal, TestStep
+from .step_writer import step_writer
+from .artifact_store import artifact_store, decode_image
 from datetime import datetime, timezone, timedelta
 
 # 设置时区为北京时间
@@ -31,6 +32,8 @@ class StepEventData:
     memory: Optional[str] = None
     next_goal: Optional[str] = None
     screenshot_data: Optional[str] = None
+    # 截图存入制品存储后的引用，数据库只保存该引用
+    screenshot_ref: Optional[str] = None
     status: str = "RUNNING"
     duration: Optional[float] = None
     error_message: Optional[str] = None
@@ -114,6 +117,10 @@ class BrowserUseEventCollector:
                 status="RUNNING"
             )
             
+            # 截图转存到制品存储，内存和数据库中只保留引用
+            step_data.screenshot_ref = await self._store_screenshot(step_data)
+            step_data.screenshot_data = None
+            
             # 计算步骤执行时间
             if step_number in self.step_start_times:
                 duration = (step_data.timestamp - self.step_start_times[step_number]).total_seconds()
@@ -184,6 +191,7 @@ class BrowserUseEventCollector:
                 last_step.status = "PASSED" if success else "FAILED"
                 if not success:
                     last_step.error_message = self.task_completion.error_message
+                await self._save_step_to_database(last_step, False)
             
             self.logger.info(f"任务完成记录: {self.task_completion.status}")
             
@@ -213,6 +221,7 @@ class BrowserUseEventCollector:
                 current_step = self.step_events[-1]
                 current_step.status = "FAILED"
                 current_step.error_message = str(getattr(event, 'error', '未知错误'))
+                await self._save_step_to_database(current_step, False)
                 
                 # 实时推送步骤更新到WebSocket
                 await self._broadcast_step_update(current_step)
@@ -232,127 +241,54 @@ class BrowserUseEventCollector:
             return screenshot_url
         return None
     
+    async def _store_screenshot(self, step_data: StepEventData) -> Optional[str]:
+        """将步骤截图存入制品存储，返回制品引用"""
+        if not step_data.screenshot_data:
+            return None
+        try:
+            image_data, content_type = decode_image(step_data.screenshot_data)
+            if image_data is None:
+                return None
+            artifact = await asyncio.to_thread(artifact_store.put, image_data, content_type, self.execution_id)
+            return artifact.ref
+        except Exception as e:
+            self.logger.warning(f"保存步骤 {step_data.step_number} 截图到制品存储失败: {e}")
+            return None
+    
     async def _save_step_to_database(self, step_data: StepEventData, is_new: bool = True):
-        """实时保存步骤数据到数据库"""
+        """提交步骤数据到后台写入器，由写入器合并并成组写入数据库"""
         try:
-            db = SessionLocal()
-            try:
-                if is_new:
-                    # 创建新的测试步骤记录
-                    step = TestStep(
-                        execution_id=self.execution_id,
-                        step_name=f"步骤 {step_data.step_number}",
-                        step_order=step_data.step_number,
-                        status=step_data.status,
-                        description=step_data.next_goal or step_data.evaluation or "执行浏览器操作",
-                        error_message=step_data.error_message,
-                        screenshot_path=step_data.screenshot_data,
-                        duration_seconds=step_data.duration,
-                        started_at=step_data.timestamp,
-                        completed_at=step_data.timestamp,
-                        # 新增字段
-                        url=step_data.url,
-                        actions=step_data.actions,
-                        evaluation=step_data.evaluation,
-                        memory=step_data.memory,
-                        next_goal=step_data.next_goal,
-                        screenshot_data=step_data.screenshot_data,
-                        event_timestamp=step_data.timestamp,
-                        step_metadata={
-                            "timestamp": step_data.timestamp.isoformat() if step_data.timestamp else None,
-                            "duration": step_data.duration
-                        }
-                    )
-                    db.add(step)
-                    db.commit()
-                    db.refresh(step)
-                    self.logger.info(f"步骤 {step_data.step_number} 已实时保存到数据库，ID: {step.id}")
-                else:
-                    # 查找并更新现有的测试步骤记录
-                    existing_step = db.query(TestStep).filter(
-                        TestStep.execution_id == self.execution_id,
-                        TestStep.step_order == step_data.step_number
-                    ).first()
-                    
-                    if existing_step:
-                        # 合并更新现有记录，保留非空值
-                        if step_data.url is not None:
-                            existing_step.url = step_data.url
-                        if step_data.actions is not None and len(step_data.actions) > 0:
-                            existing_step.actions = step_data.actions
-                        if step_data.evaluation is not None:
-                            existing_step.evaluation = step_data.evaluation
-                        if step_data.memory is not None:
-                            existing_step.memory = step_data.memory
-                        if step_data.next_goal is not None:
-                            existing_step.next_goal = step_data.next_goal
-                        if step_data.screenshot_data is not None:
-                            existing_step.screenshot_data = step_data.screenshot_data
-                        if step_data.status is not None:
-                            existing_step.status = step_data.status
-                        if step_data.duration is not None:
-                            existing_step.duration_seconds = step_data.duration
-                        if step_data.error_message is not None:
-                            existing_step.error_message = step_data.error_message
-                        
-                        existing_step.completed_at = step_data.timestamp
-                        existing_step.event_timestamp = step_data.timestamp
-                        existing_step.description = step_data.next_goal or step_data.evaluation or existing_step.description or "执行浏览器操作"
-                        
-                        # 更新元数据
-                        if existing_step.step_metadata:
-                            metadata = existing_step.step_metadata
-                            if step_data.timestamp:
-                                metadata["timestamp"] = step_data.timestamp.isoformat()
-                            if step_data.duration is not None:
-                                metadata["duration"] = step_data.duration
-                            existing_step.step_metadata = metadata
-                        else:
-                            existing_step.step_metadata = {
-                                "timestamp": step_data.timestamp.isoformat() if step_data.timestamp else None,
-                                "duration": step_data.duration
-                            }
-                        
-                        db.commit()
-                        db.refresh(existing_step)
-                        self.logger.info(f"步骤 {step_data.step_number} 已合并更新到数据库，ID: {existing_step.id}")
-                    else:
-                        # 如果没有找到现有记录，则创建新记录
-                        step = TestStep(
-                            execution_id=self.execution_id,
-                            step_name=f"步骤 {step_data.step_number}",
-                            step_order=step_data.step_number,
-                            status=step_data.status,
-                            description=step_data.next_goal or step_data.evaluation or "执行浏览器操作",
-                            error_message=step_data.error_message,
-                            screenshot_path=step_data.screenshot_data,
-                            duration_seconds=step_data.duration,
-                            started_at=step_data.timestamp,
-                            completed_at=step_data.timestamp,
-                            # 新增字段
-                            url=step_data.url,
-                            actions=step_data.actions,
-                            evaluation=step_data.evaluation,
-                            memory=step_data.memory,
-                            next_goal=step_data.next_goal,
-                            screenshot_data=step_data.screenshot_data,
-                            event_timestamp=step_data.timestamp,
-                            step_metadata={
-                                "timestamp": step_data.timestamp.isoformat() if step_data.timestamp else None,
-                                "duration": step_data.duration
-                            }
-                        )
-                        db.add(step)
-                        db.commit()
-                        db.refresh(step)
-                        self.logger.info(f"步骤 {step_data.step_number} 已实时保存到数据库，ID: {step.id}")
-            except Exception as e:
-                db.rollback()
-                self.logger.error(f"保存步骤 {step_data.step_number} 到数据库失败: {e}")
-            finally:
-                db.close()
+            values = {
+                "step_name": f"步骤 {step_data.step_number}",
+                "status": step_data.status,
+                "description": step_data.next_goal or step_data.evaluation or "执行浏览器操作",
+                "error_message": step_data.error_message,
+                "screenshot_path": step_data.screenshot_ref,
+                "duration_seconds": step_data.duration,
+                "completed_at": step_data.timestamp,
+                "url": step_data.url,
+                "actions": step_data.actions,
+                "evaluation": step_data.evaluation,
+                "memory": step_data.memory,
+                "next_goal": step_data.next_goal,
+                "event_timestamp": step_data.timestamp,
+                "step_metadata": {
+                    "timestamp": step_data.timestamp.isoformat() if step_data.timestamp else None,
+                    "duration": step_data.duration
+                }
+            }
+            # 只写入非空字段，保留数据库中已有的值
+            values = {field: value for field, value in values.items() if value is not None}
+            step_writer.enqueue(self.execution_id, step_data.step_number, values, started_at=step_data.timestamp)
         except Exception as e:
-            self.logger.error(f"获取数据库会话失败: {e}")
+            self.logger.error(f"提交步骤 {step_data.step_number} 写入失败: {e}")
+    
+    async def flush(self):
+        """等待本收集器提交的步骤全部写入数据库"""
+        try:
+            await step_writer.flush()
+        finally:
+            step_writer.forget_execution(self.execution_id)
     
     async def _broadcast_step_update(self, step_data: StepEventData):
         """广播步骤更新到WebSocket"""
@@ -439,7 +375,7 @@ class BrowserUseEventCollector:
                 "status": step_data.status,
                 "description": step_data.next_goal or step_data.evaluation or "执行浏览器操作",
                 "error_message": step_data.error_message,
-                "screenshot_path": step_data.screenshot_data,
+                "screenshot_path": step_data.screenshot_ref,
                 "duration_seconds": step_data.duration,
                 "url": step_data.url,
                 "actions": step_data.actions,
@@ -493,7 +429,7 @@ class BrowserUseEventCollector:
             evaluation=new_step.evaluation if new_step.evaluation is not None else existing_step.evaluation,
             memory=new_step.memory if new_step.memory is not None else existing_step.memory,
             next_goal=new_step.next_goal if new_step.next_goal is not None else existing_step.next_goal,
-            screenshot_data=new_step.screenshot_data if new_step.screenshot_data is not None else existing_step.screenshot_data,
+            screenshot_ref=new_step.screenshot_ref if new_step.screenshot_ref is not None else existing_step.screenshot_ref,
             status=new_step.status if new_step.status is not None else existing_step.status,
             duration=new_step.duration if new_step.duration is not None else existing_step.duration,
             error_message=new_step.error_message if new_step.error_message is not None else existing_step.error_message
@@ -0,0 +1,372 @@
+"""
+浏览器进程管理
+登记由执行器启动的 Chromium 进程，并回收所属执行已结束或所属服务进程已退出的孤儿浏览器
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import psutil
+
+from .config_manager import ConfigManager
+from .metrics import metrics_registry
+
+# 附加在浏览器启动参数中的标记，用于从进程表中找回浏览器主进程
+LAUNCH_MARKER = "--autotest-launch-id="
+# 启动浏览器的服务进程PID，未登记的浏览器据此判断所属服务进程是否已退出
+OWNER_MARKER = "--autotest-owner-pid="
+
+
+class BrowserProcessRegistry:
+    """浏览器进程登记表，持久化在数据目录中，服务重启后仍可找回上次遗留的进程"""
+
+    # 新启动的浏览器在此时间内不参与回收，避免与执行记录的写入产生竞争（秒）
+    REAP_GRACE_SECONDS = 30.0
+    # 终止进程后等待退出的时间（秒）
+    TERMINATE_TIMEOUT = 3.0
+
+    def __init__(self, registry_path: Optional[Path] = None, reap_interval: float = 60.0):
+        if registry_path is None:
+            registry_path = ConfigManager().get_browser_process_registry_path()
+        self.registry_path = Path(registry_path)
+        self.reap_interval = reap_interval
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._reaper_task: Optional[asyncio.Task] = None
+        # 浏览器断开连接时在线程中注销的任务，保留引用直到完成
+        self._unregister_tasks: Set[asyncio.Task] = set()
+
+    # ==================== 登记表读写 ====================
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """从磁盘读取登记表"""
+        try:
+            with open(self.registry_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            self.logger.warning(f"读取浏览器进程登记表失败，将重新创建: {e}")
+            return {}
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]):
+        """原子写入登记表"""
+        self.registry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.registry_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.registry_path)
+        metrics_registry.set_gauge("browser_reaper.tracked_browsers", len(entries))
+
+    def get_entries(self) -> Dict[str, Dict[str, Any]]:
+        """获取当前登记的所有浏览器进程"""
+        with self._lock:
+            return self._load()
+
+    # ==================== 启动与登记 ====================
+
+    @staticmethod
+    def new_launch_args(args: Iterable[str], owner_pid: Optional[int] = None) -> Tuple[str, List[str]]:
+        """生成启动标识，并返回附加了启动标记和所属服务进程标记的启动参数"""
+        launch_id = uuid.uuid4().hex
+        owner_pid = os.getpid() if owner_pid is None else owner_pid
+        return launch_id, [*args, f"{LAUNCH_MARKER}{launch_id}", f"{OWNER_MARKER}{owner_pid}"]
+
+    @staticmethod
+    def _find_launched_process(launch_id: str) -> Optional[psutil.Process]:
+        """在当前进程的子孙进程中查找带有启动标记的浏览器主进程"""
+        marker = f"{LAUNCH_MARKER}{launch_id}"
+        try:
+            descendants = psutil.Process().children(recursive=True)
+        except psutil.Error:
+            return None
+        for proc in descendants:
+            try:
+                if marker in proc.cmdline():
+                    return proc
+            except psutil.Error:
+                continue
+        return None
+
+    def register_launch(self, launch_id: str, execution_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """登记一个刚启动的浏览器进程"""
+        proc = self._find_launched_process(launch_id)
+        if proc is None:
+            self.logger.warning(f"未找到启动标识为 {launch_id} 的浏览器进程，无法登记")
+            return None
+
+        try:
+            pgid = os.getpgid(proc.pid) if hasattr(os, "getpgid") else None
+            entry = {
+                "pid": proc.pid,
+                "pgid": pgid,
+                "create_time": proc.create_time(),
+                "execution_id": execution_id,
+                "owner_pid": os.getpid(),
+                "registered_at": time.time()
+            }
+        except (psutil.Error, OSError) as e:
+            self.logger.warning(f"读取浏览器进程 {proc.pid} 信息失败: {e}")
+            return None
+
+        with self._lock:
+            entries = self._load()
+            entries[launch_id] = entry
+            self._save(entries)
+        self.logger.info(f"已登记浏览器进程 pid={entry['pid']} pgid={pgid} (执行记录: {execution_id})")
+        return entry
+
+    def unregister(self, launch_id: str):
+        """注销浏览器进程（浏览器正常关闭时调用）"""
+        with self._lock:
+            entries = self._load()
+            if entries.pop(launch_id, None) is not None:
+                self._save(entries)
+
+    def _unregister_in_thread(self, launch_id: str):
+        """在线程中注销浏览器进程，避免登记表读写阻塞事件循环"""
+        task = asyncio.get_running_loop().create_task(asyncio.to_thread(self.unregister, launch_id))
+        self._unregister_tasks.add(task)
+        task.add_done_callback(self._unregister_tasks.discard)
+
+    async def launch(self, playwright: Any, execution_id: Optional[int], headless: bool, args: List[str]) -> Any:
+        """启动并登记浏览器，浏览器断开连接时自动注销"""
+        launch_id, launch_args = self.new_launch_args(args)
+        browser = await playwright.chromium.launch(headless=headless, args=launch_args)
+        # 子孙进程扫描和登记表写入都是阻塞操作，放到线程中执行
+        await asyncio.to_thread(self.register_launch, launch_id, execution_id)
+        browser.on("disconnected", lambda _: self._unregister_in_thread(launch_id))
+        return browser
+
+    # ==================== 回收 ====================
+
+    @staticmethod
+    def _get_live_process(entry: Dict[str, Any]) -> Optional[psutil.Process]:
+        """返回登记项对应的存活进程；进程已退出或PID已被复用时返回None"""
+        try:
+            proc = psutil.Process(entry["pid"])
+            if abs(proc.create_time() - entry.get("create_time", 0)) > 1.0:
+                return None
+            if proc.status() == psutil.STATUS_ZOMBIE:
+                return None
+            return proc
+        except (psutil.Error, KeyError):
+            return None
+
+    @staticmethod
+    def _is_owner_gone(owner_pid: Optional[int], browser_create_time: float) -> bool:
+        """
+        判断启动浏览器的服务进程是否已退出
+
+        PID 不存在时视为已退出；PID 存在但该进程晚于浏览器启动，说明 PID 已被其他进程复用，同样视为已退出。
+        """
+        if not owner_pid:
+            return False
+        try:
+            owner = psutil.Process(owner_pid)
+            return owner.create_time() > browser_create_time
+        except psutil.NoSuchProcess:
+            return True
+        except psutil.Error:
+            return False
+
+    def _kill_process_tree(self, proc: psutil.Process, pgid: Optional[int]) -> Tuple[int, int]:
+        """终止浏览器进程及其子进程，返回 (终止的进程数, 回收的内存字节数)"""
+        try:
+            procs = [proc, *proc.children(recursive=True)]
+        except psutil.Error:
+            procs = [proc]
+
+        reclaimed_bytes = 0
+        for p in procs:
+            try:
+                reclaimed_bytes += p.memory_info().rss
+            except psutil.Error:
+                pass
+
+        # 浏览器是独立进程组的组长时，按进程组终止，覆盖已脱离父进程的子进程
+        own_pgid = os.getpgid(0) if hasattr(os, "getpgid") else None
+        if pgid and pgid == proc.pid and pgid != own_pgid and hasattr(os, "killpg"):
+            try:
+                os.killpg(pgid, signal.SIGTERM)
+            except OSError:
+                pass
+        for p in procs:
+            try:
+                p.terminate()
+            except psutil.Error:
+                pass
+
+        _, alive = psutil.wait_procs(procs, timeout=self.TERMINATE_TIMEOUT)
+        for p in alive:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        return len(procs), reclaimed_bytes
+
+    @staticmethod
+    def _load_active_execution_ids(execution_ids: Set[int]) -> Set[int]:
+        """查询仍在运行中的执行记录"""
+        if not execution_ids:
+            return set()
+        from .database import SessionLocal, TestExecution
+        db = SessionLocal()
+        try:
+            rows = db.query(TestExecution.id).filter(
+                TestExecution.id.in_(execution_ids),
+                TestExecution.status.in_(["running", "pending"])
+            ).all()
+            return {row[0] for row in rows}
+        finally:
+            db.close()
+
+    def _scan_untracked(self, tracked_launch_ids: Set[str]) -> List[psutil.Process]:
+        """
+        扫描带有启动标记、不在登记表中且所属服务进程已退出的浏览器主进程
+
+        所属服务进程仍存活的浏览器可能只是尚未完成登记，不做处理；没有所属进程标记的浏览器无法判断归属，同样跳过。
+        """
+        untracked = []
+        for proc in psutil.process_iter(["pid", "cmdline", "create_time"]):
+            try:
+                cmdline = proc.info.get("cmdline") or []
+                create_time = proc.info.get("create_time")
+            except psutil.Error:
+                continue
+            launch_id = owner_pid = None
+            for arg in cmdline:
+                if arg.startswith(LAUNCH_MARKER):
+                    launch_id = arg[len(LAUNCH_MARKER):]
+                elif arg.startswith(OWNER_MARKER) and arg[len(OWNER_MARKER):].isdigit():
+                    owner_pid = int(arg[len(OWNER_MARKER):])
+            if launch_id is None or launch_id in tracked_launch_ids or create_time is None:
+                continue
+            if self._is_owner_gone(owner_pid, create_time):
+                untracked.append(proc)
+        return untracked
+
+    def reap(self, startup: bool = False) -> Dict[str, Any]:
+        """
+        回收孤儿浏览器进程
+
+        以下情况的浏览器会被终止：
+        1. 登记它的服务进程已退出（上次运行遗留），PID 被复用时同样视为已退出
+        2. 登记它的是当前进程，且所属执行记录已不在运行中
+        启动时额外清理带有启动标记但未登记、且所属服务进程已退出的浏览器进程。
+        """
+        current_pid = os.getpid()
+        now = time.time()
+        killed_browsers = 0
+        killed_processes = 0
+        reclaimed_bytes = 0
+
+        with self._lock:
+            entries = self._load()
+            live: Dict[str, Tuple[Dict[str, Any], psutil.Process]] = {}
+            for launch_id, entry in entries.items():
+                proc = self._get_live_process(entry)
+                if proc is not None:
+                    live[launch_id] = (entry, proc)
+
+            # 当前进程登记的浏览器需要核对执行状态
+            own_execution_ids = {
+                entry["execution_id"] for entry, _ in live.values()
+                if entry.get("owner_pid") == current_pid and entry.get("execution_id") is not None
+            }
+
+        active_execution_ids = self._load_active_execution_ids(own_execution_ids)
+
+        to_kill: List[Tuple[str, Dict[str, Any], psutil.Process]] = []
+        for launch_id, (entry, proc) in live.items():
+            owner_pid = entry.get("owner_pid")
+            if owner_pid != current_pid:
+                if self._is_owner_gone(owner_pid, entry.get("create_time", 0)):
+                    to_kill.append((launch_id, entry, proc))
+                continue
+            if now - entry.get("registered_at", now) < self.REAP_GRACE_SECONDS:
+                continue
+            # 未关联执行记录的浏览器只在其服务进程退出后回收
+            execution_id = entry.get("execution_id")
+            if execution_id is not None and execution_id not in active_execution_ids:
+                to_kill.append((launch_id, entry, proc))
+
+        for launch_id, entry, proc in to_kill:
+            count, rss = self._kill_process_tree(proc, entry.get("pgid"))
+            killed_browsers += 1
+            killed_processes += count
+            reclaimed_bytes += rss
+            self.logger.warning(
+                f"已回收孤儿浏览器 pid={entry['pid']} (执行记录: {entry.get('execution_id')})，"
+                f"终止 {count} 个进程，释放 {rss / 1024 / 1024:.1f}MB"
+            )
+
+        if startup:
+            for proc in self._scan_untracked(set(live.keys())):
+                count, rss = self._kill_process_tree(proc, None)
+                killed_browsers += 1
+                killed_processes += count
+                reclaimed_bytes += rss
+                self.logger.warning(f"已回收未登记的浏览器 pid={proc.pid}，释放 {rss / 1024 / 1024:.1f}MB")
+
+        # 清理已退出和已回收的登记项
+        killed_ids = {launch_id for launch_id, _, _ in to_kill}
+        with self._lock:
+            entries = self._load()
+            remaining = {
+                launch_id: entry for launch_id, entry in entries.items()
+                if launch_id not in killed_ids and self._get_live_process(entry) is not None
+            }
+            if remaining != entries:
+                self._save(remaining)
+
+        metrics_registry.increment("browser_reaper.runs")
+        if killed_browsers:
+            metrics_registry.increment("browser_reaper.killed_browsers", killed_browsers)
+            metrics_registry.increment("browser_reaper.killed_processes", killed_processes)
+            metrics_registry.increment("browser_reaper.reclaimed_bytes", reclaimed_bytes)
+
+        return {
+            "killed_browsers": killed_browsers,
+            "killed_processes": killed_processes,
+            "reclaimed_bytes": reclaimed_bytes,
+            "tracked_browsers": len(remaining)
+        }
+
+    async def _reaper_loop(self):
+        """后台定期回收"""
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await asyncio.to_thread(self.reap)
+            except Exception as e:
+                self.logger.error(f"回收孤儿浏览器时出错: {e}")
+
+    def start_reaper(self):
+        """启动后台回收任务"""
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reaper_loop())
+            self.logger.info(f"浏览器进程回收任务已启动，间隔 {self.reap_interval}s")
+
+    async def stop_reaper(self):
+        """停止后台回收任务"""
+        if self._reaper_task is not None:
+            self._reaper_task.cancel()
+            try:
+                await self._reaper_task
+            except asyncio.CancelledError:
+                pass
+            self._reaper_task = None
+
+
+# 全局浏览器进程登记表实例
+browser_process_registry = BrowserProcessRegistry()
@@ -102,6 +102,10 @@ class ConfigManager:
         """获取提示词配置文件路径"""
         return self.data_dir / "prompt_config.json"
     
+    def get_browser_process_registry_path(self) -> Path:
+        """获取浏览器进程登记文件路径"""
+        return self.data_dir / "browser_processes.json"
+    
     def get_history_directory(self) -> Path:
         """获取history缓存目录路径"""
         history_dir = self.data_dir / "history"
@@ -114,6 +118,18 @@ class ConfigManager:
         screenshots_dir.mkdir(parents=True, exist_ok=True)
         return screenshots_dir
     
+    def get_artifacts_directory(self) -> Path:
+        """获取制品存储目录路径"""
+        artifacts_dir = self.data_dir / "artifacts"
+        artifacts_dir.mkdir(parents=True, exist_ok=True)
+        return artifacts_dir
+    
+    def get_reports_directory(self) -> Path:
+        """获取批量执行报告缓存目录路径"""
+        reports_dir = self.data_dir / "reports"
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        return reports_dir
+    
     def get_test_history_cache_directory(self) -> Path:
         """获取测试历史缓存目录路径"""
         cache_dir = self.data_dir / "test_history_cache"
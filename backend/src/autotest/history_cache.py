@@ -0,0 +1,218 @@
+"""
+History 缓存
+按测试内容哈希索引 agent history，内容相同的测试用例共享同一份缓存，
+修改操作步骤、预期结果或提示词后自然不会命中旧缓存。history 内容保存在制品存储中
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .artifact_store import ArtifactStore, artifact_store as default_artifact_store
+from .config_manager import ConfigManager
+from .metrics import metrics_registry
+
+# 设置时区为北京时间
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+class HistoryCache:
+    """内容寻址的 history 缓存，索引常驻内存并持久化到 index.json"""
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir: Path, store: ArtifactStore, ttl_days: int = 7):
+        self.cache_dir = Path(cache_dir)
+        self.store = store
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+
+    # ==================== 缓存键 ====================
+
+    @staticmethod
+    def normalize_text(text: Optional[str]) -> str:
+        """规范化文本：统一换行符，去除行尾空白和首尾空行，合并行内连续空白"""
+        if not text:
+            return ""
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        return "\n".join(" ".join(line.split()) for line in lines).strip()
+
+    @classmethod
+    def compute_key(cls, task_content: Optional[str], expected_result: Optional[str], prompt: Optional[str] = "") -> str:
+        """根据操作步骤、预期结果和提示词配置计算缓存键"""
+        payload = "\x1f".join([
+            cls.normalize_text(task_content),
+            cls.normalize_text(expected_result),
+            cls.normalize_text(prompt)
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def holder(key: str) -> str:
+        """缓存项在制品存储中的持有方标识"""
+        return f"history:{key}"
+
+    # ==================== 索引 ====================
+
+    @property
+    def index_path(self) -> Path:
+        return self.cache_dir / self.INDEX_FILE
+
+    def _ensure_index(self) -> Dict[str, Dict[str, Any]]:
+        """首次访问时从磁盘加载索引（调用方需持有锁）"""
+        if self._index is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._index = data if isinstance(data, dict) else {}
+            except FileNotFoundError:
+                self._index = {}
+            except Exception as e:
+                self.logger.warning(f"读取 history 缓存索引失败，将重建: {e}")
+                self._index = {}
+            # 登记缓存项对制品的引用（兼容引用计数之前写入的索引），已登记的不会重复写入
+            for key, entry in self._index.items():
+                self.store.retain(entry["digest"], self.holder(key))
+        return self._index
+
+    def _persist_index(self):
+        """原子写入索引（调用方需持有锁）"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    # ==================== 读写 ====================
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        查找缓存，命中时返回 history 制品的内容哈希
+
+        只查内存索引并确认制品存在，不读取也不解析 history 内容。
+        """
+        with self._lock:
+            entry = self._ensure_index().get(key)
+        if entry is None:
+            metrics_registry.increment("history_cache.miss")
+            return None
+
+        if time.time() - entry.get("stored_at", 0) > self.ttl_seconds:
+            self.logger.info(f"history 缓存 {key[:12]} 已过期")
+            metrics_registry.increment("history_cache.expired")
+            return None
+
+        if not self.store.exists(entry["digest"]):
+            self.logger.warning(f"history 缓存 {key[:12]} 的制品已被淘汰，移除索引项")
+            with self._lock:
+                self._index.pop(key, None)
+                self._persist_index()
+            metrics_registry.increment("history_cache.miss")
+            return None
+
+        metrics_registry.increment("history_cache.hit")
+        return entry["digest"]
+
+    def store_file(self, key: str, source_path: Path, test_case_id: Optional[int] = None, execution_id: Optional[int] = None) -> str:
+        """
+        将已写出的 history 文件存入缓存，返回制品引用
+
+        JSON 格式只在写入时校验一次，读取路径不再解析。
+        """
+        with open(source_path, "rb") as f:
+            data = f.read()
+        json.loads(data)
+
+        artifact = self.store.put(data, "application/json", execution_id=execution_id, holder=self.holder(key))
+
+        with self._lock:
+            index = self._ensure_index()
+            previous = index.get(key, {})
+            test_case_ids = set(previous.get("test_case_ids", []))
+            if test_case_id is not None:
+                test_case_ids.add(test_case_id)
+            index[key] = {
+                "digest": artifact.digest,
+                "stored_at": time.time(),
+                "test_case_ids": sorted(test_case_ids)
+            }
+            self._persist_index()
+
+        # 同一缓存键改存了新内容时，释放对旧制品的引用
+        if previous.get("digest") not in (None, artifact.digest):
+            self.store.release(previous["digest"], self.holder(key))
+        return artifact.ref
+
+    def temp_path(self, key: str) -> Path:
+        """获取写出或还原 history 时使用的临时文件路径"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return self.cache_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def materialize(self, key: str) -> Optional[Path]:
+        """将命中的 history 解压写出为临时文件，供回放接口读取；调用方负责删除"""
+        digest = self.lookup(key)
+        if digest is None:
+            return None
+        return self.store.materialize(digest, self.temp_path(key))
+
+    def invalidate(self, key: str) -> bool:
+        """使缓存失效并释放对应制品，制品没有其他引用时删除"""
+        with self._lock:
+            entry = self._ensure_index().pop(key, None)
+            if entry is not None:
+                self._persist_index()
+        if entry is None:
+            return False
+        self.store.release(entry["digest"], self.holder(key))
+        return True
+
+    def remove_expired(self, max_days: int) -> int:
+        """删除超过指定天数的缓存并释放对应制品，返回删除数量"""
+        cutoff = time.time() - max_days * 24 * 3600
+        with self._lock:
+            index = self._ensure_index()
+            expired = {key: index.pop(key) for key in [k for k, e in index.items() if e.get("stored_at", 0) < cutoff]}
+            if expired:
+                self._persist_index()
+        for key, entry in expired.items():
+            self.store.release(entry["digest"], self.holder(key))
+        return len(expired)
+
+    def get_stored_at(self, key: str) -> Optional[datetime]:
+        """获取缓存写入时间"""
+        with self._lock:
+            entry = self._ensure_index().get(key)
+        if not entry:
+            return None
+        return datetime.fromtimestamp(entry["stored_at"], BEIJING_TZ)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计，直接从索引汇总"""
+        with self._lock:
+            entries = list(self._ensure_index().values())
+        size_bytes = 0
+        for entry in entries:
+            metadata = self.store.get_metadata(entry["digest"])
+            if metadata:
+                size_bytes += metadata.get("stored_size", 0)
+        return {
+            "entries": len(entries),
+            "size_bytes": size_bytes,
+            "shared_entries": sum(1 for entry in entries if len(entry.get("test_case_ids", [])) > 1)
+        }
+
+
+def _create_history_cache() -> HistoryCache:
+    return HistoryCache(ConfigManager().get_history_directory(), default_artifact_store)
+
+
+# 全局 history 缓存实例
+history_cache = _create_history_cache()
@@ -5,10 +5,19 @@ FastAPI application with complete REST API for web automation testing
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+import asyncio
+import logging
+import os
 import uvicorn
 
-from .database import init_db
-from .routers import test_cases, test_executions, statistics, config, websocket, categories, multi_model_config, import_tasks
+from .database import init_db, dispose_async_engines
+from .browser_process_manager import browser_process_registry
+from .services.screenshot_service import migrate_inline_screenshots
+from .step_writer import step_writer
+from .compression import CompressionMiddleware
+from .routers import test_cases, test_executions, statistics, config, websocket, categories, multi_model_config, import_tasks, metrics, artifacts, search, exports
+
+logger = logging.getLogger(__name__)
 
 # 创建FastAPI应用实例
 app = FastAPI(
@@ -28,6 +37,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 添加响应压缩中间件（gzip/brotli），小于阈值的响应不压缩
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("AUTOTEST_COMPRESSION_MIN_SIZE", "1024")),
+)
+
 # ==================== 基础路由 ====================
 
 @app.get("/")
@@ -72,6 +87,18 @@ app.include_router(multi_model_config.router)
 # 导入任务管理路由
 app.include_router(import_tasks.router, prefix="/api")
 
+# 运行指标路由
+app.include_router(metrics.router, prefix="/api")
+
+# 制品存储路由
+app.include_router(artifacts.router, prefix="/api")
+
+# 全文检索路由
+app.include_router(search.router, prefix="/api")
+
+# 数据导出路由
+app.include_router(exports.router, prefix="/api")
+
 # WebSocket 路由
 app.include_router(websocket.router)
 
@@ -79,8 +106,28 @@ app.include_router(websocket.router)
 
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时初始化数据库"""
+    """应用启动时初始化数据库，回收上次运行遗留的浏览器进程"""
     init_db()
+    await asyncio.to_thread(browser_process_registry.reap, True)
+    browser_process_registry.start_reaper()
+    # 后台将旧数据中行内保存的截图迁移到制品存储；保留任务引用，避免运行中被回收
+    app.state.screenshot_migration_task = asyncio.create_task(asyncio.to_thread(migrate_inline_screenshots))
+    app.state.screenshot_migration_task.add_done_callback(_log_screenshot_migration_result)
+
+def _log_screenshot_migration_result(task: asyncio.Task):
+    """记录截图迁移任务的异常，否则异常不会被读取"""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error is not None:
+        logger.error(f"迁移行内截图失败: {error}", exc_info=error)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时写入剩余步骤数据并停止后台任务"""
+    await step_writer.stop()
+    await browser_process_registry.stop_reaper()
+    await dispose_async_engines()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
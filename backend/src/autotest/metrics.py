@@ -0,0 +1,91 @@
+"""
+运行时指标收集
+进程内的轻量指标注册表，用于记录计数器、瞬时值和耗时分布
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict
+
+
+class MetricsRegistry:
+    """进程内指标注册表"""
+
+    def __init__(self, max_samples: int = 500):
+        self._lock = threading.Lock()
+        self._max_samples = max_samples
+        # 计数器：只增不减
+        self._counters: Dict[str, float] = {}
+        # 瞬时值：最后一次设置的值
+        self._gauges: Dict[str, float] = {}
+        # 观测值：保留最近 max_samples 个样本用于计算分位数
+        self._samples: Dict[str, Deque[float]] = {}
+        self._sample_counts: Dict[str, int] = {}
+        self._sample_totals: Dict[str, float] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """设置瞬时值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """记录一次观测值（如耗时）"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = deque(maxlen=self._max_samples)
+                self._samples[name] = samples
+            samples.append(value)
+            self._sample_counts[name] = self._sample_counts.get(name, 0) + 1
+            self._sample_totals[name] = self._sample_totals.get(name, 0.0) + value
+
+    def get_counter(self, name: str) -> float:
+        """获取计数器当前值"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def _summarize(self, name: str) -> Dict[str, Any]:
+        """汇总单个观测指标"""
+        samples = sorted(self._samples[name])
+        count = self._sample_counts.get(name, 0)
+
+        def percentile(p: float) -> float:
+            index = min(len(samples) - 1, max(0, int(round(p * (len(samples) - 1)))))
+            return samples[index]
+
+        return {
+            "count": count,
+            "avg": round(self._sample_totals.get(name, 0.0) / count, 3) if count else 0,
+            "last": self._samples[name][-1],
+            "min": samples[0],
+            "max": samples[-1],
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取所有指标的快照"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "observations": {name: self._summarize(name) for name in self._samples if self._samples[name]},
+            }
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._samples.clear()
+            self._sample_counts.clear()
+            self._sample_totals.clear()
+
+
+# 全局指标注册表实例
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,205 @@
+"""
+数据库结构迁移
+按版本号顺序执行未应用的迁移，已应用的版本记录在 schema_version 表中。
+SQLite 驱动和 MySQL 执行 DDL 时都会隐式提交，失败的迁移不会回滚已执行的 DDL，
+只是不记录版本、下次启动重试，因此每个迁移都应写成可重复执行的
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterable, List
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+from .database import Base, Category, CategoryClosure, EntityCounter, ExecutionDailyStat, ExecutionDurationStat, TestCaseStat, beijing_now
+from .services.search_service import SEARCH_INDEXES, create_search_index
+from .services.statistics_service import create_statistics_triggers, rebuild_statistics
+
+logger = logging.getLogger(__name__)
+
+# 迁移记录表，不属于业务模型
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """一个结构迁移"""
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_indexes(connection: Connection, indexes: Iterable[Index]):
+    """
+    创建尚不存在的索引
+
+    索引定义取自模型的 __table_args__，新库由 create_all 创建，已有数据库由迁移补齐；
+    部分索引的条件只在 SQLite 上生效，MySQL 上创建为普通索引。
+    """
+    inspector = inspect(connection)
+    for index in indexes:
+        existing = {item["name"] for item in inspector.get_indexes(index.table.name)}
+        if index.name in existing:
+            continue
+        index.create(connection)
+        logger.info(f"已创建索引 {index.name}")
+
+
+def _model_indexes(*index_names: str) -> List[Index]:
+    """按名称取模型上声明的索引"""
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    return [indexes[name] for name in index_names]
+
+
+def _add_hot_path_indexes(connection: Connection):
+    create_indexes(connection, _model_indexes(
+        "ix_test_case_live_status",
+        "ix_test_case_live_category_id",
+        "ix_test_execution_test_case_created",
+        "ix_test_execution_created_at",
+        "ix_test_step_execution_order",
+        "ix_category_parent_id",
+        "ix_batch_execution_test_case_batch_status",
+    ))
+
+
+# 计数器名称 -> (表名, 是否只统计未删除的行)
+ENTITY_COUNTERS = {
+    "test_case": ("test_case", True),
+    "test_execution": ("test_execution", False),
+    "batch_execution": ("batch_execution", False),
+}
+
+
+def _counted(row: str, live_only: bool) -> str:
+    """一行是否计入计数器的 SQL 表达式（1 或 0）"""
+    return f"(CASE WHEN {row}.is_deleted = 0 THEN 1 ELSE 0 END)" if live_only else "1"
+
+
+def create_counter_triggers(connection: Connection, name: str, table: str, live_only: bool):
+    """
+    创建维护计数器的触发器
+
+    插入、删除时增减计数；软删除的表在 is_deleted 变化时同步调整。
+    SQLite 和 MySQL 的触发器语法不同，这里只生成两者都支持的单语句触发器。
+    """
+    triggers = {
+        "insert": ("AFTER INSERT", _counted("NEW", live_only)),
+        "delete": ("AFTER DELETE", f"-{_counted('OLD', live_only)}"),
+    }
+    if live_only:
+        triggers["update"] = ("AFTER UPDATE", f"{_counted('NEW', True)} - {_counted('OLD', True)}")
+
+    for suffix, (timing, delta) in triggers.items():
+        trigger_name = f"trg_{table}_count_{suffix}"
+        body = f"UPDATE entity_counter SET value = value + {delta} WHERE name = '{name}'"
+        if connection.dialect.name == "sqlite":
+            body = f"BEGIN {body}; END"
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+        connection.execute(text(f"CREATE TRIGGER {trigger_name} {timing} ON {table} FOR EACH ROW {body}"))
+
+
+def _add_keyset_pagination(connection: Connection):
+    create_indexes(connection, _model_indexes(
+        "ix_test_case_live_created",
+        "ix_batch_execution_created_at",
+    ))
+    EntityCounter.__table__.create(connection, checkfirst=True)
+    for name, (table, live_only) in ENTITY_COUNTERS.items():
+        create_counter_triggers(connection, name, table, live_only)
+        # 触发器创建后用当前数量初始化计数器
+        connection.execute(text("DELETE FROM entity_counter WHERE name = :name"), {"name": name})
+        connection.execute(text(
+            f"INSERT INTO entity_counter (name, value) SELECT :name, COUNT(*) FROM {table}"
+            + (" WHERE is_deleted = 0" if live_only else "")
+        ), {"name": name})
+
+
+def _add_full_text_search(connection: Connection):
+    for index in SEARCH_INDEXES.values():
+        try:
+            create_search_index(connection, index)
+        except OperationalError as e:
+            # SQLite 未编译 FTS5 或版本过旧（trigram 需要 3.34+）时跳过，检索退化为 LIKE
+            logger.warning(f"创建全文索引 {index.fts_table} 失败，检索将使用 LIKE 扫描: {e}")
+
+
+def _add_statistics_rollups(connection: Connection):
+    for model in (TestCaseStat, ExecutionDailyStat, ExecutionDurationStat):
+        model.__table__.create(connection, checkfirst=True)
+    create_statistics_triggers(connection)
+    rebuild_statistics(connection)
+
+
+def build_category_closure(connection: Connection):
+    """根据 parent_id 重建分类闭包表，父子关系存在环时在环处截断"""
+    parents = dict(connection.execute(select(Category.id, Category.parent_id)).all())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, visited = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id in parents and ancestor_id not in visited:
+            visited.add(ancestor_id)
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": category_id, "depth": depth})
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+
+    connection.execute(CategoryClosure.__table__.delete())
+    if rows:
+        connection.execute(insert(CategoryClosure), rows)
+
+
+def _add_category_closure(connection: Connection):
+    CategoryClosure.__table__.create(connection, checkfirst=True)
+    build_category_closure(connection)
+
+
+# 按版本号递增追加，已发布的迁移不要修改
+MIGRATIONS: List[Migration] = [
+    Migration(1, "add_hot_path_indexes", _add_hot_path_indexes),
+    Migration(2, "add_keyset_pagination", _add_keyset_pagination),
+    Migration(3, "add_full_text_search", _add_full_text_search),
+    Migration(4, "add_statistics_rollups", _add_statistics_rollups),
+    Migration(5, "add_category_closure", _add_category_closure),
+]
+
+
+def get_applied_versions(engine: Engine) -> List[int]:
+    """获取已应用的迁移版本"""
+    version_metadata.create_all(engine)
+    with engine.connect() as connection:
+        return [row.version for row in connection.execute(select(schema_version.c.version).order_by(schema_version.c.version))]
+
+
+def run_migrations(engine: Engine, migrations: List[Migration] = None) -> List[int]:
+    """
+    执行所有未应用的迁移
+
+    Returns:
+        本次应用的迁移版本
+    """
+    migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda migration: migration.version)
+    applied = set(get_applied_versions(engine))
+    newly_applied = []
+
+    for migration in migrations:
+        if migration.version in applied:
+            continue
+        logger.info(f"应用数据库迁移 {migration.version}: {migration.name}")
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(insert(schema_version).values(
+                version=migration.version,
+                name=migration.name,
+                applied_at=beijing_now(),
+            ))
+        newly_applied.append(migration.version)
+
+    return newly_applied
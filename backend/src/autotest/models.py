@@ -27,6 +27,24 @@ class TestCaseUpdate(BaseModel):
     tags: Optional[List[str]] = None
     expected_result: Optional[str] = None
 
+class TestCaseBulkUpdateItem(TestCaseUpdate):
+    """批量更新中的一项，只更新传入的字段"""
+    id: int
+
+class BulkItemResult(BaseModel):
+    """批量操作中单项的结果，index 为该项在请求中的位置"""
+    index: int
+    id: Optional[int] = None
+    success: bool
+    error: Optional[str] = None
+
+class BulkOperationResponse(BaseModel):
+    """批量操作结果"""
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
 class TestCaseResponse(BaseModel):
     id: int
     name: str
@@ -69,6 +87,8 @@ class CategoryResponse(BaseModel):
     updated_at: Optional[datetime] = None
     children: Optional[List['CategoryResponse']] = []
     test_case_count: Optional[int] = 0
+    # 包括所有子分类在内的测试用例数量
+    total_test_case_count: Optional[int] = 0
 
     class Config:
         from_attributes = True
@@ -135,6 +155,17 @@ class BatchExecutionRequest(BaseModel):
     test_case_ids: List[int]
     headless: bool = False
 
+class BatchSelectionRequest(BaseModel):
+    """按筛选条件或指定用例创建批量执行任务"""
+    test_case_ids: Optional[List[int]] = Field(default=None, description="指定的测试用例ID，不能与筛选条件同时使用")
+    category_id: Optional[int] = Field(default=None, description="分类ID")
+    include_children: bool = Field(default=True, description="是否包含子分类下的用例")
+    tags: Optional[List[str]] = Field(default=None, description="包含任一标签的用例")
+    priority: Optional[List[str]] = Field(default=None, description="优先级")
+    status: Optional[List[str]] = Field(default=None, description="用例状态")
+    name: Optional[str] = Field(default=None, description="批量执行任务名称，默认按创建时间生成")
+    headless: bool = False
+
 class BatchExecutionResponse(BaseModel):
     success: bool
     total_count: int
@@ -0,0 +1,34 @@
+"""
+JSON 序列化
+自行构造 JSON 响应的接口（字段投影的列表、响应缓存）使用 orjson 序列化，
+orjson 未安装时退回标准库 json
+"""
+
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时使用标准库 json
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """
+    序列化为 UTF-8 编码的 JSON
+
+    orjson 直接支持 datetime、dict、list 等类型，其他类型（如 Pydantic 模型）交给 jsonable_encoder 转换
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 orjson 序列化的 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,35 @@
+"""
+制品存储路由
+"""
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from ..artifact_store import artifact_store
+
+router = APIRouter(prefix="/artifacts", tags=["制品存储"])
+
+@router.get("/stats")
+async def get_artifact_stats():
+    """获取制品存储统计信息"""
+    return artifact_store.stats()
+
+@router.get("/{digest}")
+async def get_artifact(digest: str, request: Request):
+    """按内容哈希获取制品（内容不可变，可长期缓存）"""
+    etag = f'"{digest}"'
+    if request.headers.get("if-none-match") == etag and artifact_store.exists(digest):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    result = artifact_store.get(digest)
+    if result is None:
+        raise HTTPException(status_code=404, detail="制品不存在")
+    data, metadata = result
+    return Response(
+        content=data,
+        media_type=metadata["content_type"],
+        headers={
+            "ETag": etag,
+            "Cache-Control": "public, max-age=31536000, immutable"
+        }
+    )
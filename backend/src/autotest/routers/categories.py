@@ -2,12 +2,14 @@
 分类管理路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..database import get_db
 from ..models import CategoryCreate, CategoryUpdate, CategoryResponse, CategoryTreeResponse
 from ..services.category_service import CategoryService
+from ..services.response_cache import response_cache
 
 router = APIRouter(prefix="/categories", tags=["分类管理"])
 
@@ -39,14 +41,18 @@ def get_categories(
         raise HTTPException(status_code=500, detail=f"获取分类列表失败: {str(e)}")
 
 @router.get("/tree", response_model=List[CategoryResponse])
-def get_category_tree(
+async def get_category_tree(
+    request: Request,
     include_inactive: bool = Query(False, description="是否包含非激活分类"),
     db: Session = Depends(get_db)
 ):
-    """获取分类树形结构"""
+    """获取分类树形结构（分类或测试用例有写入后缓存失效）"""
     try:
         category_service = CategoryService(db)
-        return category_service.get_category_tree(include_inactive)
+        return await response_cache.respond(
+            request, ("category", "test_case"),
+            lambda response: run_in_threadpool(category_service.get_category_tree, include_inactive)
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取分类树失败: {str(e)}")
 
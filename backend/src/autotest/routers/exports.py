@@ -0,0 +1,36 @@
+"""
+数据导出路由
+"""
+
+from datetime import date, datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from ..services.export_service import EXPORT_MEDIA_TYPES, export_service
+
+router = APIRouter(prefix="/exports", tags=["数据导出"])
+
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: str,
+    export_format: Literal["ndjson", "csv", "xlsx"] = Query("ndjson", alias="format"),
+    category_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    status: Optional[str] = None
+):
+    """
+    流式导出测试用例（test_cases）、执行记录（executions）或执行步骤（steps）
+
+    category_id 包含所有子分类；start_date、end_date 均包含当天。
+    """
+    export = export_service.get_dataset(dataset)
+    statement = export_service.build_query(export, category_id, start_date, end_date, status)
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        export_service.export(export, statement, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
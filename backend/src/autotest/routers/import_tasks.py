@@ -4,12 +4,12 @@
 
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import json
 import os
 
-from ..database import get_db
+from ..database import get_async_db
 from ..models import (
     ImportTaskCreate, 
     ImportTaskResponse, 
@@ -31,7 +31,7 @@ async def create_import_task(
     import_mode: str = Form("smart"),
     import_options: str = Form(...),
     batch_size: int = Form(10),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建导入任务"""
     try:
@@ -60,7 +60,7 @@ async def create_import_task(
 @router.get("/", response_model=ImportTaskListResponse)
 async def list_import_tasks(
     limit: int = 10,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取导入任务列表"""
     tasks = await async_import_service.list_tasks(db, limit)
@@ -75,7 +75,7 @@ async def list_import_tasks(
 @router.get("/{task_id}/status", response_model=ImportTaskStatus)
 async def get_task_status(
     task_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取任务状态"""
     return await async_import_service.get_task_status(task_id, db)
@@ -83,14 +83,14 @@ async def get_task_status(
 @router.post("/{task_id}/cancel")
 async def cancel_import_task(
     task_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """取消导入任务"""
     success = await async_import_service.cancel_task(task_id, db)
     return {"success": success, "message": "任务已取消"}
 
 @router.get("/has-running")
-async def check_running_task(db: Session = Depends(get_db)):
+async def check_running_task(db: AsyncSession = Depends(get_async_db)):
     """检查是否有正在运行的任务"""
     has_running = await async_import_service.has_running_task(db)
     return {"has_running_task": has_running}
@@ -111,12 +111,12 @@ async def download_excel_template():
 @router.get("/{task_id}", response_model=ImportTaskResponse)
 async def get_import_task(
     task_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取导入任务详情"""
     from ..database import ImportTask
     
-    task = db.query(ImportTask).filter(ImportTask.id == task_id).first()
+    task = await db.get(ImportTask, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     
@@ -0,0 +1,14 @@
+"""
+运行指标路由
+"""
+
+from fastapi import APIRouter
+
+from ..metrics import metrics_registry
+
+router = APIRouter(prefix="/metrics", tags=["运行指标"])
+
+@router.get("/")
+async def get_metrics():
+    """获取进程内运行指标快照"""
+    return metrics_registry.snapshot()
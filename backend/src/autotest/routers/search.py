@@ -0,0 +1,24 @@
+"""
+全文检索路由
+"""
+
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
+from ..services.search_service import search_service
+
+router = APIRouter(prefix="/search", tags=["全文检索"])
+
+@router.get("/")
+async def search(
+    q: str = Query(..., min_length=1, description="检索词，多个词以空格分隔"),
+    scope: Literal["test_cases", "executions"] = "test_cases",
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """检索测试用例（名称、任务内容、预期结果）或执行记录（错误信息、测试总结），按相关度排序"""
+    return await search_service.search(db, scope, q, limit=limit, offset=offset)
@@ -2,38 +2,56 @@
 统计信息路由
 """
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Optional
 
-from ..database import get_db, TestCase, TestExecution
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
 from ..models import TestStatistics
+from ..services.response_cache import response_cache
+from ..services.statistics_service import StatisticsService, rebuild
 
 router = APIRouter(prefix="/statistics", tags=["统计信息"])
 
 @router.get("/", response_model=TestStatistics)
-async def get_test_statistics(db: Session = Depends(get_db)):
-    """获取测试统计信息"""
-    total_test_cases = db.query(TestCase).filter(TestCase.is_deleted == False).count()
-    active_test_cases = db.query(TestCase).filter(
-        TestCase.is_deleted == False,
-        TestCase.status == "active"
-    ).count()
-    
-    total_executions = db.query(TestExecution).count()
-    passed_executions = db.query(TestExecution).filter(
-        TestExecution.status == "passed"
-    ).count()
-    failed_executions = db.query(TestExecution).filter(
-        TestExecution.status.in_(["failed", "error"])
-    ).count()
-    
-    success_rate = (passed_executions / total_executions * 100) if total_executions > 0 else 0
-    
-    return TestStatistics(
-        total_test_cases=total_test_cases,
-        active_test_cases=active_test_cases,
-        total_executions=total_executions,
-        passed_executions=passed_executions,
-        failed_executions=failed_executions,
-        success_rate=round(success_rate, 2)
-    ) 
\ No newline at end of file
+async def get_test_statistics(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """获取测试统计信息（读取汇总表）"""
+    async def build(response):
+        return TestStatistics(**await StatisticsService.get_summary(db))
+    return await response_cache.respond(request, ("test_case", "test_execution"), build)
+
+@router.get("/trends/pass-rate")
+async def get_pass_rate_trend(
+    days: int = Query(30, ge=1, le=366),
+    category_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取按天的执行次数和通过率，category_id 为 0 表示未分类"""
+    return await StatisticsService.get_pass_rate_trend(db, days, category_id)
+
+@router.get("/trends/categories")
+async def get_category_trend(
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取按分类的执行次数、通过率和平均耗时"""
+    return await StatisticsService.get_category_trend(db, days)
+
+@router.get("/trends/duration")
+async def get_duration_percentiles(
+    days: int = Query(30, ge=1, le=366),
+    category_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取执行时间分位数（秒）"""
+    return await StatisticsService.get_duration_percentiles(db, days, category_id)
+
+@router.post("/rebuild")
+async def rebuild_statistics():
+    """从明细表重建统计汇总数据，用于修复汇总异常"""
+    await asyncio.to_thread(rebuild)
+    # 重建直接在连接上执行 SQL，不经过会话，需要手动让缓存失效
+    response_cache.invalidate("test_case", "test_execution")
+    return {"success": True, "message": "统计汇总数据已重建"}
@@ -2,18 +2,23 @@
 测试用例管理路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 import io
 import json
 
-from ..database import get_db, TestCase
-from ..models import TestCaseCreate, TestCaseUpdate, TestCaseResponse
+from ..database import get_db, get_async_db, TestCase
+from ..models import TestCaseCreate, TestCaseUpdate, TestCaseResponse, BulkOperationResponse
 from ..services.excel_service import ExcelService
+from ..services.pagination_service import PaginationService
+from ..services.response_cache import response_cache
+from ..services.bulk_service import BulkTestCaseService
 
 router = APIRouter(prefix="/test-cases", tags=["测试用例管理"])
 
@@ -21,62 +26,134 @@ router = APIRouter(prefix="/test-cases", tags=["测试用例管理"])
 class TestCasesResponse(BaseModel):
     """测试用例列表响应模型"""
     test_cases: List[TestCaseResponse]
-    total: int
+    total: Optional[int]
     skip: int
     limit: int
+    next_cursor: Optional[str] = None
 
 
 @router.get("/", response_model=TestCasesResponse)
 async def get_test_cases(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
     category: Optional[str] = None,
     category_id: Optional[int] = None,
     priority: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取测试用例列表（支持分页）"""
-    query = db.query(TestCase).filter(TestCase.is_deleted == False)
+    """
+    获取测试用例列表（支持分页）
+
+    不传 cursor 时按 skip/limit 分页；传入 cursor（第一页传空字符串）时按创建时间倒序做游标分页，
+    忽略 skip，并在 next_cursor 中返回下一页游标。
+    include_total=false 时不计算总数；不带过滤条件时总数读取维护的计数器。
+    响应按查询参数缓存，测试用例或分类有写入后失效。
+    """
+    return await response_cache.respond(
+        request, ("test_case", "category", "category_closure"),
+        lambda response: _list_test_cases(db, skip, limit, status, category, category_id, priority, cursor, include_total)
+    )
+
+
+async def _list_test_cases(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    status: Optional[str],
+    category: Optional[str],
+    category_id: Optional[int],
+    priority: Optional[str],
+    cursor: Optional[str],
+    include_total: bool
+) -> TestCasesResponse:
+    """查询测试用例列表"""
+    query = select(TestCase).where(TestCase.is_deleted == False)
     
     if status:
-        query = query.filter(TestCase.status == status)
+        query = query.where(TestCase.status == status)
     if category:
-        query = query.filter(TestCase.category == category)
+        query = query.where(TestCase.category == category)
     if category_id:
         # 支持按分类ID查询，包括子分类下的测试用例
         from ..services.category_service import CategoryService
-        category_service = CategoryService(db)
-        test_case_ids = category_service.get_category_test_cases(category_id, include_children=True)
+        test_case_ids = await db.run_sync(
+            lambda session: CategoryService(session).get_category_test_cases(category_id, include_children=True)
+        )
         if test_case_ids:
-            query = query.filter(TestCase.id.in_(test_case_ids))
+            query = query.where(TestCase.id.in_(test_case_ids))
         else:
             # 如果没有找到任何测试用例，返回空列表
             return TestCasesResponse(test_cases=[], total=0, skip=skip, limit=limit)
     if priority:
-        query = query.filter(TestCase.priority == priority)
+        query = query.where(TestCase.priority == priority)
     
     # 获取总数
-    total = query.count()
+    total = None
+    if include_total:
+        filtered = any([status, category, category_id, priority])
+        total = await PaginationService.count_total(db, query, None if filtered else "test_case")
     
     # 应用分页
-    test_cases = query.offset(skip).limit(limit).all()
+    next_cursor = None
+    if cursor is not None:
+        test_cases, next_cursor = await PaginationService.fetch_page(
+            db, PaginationService.keyset(query, TestCase.created_at, TestCase.id, cursor), limit
+        )
+    else:
+        test_cases = (await db.scalars(query.offset(skip).limit(limit))).all()
     
     return TestCasesResponse(
         test_cases=test_cases,
         total=total,
         skip=skip,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor
     )
 
 
+# 批量操作路由 - 必须在 /{test_case_id} 之前定义
+# 同步数据库会话的批量写入使用普通函数，由线程池执行，不阻塞事件循环
+@router.post("/bulk", response_model=BulkOperationResponse)
+def bulk_create_test_cases(
+    items: List[Dict[str, Any]],
+    atomic: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    批量创建测试用例
+
+    每一项的字段与创建单个测试用例相同，逐项返回结果；atomic=true 时任一项校验失败则全部不写入。
+    """
+    return BulkTestCaseService(db).create(items, atomic=atomic)
+
+
+@router.put("/bulk", response_model=BulkOperationResponse)
+def bulk_update_test_cases(
+    items: List[Dict[str, Any]],
+    atomic: bool = False,
+    db: Session = Depends(get_db)
+):
+    """批量更新测试用例，每一项带上 id 和需要修改的字段"""
+    return BulkTestCaseService(db).update(items, atomic=atomic)
+
+
+@router.delete("/bulk", response_model=BulkOperationResponse)
+def bulk_delete_test_cases(test_case_ids: List[int], db: Session = Depends(get_db)):
+    """批量删除测试用例（软删除），逐项返回结果"""
+    return BulkTestCaseService(db).delete(test_case_ids)
+
+
 @router.get("/{test_case_id}", response_model=TestCaseResponse)
-async def get_test_case(test_case_id: int, db: Session = Depends(get_db)):
+async def get_test_case(test_case_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取特定测试用例"""
-    test_case = db.query(TestCase).filter(
+    test_case = await db.scalar(select(TestCase).where(
         TestCase.id == test_case_id,
         TestCase.is_deleted == False
-    ).first()
+    ))
     if not test_case:
         raise HTTPException(status_code=404, detail="测试用例不存在")
     return test_case
@@ -107,9 +184,18 @@ async def update_test_case(
         raise HTTPException(status_code=404, detail="测试用例不存在")
     
     update_data = test_case.dict(exclude_unset=True)
+    content_changed = any(
+        field in update_data and update_data[field] != getattr(db_test_case, field)
+        for field in ("task_content", "expected_result")
+    )
     for field, value in update_data.items():
         setattr(db_test_case, field, value)
-    
+
+    # 操作步骤或预期结果变化后，原 history 缓存不再对应当前内容
+    if content_changed:
+        db_test_case.history_path = None
+        db_test_case.history_updated_at = None
+
     db.commit()
     db.refresh(db_test_case)
     return db_test_case
@@ -139,28 +225,16 @@ async def batch_delete_test_cases(
     if not test_case_ids:
         raise HTTPException(status_code=400, detail="请至少选择一个测试用例")
     
-    # 查询所有需要删除的测试用例
-    db_test_cases = db.query(TestCase).filter(
-        TestCase.id.in_(test_case_ids),
-        TestCase.is_deleted == False
-    ).all()
-    
-    if not db_test_cases:
+    deleted = BulkTestCaseService(db).soft_delete(test_case_ids)
+    if not deleted:
         raise HTTPException(status_code=404, detail="未找到任何可删除的测试用例")
-    
-    # 批量设置删除标志
-    deleted_names = []
-    for test_case in db_test_cases:
-        test_case.is_deleted = True
-        deleted_names.append(test_case.name)
-    
     db.commit()
     
     return {
-        "message": f"成功删除 {len(db_test_cases)} 个测试用例",
-        "deleted_count": len(db_test_cases),
+        "message": f"成功删除 {len(deleted)} 个测试用例",
+        "deleted_count": len(deleted),
         "requested_count": len(test_case_ids),
-        "deleted_names": deleted_names
+        "deleted_names": list(deleted.values())
     }
 
 
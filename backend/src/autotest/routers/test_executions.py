@@ -2,20 +2,54 @@
 测试执行路由
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
-from ..database import get_db, TestCase, TestExecution, TestStep, BatchExecution, BatchExecutionTestCase
+from ..database import get_db, get_async_db, TestCase, TestExecution, TestStep, BatchExecution, BatchExecutionTestCase
 from ..models import (
     TestExecutionRequest, TestExecutionResponse, TestStepResponse,
-    BatchExecutionRequest, BatchExecutionResponse
+    BatchExecutionRequest, BatchExecutionResponse, BatchSelectionRequest
 )
 from ..services.execution_service import ExecutionService
+from ..services.batch_creation_service import BatchCreationService
+from ..services.screenshot_service import ScreenshotService
+from ..services.batch_query_service import BatchQueryService
+from ..services.pagination_service import PaginationService
+from ..services.projection_service import EXECUTION_PROJECTION, STEP_PROJECTION
+from ..services.report_service import REPORT_EXTENSIONS, REPORT_MEDIA_TYPES, TERMINAL_BATCH_STATUSES, report_service
+from ..services.response_cache import response_cache
+from ..test_executor import task_context
+from ..artifact_store import parse_ref
+from ..responses import FastJSONResponse
 
 router = APIRouter(prefix="/test-executions", tags=["测试执行"])
 
+
+class TestExecutionsResponse(BaseModel):
+    """测试执行记录列表响应模型"""
+    test_executions: List[TestExecutionResponse]
+    total: Optional[int]
+    skip: int
+    limit: int
+    next_cursor: Optional[str] = None
+
+
+class BatchExecutionsResponse(BaseModel):
+    """批量执行任务列表响应模型"""
+    batch_executions: List[dict]
+    total: Optional[int]
+    skip: int
+    limit: int
+    next_cursor: Optional[str] = None
+
+
 @router.post("/", response_model=TestExecutionResponse)
 async def execute_test_case(
     execution_request: TestExecutionRequest,
@@ -34,24 +68,53 @@ async def execute_multiple_test_cases(
     """批量执行测试用例"""
     return await ExecutionService.execute_batch_tests(batch_request, background_tasks, db)
 
-@router.get("/", response_model=List[TestExecutionResponse])
+@router.get("/", response_model=TestExecutionsResponse)
 async def get_test_executions(
     skip: int = 0,
     limit: int = 100,
     test_case_id: Optional[int] = None,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取测试执行记录列表"""
-    query = db.query(TestExecution)
+    """
+    获取测试执行记录列表
+
+    分页参数和响应与测试用例列表相同：传入 cursor（第一页传空字符串）时按游标分页，
+    在 next_cursor 中返回下一页游标；include_total=true 时在 total 中返回总数。
+    fields/exclude 为逗号分隔的字段列表；默认不返回 summary 和 recommendations，完整记录见详情接口。
+    """
+    names = EXECUTION_PROJECTION.resolve(fields, exclude)
+    query = select(TestExecution)
     
     if test_case_id:
-        query = query.filter(TestExecution.test_case_id == test_case_id)
+        query = query.where(TestExecution.test_case_id == test_case_id)
     if status:
-        query = query.filter(TestExecution.status == status)
+        query = query.where(TestExecution.status == status)
     
-    executions = query.order_by(TestExecution.created_at.desc()).offset(skip).limit(limit).all()
-    return executions
+    total = None
+    if include_total:
+        filtered = any([test_case_id, status])
+        total = await PaginationService.count_total(db, query, None if filtered else "test_execution")
+    
+    next_cursor = None
+    query = PaginationService.keyset(query, TestExecution.created_at, TestExecution.id, cursor)
+    query = EXECUTION_PROJECTION.apply(query, names + ["created_at"])
+    if cursor is not None:
+        executions, next_cursor = await PaginationService.fetch_page(db, query, limit)
+    else:
+        executions = (await db.scalars(query.offset(skip).limit(limit))).all()
+    # 部分字段的记录不满足完整响应模型，直接返回 JSON 响应跳过模型校验
+    return FastJSONResponse({
+        "test_executions": EXECUTION_PROJECTION.dump(executions, names),
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": next_cursor
+    })
 
 # 批量执行任务相关路由 - 必须在通用路由之前定义
 @router.post("/batch-executions", response_model=dict)
@@ -63,20 +126,62 @@ async def create_batch_execution(
     """创建批量执行任务"""
     return await ExecutionService.create_batch_execution(batch_request, background_tasks, db)
 
-@router.get("/batch-executions", response_model=List[dict])
+@router.post("/batch-executions/from-selector", response_model=dict)
+async def create_batch_execution_from_selector(
+    selection: BatchSelectionRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    按分类（含子分类）、标签、优先级、状态筛选用例创建批量执行任务
+
+    也可以只传 test_case_ids 指定用例，两种方式不能同时使用。
+    """
+    return BatchCreationService(db).create(selection)
+
+@router.get("/batch-executions", response_model=BatchExecutionsResponse)
 async def get_batch_executions(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取批量执行任务列表"""
-    query = db.query(BatchExecution)
+    """
+    获取批量执行任务列表
+
+    分页参数与测试执行记录列表相同；响应按查询参数缓存，批量任务有写入后失效。
+    """
+    return await response_cache.respond(
+        request, ("batch_execution",),
+        lambda response: _list_batch_executions(db, skip, limit, status, cursor, include_total)
+    )
+
+async def _list_batch_executions(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    status: Optional[str],
+    cursor: Optional[str],
+    include_total: bool
+) -> BatchExecutionsResponse:
+    """查询批量执行任务列表"""
+    query = select(BatchExecution)
     
     if status:
-        query = query.filter(BatchExecution.status == status)
+        query = query.where(BatchExecution.status == status)
+    
+    total = None
+    if include_total:
+        total = await PaginationService.count_total(db, query, None if status else "batch_execution")
     
-    batch_executions = query.order_by(BatchExecution.created_at.desc()).offset(skip).limit(limit).all()
+    next_cursor = None
+    query = PaginationService.keyset(query, BatchExecution.created_at, BatchExecution.id, cursor)
+    if cursor is not None:
+        batch_executions, next_cursor = await PaginationService.fetch_page(db, query, limit)
+    else:
+        batch_executions = (await db.scalars(query.offset(skip).limit(limit))).all()
     
     # 转换为字典格式
     result = []
@@ -98,33 +203,24 @@ async def get_batch_executions(
             "updated_at": batch.updated_at.isoformat() if batch.updated_at else None
         })
     
-    return result
+    return BatchExecutionsResponse(
+        batch_executions=result,
+        total=total,
+        skip=skip,
+        limit=limit,
+        next_cursor=next_cursor
+    )
 
 @router.get("/batch-executions/{batch_execution_id}", response_model=dict)
-async def get_batch_execution(batch_execution_id: int, db: Session = Depends(get_db)):
+async def get_batch_execution(batch_execution_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取特定批量执行任务的详细信息"""
-    batch_execution = db.query(BatchExecution).filter(BatchExecution.id == batch_execution_id).first()
+    batch_execution = await db.get(BatchExecution, batch_execution_id)
     if not batch_execution:
         raise HTTPException(status_code=404, detail="批量执行任务不存在")
     
-    # 获取批量执行任务中的测试用例详情
-    batch_test_cases = db.query(BatchExecutionTestCase).filter(
-        BatchExecutionTestCase.batch_execution_id == batch_execution_id
-    ).all()
-    
-    # 获取测试用例信息
-    test_cases_info = []
-    for btc in batch_test_cases:
-        test_case = db.query(TestCase).filter(TestCase.id == btc.test_case_id).first()
-        test_case_info = {
-            "test_case_id": btc.test_case_id,
-            "test_case_name": test_case.name if test_case else "未知测试用例",
-            "status": btc.status,
-            "started_at": btc.started_at.isoformat() if btc.started_at else None,
-            "completed_at": btc.completed_at.isoformat() if btc.completed_at else None,
-            "execution_id": btc.execution_id
-        }
-        test_cases_info.append(test_case_info)
+    # 一条关联查询获取批量执行任务中的测试用例详情
+    rows = (await db.execute(BatchQueryService.test_case_details_query(batch_execution_id))).all()
+    test_cases_info = [BatchQueryService.to_dict(row) for row in rows]
     
     return {
         "id": batch_execution.id,
@@ -161,35 +257,131 @@ async def stop_batch_execution(
     """停止批量执行任务"""
     return await ExecutionService.stop_batch_execution(batch_execution_id, db)
 
+@router.get("/batch-executions/{batch_execution_id}/cancel-report", response_model=dict)
+async def get_batch_cancel_report(batch_execution_id: int):
+    """获取批量执行任务最近一次取消的耗时报告"""
+    report = task_context.get_cancel_report(batch_execution_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="该批量执行任务没有取消记录")
+    return report
+
+@router.get("/batch-executions/{batch_execution_id}/report")
+async def get_batch_execution_report(
+    batch_execution_id: int,
+    report_format: Literal["junit", "html"] = Query("junit", alias="format"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取批量执行报告（JUnit XML 或 HTML）
+
+    运行中的任务实时生成；已结束的任务生成一次后缓存，之后直接返回缓存文件。
+    """
+    batch_execution = await db.get(BatchExecution, batch_execution_id)
+    if not batch_execution:
+        raise HTTPException(status_code=404, detail="批量执行任务不存在")
+    
+    filename = f"batch-{batch_execution_id}-report.{REPORT_EXTENSIONS[report_format]}"
+    if batch_execution.status in TERMINAL_BATCH_STATUSES:
+        path = await report_service.cached_report(batch_execution, report_format)
+        return FileResponse(path, media_type=REPORT_MEDIA_TYPES[report_format], filename=filename)
+    return StreamingResponse(
+        report_service.render(batch_execution, report_format),
+        media_type=REPORT_MEDIA_TYPES[report_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # 通用路由 - 必须在特定路由之后定义
 @router.get("/{execution_id}", response_model=TestExecutionResponse)
-async def get_test_execution(execution_id: int, db: Session = Depends(get_db)):
+async def get_test_execution(execution_id: int, db: AsyncSession = Depends(get_async_db)):
     """获取特定测试执行记录"""
-    execution = db.query(TestExecution).filter(TestExecution.id == execution_id).first()
+    execution = await db.get(TestExecution, execution_id)
     if not execution:
         raise HTTPException(status_code=404, detail="执行记录不存在")
     return execution
 
 @router.get("/{execution_id}/steps", response_model=List[TestStepResponse])
-async def get_test_execution_steps(execution_id: int, db: Session = Depends(get_db)):
-    """获取测试执行步骤详情"""
-    steps = db.query(TestStep).filter(
+async def get_test_execution_steps(
+    execution_id: int,
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    获取测试执行步骤列表
+
+    默认不返回 screenshot_data、memory 和 actions，完整步骤见单个步骤接口；
+    fields/exclude 为逗号分隔的字段列表，exclude 传空字符串返回全部字段。
+    """
+    names = STEP_PROJECTION.resolve(fields, exclude)
+    steps = (await db.scalars(STEP_PROJECTION.apply(select(TestStep).where(
         TestStep.execution_id == execution_id
-    ).order_by(TestStep.step_order).all()
-    return steps
+    ).order_by(TestStep.step_order), names))).all()
+    return STEP_PROJECTION.response(steps, names)
+
+@router.get("/{execution_id}/steps/{step_id}", response_model=TestStepResponse)
+async def get_test_execution_step(execution_id: int, step_id: int, db: AsyncSession = Depends(get_async_db)):
+    """获取单个测试步骤的完整信息"""
+    step = await db.get(TestStep, step_id)
+    if not step or step.execution_id != execution_id:
+        raise HTTPException(status_code=404, detail="测试步骤不存在")
+    return step
+
+@router.get("/{execution_id}/steps/{step_id}/screenshot")
+async def get_test_step_screenshot(
+    execution_id: int,
+    step_id: int,
+    request: Request,
+    thumbnail: bool = False,
+    width: int = 320,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取测试步骤截图（支持缩略图，按内容哈希生成 ETag）"""
+    step = await db.scalar(select(TestStep).where(
+        TestStep.id == step_id,
+        TestStep.execution_id == execution_id
+    ))
+    if not step:
+        raise HTTPException(status_code=404, detail="测试步骤不存在")
+    
+    digest = parse_ref(step.screenshot_path)
+    etag = f'"{digest}-w{width}"' if thumbnail else f'"{digest}"'
+    if digest and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    screenshot = await asyncio.to_thread(ScreenshotService.load_step_screenshot, step)
+    if screenshot is None:
+        raise HTTPException(status_code=404, detail="该步骤没有截图")
+    data, content_type, digest = screenshot
+    if thumbnail:
+        data, content_type = await asyncio.to_thread(ScreenshotService.make_thumbnail, data, content_type, digest, width)
+        etag = f'"{digest}-w{width}"'
+    else:
+        etag = f'"{digest}"'
+    
+    return Response(
+        content=data,
+        media_type=content_type,
+        headers={
+            "ETag": etag,
+            "Cache-Control": "private, max-age=86400"
+        }
+    )
 
 @router.get("/test-cases/{test_case_id}/executions", response_model=List[TestExecutionResponse])
 async def get_test_case_executions(
     test_case_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = None,
+    exclude: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """获取测试用例的执行历史"""
-    executions = db.query(TestExecution).filter(
+    """获取测试用例的执行历史（字段投影参数与执行记录列表相同）"""
+    names = EXECUTION_PROJECTION.resolve(fields, exclude)
+    executions = (await db.scalars(EXECUTION_PROJECTION.apply(select(TestExecution).where(
         TestExecution.test_case_id == test_case_id
-    ).order_by(TestExecution.created_at.desc()).offset(skip).limit(limit).all()
-    return executions
+    ).order_by(TestExecution.created_at.desc()).offset(skip).limit(limit), names))).all()
+    return EXECUTION_PROJECTION.response(executions, names)
 
 
 @router.get("/batch-executions/{batch_execution_id}/test-cases", response_model=dict)
@@ -198,58 +390,19 @@ async def get_batch_execution_test_cases(
     skip: int = 0,
     limit: int = 20,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取批量执行任务中的测试用例详情（支持分页和搜索）"""
-    batch_execution = db.query(BatchExecution).filter(BatchExecution.id == batch_execution_id).first()
-    if not batch_execution:
+    batch_execution_exists = await db.scalar(select(BatchExecution.id).where(BatchExecution.id == batch_execution_id))
+    if not batch_execution_exists:
         raise HTTPException(status_code=404, detail="批量执行任务不存在")
     
-    # 构建查询
-    query = db.query(BatchExecutionTestCase).filter(
-        BatchExecutionTestCase.batch_execution_id == batch_execution_id
-    )
-    
-    # 如果有搜索关键词，添加搜索条件
-    if search:
-        # 获取测试用例名称匹配的测试用例ID
-        test_case_ids = db.query(TestCase.id).filter(
-            TestCase.name.contains(search)
-        ).all()
-        test_case_ids = [tc[0] for tc in test_case_ids]
-        
-        # 添加测试用例ID过滤条件
-        query = query.filter(BatchExecutionTestCase.test_case_id.in_(test_case_ids))
-    
-    # 获取总数
-    total = query.count()
-    
-    # 应用分页
-    batch_test_cases = query.offset(skip).limit(limit).all()
-    
-    # 获取测试用例信息
-    test_cases_info = []
-    for btc in batch_test_cases:
-        test_case = db.query(TestCase).filter(TestCase.id == btc.test_case_id).first()
-        
-        # 获取执行记录的详细信息（包括整体状态等）
-        overall_status = None
-        if btc.execution_id:
-            execution = db.query(TestExecution).filter(TestExecution.id == btc.execution_id).first()
-            overall_status = execution.overall_status if execution else None
-        
-        test_case_info = {
-            "id": btc.id,
-            "batch_execution_id": btc.batch_execution_id,
-            "test_case_id": btc.test_case_id,
-            "execution_id": btc.execution_id,
-            "status": btc.status,
-            "overall_status": overall_status,
-            "started_at": btc.started_at.isoformat() if btc.started_at else None,
-            "completed_at": btc.completed_at.isoformat() if btc.completed_at else None,
-            "test_case_name": test_case.name if test_case else "未知测试用例"
-        }
-        test_cases_info.append(test_case_info)
+    # 搜索条件通过关联测试用例在同一条查询中过滤
+    total = await db.scalar(BatchQueryService.test_case_count_query(batch_execution_id, search))
+    rows = (await db.execute(
+        BatchQueryService.test_case_details_query(batch_execution_id, search).offset(skip).limit(limit)
+    )).all()
+    test_cases_info = [BatchQueryService.to_dict(row) for row in rows]
     
     return {
         "test_cases": test_cases_info,
@@ -12,16 +12,18 @@ import shutil
 import tempfile
 from datetime import datetime
 from pathlib import Path
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List, Any, Optional
 from fastapi import UploadFile, HTTPException
 
-from ..database import get_db, ImportTask, TestCase, Category
+from ..database import AsyncSessionLocal, ImportTask, TestCase, Category
 from ..models import ImportTaskCreate, ImportTaskResponse, ImportTaskStatus
 from ..websocket_manager import websocket_manager
 from .llm_service import LLMService
 from .excel_utils import convert_excel_to_test_cases
 from .excel_template_service import ExcelTemplateService
+from .spreadsheet_reader import SpreadsheetReader, is_spreadsheet
 
 
 class AsyncImportService:
@@ -34,7 +36,7 @@ class AsyncImportService:
         self, 
         file: UploadFile, 
         task_data: ImportTaskCreate,
-        db: Session
+        db: AsyncSession
     ) -> ImportTaskResponse:
         """创建导入任务"""
         
@@ -46,16 +48,15 @@ class AsyncImportService:
             )
         
         # 验证文件格式
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="只支持Excel文件格式")
+        if not is_spreadsheet(file.filename):
+            raise HTTPException(status_code=400, detail="只支持Excel或CSV文件格式")
         
         try:
             # 保存上传的文件到临时目录
             file_path = await self._save_uploaded_file(file)
             
-            # 读取Excel文件获取总行数
-            df = pd.read_excel(file_path)
-            total_rows = len(df)
+            # 总行数取自工作表尺寸信息，不读取整个文件
+            total_rows = await asyncio.to_thread(SpreadsheetReader(file_path).count_rows)
             total_batches = math.ceil(total_rows / task_data.batch_size)
             
             # 创建任务记录
@@ -74,8 +75,8 @@ class AsyncImportService:
             )
             
             db.add(import_task)
-            db.commit()
-            db.refresh(import_task)
+            await db.commit()
+            await db.refresh(import_task)
             
             # 启动异步处理任务
             asyncio.create_task(self._process_import_task(import_task.id))
@@ -103,83 +104,93 @@ class AsyncImportService:
     
     async def _process_import_task(self, task_id: int):
         """处理导入任务的主要逻辑"""
-        db_gen = get_db()
-        db = next(db_gen)
+        db = AsyncSessionLocal()
         task = None
+        file_path = None
+        chunks = None
         
         try:
             # 标记任务为运行状态
             self.running_tasks[task_id] = True
             
             # 获取任务信息
-            task = db.query(ImportTask).filter(ImportTask.id == task_id).first()
+            task = await db.get(ImportTask, task_id)
             if not task:
                 return
+            file_path = task.file_path
             
             # 更新任务状态
             task.status = "running"
             task.started_at = datetime.now()
-            db.commit()
+            await db.commit()
             
             # 发送开始通知
             await self._send_progress_update(task_id, "running", 0, 0, 0, 0, 0, 0, 0)
             
-            # 读取Excel文件
-            df = pd.read_excel(task.file_path)
-            df = df.fillna('')
-            
-            # 分批处理
-            total_rows = len(df)
-            batch_size = task.batch_size
-            total_batches = math.ceil(total_rows / batch_size)
+            # 流式读取，每次只在内存中保留一个批次
+            total_rows = task.total_rows or 0
+            total_batches = task.total_batches or 0
+            chunks = SpreadsheetReader(task.file_path).iter_chunks(task.batch_size)
             
             success_count = 0
             failed_count = 0
             error_log = []
+            processed_rows = 0
+            batch_num = 0
             
-            for batch_num in range(total_batches):
+            while True:
                 # 检查是否需要取消任务
                 if not self.running_tasks.get(task_id, False):
                     task.status = "cancelled"
                     break
                 
-                start_idx = batch_num * batch_size
-                end_idx = min((batch_num + 1) * batch_size, total_rows)
-                batch_df = df.iloc[start_idx:end_idx]
+                # 在线程中解析下一批，避免阻塞事件循环
+                batch_df = await asyncio.to_thread(next, chunks, None)
+                if batch_df is None:
+                    break
                 
                 # 处理当前批次
                 batch_success, batch_failed, batch_errors = await self._process_batch(
                     batch_df, task.import_options, task.import_mode, db
                 )
+                # 批次回滚会使任务对象过期，异步会话中需显式重新加载
+                await db.refresh(task)
                 
                 success_count += batch_success
                 failed_count += batch_failed
                 error_log.extend(batch_errors)
                 
-                # 更新任务进度
-                processed_rows = end_idx
+                # 更新任务进度；总行数来自工作表尺寸，可能包含空行，进度按不超过总行数计算
+                batch_num += 1
+                processed_rows += len(batch_df)
+                total_rows = max(total_rows, processed_rows)
+                total_batches = max(total_batches, batch_num)
                 progress = (processed_rows / total_rows) * 100
                 
-                task.current_batch = batch_num + 1
+                task.current_batch = batch_num
                 task.processed_rows = processed_rows
                 task.success_rows = success_count
                 task.failed_rows = failed_count
                 task.progress_percentage = progress
                 task.error_log = error_log
                 
-                db.commit()
+                await db.commit()
                 
                 # 发送进度更新
                 await self._send_progress_update(
-                    task_id, "running", progress, batch_num + 1, total_batches,
+                    task_id, "running", progress, batch_num, total_batches,
                     processed_rows, total_rows, success_count, failed_count
                 )
                 
                 # 短暂延迟，避免过快处理
                 await asyncio.sleep(0.1)
             
-            # 完成任务
+            # 完成任务，总行数和批次数以实际读取到的数据为准
             if task.status != "cancelled":
+                total_rows = processed_rows
+                total_batches = batch_num
+                task.total_rows = total_rows
+                task.total_batches = total_batches
                 task.status = "completed"
                 task.completed_at = datetime.now()
                 task.result_summary = {
@@ -195,11 +206,13 @@ class AsyncImportService:
                     total_rows, total_rows, success_count, failed_count
                 )
             
-            db.commit()
+            await db.commit()
             
         except Exception as e:
             # 处理异常
             if task:
+                await db.rollback()
+                await db.refresh(task)
                 task.status = "failed"
                 task.completed_at = datetime.now()
                 task.error_log = task.error_log or []
@@ -208,7 +221,7 @@ class AsyncImportService:
                     "message": str(e),
                     "timestamp": datetime.now().isoformat()
                 })
-                db.commit()
+                await db.commit()
                 
                 # 发送错误通知
                 await self._send_progress_update(
@@ -223,21 +236,23 @@ class AsyncImportService:
             if task_id in self.running_tasks:
                 del self.running_tasks[task_id]
             
-            # 清理临时文件
+            # 关闭读取器持有的文件后清理临时文件
+            if chunks is not None:
+                chunks.close()
             try:
-                if task and task.file_path and os.path.exists(task.file_path):
-                    os.remove(task.file_path)
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
             except:
                 pass
             
-            db.close()
+            await db.close()
     
     async def _process_batch(
         self, 
         batch_df: pd.DataFrame, 
         import_options: dict,
         import_mode: str,
-        db: Session
+        db: AsyncSession
     ) -> tuple[int, int, List[dict]]:
         """处理单个批次的数据"""
         success_count = 0
@@ -247,8 +262,13 @@ class AsyncImportService:
         try:
             # 根据导入模式选择不同的解析方式
             if import_mode == "standard":
-                # 标准模版解析
-                test_cases = ExcelTemplateService.parse_standard_template(batch_df)
+                # 标准模版按列批量解析，校验失败的行逐行记录，不影响同批次的其他行
+                test_cases, row_errors = ExcelTemplateService.parse_standard_template_rows(batch_df)
+                failed_count += len(row_errors)
+                error_log.extend(
+                    {**row_error, "type": "validation_error", "timestamp": datetime.now().isoformat()}
+                    for row_error in row_errors
+                )
             else:
                 # 智能识别解析（使用LLM服务或规则转换）
                 test_cases = await LLMService.analyze_excel_with_llm(batch_df, import_options)
@@ -271,10 +291,10 @@ class AsyncImportService:
                     selected_category_id = import_options.get('selectedCategoryId')
                     if selected_category_id:
                         # 验证分类是否存在
-                        category = db.query(Category).filter(
+                        category = await db.scalar(select(Category).where(
                             Category.id == selected_category_id,
                             Category.is_deleted == False
-                        ).first()
+                        ))
                         if category:
                             test_case_data['category_id'] = selected_category_id
                             test_case_data['category'] = category.name
@@ -288,7 +308,7 @@ class AsyncImportService:
                     # 创建测试用例
                     db_test_case = TestCase(**test_case_data)
                     db.add(db_test_case)
-                    db.flush()  # 不立即提交，等批次结束再提交
+                    await db.flush()  # 不立即提交，等批次结束再提交
                     success_count += 1
                     
                 except Exception as e:
@@ -302,11 +322,11 @@ class AsyncImportService:
                     })
             
             # 提交当前批次
-            db.commit()
+            await db.commit()
             
         except Exception as e:
             # 整个批次失败
-            db.rollback()
+            await db.rollback()
             failed_count = len(batch_df)
             error_log.append({
                 "type": "batch_error",
@@ -348,9 +368,9 @@ class AsyncImportService:
         except Exception as e:
             print(f"发送进度更新失败: {e}")
     
-    async def get_task_status(self, task_id: int, db: Session) -> ImportTaskStatus:
+    async def get_task_status(self, task_id: int, db: AsyncSession) -> ImportTaskStatus:
         """获取任务状态"""
-        task = db.query(ImportTask).filter(ImportTask.id == task_id).first()
+        task = await db.get(ImportTask, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="任务不存在")
         
@@ -371,9 +391,9 @@ class AsyncImportService:
             error_messages=error_messages
         )
     
-    async def cancel_task(self, task_id: int, db: Session) -> bool:
+    async def cancel_task(self, task_id: int, db: AsyncSession) -> bool:
         """取消任务"""
-        task = db.query(ImportTask).filter(ImportTask.id == task_id).first()
+        task = await db.get(ImportTask, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="任务不存在")
         
@@ -384,18 +404,18 @@ class AsyncImportService:
         self.running_tasks[task_id] = False
         task.status = "cancelled"
         task.completed_at = datetime.now()
-        db.commit()
+        await db.commit()
         
         return True
     
-    async def has_running_task(self, db: Session) -> bool:
+    async def has_running_task(self, db: AsyncSession) -> bool:
         """检查是否有正在运行的任务"""
-        running_task = db.query(ImportTask).filter(
+        running_task_id = await db.scalar(select(ImportTask.id).where(
             ImportTask.status.in_(["pending", "running"])
-        ).first()
-        return running_task is not None
+        ).limit(1))
+        return running_task_id is not None
     
-    async def list_tasks(self, db: Session, limit: int = 10) -> List[ImportTaskResponse]:
+    async def list_tasks(self, db: AsyncSession, limit: int = 10) -> List[ImportTaskResponse]:
         """获取任务列表"""
-        tasks = db.query(ImportTask).order_by(ImportTask.created_at.desc()).limit(limit).all()
+        tasks = (await db.scalars(select(ImportTask).order_by(ImportTask.created_at.desc()).limit(limit))).all()
         return [ImportTaskResponse.from_orm(task) for task in tasks]
\ No newline at end of file
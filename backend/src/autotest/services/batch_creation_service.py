@@ -0,0 +1,138 @@
+"""
+批量执行任务创建服务
+按分类子树、标签、优先级、状态筛选时用一条 INSERT ... SELECT 在数据库内生成任务用例行；
+指定用例ID时分批校验后用 executemany 一次写入
+"""
+
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import exists, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from ..database import BatchExecution, BatchExecutionTestCase, Category, CategoryClosure, TestCase, beijing_now
+from ..models import BatchSelectionRequest
+from .bulk_service import MAX_BULK_ITEMS, _chunks
+
+BATCH_CASE_COLUMNS = ("batch_execution_id", "test_case_id", "status", "created_at", "updated_at")
+
+# 列表类型的筛选条件，空列表会被当成“不过滤”而选中所有用例，因此直接拒绝
+LIST_FILTER_FIELDS = ("tags", "priority", "status")
+
+
+def tags_filter(dialect_name: str, tags: List[str]):
+    """JSON 标签列表包含任一指定标签"""
+    if dialect_name == "mysql":
+        return or_(*[func.json_contains(TestCase.tags, func.json_quote(tag)) for tag in tags])
+    tag_values = func.json_each(TestCase.tags).table_valued("value")
+    return exists(select(literal(1)).select_from(tag_values).where(tag_values.c.value.in_(tags)))
+
+
+class BatchCreationService:
+    """创建批量执行任务"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _has_filters(request: BatchSelectionRequest) -> bool:
+        return any(value is not None for value in (request.category_id, request.tags, request.priority, request.status))
+
+    def create(self, request: BatchSelectionRequest) -> dict:
+        """按请求创建 pending 状态的批量执行任务，返回与原创建接口相同的结构"""
+        empty = [field for field in LIST_FILTER_FIELDS if getattr(request, field) == []]
+        if empty:
+            raise HTTPException(status_code=400, detail=f"筛选条件不能为空列表: {', '.join(empty)}")
+        if request.test_case_ids is not None and self._has_filters(request):
+            raise HTTPException(status_code=400, detail="指定测试用例ID时不能同时使用筛选条件")
+        if request.test_case_ids is None and not self._has_filters(request):
+            raise HTTPException(status_code=400, detail="请指定测试用例ID或至少一个筛选条件")
+
+        batch = self._new_batch(request.name, request.headless)
+        if request.test_case_ids is not None:
+            count = self._insert_ids(batch, request.test_case_ids)
+        else:
+            count = self._insert_selected(batch, self.selector_query(request))
+            if count == 0:
+                self.db.rollback()
+                raise HTTPException(status_code=400, detail="没有符合条件的测试用例")
+
+        batch.total_count = count
+        batch.pending_count = count
+        self.db.commit()
+        return {
+            "success": True,
+            "batch_execution_id": batch.id,
+            "total_count": count,
+            "message": "批量执行任务已创建，请点击执行按钮开始执行"
+        }
+
+    def _new_batch(self, name: Optional[str], headless: bool) -> BatchExecution:
+        batch = BatchExecution(
+            name=name or f"批量执行任务_{beijing_now().strftime('%Y%m%d_%H%M%S')}",
+            status="pending",
+            headless=headless,
+        )
+        self.db.add(batch)
+        self.db.flush()
+        return batch
+
+    def selector_query(self, request: BatchSelectionRequest):
+        """符合筛选条件的未删除用例ID，按ID排序"""
+        query = select(TestCase.id).where(TestCase.is_deleted == False).order_by(TestCase.id)
+        if request.category_id is not None:
+            category = self.db.scalar(select(Category.id).where(
+                Category.id == request.category_id,
+                Category.is_deleted == False
+            ))
+            if category is None:
+                raise HTTPException(status_code=404, detail="分类不存在")
+            if request.include_children:
+                query = query.where(TestCase.category_id.in_(
+                    select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == request.category_id)
+                ))
+            else:
+                query = query.where(TestCase.category_id == request.category_id)
+        if request.tags:
+            query = query.where(tags_filter(self.db.get_bind().dialect.name, request.tags))
+        if request.priority:
+            query = query.where(TestCase.priority.in_(request.priority))
+        if request.status:
+            query = query.where(TestCase.status.in_(request.status))
+        return query
+
+    def _insert_selected(self, batch: BatchExecution, case_ids) -> int:
+        """INSERT ... SELECT，用例行不经过应用层"""
+        now = beijing_now()
+        rows = select(
+            literal(batch.id), case_ids.subquery().c.id, literal("pending"), literal(now), literal(now)
+        )
+        result = self.db.execute(insert(BatchExecutionTestCase).from_select(BATCH_CASE_COLUMNS, rows))
+        return result.rowcount
+
+    def _insert_ids(self, batch: BatchExecution, test_case_ids: List[int]) -> int:
+        """校验指定的用例后 executemany 写入，重复的ID只保留第一次出现的位置"""
+        ids = list(dict.fromkeys(test_case_ids))
+        if not ids:
+            raise HTTPException(status_code=400, detail="请至少选择一个测试用例")
+        if len(ids) > MAX_BULK_ITEMS:
+            raise HTTPException(status_code=400, detail=f"单次最多选择 {MAX_BULK_ITEMS} 个测试用例")
+
+        found = set()
+        for chunk in _chunks(ids):
+            found.update(self.db.scalars(select(TestCase.id).where(
+                TestCase.id.in_(chunk),
+                TestCase.is_deleted == False
+            )))
+        missing = [test_case_id for test_case_id in ids if test_case_id not in found]
+        if missing:
+            self.db.rollback()
+            raise HTTPException(status_code=404, detail=f"部分测试用例不存在: {missing[:20]}")
+
+        now = beijing_now()
+        self.db.execute(insert(BatchExecutionTestCase), [
+            {"batch_execution_id": batch.id, "test_case_id": test_case_id, "status": "pending",
+             "created_at": now, "updated_at": now}
+            for test_case_id in ids
+        ])
+        return len(ids)
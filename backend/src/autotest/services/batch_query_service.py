@@ -0,0 +1,71 @@
+"""
+批量执行任务查询服务
+批量任务中的用例详情通过一条关联查询获取，只投影列表需要的列，
+避免逐行查询测试用例和执行记录
+"""
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Select, func, select
+
+from ..database import BatchExecutionTestCase, TestCase, TestExecution
+
+
+class BatchQueryService:
+    """批量执行任务查询服务"""
+
+    @staticmethod
+    def _filtered(statement: Select, batch_execution_id: int, search: Optional[str]) -> Select:
+        statement = statement.where(BatchExecutionTestCase.batch_execution_id == batch_execution_id)
+        if search:
+            statement = statement.where(TestCase.name.contains(search))
+        return statement
+
+    @classmethod
+    def test_case_details_query(cls, batch_execution_id: int, search: Optional[str] = None) -> Select:
+        """
+        批量任务中用例详情的查询语句
+
+        关联测试用例和执行记录，只取名称、整体状态和错误信息；search 按用例名称过滤。
+        """
+        statement = select(
+            BatchExecutionTestCase.id,
+            BatchExecutionTestCase.batch_execution_id,
+            BatchExecutionTestCase.test_case_id,
+            BatchExecutionTestCase.execution_id,
+            BatchExecutionTestCase.status,
+            BatchExecutionTestCase.started_at,
+            BatchExecutionTestCase.completed_at,
+            TestCase.name.label("test_case_name"),
+            TestExecution.overall_status,
+            TestExecution.error_message,
+        ).outerjoin(
+            TestCase, TestCase.id == BatchExecutionTestCase.test_case_id
+        ).outerjoin(
+            TestExecution, TestExecution.id == BatchExecutionTestCase.execution_id
+        )
+        return cls._filtered(statement, batch_execution_id, search).order_by(BatchExecutionTestCase.id)
+
+    @classmethod
+    def test_case_count_query(cls, batch_execution_id: int, search: Optional[str] = None) -> Select:
+        """批量任务中用例数量的查询语句，仅在搜索时关联测试用例"""
+        statement = select(func.count(BatchExecutionTestCase.id))
+        if search:
+            statement = statement.join(TestCase, TestCase.id == BatchExecutionTestCase.test_case_id)
+        return cls._filtered(statement, batch_execution_id, search)
+
+    @staticmethod
+    def to_dict(row, unknown_name: str = "未知测试用例") -> Dict[str, Any]:
+        """将查询行转换为接口返回的字典"""
+        return {
+            "id": row.id,
+            "batch_execution_id": row.batch_execution_id,
+            "test_case_id": row.test_case_id,
+            "execution_id": row.execution_id,
+            "status": row.status,
+            "overall_status": row.overall_status,
+            "error_message": row.error_message,
+            "started_at": row.started_at.isoformat() if row.started_at else None,
+            "completed_at": row.completed_at.isoformat() if row.completed_at else None,
+            "test_case_name": row.test_case_name if row.test_case_name is not None else unknown_name,
+        }
@@ -0,0 +1,201 @@
+"""
+测试用例批量操作服务
+批量新增、修改、删除先逐项校验，再用集合式 SQL（多行 INSERT、按主键批量 UPDATE、UPDATE ... WHERE id IN）
+在一个事务中写入，返回每一项的结果
+"""
+
+from typing import Any, Dict, Iterable, List, Set
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from ..database import Category, TestCase
+from ..models import BulkItemResult, BulkOperationResponse, TestCaseBulkUpdateItem, TestCaseCreate
+
+# 单次请求最多处理的条数
+MAX_BULK_ITEMS = 10000
+# IN 查询每批的参数个数，兼容参数上限为 999 的旧版 SQLite
+IN_CLAUSE_CHUNK_SIZE = 900
+# 修改这些字段后原 history 缓存不再对应当前内容
+HISTORY_FIELDS = ("task_content", "expected_result")
+
+
+def _chunks(values: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(values), IN_CLAUSE_CHUNK_SIZE):
+        yield values[start:start + IN_CLAUSE_CHUNK_SIZE]
+
+
+def _error_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or '数据'}: {item['msg']}" for item in error.errors()
+    )
+
+
+class BulkTestCaseService:
+    """测试用例批量操作"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _check_size(items: List[Any]):
+        if not items:
+            raise HTTPException(status_code=400, detail="请至少提交一条数据")
+        if len(items) > MAX_BULK_ITEMS:
+            raise HTTPException(status_code=400, detail=f"单次最多处理 {MAX_BULK_ITEMS} 条数据")
+
+    def _existing_categories(self, category_ids: Set[int]) -> Set[int]:
+        found = set()
+        for chunk in _chunks(sorted(category_ids)):
+            found.update(self.db.scalars(select(Category.id).where(
+                Category.id.in_(chunk),
+                Category.is_deleted == False
+            )))
+        return found
+
+    def _live_test_cases(self, ids: List[int], *columns) -> Dict[int, Any]:
+        """查询未删除的测试用例，返回 {id: 行}"""
+        rows = {}
+        for chunk in _chunks(sorted(set(ids))):
+            for row in self.db.execute(select(TestCase.id, *columns).where(
+                TestCase.id.in_(chunk),
+                TestCase.is_deleted == False
+            )):
+                rows[row.id] = row
+        return rows
+
+    def _validate_categories(self, items: Dict[int, Any], results: Dict[int, BulkItemResult]):
+        """分类不存在的项标记为失败并移出待写入列表"""
+        category_ids = {item.category_id for item in items.values() if item.category_id is not None}
+        existing = self._existing_categories(category_ids) if category_ids else set()
+        for index, item in list(items.items()):
+            if item.category_id is not None and item.category_id not in existing:
+                results[index] = BulkItemResult(index=index, success=False, error=f"分类不存在: {item.category_id}")
+                del items[index]
+
+    def _finish(self, total: int, results: Dict[int, BulkItemResult], atomic: bool) -> BulkOperationResponse:
+        if atomic and results and not all(result.success for result in results.values()):
+            # 全部成功才写入：回滚，校验通过的项标记为未执行
+            self.db.rollback()
+            ordered = [
+                results[index] if index in results else BulkItemResult(index=index, success=False, error="其他项校验失败，未执行")
+                for index in range(total)
+            ]
+            return BulkOperationResponse(total=total, succeeded=0, failed=total, results=ordered)
+        ordered = [results[index] for index in range(total)]
+        failed = sum(1 for result in ordered if not result.success)
+        self.db.commit()
+        return BulkOperationResponse(total=total, succeeded=total - failed, failed=failed, results=ordered)
+
+    def create(self, payload: List[Dict[str, Any]], atomic: bool = False) -> BulkOperationResponse:
+        """批量新增"""
+        self._check_size(payload)
+        results: Dict[int, BulkItemResult] = {}
+        valid: Dict[int, TestCaseCreate] = {}
+        for index, raw in enumerate(payload):
+            try:
+                valid[index] = TestCaseCreate.model_validate(raw)
+            except ValidationError as e:
+                results[index] = BulkItemResult(index=index, success=False, error=_error_message(e))
+        self._validate_categories(valid, results)
+
+        if valid and not (atomic and results):
+            indexes = list(valid)
+            rows = [valid[index].model_dump() for index in indexes]
+            ids = self._insert(rows)
+            for index, test_case_id in zip(indexes, ids):
+                results[index] = BulkItemResult(index=index, id=test_case_id, success=True)
+
+        return self._finish(len(payload), results, atomic)
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """多行 INSERT，返回与 rows 顺序一致的主键"""
+        dialect = self.db.get_bind().dialect
+        if dialect.name == "sqlite":
+            # SQLite 写事务独占数据库，单条多行 INSERT 分配连续的 rowid，由最后一行的 rowid 推出全部主键
+            ids = []
+            rows_per_statement = max(1, IN_CLAUSE_CHUNK_SIZE // len(rows[0]))
+            for start in range(0, len(rows), rows_per_statement):
+                chunk = rows[start:start + rows_per_statement]
+                last_id = self.db.execute(insert(TestCase).values(chunk)).lastrowid
+                ids.extend(range(last_id - len(chunk) + 1, last_id + 1))
+            return ids
+        if dialect.insert_executemany_returning_sort_by_parameter_order:
+            return list(self.db.scalars(insert(TestCase).returning(TestCase.id, sort_by_parameter_order=True), rows))
+        # MySQL 不支持 RETURNING，并发插入时自增主键不保证连续，逐行获取主键
+        objects = [TestCase(**row) for row in rows]
+        self.db.add_all(objects)
+        self.db.flush()
+        return [test_case.id for test_case in objects]
+
+    def update(self, payload: List[Dict[str, Any]], atomic: bool = False) -> BulkOperationResponse:
+        """
+        批量修改，每一项只更新传入的字段
+
+        按主键批量 UPDATE：SQLAlchemy 将字段相同的项合并为一条 executemany 语句
+        """
+        self._check_size(payload)
+        results: Dict[int, BulkItemResult] = {}
+        valid: Dict[int, TestCaseBulkUpdateItem] = {}
+        for index, raw in enumerate(payload):
+            try:
+                valid[index] = TestCaseBulkUpdateItem.model_validate(raw)
+            except ValidationError as e:
+                results[index] = BulkItemResult(index=index, success=False, error=_error_message(e))
+
+        existing = self._live_test_cases([item.id for item in valid.values()], *(getattr(TestCase, field) for field in HISTORY_FIELDS))
+        seen: Set[int] = set()
+        for index, item in list(valid.items()):
+            error = None
+            if item.id not in existing:
+                error = "测试用例不存在"
+            elif item.id in seen:
+                error = "同一测试用例在请求中重复出现"
+            if error:
+                results[index] = BulkItemResult(index=index, id=item.id, success=False, error=error)
+                del valid[index]
+            seen.add(item.id)
+        self._validate_categories(valid, results)
+
+        if valid and not (atomic and results):
+            rows = []
+            for index, item in valid.items():
+                row = item.model_dump(exclude_unset=True)
+                current = existing[item.id]
+                if any(field in row and row[field] != getattr(current, field) for field in HISTORY_FIELDS):
+                    row.update(history_path=None, history_updated_at=None)
+                # 只有 id 的项没有需要修改的字段
+                if len(row) > 1:
+                    rows.append(row)
+                results[index] = BulkItemResult(index=index, id=item.id, success=True)
+            if rows:
+                self.db.execute(update(TestCase), rows)
+
+        return self._finish(len(payload), results, atomic)
+
+    def soft_delete(self, test_case_ids: List[int]) -> Dict[int, str]:
+        """将未删除的测试用例标记为删除（不提交），返回 {id: 名称}"""
+        existing = self._live_test_cases(test_case_ids, TestCase.name)
+        for chunk in _chunks(sorted(existing)):
+            self.db.execute(update(TestCase).where(
+                TestCase.id.in_(chunk),
+                TestCase.is_deleted == False
+            ).values(is_deleted=True))
+        return {test_case_id: row.name for test_case_id, row in existing.items()}
+
+    def delete(self, test_case_ids: List[int]) -> BulkOperationResponse:
+        """批量软删除"""
+        self._check_size(test_case_ids)
+        deleted = self.soft_delete(test_case_ids)
+
+        results: Dict[int, BulkItemResult] = {}
+        seen: Set[int] = set()
+        for index, test_case_id in enumerate(test_case_ids):
+            if test_case_id in deleted and test_case_id not in seen:
+                results[index] = BulkItemResult(index=index, id=test_case_id, success=True)
+            else:
+                results[index] = BulkItemResult(index=index, id=test_case_id, success=False, error="测试用例不存在")
+            seen.add(test_case_id)
+        return self._finish(len(test_case_ids), results, atomic=False)
@@ -1,11 +1,13 @@
 """
 分类服务
+分类层级保存在闭包表 category_closure 中，在创建、移动时维护；
+子树、子树用例数、循环检查和级联删除都只需一次查询
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
-from typing import List, Optional, Dict, Any
-from ..database import Category, TestCase
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, func, insert, literal, select, true, union_all
+from typing import List, Optional, Dict, Any, Iterable
+from ..database import Category, CategoryClosure, TestCase
 from ..models import CategoryCreate, CategoryUpdate, CategoryResponse
 from datetime import datetime
 
@@ -35,10 +37,12 @@ class CategoryService:
         )
         
         self.db.add(db_category)
+        self.db.flush()
+        self._insert_closure(db_category.id, category_data.parent_id)
         self.db.commit()
         self.db.refresh(db_category)
         
-        return self._to_response(db_category)
+        return self._to_responses([db_category])[0]
 
     def get_category(self, category_id: int) -> Optional[CategoryResponse]:
         """获取单个分类"""
@@ -49,7 +53,7 @@ class CategoryService:
         if not category:
             return None
             
-        return self._to_response(category)
+        return self._to_responses([category])[0]
 
     def get_categories(self, parent_id: Optional[int] = None, include_inactive: bool = False) -> List[CategoryResponse]:
         """获取分类列表"""
@@ -66,69 +70,33 @@ class CategoryService:
         query = query.order_by(Category.sort_order, Category.name)
         
         categories = query.all()
-        return [self._to_response(category) for category in categories]
+        return self._to_responses(categories)
 
     def get_category_tree(self, include_inactive: bool = False) -> List[CategoryResponse]:
-        """获取分类树形结构"""
+        """获取分类树形结构：一次查询分类，一次按分类分组统计用例数"""
         # 获取所有分类
         query = self.db.query(Category).filter(Category.is_deleted == False)
         if not include_inactive:
             query = query.filter(Category.is_active == True)
         query = query.order_by(Category.sort_order, Category.name)
         
-        all_categories = query.all()
-        
-        # 构建树形结构
-        category_dict = {cat.id: self._to_response(cat) for cat in all_categories}
-        root_categories = []
-        
-        for category in all_categories:
-            if category.parent_id is None:
-                root_categories.append(category_dict[category.id])
-            else:
-                if category.parent_id in category_dict:
-                    if category_dict[category.parent_id].children is None:
-                        category_dict[category.parent_id].children = []
-                    category_dict[category.parent_id].children.append(category_dict[category.id])
-        
-        return root_categories
+        return self._build_tree(query.all())
 
     def get_category_with_children(self, category_id: int, include_inactive: bool = False) -> Optional[CategoryResponse]:
         """获取分类及其所有子分类"""
-        # 获取指定分类
-        category = self.db.query(Category).filter(
-            and_(Category.id == category_id, Category.is_deleted == False)
-        ).first()
-        
-        if not category:
-            return None
-            
-        # 获取所有子分类
-        children = self._get_all_children(category_id, include_inactive)
-        
-        response = self._to_response(category)
-        response.children = children
-        
-        return response
-
-    def _get_all_children(self, parent_id: int, include_inactive: bool = False) -> List[CategoryResponse]:
-        """递归获取所有子分类"""
-        query = self.db.query(Category).filter(
-            and_(Category.parent_id == parent_id, Category.is_deleted == False)
+        # 通过闭包表一次取出整个子树
+        query = self.db.query(Category).join(
+            CategoryClosure, CategoryClosure.descendant_id == Category.id
+        ).filter(
+            CategoryClosure.ancestor_id == category_id,
+            Category.is_deleted == False
         )
         if not include_inactive:
-            query = query.filter(Category.is_active == True)
+            query = query.filter((Category.is_active == True) | (Category.id == category_id))
         query = query.order_by(Category.sort_order, Category.name)
         
-        children = query.all()
-        result = []
-        
-        for child in children:
-            child_response = self._to_response(child)
-            child_response.children = self._get_all_children(child.id, include_inactive)
-            result.append(child_response)
-            
-        return result
+        roots = [root for root in self._build_tree(query.all()) if root.id == category_id]
+        return roots[0] if roots else None
 
     def update_category(self, category_id: int, category_data: CategoryUpdate) -> Optional[CategoryResponse]:
         """更新分类"""
@@ -149,38 +117,36 @@ class CategoryService:
         if category_data.is_active is not None:
             category.is_active = category_data.is_active
             
-        # 如果更新了父分类，需要重新计算层级
+        # 如果更新了父分类，需要移动子树并重新计算层级
         if category_data.parent_id is not None and category_data.parent_id != category.parent_id:
             if category_data.parent_id == category_id:
                 raise ValueError("不能将分类设置为自己的父分类")
                 
+            parent = self.db.query(Category).filter(
+                and_(Category.id == category_data.parent_id, Category.is_deleted == False)
+            ).first()
+            if not parent:
+                raise ValueError("父分类不存在")
+                
             # 检查是否会造成循环引用
             if self._would_create_cycle(category_id, category_data.parent_id):
                 raise ValueError("不能创建循环引用的分类结构")
                 
-            category.parent_id = category_data.parent_id
-            category.level = self._calculate_level(category_data.parent_id)
+            self._move_subtree(category, category_data.parent_id)
             
         category.updated_at = datetime.now()
         
         self.db.commit()
         self.db.refresh(category)
         
-        return self._to_response(category)
+        return self._to_responses([category])[0]
 
     def _would_create_cycle(self, category_id: int, new_parent_id: int) -> bool:
-        """检查是否会造成循环引用"""
-        current_parent_id = new_parent_id
-        while current_parent_id is not None:
-            if current_parent_id == category_id:
-                return True
-            parent = self.db.query(Category).filter(
-                and_(Category.id == current_parent_id, Category.is_deleted == False)
-            ).first()
-            if not parent:
-                break
-            current_parent_id = parent.parent_id
-        return False
+        """检查是否会造成循环引用：新的父分类位于当前分类的子树中"""
+        return self.db.query(CategoryClosure).filter(
+            CategoryClosure.ancestor_id == category_id,
+            CategoryClosure.descendant_id == new_parent_id
+        ).first() is not None
 
     def _calculate_level(self, parent_id: Optional[int]) -> int:
         """计算分类层级"""
@@ -196,6 +162,43 @@ class CategoryService:
             
         return parent.level + 1
 
+    def _insert_closure(self, category_id: int, parent_id: Optional[int]):
+        """为新分类写入闭包关系：自身，以及父分类的所有祖先"""
+        rows = select(literal(category_id), literal(category_id), literal(0))
+        if parent_id is not None:
+            rows = union_all(rows, select(
+                CategoryClosure.ancestor_id, literal(category_id), CategoryClosure.depth + 1
+            ).where(CategoryClosure.descendant_id == parent_id))
+        self.db.execute(insert(CategoryClosure).from_select(["ancestor_id", "descendant_id", "depth"], rows))
+
+    def _move_subtree(self, category: Category, new_parent_id: int):
+        """将分类及其子树移动到新的父分类下，同步闭包关系和子树层级"""
+        subtree_ids = self._get_subtree_ids(category.id, include_deleted=True)
+        
+        # 断开子树与原祖先的关系
+        self.db.query(CategoryClosure).filter(
+            CategoryClosure.descendant_id.in_(subtree_ids),
+            CategoryClosure.ancestor_id.notin_(subtree_ids)
+        ).delete(synchronize_session=False)
+        
+        # 新父分类的每个祖先与子树中每个分类建立关系（显式笛卡尔积）
+        supers, subs = aliased(CategoryClosure), aliased(CategoryClosure)
+        self.db.execute(insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(supers.ancestor_id, subs.descendant_id, supers.depth + subs.depth + 1).select_from(supers).join(subs, true()).where(
+                supers.descendant_id == new_parent_id,
+                subs.ancestor_id == category.id
+            )
+        ))
+        
+        level_delta = self._calculate_level(new_parent_id) - (category.level or 0)
+        if level_delta:
+            self.db.query(Category).filter(Category.id.in_(subtree_ids)).update(
+                {Category.level: Category.level + level_delta}, synchronize_session=False
+            )
+        category.parent_id = new_parent_id
+        category.level = (category.level or 0) + level_delta
+
     def delete_category(self, category_id: int, force: bool = False) -> bool:
         """删除分类"""
         category = self.db.query(Category).filter(
@@ -222,12 +225,14 @@ class CategoryService:
             raise ValueError("该分类下有关联的测试用例，无法删除")
             
         if force:
-            # 强制删除：标记所有子分类为删除
-            self._mark_children_deleted(category_id)
-            # 将关联的测试用例的分类设为空
+            # 强制删除：整个子树标记为删除，子树下测试用例的分类设为空
+            subtree = select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
             self.db.query(TestCase).filter(
-                and_(TestCase.category_id == category_id, TestCase.is_deleted == False)
-            ).update({"category_id": None})
+                and_(TestCase.category_id.in_(subtree), TestCase.is_deleted == False)
+            ).update({"category_id": None}, synchronize_session=False)
+            self.db.query(Category).filter(
+                and_(Category.id.in_(subtree), Category.is_deleted == False)
+            ).update({"is_deleted": True, "updated_at": datetime.now()}, synchronize_session=False)
             
         category.is_deleted = True
         category.updated_at = datetime.now()
@@ -235,52 +240,101 @@ class CategoryService:
         self.db.commit()
         return True
 
-    def _mark_children_deleted(self, parent_id: int):
-        """递归标记子分类为删除"""
-        children = self.db.query(Category).filter(
-            and_(Category.parent_id == parent_id, Category.is_deleted == False)
-        ).all()
-        
-        for child in children:
-            child.is_deleted = True
-            child.updated_at = datetime.now()
-            self._mark_children_deleted(child.id)
-
     def get_category_test_cases(self, category_id: int, include_children: bool = True) -> List[int]:
         """获取分类下的测试用例ID列表"""
+        query = self.db.query(TestCase.id).filter(TestCase.is_deleted == False)
         if include_children:
-            # 获取所有子分类ID
-            category_ids = self._get_all_descendant_ids(category_id)
-            category_ids.append(category_id)
+            query = query.join(
+                CategoryClosure, CategoryClosure.descendant_id == TestCase.category_id
+            ).join(
+                Category, Category.id == CategoryClosure.descendant_id
+            ).filter(
+                CategoryClosure.ancestor_id == category_id,
+                (Category.is_deleted == False) | (Category.id == category_id)
+            )
         else:
-            category_ids = [category_id]
+            query = query.filter(TestCase.category_id == category_id)
             
-        test_cases = self.db.query(TestCase).filter(
-            and_(TestCase.category_id.in_(category_ids), TestCase.is_deleted == False)
-        ).all()
-        
-        return [tc.id for tc in test_cases]
+        return [test_case_id for test_case_id, in query.all()]
+
+    def _get_subtree_ids(self, category_id: int, include_deleted: bool = False) -> List[int]:
+        """获取分类自身及所有后代分类ID"""
+        query = self.db.query(CategoryClosure.descendant_id).filter(CategoryClosure.ancestor_id == category_id)
+        if not include_deleted:
+            query = query.join(Category, Category.id == CategoryClosure.descendant_id).filter(
+                (Category.is_deleted == False) | (Category.id == category_id)
+            )
+        return [descendant_id for descendant_id, in query.all()]
 
     def _get_all_descendant_ids(self, category_id: int) -> List[int]:
         """获取所有后代分类ID"""
-        children = self.db.query(Category).filter(
-            and_(Category.parent_id == category_id, Category.is_deleted == False)
-        ).all()
+        return [descendant_id for descendant_id in self._get_subtree_ids(category_id) if descendant_id != category_id]
+
+    def _test_case_counts(self, category_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """按分类分组统计未删除的测试用例数量"""
+        query = self.db.query(TestCase.category_id, func.count(TestCase.id)).filter(
+            TestCase.is_deleted == False, TestCase.category_id.isnot(None)
+        )
+        if category_ids is not None:
+            query = query.filter(TestCase.category_id.in_(list(category_ids)))
+        return dict(query.group_by(TestCase.category_id).all())
+
+    def _subtree_test_case_counts(self, category_ids: List[int]) -> Dict[int, int]:
+        """统计每个分类子树（包括自身）下的测试用例数量"""
+        rows = self.db.query(CategoryClosure.ancestor_id, func.count(TestCase.id)).join(
+            TestCase, TestCase.category_id == CategoryClosure.descendant_id
+        ).join(
+            Category, Category.id == CategoryClosure.descendant_id
+        ).filter(
+            CategoryClosure.ancestor_id.in_(category_ids),
+            TestCase.is_deleted == False,
+            Category.is_deleted == False
+        ).group_by(CategoryClosure.ancestor_id).all()
+        return dict(rows)
+
+    def _build_tree(self, categories: List[Category]) -> List[CategoryResponse]:
+        """
+        由已排序的分类列表一次遍历构建树，用例数只做一次分组统计
+        
+        父分类不在列表中的分类作为根节点返回；子树用例数由子节点向上累加。
+        """
+        counts = self._test_case_counts()
+        category_dict = {
+            category.id: self._to_response(category, counts.get(category.id, 0))
+            for category in categories
+        }
+        root_categories = []
         
-        descendant_ids = []
-        for child in children:
-            descendant_ids.append(child.id)
-            descendant_ids.extend(self._get_all_descendant_ids(child.id))
+        for category in categories:
+            if category.parent_id in category_dict:
+                category_dict[category.parent_id].children.append(category_dict[category.id])
+            else:
+                root_categories.append(category_dict[category.id])
+                
+        # 由子节点向上累加子树用例数
+        def fill_total(response: CategoryResponse) -> int:
+            response.total_test_case_count = response.test_case_count + sum(fill_total(child) for child in response.children)
+            return response.total_test_case_count
+        
+        for root in root_categories:
+            fill_total(root)
             
-        return descendant_ids
+        return root_categories
+
+    def _to_responses(self, categories: List[Category]) -> List[CategoryResponse]:
+        """批量转换为响应模型，用例数各只查询一次"""
+        category_ids = [category.id for category in categories]
+        if not category_ids:
+            return []
+        counts = self._test_case_counts(category_ids)
+        totals = self._subtree_test_case_counts(category_ids)
+        return [
+            self._to_response(category, counts.get(category.id, 0), totals.get(category.id, 0))
+            for category in categories
+        ]
 
-    def _to_response(self, category: Category) -> CategoryResponse:
+    def _to_response(self, category: Category, test_case_count: int = 0, total_test_case_count: Optional[int] = None) -> CategoryResponse:
         """转换为响应模型"""
-        # 计算测试用例数量
-        test_case_count = self.db.query(TestCase).filter(
-            and_(TestCase.category_id == category.id, TestCase.is_deleted == False)
-        ).count()
-        
         return CategoryResponse(
             id=category.id,
             name=category.name,
@@ -292,5 +346,6 @@ class CategoryService:
             created_at=category.created_at,
             updated_at=category.updated_at,
             children=[],
-            test_case_count=test_case_count
-        ) 
\ No newline at end of file
+            test_case_count=test_case_count,
+            total_test_case_count=test_case_count if total_test_case_count is None else total_test_case_count
+        )
@@ -4,59 +4,45 @@ Excel导入服务
 
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.orm import Session
-import pandas as pd
-import io
+import asyncio
 import json
-import os
 from typing import List, Dict, Any
 
 from ..database import TestCase
 from ..config_manager import ConfigManager
 from .llm_service import LLMService
+from .spreadsheet_reader import SpreadsheetReader, is_spreadsheet
 
 class ExcelService:
     """Excel文件处理服务"""
     
     @staticmethod
-    async def preview_excel(file: UploadFile) -> Dict[str, Any]:
-        """预览Excel文件内容"""
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="只支持Excel文件格式")
+    async def preview_excel(file: UploadFile, nrows: int = 5) -> Dict[str, Any]:
+        """预览Excel文件内容，只读取前 nrows 行，总行数取自工作表尺寸"""
+        if not is_spreadsheet(file.filename):
+            raise HTTPException(status_code=400, detail="只支持Excel或CSV文件格式")
         
         try:
-            # 读取Excel文件
-            content = await file.read()
-            df = pd.read_excel(io.BytesIO(content))
+            reader = SpreadsheetReader(file.file, file.filename)
+            preview = await asyncio.to_thread(reader.preview, nrows)
+            total_rows = await asyncio.to_thread(reader.count_rows)
             
-            # 处理NaN值
-            df = df.fillna('')
-            
-            # 转换为字典列表
-            data = df.to_dict('records')
-            
-            # 返回前5行作为预览
-            preview = data[:5] if len(data) > 5 else data
-            
-            return {"preview": preview, "total_rows": len(data)}
+            return {"preview": preview.to_dict('records'), "total_rows": total_rows}
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"读取Excel文件失败: {str(e)}")
 
     @staticmethod
     async def import_excel(file: UploadFile, options: str, db: Session) -> Dict[str, Any]:
         """导入Excel文件中的测试用例"""
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="只支持Excel文件格式")
+        if not is_spreadsheet(file.filename):
+            raise HTTPException(status_code=400, detail="只支持Excel或CSV文件格式")
         
         try:
             # 解析导入选项
             import_options = json.loads(options)
             
-            # 读取Excel文件
-            content = await file.read()
-            df = pd.read_excel(io.BytesIO(content))
-            
-            # 处理NaN值
-            df = df.fillna('')
+            # 同步导入需要整表内容交给大模型分析，大文件请使用异步导入任务
+            df = await asyncio.to_thread(SpreadsheetReader(file.file, file.filename).read_all)
             
             # 使用大模型分析Excel内容并转换为测试用例格式
             test_cases = await LLMService.analyze_excel_with_llm(df, import_options)
@@ -6,10 +6,12 @@ Excel模版服务
 import pandas as pd
 import tempfile
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from fastapi import HTTPException
 from fastapi.responses import FileResponse
 
+from .excel_utils import blank_mask, split_tags
+
 class ExcelTemplateService:
     """Excel模版服务类"""
     
@@ -110,58 +112,11 @@ class ExcelTemplateService:
     
     @classmethod
     def parse_standard_template(cls, df: pd.DataFrame) -> List[Dict[str, Any]]:
-        """解析标准模版Excel文件"""
+        """解析标准模版Excel文件，任一行校验失败时整体报错"""
         try:
-            test_cases = []
-            
-            # 验证必要的列是否存在
-            required_columns = ["测试用例名称", "测试步骤", "预期结果"]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"缺少必需的列: {', '.join(missing_columns)}")
-            
-            for index, row in df.iterrows():
-                # 跳过空行
-                if pd.isna(row["测试用例名称"]) or str(row["测试用例名称"]).strip() == "":
-                    continue
-                
-                # 验证必填字段
-                if pd.isna(row["测试步骤"]) or str(row["测试步骤"]).strip() == "":
-                    raise ValueError(f"第{index + 2}行：测试步骤不能为空")
-                
-                if pd.isna(row["预期结果"]) or str(row["预期结果"]).strip() == "":
-                    raise ValueError(f"第{index + 2}行：预期结果不能为空")
-                
-                # 处理标签（转换为列表）
-                tags = []
-                if not pd.isna(row.get("标签", "")):
-                    tag_str = str(row["标签"]).strip()
-                    if tag_str:
-                        tags = [tag.strip() for tag in tag_str.split(",") if tag.strip()]
-                
-                # 处理优先级
-                priority = str(row.get("优先级", "medium")).lower()
-                if priority not in ["low", "medium", "high", "critical"]:
-                    priority = "medium"
-                
-                # 处理状态
-                status = str(row.get("状态", "active")).lower()
-                if status not in ["active", "inactive", "draft"]:
-                    status = "active"
-                
-                # 构建测试用例对象
-                test_case = {
-                    "name": str(row["测试用例名称"]).strip(),
-                    "task_content": str(row["测试步骤"]).strip(),
-                    "expected_result": str(row["预期结果"]).strip(),
-                    "priority": priority,
-                    "category": str(row.get("分类", "导入")).strip() if not pd.isna(row.get("分类")) else "导入",
-                    "tags": tags,
-                    "status": status
-                }
-                
-                test_cases.append(test_case)
-            
+            test_cases, errors = cls.parse_standard_template_rows(df)
+            if errors:
+                raise ValueError(errors[0]["message"])
             if not test_cases:
                 raise ValueError("没有找到有效的测试用例数据")
             
@@ -170,6 +125,78 @@ class ExcelTemplateService:
         except Exception as e:
             raise ValueError(f"解析标准模版失败: {str(e)}")
     
+    @classmethod
+    def parse_standard_template_rows(cls, df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        按列批量解析标准模版，返回 (测试用例列表, 逐行错误列表)
+        
+        名称为空的行视为空行跳过；错误项的 row 为表格中的行号（DataFrame 索引 + 2），errors 为该行的全部错误
+        """
+        # 验证必要的列是否存在
+        required_columns = ["测试用例名称", "测试步骤", "预期结果"]
+        missing_columns = [col for col in required_columns if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"缺少必需的列: {', '.join(missing_columns)}")
+        
+        # 跳过空行
+        df = df[~blank_mask(df, "测试用例名称")]
+        
+        # 批量校验必填字段，同一行的多个错误合并报告
+        step_missing = blank_mask(df, "测试步骤")
+        result_missing = blank_mask(df, "预期结果")
+        invalid = step_missing | result_missing
+        errors = []
+        for row_index, no_step, no_result in zip(df.index[invalid], step_missing[invalid], result_missing[invalid]):
+            row_errors = [message for message, failed in (("测试步骤不能为空", no_step), ("预期结果不能为空", no_result)) if failed]
+            errors.append({
+                "row": row_index + 2,
+                "errors": row_errors,
+                "message": f"第{row_index + 2}行：{'；'.join(row_errors)}"
+            })
+        df = df[~invalid]
+        
+        # 处理标签（转换为列表），优先级和状态不在可选范围内时使用默认值
+        if "标签" in df.columns:
+            tags = split_tags(df["标签"].where(df["标签"].notna(), "").astype(str))
+        else:
+            tags = [[] for _ in range(len(df))]
+        priorities = cls._optional_column(df, "优先级", "medium").str.lower()
+        priorities = priorities.where(priorities.isin(["low", "medium", "high", "critical"]), "medium")
+        statuses = cls._optional_column(df, "状态", "active").str.lower()
+        statuses = statuses.where(statuses.isin(["active", "inactive", "draft"]), "active")
+        if "分类" in df.columns:
+            categories = df["分类"].astype(str).str.strip().where(df["分类"].notna(), "导入")
+        else:
+            categories = pd.Series("导入", index=df.index, dtype=object)
+        
+        # 构建测试用例对象
+        test_cases = [
+            {
+                "name": name,
+                "task_content": task_content,
+                "expected_result": expected_result,
+                "priority": priority,
+                "category": category,
+                "tags": case_tags,
+                "status": status
+            }
+            for name, task_content, expected_result, priority, category, case_tags, status in zip(
+                df["测试用例名称"].astype(str).str.strip().tolist(),
+                df["测试步骤"].astype(str).str.strip().tolist(),
+                df["预期结果"].astype(str).str.strip().tolist(),
+                priorities.tolist(), categories.tolist(), tags, statuses.tolist()
+            )
+        ]
+        
+        return test_cases, errors
+    
+    @staticmethod
+    def _optional_column(df: pd.DataFrame, column: str, default: str) -> pd.Series:
+        """可选列转为字符串，列不存在时整列取默认值"""
+        if column not in df.columns:
+            return pd.Series(default, index=df.index, dtype=object)
+        return df[column].astype(str)
+    
     @classmethod
     def is_standard_template(cls, df: pd.DataFrame) -> bool:
         """检测是否为标准模版格式"""
@@ -1,72 +1,115 @@
 """
 Excel工具模块
+规则转换按列向量化计算：列名别名只解析一次，分类/优先级/状态/标签用 str.contains 掩码整列判断
 """
 
+import re
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+# 列名别名，按顺序取表格中第一个存在的列
+NAME_COLUMNS = ('标题', 'name', '名称', 'Name')
+TASK_CONTENT_COLUMNS = ('步骤描述', 'task_content', '任务内容', 'Task', '内容')
+EXPECTED_RESULT_COLUMNS = ('预期结果', 'expected_result', '期望结果', 'Expected Result')
+
+# (关键词, 取值)，按顺序第一个命中的规则生效
+CATEGORY_RULES = (('组合商品', '组合商品功能'), ('会员', '会员管理'), ('首页', '首页功能'), ('分类', '分类管理'))
+PRIORITY_RULES = ((('紧急', '重要', '核心', 'critical'), 'critical'), (('高', 'high'), 'high'), (('低', 'low'), 'low'))
+STATUS_RULES = ((('草稿', 'draft'), 'draft'), (('非激活', 'inactive'), 'inactive'))
+# 步骤内容包含关键词时添加的标签，可同时命中多个
+TAG_RULES = (('登录', '登录功能'), ('搜索', '搜索功能'), ('审核', '审核功能'), ('发布', '发布功能'), ('编辑', '编辑功能'), ('删除', '删除功能'))
+
+# 逗号分隔的标签：去掉首尾空白，忽略空项
+TAG_PATTERN = r"[^,\s](?:[^,]*[^,\s])?"
+
+
+def resolve_column(df: pd.DataFrame, aliases: Sequence[str]) -> Optional[str]:
+    """返回别名中第一个存在于表格的列名"""
+    return next((column for column in aliases if column in df.columns), None)
+
+
+def text_column(df: pd.DataFrame, column: Optional[str], default: str = '') -> pd.Series:
+    """按位置索引的字符串列，列不存在时填充默认值；空值与逐行 str() 一致转为 'None'/'nan'"""
+    if column is None:
+        return pd.Series(default, index=range(len(df)), dtype=object)
+    return df[column].map(str).reset_index(drop=True)
+
+
+def contains_any(values: pd.Series, keywords: Sequence[str]) -> pd.Series:
+    """整列判断是否包含任一关键词"""
+    return values.str.contains('|'.join(re.escape(keyword) for keyword in keywords), regex=True)
+
+
+def select_by_rules(values: pd.Series, rules: Sequence[Tuple[Sequence[str], str]], default: str) -> List[str]:
+    """按规则顺序取第一个命中的值，都未命中时取默认值"""
+    if values.empty:
+        return []
+    conditions = [contains_any(values, keywords).to_numpy() for keywords, _ in rules]
+    return np.select(conditions, [value for _, value in rules], default).tolist()
+
+
+def blank_mask(df: pd.DataFrame, column: str) -> pd.Series:
+    """空值或只有空白字符的单元格"""
+    return df[column].isna() | df[column].astype(str).str.strip().eq('')
+
+
+def split_tags(values: pd.Series) -> List[List[str]]:
+    """逗号分隔的标签拆分为列表"""
+    return values.str.findall(TAG_PATTERN).tolist()
+
+
+def keyword_tags(values: pd.Series, rules: Sequence[Tuple[str, str]]) -> List[List[str]]:
+    """按关键词命中情况生成标签列表，标签顺序与规则顺序一致"""
+    if values.empty:
+        return []
+    hits = np.column_stack([values.str.contains(keyword, regex=False).to_numpy() for keyword, _ in rules])
+    codes = hits.astype(np.int64) @ (1 << np.arange(len(rules), dtype=np.int64))
+    # 命中组合数量有限，按组合缓存标签列表，每行返回副本
+    combinations = {
+        code: [tag for position, (_, tag) in enumerate(rules) if code >> position & 1]
+        for code in np.unique(codes).tolist()
+    }
+    return [list(combinations[code]) for code in codes.tolist()]
+
 
 def convert_excel_to_test_cases(df: pd.DataFrame, import_options: dict) -> List[dict]:
     """智能的Excel到测试用例转换逻辑"""
-    test_cases = []
-    
-    for _, row in df.iterrows():
-        # 智能识别列名并提取信息
-        name = str(row.get('标题', row.get('name', row.get('名称', row.get('Name', f'测试用例_{len(test_cases) + 1}')))))
-        task_content = str(row.get('步骤描述', row.get('task_content', row.get('任务内容', row.get('Task', row.get('内容', ''))))))
-        expected_result = str(row.get('预期结果', row.get('expected_result', row.get('期望结果', row.get('Expected Result', '')))))
-        
-        # 根据内容智能判断分类
-        category = import_options.get('defaultCategory', '导入')
-        if '组合商品' in name or '组合商品' in task_content:
-            category = '组合商品功能'
-        elif '会员' in name or '会员' in task_content:
-            category = '会员管理'
-        elif '首页' in name or '首页' in task_content:
-            category = '首页功能'
-        elif '分类' in name or '分类' in task_content:
-            category = '分类管理'
-        
-        # 根据内容智能判断优先级
-        priority = import_options.get('defaultPriority', 'medium')
-        if any(keyword in name.lower() for keyword in ['紧急', '重要', '核心', 'critical']):
-            priority = 'critical'
-        elif any(keyword in name.lower() for keyword in ['高', 'high']):
-            priority = 'high'
-        elif any(keyword in name.lower() for keyword in ['低', 'low']):
-            priority = 'low'
-        
-        # 根据内容智能判断状态
-        status = import_options.get('defaultStatus', 'active')
-        if any(keyword in name.lower() for keyword in ['草稿', 'draft']):
-            status = 'draft'
-        elif any(keyword in name.lower() for keyword in ['非激活', 'inactive']):
-            status = 'inactive'
-        
-        # 生成标签
-        tags = []
-        if '登录' in task_content:
-            tags.append('登录功能')
-        if '搜索' in task_content:
-            tags.append('搜索功能')
-        if '审核' in task_content:
-            tags.append('审核功能')
-        if '发布' in task_content:
-            tags.append('发布功能')
-        if '编辑' in task_content:
-            tags.append('编辑功能')
-        if '删除' in task_content:
-            tags.append('删除功能')
-        
-        test_case = {
+    if df.empty:
+        return []
+
+    # 智能识别列名并提取信息，没有名称列时按行序号命名
+    name_column = resolve_column(df, NAME_COLUMNS)
+    if name_column is None:
+        names = pd.Series([f'测试用例_{index}' for index in range(1, len(df) + 1)], dtype=object)
+    else:
+        names = text_column(df, name_column)
+    task_contents = text_column(df, resolve_column(df, TASK_CONTENT_COLUMNS))
+    expected_results = text_column(df, resolve_column(df, EXPECTED_RESULT_COLUMNS))
+
+    # 根据名称和步骤内容判断分类，根据名称判断优先级和状态
+    combined = names + '\n' + task_contents
+    lower_names = names.str.lower()
+    categories = select_by_rules(
+        combined, [((keyword,), category) for keyword, category in CATEGORY_RULES], import_options.get('defaultCategory', '导入')
+    )
+    priorities = select_by_rules(lower_names, PRIORITY_RULES, import_options.get('defaultPriority', 'medium'))
+    statuses = select_by_rules(lower_names, STATUS_RULES, import_options.get('defaultStatus', 'active'))
+
+    # 根据步骤内容生成标签
+    tags = keyword_tags(task_contents, TAG_RULES)
+
+    return [
+        {
             "name": name,
             "task_content": task_content,
             "status": status,
             "priority": priority,
             "category": category,
-            "tags": tags,
+            "tags": case_tags,
             "expected_result": expected_result
         }
-        
-        test_cases.append(test_case)
-    
-    return test_cases 
\ No newline at end of file
+        for name, task_content, status, priority, category, case_tags, expected_result in zip(
+            names.tolist(), task_contents.tolist(), statuses, priorities, categories, tags, expected_results.tolist()
+        )
+    ]
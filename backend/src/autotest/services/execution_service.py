@@ -4,6 +4,7 @@
 
 import logging
 from fastapi import HTTPException, BackgroundTasks
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone, timedelta
 from typing import List
@@ -16,9 +17,11 @@ def beijing_now():
     """获取北京时间"""
     return datetime.now(BEIJING_TZ)
 
+from ..batch_progress import counter_fields_from_counts
 from ..database import TestCase, TestExecution, TestStep, SessionLocal, BatchExecution, BatchExecutionTestCase
-from ..models import TestExecutionRequest, TestExecutionResponse, BatchExecutionRequest, BatchExecutionResponse
-from ..test_executor import execute_single_test, execute_multiple_tests, BatchTestExecutor, batch_executor_manager
+from ..models import TestExecutionRequest, TestExecutionResponse, BatchExecutionRequest, BatchExecutionResponse, BatchSelectionRequest
+from .batch_creation_service import BatchCreationService
+from ..test_executor import execute_single_test, execute_multiple_tests, BatchTestExecutor, batch_executor_manager, task_context
 from ..websocket_manager import websocket_manager
 
 class ExecutionService:
@@ -98,55 +101,11 @@ class ExecutionService:
         background_tasks: BackgroundTasks,
         db: Session
     ) -> dict:
-        """创建批量执行任务"""
-        # 检查所有测试用例是否存在
-        test_cases = db.query(TestCase).filter(
-            TestCase.id.in_(batch_request.test_case_ids),
-            TestCase.is_deleted == False
-        ).all()
-        
-        if len(test_cases) != len(batch_request.test_case_ids):
-            raise HTTPException(status_code=404, detail="部分测试用例不存在")
-        
-        # 创建批量执行任务记录 - 状态设为pending，不立即执行
-        batch_execution = BatchExecution(
-            name=f"批量执行任务_{beijing_now().strftime('%Y%m%d_%H%M%S')}",
-            status="pending",  # 改为pending状态
-            total_count=len(batch_request.test_case_ids),
-            pending_count=len(batch_request.test_case_ids),
-            headless=batch_request.headless,  # 保存headless设置
-            # 不设置started_at，因为还没有开始执行
-        )
-        db.add(batch_execution)
-        db.commit()
-        db.refresh(batch_execution)
-        
-        # 创建批量执行任务中的测试用例记录
-        batch_test_cases = []
-        for test_case_id in batch_request.test_case_ids:
-            batch_test_case = BatchExecutionTestCase(
-                batch_execution_id=batch_execution.id,
-                test_case_id=test_case_id,
-                status="pending"
-            )
-            db.add(batch_test_case)
-            batch_test_cases.append(batch_test_case)
-        
-        db.commit()
-        
-        # 不再立即在后台执行批量测试
-        # background_tasks.add_task(
-        #     ExecutionService._run_batch_execution_in_background,
-        #     batch_execution.id,
-        #     batch_request.test_case_ids,
-        #     batch_request.headless
-        # )
-        
-        return {
-            "success": True,
-            "batch_execution_id": batch_execution.id,
-            "message": "批量执行任务已创建，请点击执行按钮开始执行"
-        }
+        """创建批量执行任务，状态为 pending，需要再调用启动接口执行"""
+        return BatchCreationService(db).create(BatchSelectionRequest(
+            test_case_ids=batch_request.test_case_ids,
+            headless=batch_request.headless
+        ))
 
     @staticmethod
     async def start_batch_execution(
@@ -232,99 +191,51 @@ class ExecutionService:
             raise HTTPException(status_code=400, detail="任务不在运行状态，无法停止")
         logging.info(f"步骤2完成: 任务状态检查通过")
         
-        # 尝试取消正在运行的执行器
+        # 发出取消信号：停止Agent、取消任务、并发关闭浏览器并等待任务确认结束
         logging.info(f"步骤3: 开始取消批量执行任务 {batch_execution_id}")
         executor_cancelled = await batch_executor_manager.cancel_executor(batch_execution_id)
+        cancel_report = task_context.get_cancel_report(batch_execution_id) if executor_cancelled else None
         logging.info(f"步骤3完成: 批量执行任务 {batch_execution_id} 取消结果: {executor_cancelled}")
         
-        # 等待一小段时间，让后台任务响应取消信号
-        import asyncio
-        logging.info(f"步骤4: 等待 0.5 秒，让后台任务响应取消信号...")
-        await asyncio.sleep(0.5)
-        logging.info(f"步骤4完成: 等待结束")
-        
-        # 检查是否还有正在运行的测试用例
-        logging.info(f"步骤5: 检查剩余运行中的测试用例")
-        still_running = db.query(BatchExecutionTestCase).filter(
+        # 批量更新剩余的运行中/待执行用例及其执行记录
+        logging.info(f"步骤4: 批量更新未结束的测试用例状态")
+        now = beijing_now()
+        unfinished_filter = (
             BatchExecutionTestCase.batch_execution_id == batch_execution_id,
-            BatchExecutionTestCase.status == "running"
-        ).count()
-        logging.info(f"步骤5完成: 批量任务 {batch_execution_id} 当前仍有 {still_running} 个测试用例在运行")
-        
-        if still_running > 0:
-            logging.info(f"步骤6: 仍有测试用例在运行，再等待 0.5 秒...")
-            await asyncio.sleep(0.5)
-            logging.info(f"步骤6完成: 额外等待结束")
-            
-            # 最终检查
-            final_running = db.query(BatchExecutionTestCase).filter(
-                BatchExecutionTestCase.batch_execution_id == batch_execution_id,
-                BatchExecutionTestCase.status == "running"
-            ).count()
-            logging.info(f"步骤6结果: 批量任务 {batch_execution_id} 最终仍有 {final_running} 个测试用例在运行")
-        
-        # 如果仍有测试用例在运行，强制更新状态
-        if still_running > 0:
-            logging.info(f"步骤7: 强制更新 {still_running} 个测试用例状态为已取消")
-            db.query(BatchExecutionTestCase).filter(
-                BatchExecutionTestCase.batch_execution_id == batch_execution_id,
-                BatchExecutionTestCase.status == "running"
-            ).update({
-                "status": "cancelled",
-                "completed_at": beijing_now()
-            })
-            db.commit()
-            logging.info(f"步骤7完成: 已强制更新 {still_running} 个测试用例状态为已取消")
-        
-        # 更新任务状态为已取消
-        logging.info(f"步骤8: 更新任务状态为已取消")
+            BatchExecutionTestCase.status.in_(["running", "pending"])
+        )
+        running_execution_ids = db.query(BatchExecutionTestCase.execution_id).filter(
+            *unfinished_filter,
+            BatchExecutionTestCase.execution_id.isnot(None)
+        ).subquery()
+        db.query(TestExecution).filter(
+            TestExecution.id.in_(select(running_execution_ids.c.execution_id)),
+            TestExecution.status.in_(["running", "pending"])
+        ).update({
+            "status": "cancelled",
+            "completed_at": now
+        }, synchronize_session=False)
+        cancelled_count = db.query(BatchExecutionTestCase).filter(*unfinished_filter).update({
+            "status": "cancelled",
+            "completed_at": now
+        }, synchronize_session=False)
+        
+        # 已取消任务的最终状态和统计数据只在这里写入：按分组统计重算，已取消的用例计入失败数
+        status_counts = dict(
+            db.query(BatchExecutionTestCase.status, func.count(BatchExecutionTestCase.id)).filter(
+                BatchExecutionTestCase.batch_execution_id == batch_execution_id
+            ).group_by(BatchExecutionTestCase.status).all()
+        )
         batch_execution.status = "cancelled"
-        batch_execution.completed_at = beijing_now()
-        batch_execution.updated_at = beijing_now()
-        logging.info(f"步骤8完成: 任务状态已更新为已取消")
-        
-        # 停止所有正在运行的测试用例
-        logging.info(f"步骤9: 停止所有正在运行的测试用例")
-        running_test_cases = db.query(BatchExecutionTestCase).filter(
-            BatchExecutionTestCase.batch_execution_id == batch_execution_id,
-            BatchExecutionTestCase.status == "running"
-        ).all()
-        logging.info(f"步骤9完成: 找到 {len(running_test_cases)} 个正在运行的测试用例")
-        
-        for btc in running_test_cases:
-            btc.status = "cancelled"
-            btc.completed_at = beijing_now()
-            # 如果有对应的执行记录，也将其标记为取消
-            if btc.execution_id:
-                execution = db.query(TestExecution).filter(TestExecution.id == btc.execution_id).first()
-                if execution:
-                    execution.status = "cancelled"
-                    execution.completed_at = beijing_now()
-        
-        # 将pending状态的测试用例也标记为取消
-        logging.info(f"步骤10: 将pending状态的测试用例标记为取消")
-        pending_test_cases = db.query(BatchExecutionTestCase).filter(
-            BatchExecutionTestCase.batch_execution_id == batch_execution_id,
-            BatchExecutionTestCase.status == "pending"
-        ).all()
-        logging.info(f"步骤10完成: 找到 {len(pending_test_cases)} 个pending状态的测试用例")
-        
-        for btc in pending_test_cases:
-            btc.status = "cancelled"
-            btc.completed_at = beijing_now()
-        
-        # 更新统计信息
-        logging.info(f"步骤11: 更新统计信息")
-        cancelled_count = len(running_test_cases) + len(pending_test_cases)
-        batch_execution.running_count = 0
-        batch_execution.pending_count = 0
-        batch_execution.failed_count += cancelled_count
-        
+        batch_execution.completed_at = now
+        batch_execution.updated_at = now
+        for field, value in counter_fields_from_counts(status_counts).items():
+            setattr(batch_execution, field, value)
         db.commit()
-        logging.info(f"步骤11完成: 统计信息已更新，共取消 {cancelled_count} 个测试用例")
+        logging.info(f"步骤4完成: 共取消 {cancelled_count} 个测试用例")
         
         # 推送WebSocket更新
-        logging.info(f"步骤12: 推送WebSocket更新")
+        logging.info(f"步骤5: 推送WebSocket更新")
         await websocket_manager.broadcast_batch_update(
             batch_execution.id,
             {
@@ -338,12 +249,14 @@ class ExecutionService:
                 "updated_at": batch_execution.updated_at.isoformat() if batch_execution.updated_at else None
             }
         )
-        logging.info(f"步骤12完成: WebSocket更新已推送")
+        logging.info(f"步骤5完成: WebSocket更新已推送")
         
         logging.info(f"=== stop_batch_execution 执行完成，准备返回结果 ===")
         return {
             "success": True,
-            "message": "批量执行任务已停止"
+            "message": "批量执行任务已停止",
+            "cancelled_count": cancelled_count,
+            "cancel_latency_ms": cancel_report["cancel_latency_ms"] if cancel_report else None
         }
 
     @staticmethod
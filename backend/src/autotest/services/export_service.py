@@ -0,0 +1,241 @@
+"""
+数据导出服务
+测试用例、执行记录和执行步骤按服务端游标分批读取（yield_per），逐块生成 NDJSON、CSV 或 XLSX，
+内存占用与导出行数无关；支持按分类子树、日期范围和状态过滤
+"""
+
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from sqlalchemy import Select, select
+
+from ..database import AsyncSessionLocal, CategoryClosure, TestCase, TestExecution, TestStep
+from ..responses import dumps
+
+# 每批从数据库读取的行数
+EXPORT_CHUNK_SIZE = 1000
+# Excel 单个工作表最多 1048576 行，超过后写入新的工作表
+XLSX_ROWS_PER_SHEET = 1_000_000
+# XLSX 文件生成后按块发送
+XLSX_READ_CHUNK_SIZE = 64 * 1024
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+@dataclass(frozen=True)
+class ExportDataset:
+    """一种可导出的数据"""
+    title: str
+    # 导出的列：(列名, 查询列)
+    columns: Tuple[Tuple[str, Any], ...]
+    id_column: Any
+    date_column: Any
+    status_column: Any
+    # 在查询上关联到测试用例表，用于按分类过滤
+    join_test_case: Callable[[Select], Select]
+    live_column: Any = None
+
+
+EXPORT_DATASETS: Dict[str, ExportDataset] = {
+    "test_cases": ExportDataset(
+        title="测试用例",
+        columns=(
+            ("id", TestCase.id), ("name", TestCase.name), ("task_content", TestCase.task_content),
+            ("expected_result", TestCase.expected_result),
+            ("status", TestCase.status), ("priority", TestCase.priority), ("category", TestCase.category),
+            ("category_id", TestCase.category_id), ("created_at", TestCase.created_at), ("updated_at", TestCase.updated_at),
+        ),
+        id_column=TestCase.id,
+        date_column=TestCase.created_at,
+        status_column=TestCase.status,
+        join_test_case=lambda statement: statement,
+        live_column=TestCase.is_deleted,
+    ),
+    "executions": ExportDataset(
+        title="执行记录",
+        columns=(
+            ("id", TestExecution.id), ("test_case_id", TestExecution.test_case_id), ("execution_name", TestExecution.execution_name),
+            ("status", TestExecution.status), ("overall_status", TestExecution.overall_status),
+            ("total_steps", TestExecution.total_steps), ("passed_steps", TestExecution.passed_steps),
+            ("failed_steps", TestExecution.failed_steps), ("skipped_steps", TestExecution.skipped_steps),
+            ("total_duration", TestExecution.total_duration), ("error_message", TestExecution.error_message),
+            ("started_at", TestExecution.started_at), ("completed_at", TestExecution.completed_at),
+            ("created_at", TestExecution.created_at),
+        ),
+        id_column=TestExecution.id,
+        date_column=TestExecution.created_at,
+        status_column=TestExecution.status,
+        join_test_case=lambda statement: statement.join(TestCase, TestCase.id == TestExecution.test_case_id),
+    ),
+    "steps": ExportDataset(
+        title="执行步骤",
+        columns=(
+            ("id", TestStep.id), ("execution_id", TestStep.execution_id), ("step_order", TestStep.step_order),
+            ("step_name", TestStep.step_name), ("status", TestStep.status), ("url", TestStep.url),
+            ("description", TestStep.description), ("evaluation", TestStep.evaluation), ("next_goal", TestStep.next_goal),
+            ("error_message", TestStep.error_message), ("duration_seconds", TestStep.duration_seconds),
+            ("started_at", TestStep.started_at), ("completed_at", TestStep.completed_at),
+        ),
+        id_column=TestStep.id,
+        date_column=TestStep.started_at,
+        status_column=TestStep.status,
+        join_test_case=lambda statement: statement.join(TestExecution, TestExecution.id == TestStep.execution_id).join(
+            TestCase, TestCase.id == TestExecution.test_case_id
+        ),
+    ),
+}
+
+
+class ExportService:
+    """流式导出"""
+
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+
+    @property
+    def session_factory(self):
+        return self._session_factory or AsyncSessionLocal
+
+    @staticmethod
+    def get_dataset(name: str) -> ExportDataset:
+        dataset = EXPORT_DATASETS.get(name)
+        if dataset is None:
+            raise HTTPException(status_code=404, detail=f"不支持导出的数据: {name}")
+        return dataset
+
+    @staticmethod
+    def build_query(
+        dataset: ExportDataset,
+        category_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        status: Optional[str] = None,
+    ) -> Select:
+        """
+        构造导出查询，按主键顺序读取
+
+        Args:
+            category_id: 只导出该分类及其所有子分类下的数据
+            start_date: 起始日期（含）
+            end_date: 结束日期（含）
+        """
+        statement = select(*(column for _, column in dataset.columns))
+        if dataset.live_column is not None:
+            statement = statement.where(dataset.live_column == False)
+        if category_id is not None:
+            subtree = select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+            statement = dataset.join_test_case(statement).where(TestCase.category_id.in_(subtree))
+        if start_date is not None:
+            statement = statement.where(dataset.date_column >= datetime.combine(start_date, time.min))
+        if end_date is not None:
+            statement = statement.where(dataset.date_column < datetime.combine(end_date + timedelta(days=1), time.min))
+        if status:
+            statement = statement.where(dataset.status_column == status)
+        return statement.order_by(dataset.id_column)
+
+    async def iter_rows(self, statement: Select) -> AsyncIterator[list]:
+        """用服务端游标分批读取，每次产出一批行"""
+        async with self.session_factory() as db:
+            result = await db.stream(statement.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+            async for partition in result.partitions():
+                yield partition
+
+    def export(self, dataset: ExportDataset, statement: Select, export_format: str) -> AsyncIterator[bytes]:
+        """按格式生成导出内容"""
+        if export_format == "ndjson":
+            return self._ndjson(dataset, statement)
+        if export_format == "csv":
+            return self._csv(dataset, statement)
+        return self._xlsx(dataset, statement)
+
+    async def _ndjson(self, dataset: ExportDataset, statement: Select) -> AsyncIterator[bytes]:
+        names = [name for name, _ in dataset.columns]
+        async for rows in self.iter_rows(statement):
+            yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+
+    async def _csv(self, dataset: ExportDataset, statement: Select) -> AsyncIterator[bytes]:
+        # 带 BOM，Excel 打开中文不乱码
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([name for name, _ in dataset.columns])
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        async for rows in self.iter_rows(statement):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode("utf-8")
+
+    async def _xlsx(self, dataset: ExportDataset, statement: Select) -> AsyncIterator[bytes]:
+        """
+        XLSX 只能在全部行写完后生成文件：使用只写模式的工作簿（行数据写入临时文件而不是保存在内存），
+        保存到临时文件后再分块发送。每批行在工作线程中写入，百万行的格式转换不阻塞事件循环
+        """
+        writer = XlsxSheetWriter(dataset.title, [name for name, _ in dataset.columns])
+        async for rows in self.iter_rows(statement):
+            await asyncio.to_thread(writer.append_rows, rows)
+
+        handle, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(handle)
+        try:
+            await asyncio.to_thread(writer.save, path)
+            with open(path, "rb") as file:
+                while True:
+                    chunk = await asyncio.to_thread(file.read, XLSX_READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+
+
+class XlsxSheetWriter:
+    """
+    只写模式的工作簿，超过单个工作表行数上限时写入新的工作表
+
+    各方法按顺序在工作线程中调用，同一时刻只有一个线程访问工作簿
+    """
+
+    def __init__(self, title: str, header: list):
+        self.title = title
+        self.header = header
+        self.workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = XLSX_ROWS_PER_SHEET
+
+    def append_rows(self, rows: list):
+        for row in rows:
+            if self._sheet_rows >= XLSX_ROWS_PER_SHEET:
+                self._sheet = self.workbook.create_sheet(f"{self.title}{len(self.workbook.worksheets) + 1}")
+                self._sheet.append(self.header)
+                self._sheet_rows = 0
+            self._sheet.append([_xlsx_value(value) for value in row])
+            self._sheet_rows += 1
+
+    def save(self, path: str):
+        if self._sheet is None:
+            self.workbook.create_sheet(self.title).append(self.header)
+        self.workbook.save(path)
+
+
+def _xlsx_value(value: Any) -> Any:
+    """去掉 Excel 不允许的控制字符（错误信息中可能包含终端颜色码）"""
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", value)
+    return value
+
+
+# 全局导出服务实例
+export_service = ExportService()
@@ -0,0 +1,77 @@
+"""
+列表分页服务
+大列表按 (created_at, id) 做游标分页，翻页代价与页码无关；
+不带过滤条件的总数直接读取触发器维护的计数器，不再 COUNT(*) 全表；
+各列表接口都在响应体中返回 total 和 next_cursor
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import EntityCounter
+
+
+class PaginationService:
+    """游标分页与列表总数"""
+
+    @staticmethod
+    def encode_cursor(created_at: Optional[datetime], row_id: int) -> str:
+        """将一行的排序键编码为游标"""
+        payload = {"c": created_at.isoformat() if created_at else None, "i": row_id}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        """解析游标，格式不正确时返回 400"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return datetime.fromisoformat(payload["c"]), int(payload["i"])
+        except (ValueError, TypeError, KeyError, UnicodeError):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+
+    @classmethod
+    def keyset(cls, statement: Select, created_column, id_column, cursor: Optional[str]) -> Select:
+        """
+        按 (created_at, id) 倒序排列，并从游标之后开始取数据
+
+        cursor 为空字符串表示第一页。
+        """
+        statement = statement.order_by(created_column.desc(), id_column.desc())
+        if cursor:
+            created_at, row_id = cls.decode_cursor(cursor)
+            statement = statement.where(tuple_(created_column, id_column) < tuple_(created_at, row_id))
+        return statement
+
+    @classmethod
+    async def fetch_page(cls, db: AsyncSession, statement: Select, limit: int) -> Tuple[List[Any], Optional[str]]:
+        """
+        取一页数据，多取一行判断是否还有下一页
+
+        Returns:
+            (本页数据, 下一页游标)，没有下一页时游标为 None
+        """
+        items = list((await db.scalars(statement.limit(limit + 1))).all())
+        if len(items) <= limit:
+            return items, None
+        items = items[:limit]
+        return items, cls.encode_cursor(items[-1].created_at, items[-1].id)
+
+    @staticmethod
+    async def count_total(db: AsyncSession, statement: Select, counter_name: Optional[str] = None) -> int:
+        """
+        获取列表总数
+
+        counter_name 不为空时（即查询没有过滤条件）读取维护的计数器；
+        计数器尚未初始化时退回 COUNT 查询。
+        """
+        if counter_name:
+            value = await db.scalar(select(EntityCounter.value).where(EntityCounter.name == counter_name))
+            if value is not None:
+                return value
+        return await db.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
@@ -0,0 +1,76 @@
+"""
+字段投影服务
+列表接口支持 fields=（只返回指定字段）和 exclude=（排除指定字段）参数，
+选中的字段下推到 SQL 的 SELECT 列（load_only），未选中的大字段不会从数据库读出
+"""
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Select, inspect
+from sqlalchemy.orm import load_only
+
+from ..database import TestExecution, TestStep
+from ..models import TestExecutionResponse, TestStepResponse
+from ..responses import FastJSONResponse
+
+
+class FieldProjection:
+    """一个响应模型在某个 ORM 模型上的字段投影"""
+
+    def __init__(self, orm_model, response_model: Type[BaseModel], default_exclude: Iterable[str] = ()):
+        self.orm_model = orm_model
+        self.response_model = response_model
+        self.available: List[str] = list(response_model.model_fields)
+        self.default_exclude: FrozenSet[str] = frozenset(default_exclude)
+        # 主键总是查询出来，否则 ORM 无法构造对象
+        self.primary_keys = [column.key for column in inspect(orm_model).primary_key]
+        columns = inspect(orm_model).column_attrs
+        self._columns = {name: columns[name].class_attribute for name in self.available if name in columns}
+
+    def resolve(self, fields: Optional[str] = None, exclude: Optional[str] = None) -> List[str]:
+        """
+        解析要返回的字段
+
+        Args:
+            fields: 逗号分隔的字段列表，指定后只返回这些字段
+            exclude: 逗号分隔的排除字段列表；未传时使用默认排除的大字段，传空字符串表示不排除
+        """
+        if fields:
+            selected = self._parse(fields)
+            return [name for name in self.available if name in selected]
+        excluded = self.default_exclude if exclude is None else self._parse(exclude)
+        return [name for name in self.available if name not in excluded]
+
+    def apply(self, statement: Select, names: Sequence[str]) -> Select:
+        """只查询选中字段对应的列"""
+        columns = [self._columns[name] for name in names if name in self._columns]
+        columns += [getattr(self.orm_model, key) for key in self.primary_keys if key not in names]
+        return statement.options(load_only(*columns, raiseload=True))
+
+    def dump(self, rows: Iterable[Any], names: Sequence[str]) -> List[Dict[str, Any]]:
+        """按选中字段输出，未加载的列不会被访问"""
+        return [{name: getattr(row, name) for name in names} for row in rows]
+
+    def response(self, rows: Iterable[Any], names: Sequence[str]) -> FastJSONResponse:
+        """
+        生成 JSON 响应
+
+        部分字段的结果不满足完整响应模型，直接返回 JSON 响应跳过模型校验
+        """
+        return FastJSONResponse(self.dump(rows, names))
+
+    def _parse(self, value: str) -> FrozenSet[str]:
+        names = frozenset(name.strip() for name in value.split(",") if name.strip())
+        unknown = sorted(names - set(self.available))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(unknown)}")
+        return names
+
+
+# 执行记录列表默认不返回测试总结和改进建议，详情接口返回完整记录
+EXECUTION_PROJECTION = FieldProjection(TestExecution, TestExecutionResponse, default_exclude=("summary", "recommendations"))
+
+# 步骤列表默认不返回截图数据、Agent 记忆和动作列表，单个步骤接口返回完整记录
+STEP_PROJECTION = FieldProjection(TestStep, TestStepResponse, default_exclude=("screenshot_data", "memory", "actions"))
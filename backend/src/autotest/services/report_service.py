@@ -0,0 +1,288 @@
+"""
+批量执行报告服务
+通过一条关联查询（批量任务用例 + 测试用例 + 执行记录 + 执行步骤）按服务端游标分批读取，
+流式生成 JUnit XML 或 HTML 报告；批量任务结束后报告不再变化，生成一次后缓存到磁盘
+"""
+
+import html
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from sqlalchemy import Select, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config_manager import ConfigManager
+from ..database import AsyncSessionLocal, BatchExecution, BatchExecutionTestCase, TestCase, TestExecution, TestStep
+
+# 批量任务处于这些状态时报告内容不再变化，可以缓存
+TERMINAL_BATCH_STATUSES = ("completed", "failed", "cancelled")
+
+REPORT_MEDIA_TYPES = {
+    "junit": "application/xml",
+    "html": "text/html; charset=utf-8",
+}
+REPORT_EXTENSIONS = {"junit": "xml", "html": "html"}
+
+# 每批从数据库读取的行数（一行对应一个步骤）
+REPORT_CHUNK_SIZE = 2000
+# 累积多少个用例后输出一次
+REPORT_FLUSH_CASES = 200
+
+# 用例结果：与 JUnit 的 passed / failure / error / skipped 对应，汇总和明细使用同一个表达式
+OUTCOME = case(
+    (TestExecution.status == "passed", "passed"),
+    (TestExecution.status == "failed", "failure"),
+    (or_(TestExecution.status == "error", BatchExecutionTestCase.status == "failed"), "error"),
+    else_="skipped",
+)
+
+# XML 1.0 不允许的控制字符（错误信息中可能包含终端颜色码）
+_ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+OUTCOME_LABELS = {"passed": "通过", "failure": "失败", "error": "错误", "skipped": "跳过"}
+
+
+def _text(value) -> str:
+    return _ILLEGAL_XML_CHARS.sub("", "" if value is None else str(value))
+
+
+def _seconds(value: Optional[float]) -> str:
+    return f"{value or 0:.3f}"
+
+
+class ReportService:
+    """批量执行报告"""
+
+    def __init__(self, session_factory=None, cache_dir: Optional[Path] = None):
+        self._session_factory = session_factory
+        self._cache_dir = cache_dir
+
+    @property
+    def session_factory(self):
+        return self._session_factory or AsyncSessionLocal
+
+    @property
+    def cache_dir(self) -> Path:
+        if self._cache_dir is None:
+            self._cache_dir = ConfigManager().get_reports_directory()
+        return self._cache_dir
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def summary_query(batch_execution_id: int) -> Select:
+        """各结果的用例数和总耗时"""
+        return select(
+            OUTCOME.label("outcome"),
+            func.count(BatchExecutionTestCase.id),
+            func.coalesce(func.sum(TestExecution.total_duration), 0),
+        ).outerjoin(
+            TestExecution, TestExecution.id == BatchExecutionTestCase.execution_id
+        ).where(
+            BatchExecutionTestCase.batch_execution_id == batch_execution_id
+        ).group_by(OUTCOME)
+
+    @staticmethod
+    def detail_query(batch_execution_id: int) -> Select:
+        """用例及其步骤的明细，每行一个步骤（没有步骤的用例一行），按用例和步骤顺序排列"""
+        return select(
+            BatchExecutionTestCase.id.label("batch_case_id"),
+            BatchExecutionTestCase.test_case_id,
+            BatchExecutionTestCase.status.label("case_status"),
+            TestCase.name.label("test_case_name"),
+            TestCase.category,
+            OUTCOME.label("outcome"),
+            TestExecution.id.label("execution_id"),
+            TestExecution.total_duration,
+            TestExecution.error_message,
+            TestExecution.summary,
+            TestStep.step_order,
+            TestStep.step_name,
+            TestStep.status.label("step_status"),
+            TestStep.error_message.label("step_error"),
+            TestStep.duration_seconds,
+        ).outerjoin(
+            TestCase, TestCase.id == BatchExecutionTestCase.test_case_id
+        ).outerjoin(
+            TestExecution, TestExecution.id == BatchExecutionTestCase.execution_id
+        ).outerjoin(
+            TestStep, TestStep.execution_id == TestExecution.id
+        ).where(
+            BatchExecutionTestCase.batch_execution_id == batch_execution_id
+        ).order_by(BatchExecutionTestCase.id, TestStep.step_order, TestStep.id)
+
+    async def _summary(self, db: AsyncSession, batch_execution_id: int) -> Dict[str, float]:
+        summary = {"tests": 0, "time": 0.0, **{outcome: 0 for outcome in OUTCOME_LABELS}}
+        for outcome, count, duration in (await db.execute(self.summary_query(batch_execution_id))).all():
+            summary[outcome] = count
+            summary["tests"] += count
+            summary["time"] += float(duration or 0)
+        return summary
+
+    async def _iter_cases(self, db: AsyncSession, batch_execution_id: int) -> AsyncIterator[List[list]]:
+        """按用例分组产出步骤行，每次产出一组用例"""
+        result = await db.stream(self.detail_query(batch_execution_id).execution_options(yield_per=REPORT_CHUNK_SIZE))
+        pending: List[list] = []
+        current: List = []
+        async for partition in result.partitions():
+            for row in partition:
+                if current and current[0].batch_case_id != row.batch_case_id:
+                    pending.append(current)
+                    current = []
+                current.append(row)
+            if len(pending) >= REPORT_FLUSH_CASES:
+                yield pending
+                pending = []
+        if current:
+            pending.append(current)
+        if pending:
+            yield pending
+
+    # ==================== 渲染 ====================
+
+    async def render(self, batch: BatchExecution, report_format: str) -> AsyncIterator[bytes]:
+        """流式生成报告"""
+        async with self.session_factory() as db:
+            summary = await self._summary(db, batch.id)
+            render_case = self._junit_case if report_format == "junit" else self._html_case
+            header, footer = (self._junit_frame if report_format == "junit" else self._html_frame)(batch, summary)
+            yield header.encode("utf-8")
+            async for cases in self._iter_cases(db, batch.id):
+                yield "".join(render_case(rows) for rows in cases).encode("utf-8")
+            yield footer.encode("utf-8")
+
+    @staticmethod
+    def _steps(rows) -> list:
+        return [row for row in rows if row.step_order is not None or row.step_name is not None]
+
+    @staticmethod
+    def _failure_message(rows) -> str:
+        """执行记录的错误信息，没有时取第一个失败步骤的错误信息"""
+        first = rows[0]
+        if first.error_message:
+            return first.error_message
+        for row in rows:
+            if row.step_error:
+                return row.step_error
+        return "执行失败" if first.outcome != "skipped" else f"未执行（{first.case_status}）"
+
+    @staticmethod
+    def _junit_frame(batch: BatchExecution, summary: Dict[str, float]):
+        counts = (
+            f'tests="{summary["tests"]}" failures="{summary["failure"]}" errors="{summary["error"]}" '
+            f'skipped="{summary["skipped"]}" time="{_seconds(summary["time"])}"'
+        )
+        name = quoteattr(_text(batch.name))
+        timestamp = quoteattr(batch.started_at.isoformat() if batch.started_at else "")
+        header = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<testsuites name={name} {counts}>\n'
+            f'  <testsuite name={name} id="{batch.id}" timestamp={timestamp} {counts}>\n'
+        )
+        return header, "  </testsuite>\n</testsuites>\n"
+
+    def _junit_case(self, rows) -> str:
+        first = rows[0]
+        name = first.test_case_name or f"测试用例 {first.test_case_id}"
+        parts = [
+            f'    <testcase classname={quoteattr(_text(first.category or "未分类"))} '
+            f'name={quoteattr(_text(name))} time="{_seconds(first.total_duration)}">\n'
+        ]
+        if first.outcome == "skipped":
+            parts.append(f'      <skipped message={quoteattr(_text(self._failure_message(rows)))}/>\n')
+        elif first.outcome in ("failure", "error"):
+            message = _text(self._failure_message(rows))
+            parts.append(f'      <{first.outcome} message={quoteattr(message[:500])}>{escape(message)}</{first.outcome}>\n')
+        steps = self._steps(rows)
+        if steps or first.summary:
+            lines = [
+                f"[{step.step_status or '-'}] {step.step_order}. {step.step_name} ({step.duration_seconds or 0:.1f}s)"
+                + (f" - {step.step_error}" if step.step_error else "")
+                for step in steps
+            ]
+            if first.summary:
+                lines.append(first.summary)
+            parts.append(f"      <system-out>{escape(_text(chr(10).join(lines)))}</system-out>\n")
+        parts.append("    </testcase>\n")
+        return "".join(parts)
+
+    @staticmethod
+    def _html_frame(batch: BatchExecution, summary: Dict[str, float]):
+        title = html.escape(batch.name or f"批量执行 {batch.id}")
+        cells = "".join(
+            f'<td class="{outcome}">{OUTCOME_LABELS[outcome]} {summary[outcome]}</td>' for outcome in OUTCOME_LABELS
+        )
+        header = (
+            '<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{title}</title>\n"
+            "<style>\n"
+            "body{font-family:sans-serif;margin:24px;color:#303133}"
+            "table{border-collapse:collapse;width:100%}td,th{border:1px solid #dcdfe6;padding:6px 8px;text-align:left;vertical-align:top}"
+            ".passed{color:#67c23a}.failure{color:#f56c6c}.error{color:#e6a23c}.skipped{color:#909399}"
+            "pre{white-space:pre-wrap;margin:4px 0}\n"
+            "</style>\n</head>\n<body>\n"
+            f"<h1>{title}</h1>\n"
+            f"<p>状态: {html.escape(batch.status or '')}　用例数: {summary['tests']}　总耗时: {summary['time']:.1f}s</p>\n"
+            f"<table><tr>{cells}</tr></table>\n<h2>用例</h2>\n"
+            "<table>\n<tr><th>用例</th><th>分类</th><th>结果</th><th>耗时(秒)</th><th>详情</th></tr>\n"
+        )
+        return header, "</table>\n</body>\n</html>\n"
+
+    def _html_case(self, rows) -> str:
+        first = rows[0]
+        name = html.escape(first.test_case_name or f"测试用例 {first.test_case_id}")
+        details = []
+        if first.outcome != "passed":
+            details.append(f"<pre>{html.escape(self._failure_message(rows))}</pre>")
+        steps = self._steps(rows)
+        if steps:
+            items = "".join(
+                f'<li class="{"passed" if (step.step_status or "").upper() == "PASSED" else "failure"}">'
+                f"{html.escape(str(step.step_name or ''))} ({step.duration_seconds or 0:.1f}s)"
+                + (f"<pre>{html.escape(step.step_error)}</pre>" if step.step_error else "")
+                + "</li>"
+                for step in steps
+            )
+            details.append(f"<details><summary>{len(steps)} 个步骤</summary><ol>{items}</ol></details>")
+        return (
+            f"<tr><td>{name}</td><td>{html.escape(first.category or '未分类')}</td>"
+            f'<td class="{first.outcome}">{OUTCOME_LABELS[first.outcome]}</td>'
+            f"<td>{first.total_duration or 0:.1f}</td><td>{''.join(details)}</td></tr>\n"
+        )
+
+    # ==================== 缓存 ====================
+
+    def cache_path(self, batch: BatchExecution, report_format: str) -> Path:
+        """缓存文件名带上批量任务的更新时间，任务数据变化后不会命中旧报告"""
+        version = int(batch.updated_at.timestamp()) if batch.updated_at else 0
+        return self.cache_dir / f"batch-{batch.id}-{version}.{REPORT_EXTENSIONS[report_format]}"
+
+    async def cached_report(self, batch: BatchExecution, report_format: str) -> Path:
+        """获取已结束批量任务的报告文件，不存在时生成"""
+        path = self.cache_path(batch, report_format)
+        if path.exists():
+            return path
+
+        handle, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                async for chunk in self.render(batch, report_format):
+                    file.write(chunk)
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.remove(tmp_name)
+            raise
+
+        # 删除该批量任务同格式的旧报告
+        for stale in self.cache_dir.glob(f"batch-{batch.id}-*{path.suffix}"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        return path
+
+
+# 全局报告服务实例
+report_service = ReportService()
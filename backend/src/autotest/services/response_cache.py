@@ -0,0 +1,178 @@
+"""
+版本化响应缓存
+读多写少的列表接口按路径和查询参数缓存序列化后的响应体，缓存键带上所依赖实体的版本号；
+任何会话提交对应表的写入时版本号递增，旧缓存自然失效。ETag 由版本号生成，
+客户端带 If-None-Match 且版本未变时直接返回 304，不访问数据库
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..metrics import metrics_registry
+from ..responses import dumps
+
+# 构建响应时可以设置的响应头会随响应体一起缓存
+IGNORED_HEADERS = {"content-length", "content-type"}
+
+
+class ResponseCache:
+    """按实体版本号失效的 LRU 响应缓存"""
+
+    def __init__(self, max_entries: int = 512):
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, Dict[str, str]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        # 进程重启后版本号从 0 开始，ETag 中带上实例标识避免与重启前的 ETag 冲突
+        self._instance = uuid.uuid4().hex[:8]
+        # 会话中待提交的写入涉及的表，记录在 session.info 的这个键下
+        self._pending_key = f"response_cache_pending_tables_{self._instance}"
+        self._hooks_installed = False
+
+    def generation(self, entity: str) -> int:
+        """获取实体当前版本号"""
+        with self._lock:
+            return self._generations.get(entity, 0)
+
+    def invalidate(self, *entities: str):
+        """实体发生写入，版本号递增"""
+        with self._lock:
+            for entity in entities:
+                self._generations[entity] = self._generations.get(entity, 0) + 1
+        metrics_registry.increment("response_cache.invalidations", len(entities))
+
+    def clear(self):
+        """清空缓存内容"""
+        with self._lock:
+            self._entries.clear()
+
+    def make_key(self, path: str, params: Iterable[Tuple[str, str]], entities: Iterable[str]) -> str:
+        """缓存键：路径 + 排序后的查询参数 + 依赖实体的版本号"""
+        with self._lock:
+            versions = ",".join(f"{entity}:{self._generations.get(entity, 0)}" for entity in sorted(entities))
+        query = "&".join(f"{name}={value}" for name, value in sorted(params))
+        return f"{path}?{query}#{versions}"
+
+    def etag(self, key: str) -> str:
+        digest = hashlib.sha1(f"{self._instance}:{key}".encode("utf-8")).hexdigest()[:20]
+        return f'W/"{digest}"'
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, body: bytes, headers: Dict[str, str]):
+        with self._lock:
+            self._entries[key] = (body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def install_session_hooks(self):
+        """
+        在所有 ORM 会话（包括异步会话和后台任务的会话）上注册失效钩子
+
+        只覆盖经过会话的写入；绕过会话直接在连接上执行的 SQL 需要调用 invalidate。
+        """
+        if self._hooks_installed:
+            return
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "do_orm_execute", self._do_orm_execute)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+        self._hooks_installed = True
+
+    def _pending_tables(self, session: Session) -> Set[str]:
+        return session.info.setdefault(self._pending_key, set())
+
+    def _after_flush(self, session: Session, flush_context):
+        """记录本次刷新写入的表"""
+        tables = self._pending_tables(session)
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(instance, "__tablename__", None)
+            if table:
+                tables.add(table)
+
+    def _do_orm_execute(self, orm_execute_state):
+        """记录通过会话执行的批量 INSERT/UPDATE/DELETE 语句写入的表"""
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and getattr(table, "name", None):
+            self._pending_tables(orm_execute_state.session).add(table.name)
+
+    def _after_commit(self, session: Session):
+        tables = session.info.pop(self._pending_key, None)
+        if tables:
+            self.invalidate(*tables)
+
+    def _after_rollback(self, session: Session):
+        session.info.pop(self._pending_key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "generations": dict(self._generations),
+            }
+
+    async def respond(
+        self,
+        request: Request,
+        entities: Tuple[str, ...],
+        build: Callable[[Response], Awaitable[Any]],
+    ) -> Response:
+        """
+        返回缓存的响应，必要时调用 build 重新生成
+
+        Args:
+            entities: 响应依赖的表名，任一表有写入提交后缓存失效
+            build: 生成响应内容的协程函数，参数是用于设置额外响应头的 Response
+        """
+        # 版本号在生成内容之前读取：生成期间发生的写入会让这份缓存在下次请求时失效
+        key = self.make_key(request.url.path, request.query_params.multi_items(), entities)
+        etag = self.etag(key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        if etag in _parse_if_none_match(request.headers.get("if-none-match")):
+            metrics_registry.increment("response_cache.not_modified")
+            return Response(status_code=304, headers=headers)
+
+        entry = self.get(key)
+        if entry is not None:
+            metrics_registry.increment("response_cache.hits")
+            body, extra_headers = entry
+        else:
+            metrics_registry.increment("response_cache.misses")
+            scratch = Response()
+            content = await build(scratch)
+            body = dumps(content)
+            extra_headers = {name: value for name, value in scratch.headers.items() if name not in IGNORED_HEADERS}
+            self.put(key, body, extra_headers)
+
+        return Response(content=body, media_type="application/json", headers={**extra_headers, **headers})
+
+
+def _parse_if_none_match(value: Optional[str]) -> Set[str]:
+    if not value:
+        return set()
+    return {item.strip() for item in value.split(",")}
+
+
+# 全局响应缓存实例
+response_cache = ResponseCache(max_entries=int(os.getenv("AUTOTEST_RESPONSE_CACHE_SIZE", "512")))
+response_cache.install_session_hooks()
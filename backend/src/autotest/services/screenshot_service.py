@@ -0,0 +1,167 @@
+"""
+步骤截图服务
+截图内容保存在制品存储中，TestStep 只保存制品引用；本服务负责读取截图、生成缩略图，
+并将旧数据中直接写在行内的截图迁移到制品存储
+"""
+
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖，缺失时缩略图退化为原图
+    Image = None
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..artifact_store import artifact_store, decode_image, parse_ref
+from ..database import SessionLocal, TestStep
+
+logger = logging.getLogger(__name__)
+
+# 缩略图宽度范围（像素）
+MIN_THUMBNAIL_WIDTH = 64
+MAX_THUMBNAIL_WIDTH = 1024
+
+
+class ScreenshotService:
+    """步骤截图服务"""
+
+    # 缩略图内存缓存：(内容哈希, 宽度) -> (内容, 内容类型)
+    _thumbnail_cache: "OrderedDict[Tuple[str, int], Tuple[bytes, str]]" = OrderedDict()
+    _thumbnail_cache_size = 256
+    _thumbnail_lock = threading.Lock()
+
+    @staticmethod
+    def load_step_screenshot(step: TestStep) -> Optional[Tuple[bytes, str, str]]:
+        """
+        读取步骤截图
+
+        Returns:
+            (内容, 内容类型, 内容哈希)，步骤没有截图时返回None
+        """
+        digest = parse_ref(step.screenshot_path)
+        if digest:
+            result = artifact_store.get(digest)
+            if result is None:
+                return None
+            data, metadata = result
+            return data, metadata["content_type"], digest
+
+        # 尚未迁移的旧数据：截图直接保存在行内
+        legacy_value = step.screenshot_data or step.screenshot_path
+        if legacy_value:
+            data, content_type = decode_image(legacy_value)
+            if data is not None:
+                artifact = artifact_store.put(data, content_type, execution_id=step.execution_id)
+                return data, content_type, artifact.digest
+        return None
+
+    @classmethod
+    def make_thumbnail(cls, data: bytes, content_type: str, digest: str, width: int) -> Tuple[bytes, str]:
+        """生成指定宽度的缩略图（JPEG），结果按内容哈希缓存"""
+        width = max(MIN_THUMBNAIL_WIDTH, min(MAX_THUMBNAIL_WIDTH, width))
+        if Image is None:
+            return data, content_type
+
+        cache_key = (digest, width)
+        with cls._thumbnail_lock:
+            cached = cls._thumbnail_cache.get(cache_key)
+            if cached is not None:
+                cls._thumbnail_cache.move_to_end(cache_key)
+                return cached
+
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, format="JPEG", quality=80, optimize=True)
+        thumbnail = (buffer.getvalue(), "image/jpeg")
+
+        with cls._thumbnail_lock:
+            cls._thumbnail_cache[cache_key] = thumbnail
+            while len(cls._thumbnail_cache) > cls._thumbnail_cache_size:
+                cls._thumbnail_cache.popitem(last=False)
+        return thumbnail
+
+    @staticmethod
+    def migrate_inline_screenshots(db: Session, batch_size: int = 100) -> Dict[str, int]:
+        """
+        将行内保存的截图迁移到制品存储
+
+        每批处理 batch_size 行并提交一次，可重复执行；返回迁移统计。
+        """
+        migrated = 0
+        failed = 0
+        freed_bytes = 0
+        last_id = 0
+
+        while True:
+            steps = db.query(TestStep).filter(
+                TestStep.id > last_id,
+                or_(
+                    TestStep.screenshot_data.isnot(None),
+                    TestStep.screenshot_path.like("data:%")
+                )
+            ).order_by(TestStep.id).limit(batch_size).all()
+            if not steps:
+                break
+
+            for step in steps:
+                last_id = step.id
+                legacy_value = step.screenshot_data or step.screenshot_path
+                if parse_ref(legacy_value):
+                    step.screenshot_path = legacy_value
+                    step.screenshot_data = None
+                    continue
+                try:
+                    data, content_type = decode_image(legacy_value)
+                except Exception as e:
+                    logger.warning(f"解码步骤 {step.id} 的截图失败: {e}")
+                    data = None
+                if data is None:
+                    failed += 1
+                    continue
+                artifact = artifact_store.put(data, content_type, execution_id=step.execution_id)
+                freed_bytes += len(step.screenshot_data or "") + len(step.screenshot_path or "")
+                step.screenshot_path = artifact.ref
+                step.screenshot_data = None
+                migrated += 1
+
+            db.commit()
+
+        logger.info(f"截图迁移完成: 迁移 {migrated} 条，失败 {failed} 条，行内数据减少 {freed_bytes} 字节")
+        return {"migrated": migrated, "failed": failed, "freed_bytes": freed_bytes}
+
+
+def migrate_inline_screenshots(batch_size: int = 100) -> Dict[str, int]:
+    """使用独立会话执行截图迁移"""
+    db = SessionLocal()
+    try:
+        return ScreenshotService.migrate_inline_screenshots(db, batch_size)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="将行内保存的步骤截图迁移到制品存储")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批处理的行数")
+    parser.add_argument("--vacuum", action="store_true", help="迁移后执行 VACUUM 回收 SQLite 文件空间")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(migrate_inline_screenshots(args.batch_size))
+
+    if args.vacuum:
+        from ..database import engine
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as connection:
+                connection.exec_driver_sql("VACUUM")
+            print("VACUUM 完成")
@@ -0,0 +1,219 @@
+"""
+全文检索服务
+SQLite 使用 FTS5 trigram 索引表，由触发器在新增、修改、软删除（包括 Excel 导入）时同步；
+MySQL 使用 ngram 分词的 FULLTEXT 索引。检索结果按相关度排序并分页
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词只能匹配 3 个字符及以上的词，更短的词退化为 LIKE 过滤
+MIN_MATCH_TERM_LENGTH = 3
+MAX_QUERY_TERMS = 10
+SNIPPET_TOKENS = 16
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    """一个全文检索范围"""
+    table: str
+    fts_table: str
+    columns: Tuple[str, ...]
+    weights: Tuple[float, ...]
+    result_columns: Tuple[str, ...]
+    # 是否只索引未删除的行
+    live_only: bool = False
+
+    @property
+    def fulltext_index(self) -> str:
+        return f"ft_{self.table}"
+
+
+SEARCH_INDEXES: Dict[str, SearchIndex] = {
+    "test_cases": SearchIndex(
+        table="test_case",
+        fts_table="test_case_fts",
+        columns=("name", "task_content", "expected_result"),
+        weights=(10.0, 1.0, 1.0),
+        result_columns=("name", "status", "priority", "category", "category_id"),
+        live_only=True,
+    ),
+    "executions": SearchIndex(
+        table="test_execution",
+        fts_table="test_execution_fts",
+        columns=("error_message", "summary"),
+        weights=(1.0, 1.0),
+        result_columns=("test_case_id", "execution_name", "status", "overall_status", "created_at"),
+    ),
+}
+
+
+def create_search_index(connection: Connection, index: SearchIndex):
+    """
+    创建全文索引及同步触发器，并用现有数据重建索引
+
+    SQLite 的索引表只保存需要检索的行，软删除时从索引中移除、恢复时重新加入；
+    MySQL 的 FULLTEXT 索引由数据库自身维护。
+    """
+    if connection.dialect.name == "mysql":
+        existing = {item["name"] for item in inspect(connection).get_indexes(index.table)}
+        if index.fulltext_index not in existing:
+            connection.execute(text(
+                f"ALTER TABLE {index.table} ADD FULLTEXT INDEX {index.fulltext_index} "
+                f"({', '.join(index.columns)}) WITH PARSER ngram"
+            ))
+        return
+
+    columns = ", ".join(index.columns)
+    new_values = ", ".join(f"NEW.{column}" for column in index.columns)
+    live_condition = "WHERE NEW.is_deleted = 0" if index.live_only else ""
+    watched_columns = ", ".join(index.columns + (("is_deleted",) if index.live_only else ()))
+    insert_new = f"INSERT INTO {index.fts_table} (rowid, {columns}) SELECT NEW.id, {new_values} {live_condition};"
+    delete_old = f"DELETE FROM {index.fts_table} WHERE rowid = OLD.id;"
+
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index.fts_table} USING fts5({columns}, tokenize='trigram')"
+    ))
+    triggers = {
+        "insert": f"AFTER INSERT ON {index.table} FOR EACH ROW BEGIN {insert_new} END",
+        "update": f"AFTER UPDATE OF {watched_columns} ON {index.table} FOR EACH ROW BEGIN {delete_old} {insert_new} END",
+        "delete": f"AFTER DELETE ON {index.table} FOR EACH ROW BEGIN {delete_old} END",
+    }
+    for suffix, definition in triggers.items():
+        trigger_name = f"trg_{index.fts_table}_{suffix}"
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+        connection.execute(text(f"CREATE TRIGGER {trigger_name} {definition}"))
+
+    connection.execute(text(f"DELETE FROM {index.fts_table}"))
+    connection.execute(text(
+        f"INSERT INTO {index.fts_table} (rowid, {columns}) SELECT id, {columns} FROM {index.table}"
+        + (" WHERE is_deleted = 0" if index.live_only else "")
+    ))
+
+
+class SearchService:
+    """全文检索服务"""
+
+    def __init__(self):
+        # 索引表是否可用，按索引表名缓存
+        self._available: Dict[str, bool] = {}
+
+    async def search(self, db: AsyncSession, scope: str, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        全文检索
+
+        Args:
+            scope: test_cases 或 executions
+            query: 检索词，多个词以空格分隔，需全部命中
+
+        Returns:
+            按相关度排序的结果和命中总数
+        """
+        index = SEARCH_INDEXES[scope]
+        terms = query.split()[:MAX_QUERY_TERMS]
+        if not terms:
+            return {"query": query, "scope": scope, "total": 0, "items": []}
+
+        if db.bind.dialect.name == "mysql":
+            sql, count_sql, params = self._mysql_query(index, query)
+        elif await self._fts_available(db, index):
+            sql, count_sql, params = self._fts_query(index, terms)
+        else:
+            sql, count_sql, params = self._like_query(index, terms)
+
+        total = await db.scalar(text(count_sql), params)
+        rows = (await db.execute(text(sql), {**params, "limit": limit, "offset": offset})).mappings().all()
+        return {
+            "query": query,
+            "scope": scope,
+            "total": total,
+            "items": [self._to_item(row) for row in rows],
+        }
+
+    async def _fts_available(self, db: AsyncSession, index: SearchIndex) -> bool:
+        if index.fts_table not in self._available:
+            name = await db.scalar(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": index.fts_table}
+            )
+            if name is None:
+                logger.warning(f"全文索引 {index.fts_table} 不存在，检索退化为 LIKE 扫描")
+            self._available[index.fts_table] = name is not None
+        return self._available[index.fts_table]
+
+    @staticmethod
+    def _like_conditions(table: str, columns: Tuple[str, ...], terms: List[str], params: Dict[str, Any]) -> List[str]:
+        """每个词在任一列中出现即命中"""
+        conditions = []
+        for position, term in enumerate(terms):
+            name = f"like_{position}"
+            escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params[name] = f"%{escaped}%"
+            conditions.append("(" + " OR ".join(f"{table}.{column} LIKE :{name} ESCAPE '\\'" for column in columns) + ")")
+        return conditions
+
+    def _fts_query(self, index: SearchIndex, terms: List[str]) -> Tuple[str, str, Dict[str, Any]]:
+        fts = index.fts_table
+        params: Dict[str, Any] = {}
+        match_terms = [term for term in terms if len(term) >= MIN_MATCH_TERM_LENGTH]
+        conditions = self._like_conditions(fts, index.columns, [term for term in terms if len(term) < MIN_MATCH_TERM_LENGTH], params)
+
+        if match_terms:
+            # 每个词作为短语匹配，避免用户输入被解析为 FTS5 语法
+            params["match"] = " ".join('"' + term.replace('"', '""') + '"' for term in match_terms)
+            conditions.insert(0, f"{fts} MATCH :match")
+            weights = ", ".join(str(weight) for weight in index.weights)
+            # bm25 分值越小越相关，取负数后与 MySQL 的相关度一致：越大越相关
+            score = f"-bm25({fts}, {weights})"
+            snippet = f"snippet({fts}, -1, '【', '】', '…', {SNIPPET_TOKENS})"
+            order = "score DESC"
+        else:
+            score, snippet, order = "0.0", "NULL", f"{fts}.rowid DESC"
+
+        where = " AND ".join(conditions)
+        result_columns = ", ".join(f"{index.table}.{column}" for column in index.result_columns)
+        sql = (
+            f"SELECT {index.table}.id, {result_columns}, {score} AS score, {snippet} AS snippet "
+            f"FROM {fts} JOIN {index.table} ON {index.table}.id = {fts}.rowid "
+            f"WHERE {where} ORDER BY {order} LIMIT :limit OFFSET :offset"
+        )
+        count_sql = f"SELECT count(*) FROM {fts} WHERE {where}"
+        return sql, count_sql, params
+
+    def _like_query(self, index: SearchIndex, terms: List[str]) -> Tuple[str, str, Dict[str, Any]]:
+        params: Dict[str, Any] = {}
+        conditions = self._like_conditions(index.table, index.columns, terms, params)
+        if index.live_only:
+            conditions.append(f"{index.table}.is_deleted = 0")
+        where = " AND ".join(conditions)
+        result_columns = ", ".join(f"{index.table}.{column}" for column in index.result_columns)
+        sql = (
+            f"SELECT {index.table}.id, {result_columns}, 0.0 AS score, NULL AS snippet FROM {index.table} "
+            f"WHERE {where} ORDER BY {index.table}.id DESC LIMIT :limit OFFSET :offset"
+        )
+        return sql, f"SELECT count(*) FROM {index.table} WHERE {where}", params
+
+    def _mysql_query(self, index: SearchIndex, query: str) -> Tuple[str, str, Dict[str, Any]]:
+        match = f"MATCH ({', '.join(index.columns)}) AGAINST (:query IN NATURAL LANGUAGE MODE)"
+        where = match + (" AND is_deleted = 0" if index.live_only else "")
+        sql = (
+            f"SELECT id, {', '.join(index.result_columns)}, {match} AS score, NULL AS snippet FROM {index.table} "
+            f"WHERE {where} ORDER BY score DESC LIMIT :limit OFFSET :offset"
+        )
+        return sql, f"SELECT count(*) FROM {index.table} WHERE {where}", {"query": query}
+
+    @staticmethod
+    def _to_item(row) -> Dict[str, Any]:
+        item = dict(row)
+        item["score"] = round(float(item["score"] or 0.0), 4)
+        return item
+
+
+# 全局检索服务实例
+search_service = SearchService()
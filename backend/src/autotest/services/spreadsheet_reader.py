@@ -0,0 +1,164 @@
+"""
+表格文件流式读取
+xlsx 用 openpyxl 只读模式逐行读取，csv 用 pandas 分块读取；
+总行数取自工作表尺寸信息，预览只读前几行，导入按块返回 DataFrame，内存占用不随文件行数增长
+"""
+
+import codecs
+import csv
+import io
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+from openpyxl import load_workbook
+
+SPREADSHEET_EXTENSIONS = (".xlsx", ".xls", ".csv")
+# 无 BOM 且不是合法 UTF-8 的 CSV 按 Excel 中文环境默认的 GBK 系编码读取
+CSV_FALLBACK_ENCODING = "gb18030"
+CSV_SNIFF_BYTES = 64 * 1024
+# 按文件头识别实际格式，兼容扩展名与内容不符的文件（如另存为 .xlsx 的 CSV）
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+
+def is_spreadsheet(filename: Optional[str]) -> bool:
+    """是否为支持导入的表格文件"""
+    return bool(filename) and filename.lower().endswith(SPREADSHEET_EXTENSIONS)
+
+
+def _column_names(header: Tuple) -> List[str]:
+    """表头空单元格按 pandas 的规则命名为 Unnamed: n"""
+    return [f"Unnamed: {index}" if value is None or value == "" else str(value).strip() for index, value in enumerate(header)]
+
+
+class SpreadsheetReader:
+    """
+    表格文件读取器
+
+    Args:
+        source: 文件路径或可 seek 的二进制文件对象（如 UploadFile.file）
+        filename: source 为文件对象时用于判断格式的文件名
+    """
+
+    def __init__(self, source: Union[str, os.PathLike, BinaryIO], filename: Optional[str] = None):
+        self.source = source
+        if Path(filename or str(source)).suffix.lower() not in SPREADSHEET_EXTENSIONS:
+            raise ValueError("只支持 xlsx、xls、csv 格式的文件")
+        with self._open() as handle:
+            magic = handle.read(len(XLSX_MAGIC))
+        if magic == XLSX_MAGIC:
+            self.file_format = ".xlsx"
+        elif magic == XLS_MAGIC:
+            self.file_format = ".xls"
+        else:
+            self.file_format = ".csv"
+
+    @contextmanager
+    def _open(self):
+        if isinstance(self.source, (str, os.PathLike)):
+            with open(self.source, "rb") as handle:
+                yield handle
+        else:
+            self.source.seek(0)
+            yield self.source
+
+    def count_rows(self) -> int:
+        """数据行数（不含表头）；xlsx 取工作表尺寸，不逐行读取"""
+        if self.file_format == ".xlsx":
+            with self._open() as handle:
+                workbook = load_workbook(handle, read_only=True, data_only=True)
+                try:
+                    max_row = workbook.worksheets[0].max_row
+                finally:
+                    workbook.close()
+            if max_row is not None:
+                return max(max_row - 1, 0)
+            # 部分工具生成的文件没有尺寸信息，只能逐行计数
+            return max(sum(1 for _ in self._xlsx_rows()) - 1, 0)
+        if self.file_format == ".csv":
+            with self._open() as handle:
+                text = io.TextIOWrapper(handle, encoding=self._csv_encoding(handle), newline="")
+                try:
+                    return max(sum(1 for row in csv.reader(text) if row) - 1, 0)
+                finally:
+                    # 避免 TextIOWrapper 回收时关闭调用方的文件对象
+                    text.detach()
+        return len(self._read_xls())
+
+    def preview(self, nrows: int = 5) -> pd.DataFrame:
+        """只读取前 nrows 行数据"""
+        return next(self.iter_chunks(nrows), pd.DataFrame())
+
+    def read_all(self) -> pd.DataFrame:
+        """读取全部数据，只用于需要整表内容的场景"""
+        chunks = list(self.iter_chunks(10000))
+        return pd.concat(chunks) if chunks else pd.DataFrame()
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """
+        按块读取数据，空值填充为空字符串
+
+        DataFrame 的索引为数据行号（第一行数据为 0），index + 2 即表格中的行号，与整表读取时一致
+        """
+        if self.file_format == ".xlsx":
+            yield from self._xlsx_chunks(chunk_size)
+        elif self.file_format == ".csv":
+            with self._open() as handle:
+                encoding = self._csv_encoding(handle)
+                try:
+                    chunks = pd.read_csv(handle, encoding=encoding, chunksize=chunk_size, dtype=str, keep_default_na=False)
+                except pd.errors.EmptyDataError:
+                    return
+                with chunks:
+                    yield from chunks
+        else:
+            # xls 为旧格式（最多 65536 行），openpyxl 不支持，整表读取后分块
+            df = self._read_xls()
+            for start in range(0, len(df), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+
+    def _read_xls(self) -> pd.DataFrame:
+        with self._open() as handle:
+            return pd.read_excel(handle).fillna("")
+
+    def _csv_encoding(self, handle: BinaryIO) -> str:
+        start = handle.tell()
+        sample = handle.read(CSV_SNIFF_BYTES)
+        handle.seek(start)
+        try:
+            codecs.getincrementaldecoder("utf-8-sig")().decode(sample, final=False)
+            return "utf-8-sig"
+        except UnicodeDecodeError:
+            return CSV_FALLBACK_ENCODING
+
+    def _xlsx_rows(self) -> Iterator[Tuple[int, Tuple]]:
+        """逐行返回 (数据行号, 单元格值)，跳过整行为空的行"""
+        with self._open() as handle:
+            workbook = load_workbook(handle, read_only=True, data_only=True)
+            try:
+                for index, row in enumerate(workbook.worksheets[0].iter_rows(values_only=True), start=-1):
+                    if any(value is not None and value != "" for value in row):
+                        yield index, row
+            finally:
+                workbook.close()
+
+    def _xlsx_chunks(self, chunk_size: int) -> Iterator[pd.DataFrame]:
+        rows = self._xlsx_rows()
+        first = next(rows, None)
+        if first is None:
+            return
+        header_index, header = first
+        columns = _column_names(header)
+        width = len(columns)
+        index, values = [], []
+        for row_index, row in rows:
+            index.append(row_index - header_index - 1)
+            values.append(row[:width] + (None,) * (width - len(row)))
+            if len(values) >= chunk_size:
+                yield pd.DataFrame(values, columns=columns, index=index).fillna("")
+                index, values = [], []
+        if values:
+            yield pd.DataFrame(values, columns=columns, index=index).fillna("")
@@ -0,0 +1,274 @@
+"""
+统计汇总服务
+测试用例按状态、执行记录按天/分类/状态的汇总表由数据库触发器增量维护，
+统计和趋势接口只读取汇总表；汇总数据异常时可以从明细表重建：
+
+    python -m src.autotest.services.statistics_service
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import case, func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import (
+    Category, ExecutionDailyStat, ExecutionDurationStat, TestCaseStat, beijing_now
+)
+
+logger = logging.getLogger(__name__)
+
+# 执行时间直方图的区间上界（秒），最后一个区间不设上界
+DURATION_BUCKET_BOUNDS = (5, 10, 30, 60, 120, 300, 600)
+PASSED_STATUSES = ("passed",)
+FAILED_STATUSES = ("failed", "error")
+DURATION_PERCENTILES = (50, 90, 95, 99)
+
+# 执行记录以下字段变化时需要调整汇总
+EXECUTION_STAT_COLUMNS = ("test_case_id", "status", "total_duration", "created_at")
+TEST_CASE_STAT_COLUMNS = ("status", "is_deleted")
+
+
+def _bucket_sql(duration: str) -> str:
+    """执行时间所在区间序号的 SQL 表达式"""
+    branches = " ".join(f"WHEN {duration} < {bound} THEN {index}" for index, bound in enumerate(DURATION_BUCKET_BOUNDS))
+    return f"CASE {branches} ELSE {len(DURATION_BUCKET_BOUNDS)} END"
+
+
+def _upsert(dialect: str, table: str, keys: Dict[str, str], deltas: Dict[str, str], condition: str) -> str:
+    """按主键累加汇总行的 SQL，行不存在时插入"""
+    columns = ", ".join(list(keys) + list(deltas))
+    values = ", ".join(list(keys.values()) + list(deltas.values()))
+    if dialect == "mysql":
+        updates = ", ".join(f"{column} = {column} + VALUES({column})" for column in deltas)
+        return f"INSERT INTO {table} ({columns}) SELECT {values} FROM DUAL WHERE {condition} ON DUPLICATE KEY UPDATE {updates};"
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in deltas)
+    return f"INSERT INTO {table} ({columns}) SELECT {values} WHERE {condition} ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates};"
+
+
+def _test_case_statements(dialect: str, row: str, sign: str) -> List[str]:
+    return [_upsert(
+        dialect, "test_case_stat",
+        {"status": f"COALESCE({row}.status, 'unknown')"},
+        {"case_count": f"{sign}1"},
+        f"{row}.is_deleted = 0",
+    )]
+
+
+def _execution_statements(dialect: str, row: str, sign: str) -> List[str]:
+    day = f"DATE({row}.created_at)"
+    category = f"COALESCE((SELECT category_id FROM test_case WHERE id = {row}.test_case_id), 0)"
+    duration = f"{row}.total_duration"
+    return [
+        _upsert(
+            dialect, "execution_daily_stat",
+            {"day": day, "category_id": category, "status": f"COALESCE({row}.status, 'unknown')"},
+            {"execution_count": f"{sign}1", "total_duration": f"{sign}COALESCE({duration}, 0)"},
+            f"{row}.created_at IS NOT NULL",
+        ),
+        _upsert(
+            dialect, "execution_duration_stat",
+            {"day": day, "category_id": category, "bucket": _bucket_sql(duration)},
+            {"execution_count": f"{sign}1"},
+            f"{row}.created_at IS NOT NULL AND {duration} IS NOT NULL",
+        ),
+    ]
+
+
+def create_statistics_triggers(connection: Connection):
+    """
+    创建维护汇总表的触发器
+
+    修改时先减去旧行的贡献再加上新行的贡献；执行记录的分类取写入时用例所在的分类，
+    用例移动分类后历史汇总不随之调整，需要时重建。
+    """
+    dialect = connection.dialect.name
+    triggers = {
+        "trg_test_case_stat_insert": ("AFTER INSERT", "test_case", (), _test_case_statements(dialect, "NEW", "")),
+        "trg_test_case_stat_update": ("AFTER UPDATE", "test_case", TEST_CASE_STAT_COLUMNS,
+                                      _test_case_statements(dialect, "OLD", "-") + _test_case_statements(dialect, "NEW", "")),
+        "trg_test_case_stat_delete": ("AFTER DELETE", "test_case", (), _test_case_statements(dialect, "OLD", "-")),
+        "trg_execution_stat_insert": ("AFTER INSERT", "test_execution", (), _execution_statements(dialect, "NEW", "")),
+        "trg_execution_stat_update": ("AFTER UPDATE", "test_execution", EXECUTION_STAT_COLUMNS,
+                                      _execution_statements(dialect, "OLD", "-") + _execution_statements(dialect, "NEW", "")),
+        "trg_execution_stat_delete": ("AFTER DELETE", "test_execution", (), _execution_statements(dialect, "OLD", "-")),
+    }
+    for trigger_name, (timing, table, columns, statements) in triggers.items():
+        # MySQL 不支持 UPDATE OF，任意字段修改都会触发，新旧贡献相互抵消
+        if columns and dialect == "sqlite":
+            timing = f"{timing} OF {', '.join(columns)}"
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+        connection.execute(text(f"CREATE TRIGGER {trigger_name} {timing} ON {table} FOR EACH ROW BEGIN {' '.join(statements)} END"))
+
+
+def rebuild_statistics(connection: Connection):
+    """从明细表重建全部汇总数据"""
+    for table in ("test_case_stat", "execution_daily_stat", "execution_duration_stat"):
+        connection.execute(text(f"DELETE FROM {table}"))
+
+    connection.execute(text(
+        "INSERT INTO test_case_stat (status, case_count) "
+        "SELECT COALESCE(status, 'unknown'), COUNT(*) FROM test_case WHERE is_deleted = 0 GROUP BY 1"
+    ))
+    executions = (
+        "FROM test_execution LEFT JOIN test_case ON test_case.id = test_execution.test_case_id "
+        "WHERE test_execution.created_at IS NOT NULL"
+    )
+    connection.execute(text(
+        "INSERT INTO execution_daily_stat (day, category_id, status, execution_count, total_duration) "
+        "SELECT DATE(test_execution.created_at), COALESCE(test_case.category_id, 0), COALESCE(test_execution.status, 'unknown'), "
+        f"COUNT(*), COALESCE(SUM(test_execution.total_duration), 0) {executions} GROUP BY 1, 2, 3"
+    ))
+    connection.execute(text(
+        "INSERT INTO execution_duration_stat (day, category_id, bucket, execution_count) "
+        "SELECT DATE(test_execution.created_at), COALESCE(test_case.category_id, 0), "
+        f"{_bucket_sql('test_execution.total_duration')}, COUNT(*) {executions} "
+        "AND test_execution.total_duration IS NOT NULL GROUP BY 1, 2, 3"
+    ))
+
+
+def rebuild(engine: Optional[Engine] = None):
+    """在一个事务中重建汇总数据"""
+    if engine is None:
+        from ..database import writer_engine as engine
+    with engine.begin() as connection:
+        rebuild_statistics(connection)
+    logger.info("统计汇总数据已重建")
+
+
+def estimate_percentile(bucket_counts: Sequence[int], percentile: float) -> Optional[float]:
+    """
+    根据执行时间直方图估算分位数
+
+    在命中的区间内线性插值；落在最后一个不设上界的区间时返回其下界。
+    """
+    total = sum(bucket_counts)
+    if total <= 0:
+        return None
+    rank = total * percentile / 100
+    cumulative = 0
+    for index, count in enumerate(bucket_counts):
+        if count <= 0:
+            continue
+        if cumulative + count >= rank:
+            lower = DURATION_BUCKET_BOUNDS[index - 1] if index > 0 else 0
+            if index >= len(DURATION_BUCKET_BOUNDS):
+                return float(lower)
+            upper = DURATION_BUCKET_BOUNDS[index]
+            return round(lower + (upper - lower) * (rank - cumulative) / count, 2)
+        cumulative += count
+    return float(DURATION_BUCKET_BOUNDS[-1])
+
+
+def _pass_rate(passed: int, failed: int) -> float:
+    finished = passed + failed
+    return round(passed / finished * 100, 2) if finished else 0.0
+
+
+class StatisticsService:
+    """统计汇总查询"""
+
+    @staticmethod
+    def _since(days: int) -> date:
+        return beijing_now().date() - timedelta(days=days - 1)
+
+    @staticmethod
+    def _outcome_columns():
+        """汇总行中的执行总数、通过数、失败数"""
+        return (
+            func.sum(ExecutionDailyStat.execution_count).label("total"),
+            func.sum(case((ExecutionDailyStat.status.in_(PASSED_STATUSES), ExecutionDailyStat.execution_count), else_=0)).label("passed"),
+            func.sum(case((ExecutionDailyStat.status.in_(FAILED_STATUSES), ExecutionDailyStat.execution_count), else_=0)).label("failed"),
+        )
+
+    @classmethod
+    async def get_summary(cls, db: AsyncSession) -> Dict[str, Any]:
+        """总体统计：用例数量、执行次数和成功率"""
+        case_counts = dict((await db.execute(select(TestCaseStat.status, TestCaseStat.case_count))).all())
+        total, passed, failed = (await db.execute(select(*cls._outcome_columns()))).one()
+        total, passed, failed = total or 0, passed or 0, failed or 0
+        return {
+            "total_test_cases": sum(case_counts.values()),
+            "active_test_cases": case_counts.get("active", 0),
+            "total_executions": total,
+            "passed_executions": passed,
+            "failed_executions": failed,
+            "success_rate": round(passed / total * 100, 2) if total > 0 else 0,
+        }
+
+    @classmethod
+    async def get_pass_rate_trend(cls, db: AsyncSession, days: int = 30, category_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按天的执行次数和通过率，通过率只计算已结束（通过、失败、出错）的执行"""
+        statement = select(ExecutionDailyStat.day, *cls._outcome_columns()).where(ExecutionDailyStat.day >= cls._since(days))
+        if category_id is not None:
+            statement = statement.where(ExecutionDailyStat.category_id == category_id)
+        rows = (await db.execute(statement.group_by(ExecutionDailyStat.day).order_by(ExecutionDailyStat.day))).all()
+        return [
+            {
+                "day": row.day.isoformat(),
+                "total": row.total,
+                "passed": row.passed,
+                "failed": row.failed,
+                "pass_rate": _pass_rate(row.passed, row.failed),
+            }
+            for row in rows if row.total
+        ]
+
+    @classmethod
+    async def get_category_trend(cls, db: AsyncSession, days: int = 30) -> List[Dict[str, Any]]:
+        """按分类的执行次数、通过率和已结束执行的平均耗时"""
+        finished = ExecutionDailyStat.status.in_(PASSED_STATUSES + FAILED_STATUSES)
+        statement = select(
+            ExecutionDailyStat.category_id,
+            Category.name.label("category_name"),
+            *cls._outcome_columns(),
+            func.sum(case((finished, ExecutionDailyStat.total_duration), else_=0)).label("finished_duration"),
+        ).outerjoin(
+            Category, Category.id == ExecutionDailyStat.category_id
+        ).where(
+            ExecutionDailyStat.day >= cls._since(days)
+        ).group_by(ExecutionDailyStat.category_id, Category.name).order_by(ExecutionDailyStat.category_id)
+
+        result = []
+        for row in (await db.execute(statement)).all():
+            if not row.total:
+                continue
+            finished_count = row.passed + row.failed
+            result.append({
+                "category_id": row.category_id or None,
+                "category_name": row.category_name or "未分类",
+                "total": row.total,
+                "passed": row.passed,
+                "failed": row.failed,
+                "pass_rate": _pass_rate(row.passed, row.failed),
+                "average_duration": round(row.finished_duration / finished_count, 2) if finished_count else None,
+            })
+        return result
+
+    @classmethod
+    async def get_duration_percentiles(cls, db: AsyncSession, days: int = 30, category_id: Optional[int] = None) -> Dict[str, Any]:
+        """执行时间分位数（秒），由直方图估算"""
+        statement = select(
+            ExecutionDurationStat.bucket, func.sum(ExecutionDurationStat.execution_count)
+        ).where(ExecutionDurationStat.day >= cls._since(days))
+        if category_id is not None:
+            statement = statement.where(ExecutionDurationStat.category_id == category_id)
+        counts = dict((await db.execute(statement.group_by(ExecutionDurationStat.bucket))).all())
+        bucket_counts = [counts.get(index, 0) for index in range(len(DURATION_BUCKET_BOUNDS) + 1)]
+
+        result: Dict[str, Any] = {"count": sum(bucket_counts)}
+        for percentile in DURATION_PERCENTILES:
+            result[f"p{percentile}"] = estimate_percentile(bucket_counts, percentile)
+        return result
+
+
+def main():
+    """重建统计汇总数据"""
+    rebuild()
+    print("✅ 统计汇总数据已重建")
+
+
+if __name__ == "__main__":
+    main()
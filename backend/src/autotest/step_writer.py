@@ -0,0 +1,205 @@
+"""
+步骤写入器
+所有事件收集器的步骤写入都交给一个后台协程：同一步骤 (execution_id, step_order) 的多次更新
+在内存中合并，按时间间隔或行数阈值通过异步会话成组提交，步骤ID缓存在内存中，更新时不再回查
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from .database import AsyncWriterSessionLocal, TestStep
+from .metrics import metrics_registry
+
+StepKey = Tuple[int, int]
+
+
+class StepWriter:
+    """步骤数据的后台批量写入器"""
+
+    def __init__(self, flush_interval_ms: int = 200, max_batch_rows: int = 50, session_factory=AsyncWriterSessionLocal):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.session_factory = session_factory
+        self.logger = logging.getLogger(__name__)
+        # 待写入的步骤：步骤键 -> {"values": 最新字段值, "started_at": 首次出现时间}
+        self._pending: "OrderedDict[StepKey, Dict[str, Any]]" = OrderedDict()
+        # 已写入的步骤ID
+        self._step_ids: Dict[StepKey, int] = {}
+        # 步骤ID已全部在内存中的执行，这些执行的新步骤直接插入，不再回查
+        self._known_executions: Set[int] = set()
+        # 等待下一次提交完成的 flush 请求
+        self._flush_waiters: List[asyncio.Future] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ==================== 对外接口 ====================
+
+    def enqueue(self, execution_id: int, step_order: int, values: Dict[str, Any], started_at=None):
+        """
+        提交一次步骤写入
+
+        values 为该步骤当前的完整字段值，同一步骤后到的写入覆盖先到的写入；
+        started_at 只在首次插入时使用。
+        """
+        self._ensure_started()
+        key = (execution_id, step_order)
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = {"values": dict(values), "started_at": started_at}
+        else:
+            pending["values"].update(values)
+            metrics_registry.increment("step_writer.coalesced")
+        if len(self._pending) >= self.max_batch_rows:
+            self._wakeup.set()
+
+    async def flush(self):
+        """等待此前提交的所有写入落库，写入失败时抛出异常（数据保留在队列中，后台继续重试）"""
+        if self._task is None or self._task.done():
+            if self._pending:
+                await self._commit_pending()
+            return
+        future = self._loop.create_future()
+        self._flush_waiters.append(future)
+        self._wakeup.set()
+        await future
+
+    def get_step_id(self, execution_id: int, step_order: int) -> Optional[int]:
+        """获取已写入步骤的ID"""
+        return self._step_ids.get((execution_id, step_order))
+
+    def forget_execution(self, execution_id: int):
+        """执行结束后释放该执行的步骤ID缓存"""
+        for key in [key for key in self._step_ids if key[0] == execution_id]:
+            del self._step_ids[key]
+        self._known_executions.discard(execution_id)
+
+    async def stop(self):
+        """提交剩余数据并停止后台任务"""
+        if self._task is None:
+            return
+        try:
+            await self.flush()
+        except Exception as e:
+            self.logger.error(f"停止前写入步骤失败，{len(self._pending)} 个步骤未落库: {e}")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # ==================== 后台写入 ====================
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            waiters, self._flush_waiters = self._flush_waiters, []
+            error: Optional[Exception] = None
+            try:
+                if self._pending:
+                    await self._commit_pending()
+            except Exception as e:
+                error = e
+                self.logger.error(f"批量写入步骤失败: {e}")
+            finally:
+                # 写入失败时让等待方感知失败，而不是当作已落库
+                for waiter in waiters:
+                    if waiter.done():
+                        continue
+                    if error is None:
+                        waiter.set_result(None)
+                    else:
+                        waiter.set_exception(error)
+
+    async def _commit_pending(self):
+        """取出当前所有待写入的步骤，一次提交"""
+        batch, self._pending = self._pending, OrderedDict()
+        started = time.perf_counter()
+        try:
+            new_ids = await self._write_batch(batch, dict(self._step_ids), set(self._known_executions))
+        except Exception:
+            # 写入失败时放回队列，未被新数据覆盖的字段下次重试
+            for key, item in batch.items():
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = item
+                else:
+                    pending["values"] = {**item["values"], **pending["values"]}
+            raise
+        self._step_ids.update(new_ids)
+        self._known_executions.update(key[0] for key in batch)
+        metrics_registry.increment("step_writer.commits")
+        metrics_registry.increment("step_writer.rows", len(batch))
+        metrics_registry.observe("step_writer.commit_ms", round((time.perf_counter() - started) * 1000, 2))
+
+    async def _write_batch(
+        self,
+        batch: "OrderedDict[StepKey, Dict[str, Any]]",
+        known_ids: Dict[StepKey, int],
+        known_executions: Set[int]
+    ) -> Dict[StepKey, int]:
+        """在一个事务中写入一批步骤，返回新插入步骤的ID"""
+        async with self.session_factory() as db:
+            try:
+                updates = []
+                inserts: List[Tuple[StepKey, TestStep]] = []
+                unknown = [key for key in batch if key not in known_ids and key[0] not in known_executions]
+
+                # 本写入器首次遇到的执行（进程重启等情况下可能已有步骤），一次查询补齐ID
+                if unknown:
+                    execution_ids = {key[0] for key in unknown}
+                    rows = (await db.execute(
+                        select(TestStep.id, TestStep.execution_id, TestStep.step_order).where(
+                            TestStep.execution_id.in_(execution_ids)
+                        )
+                    )).all()
+                    existing = {(row.execution_id, row.step_order): row.id for row in rows}
+                    known_ids = {**known_ids, **{key: existing[key] for key in unknown if key in existing}}
+
+                for key, item in batch.items():
+                    step_id = known_ids.get(key)
+                    if step_id is not None:
+                        updates.append({"id": step_id, **item["values"]})
+                    else:
+                        step = TestStep(
+                            execution_id=key[0],
+                            step_order=key[1],
+                            started_at=item["started_at"],
+                            **item["values"]
+                        )
+                        db.add(step)
+                        inserts.append((key, step))
+
+                if updates:
+                    await db.execute(update(TestStep), updates)
+                await db.flush()
+                new_ids = {key: step.id for key, step in inserts}
+                await db.commit()
+
+                new_ids.update({key: known_ids[key] for key in batch if key in known_ids})
+                return new_ids
+            except Exception:
+                await db.rollback()
+                raise
+
+
+# 全局步骤写入器实例
+step_writer = StepWriter()
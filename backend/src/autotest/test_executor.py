@@ -7,10 +7,14 @@ import asyncio
 import base64
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Set
 from pydantic import BaseModel, Field
+from sqlalchemy import func, select, update
 
 # 设置时区为北京时间
 BEIJING_TZ = timezone(timedelta(hours=8))
@@ -33,14 +37,50 @@ from browser_use.browser.profile import BrowserProfile
 from .services.multi_llm_service import MultiLLMService
 from playwright.async_api import async_playwright
 
-from .database import TestCase, TestExecution, TestStep, SessionLocal, BatchExecution, BatchExecutionTestCase
+from .database import TestCase, TestExecution, TestStep, SessionLocal, AsyncWriterSessionLocal, ReadSessionLocal, BatchExecution, BatchExecutionTestCase
 from .websocket_manager import websocket_manager
 from .browser_event_collector import event_manager, BrowserUseEventCollector
+from .metrics import metrics_registry
+from .browser_process_manager import browser_process_registry
+from .history_cache import history_cache
+from .artifact_store import artifact_store, decode_image
+from .batch_progress import BatchProgress
+from .services.batch_query_service import BatchQueryService
+
+# 取消令牌
+class CancellationToken:
+    """批量任务的取消令牌，供执行中的协程查询或等待取消信号"""
+    
+    def __init__(self):
+        self._event = asyncio.Event()
+        self.cancelled_at: Optional[float] = None
+    
+    def cancel(self):
+        """发出取消信号"""
+        if not self._event.is_set():
+            self.cancelled_at = time.perf_counter()
+            self._event.set()
+    
+    @property
+    def is_cancelled(self) -> bool:
+        """是否已发出取消信号"""
+        return self._event.is_set()
+    
+    async def wait(self):
+        """等待取消信号"""
+        await self._event.wait()
 
 # 任务上下文管理类
 class TaskContext:
     """任务上下文管理类，用于维护正在运行的任务和浏览器对象"""
     
+    # 关闭单个浏览器的超时时间（秒）
+    BROWSER_CLOSE_TIMEOUT = 5.0
+    # 等待所有任务确认取消的超时时间（秒）
+    CANCEL_ACK_TIMEOUT = 10.0
+    # 最多保留的取消耗时报告数量
+    MAX_CANCEL_REPORTS = 100
+    
     def __init__(self):
         # 批量任务ID -> 批量任务执行器实例
         self._batch_executors: Dict[int, 'BatchTestExecutor'] = {}
@@ -52,6 +92,14 @@ class TaskContext:
         self._test_case_tasks: Dict[int, asyncio.Task] = {}
         # 测试用例ID -> 所属的批量任务ID
         self._test_case_batch_mapping: Dict[int, int] = {}
+        # 测试用例ID -> 正在运行的Agent
+        self._test_case_agents: Dict[int, Any] = {}
+        # 批量任务ID -> 取消令牌
+        self._batch_tokens: Dict[int, CancellationToken] = {}
+        # 批量任务ID -> 已调度的用例执行任务（完成即视为确认）
+        self._batch_tasks: Dict[int, Set[asyncio.Task]] = {}
+        # 批量任务ID -> 最近一次取消的耗时报告，按写入顺序只保留最近 MAX_CANCEL_REPORTS 个
+        self._cancel_reports: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
         # 锁，用于保护并发访问
         self._lock = asyncio.Lock()
     
@@ -60,224 +108,200 @@ class TaskContext:
         async with self._lock:
             self._batch_executors[batch_execution_id] = executor
             self._batch_test_cases[batch_execution_id] = set()
+            self._batch_tokens[batch_execution_id] = CancellationToken()
+            self._batch_tasks[batch_execution_id] = set()
             logging.info(f"注册批量任务执行器: {batch_execution_id}")
             logging.info(f"当前批量任务执行器: {list(self._batch_executors.keys())}")
-            logging.info(f"当前批量任务测试用例映射: {self._batch_test_cases}")
     
     async def unregister_batch_executor(self, batch_execution_id: int):
         """注销批量任务执行器"""
-        logging.info(f"=== 开始注销批量任务执行器: {batch_execution_id} ===")
-        try:
-            async with self._lock:
-                logging.info(f"步骤1: 获取锁成功，开始注销批量任务执行器: {batch_execution_id}")
-                logging.info(f"注销前状态:")
-                logging.info(f"  - 批量任务 {batch_execution_id} 在执行器中: {batch_execution_id in self._batch_executors}")
-                logging.info(f"  - 批量任务 {batch_execution_id} 在测试用例映射中: {batch_execution_id in self._batch_test_cases}")
-                
-                logging.info(f"步骤2: 从执行器上下文中移除批量任务: {batch_execution_id}")
-                if batch_execution_id in self._batch_executors:
-                    del self._batch_executors[batch_execution_id]
-                    logging.info(f"步骤2完成: 已从执行器上下文中移除批量任务: {batch_execution_id}")
-                else:
-                    logging.info(f"步骤2完成: 批量任务 {batch_execution_id} 不在执行器上下文中")
-                
-                logging.info(f"步骤3: 从测试用例映射中移除批量任务: {batch_execution_id}")
-                if batch_execution_id in self._batch_test_cases:
-                    del self._batch_test_cases[batch_execution_id]
-                    logging.info(f"步骤3完成: 已从测试用例映射中移除批量任务: {batch_execution_id}")
-                else:
-                    logging.info(f"步骤3完成: 批量任务 {batch_execution_id} 不在测试用例映射中")
-                
-                logging.info(f"步骤4: 注销批量任务执行器: {batch_execution_id} 完成")
-                logging.info(f"注销后状态:")
-                logging.info(f"  - 剩余批量任务执行器: {list(self._batch_executors.keys())}")
-                logging.info(f"  - 剩余批量任务测试用例映射: {self._batch_test_cases}")
-        except Exception as e:
-            logging.error(f"注销批量任务执行器 {batch_execution_id} 时出错: {e}")
-            logging.error(f"错误详情: {type(e).__name__}: {str(e)}")
-            import traceback
-            logging.error(f"错误堆栈: {traceback.format_exc()}")
-            raise
-        finally:
-            logging.info(f"=== 注销批量任务执行器: {batch_execution_id} 结束 ===")
+        async with self._lock:
+            self._batch_executors.pop(batch_execution_id, None)
+            self._batch_test_cases.pop(batch_execution_id, None)
+            self._batch_tasks.pop(batch_execution_id, None)
+            # 保留已取消的令牌，便于仍在收尾的协程查询取消状态
+            token = self._batch_tokens.get(batch_execution_id)
+            if token is not None and not token.is_cancelled:
+                del self._batch_tokens[batch_execution_id]
+            logging.info(f"已注销批量任务执行器: {batch_execution_id}，剩余: {list(self._batch_executors.keys())}")
+    
+    def release_batch(self, batch_execution_id: int):
+        """批量执行器收尾结束后释放取消令牌，注销后的任务仍按已取消处理"""
+        self._batch_tokens.pop(batch_execution_id, None)
+    
+    def track_batch_task(self, batch_execution_id: int, task: asyncio.Task):
+        """登记批量任务下已调度的用例执行任务，任务结束后自动移除"""
+        tasks = self._batch_tasks.setdefault(batch_execution_id, set())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    def get_cancellation_token(self, batch_execution_id: int) -> Optional[CancellationToken]:
+        """获取批量任务的取消令牌"""
+        return self._batch_tokens.get(batch_execution_id)
     
-    async def register_test_case(self, batch_execution_id: int, test_case_id: int, browser: Any, task: asyncio.Task):
+    def is_batch_cancelled(self, batch_execution_id: int) -> bool:
+        """检查批量任务是否已收到取消信号"""
+        token = self._batch_tokens.get(batch_execution_id)
+        if token is not None and token.is_cancelled:
+            return True
+        return batch_execution_id not in self._batch_executors
+    
+    async def register_test_case(self, batch_execution_id: int, test_case_id: int, browser: Any, task: asyncio.Task, agent: Any = None):
         """注册测试用例的执行上下文"""
         async with self._lock:
-            self._batch_test_cases[batch_execution_id].add(test_case_id)
+            self._batch_test_cases.setdefault(batch_execution_id, set()).add(test_case_id)
             self._test_case_browsers[test_case_id] = browser
             self._test_case_tasks[test_case_id] = task
             self._test_case_batch_mapping[test_case_id] = batch_execution_id
+            if agent is not None:
+                self._test_case_agents[test_case_id] = agent
             logging.info(f"注册测试用例: {test_case_id} -> 批量任务: {batch_execution_id}")
-            logging.info(f"当前任务上下文状态:")
-            logging.info(f"  - 批量任务 {batch_execution_id} 下的测试用例: {self._batch_test_cases[batch_execution_id]}")
-            logging.info(f"  - 所有测试用例浏览器: {list(self._test_case_browsers.keys())}")
-            logging.info(f"  - 所有测试用例任务: {list(self._test_case_tasks.keys())}")
-            logging.info(f"  - 测试用例到批量任务的映射: {self._test_case_batch_mapping}")
     
     async def unregister_test_case(self, test_case_id: int):
         """注销测试用例的执行上下文"""
-        logging.info(f"=== 开始注销测试用例: {test_case_id} ===")
-        try:
-            async with self._lock:
-                logging.info(f"步骤1: 获取锁成功，开始注销测试用例: {test_case_id}")
-                logging.info(f"注销前状态:")
-                logging.info(f"  - 测试用例 {test_case_id} 在浏览器中: {test_case_id in self._test_case_browsers}")
-                logging.info(f"  - 测试用例 {test_case_id} 在任务中: {test_case_id in self._test_case_tasks}")
-                logging.info(f"  - 测试用例 {test_case_id} 在批量任务映射中: {test_case_id in self._test_case_batch_mapping}")
-                
-                logging.info(f"步骤2: 从浏览器上下文中移除测试用例: {test_case_id}")
-                if test_case_id in self._test_case_browsers:
-                    del self._test_case_browsers[test_case_id]
-                    logging.info(f"步骤2完成: 已从浏览器上下文中移除测试用例: {test_case_id}")
-                else:
-                    logging.info(f"步骤2完成: 测试用例 {test_case_id} 不在浏览器上下文中")
-                
-                logging.info(f"步骤3: 从任务上下文中移除测试用例: {test_case_id}")
-                if test_case_id in self._test_case_tasks:
-                    del self._test_case_tasks[test_case_id]
-                    logging.info(f"步骤3完成: 已从任务上下文中移除测试用例: {test_case_id}")
-                else:
-                    logging.info(f"步骤3完成: 测试用例 {test_case_id} 不在任务上下文中")
-                
-                # 从批量任务中移除
-                logging.info(f"步骤4: 从批量任务中移除测试用例: {test_case_id}")
-                batch_execution_id = self._test_case_batch_mapping.get(test_case_id)
-                logging.info(f"步骤4a: 获取到批量任务ID: {batch_execution_id}")
-                if batch_execution_id and batch_execution_id in self._batch_test_cases:
-                    self._batch_test_cases[batch_execution_id].discard(test_case_id)
-                    logging.info(f"步骤4b: 已从批量任务 {batch_execution_id} 中移除测试用例: {test_case_id}")
-                else:
-                    logging.info(f"步骤4b: 批量任务 {batch_execution_id} 不在映射中或不存在")
-                
-                logging.info(f"步骤5: 移除测试用例 {test_case_id} 的批量任务映射")
-                if test_case_id in self._test_case_batch_mapping:
-                    del self._test_case_batch_mapping[test_case_id]
-                    logging.info(f"步骤5完成: 已移除测试用例 {test_case_id} 的批量任务映射")
-                else:
-                    logging.info(f"步骤5完成: 测试用例 {test_case_id} 不在批量任务映射中")
-                
-                logging.info(f"步骤6: 注销测试用例: {test_case_id} 完成")
-        except Exception as e:
-            logging.error(f"注销测试用例 {test_case_id} 时出错: {e}")
-            logging.error(f"错误详情: {type(e).__name__}: {str(e)}")
-            import traceback
-            logging.error(f"错误堆栈: {traceback.format_exc()}")
-            raise
-        finally:
-            logging.info(f"=== 注销测试用例: {test_case_id} 结束 ===")
+        async with self._lock:
+            self._test_case_browsers.pop(test_case_id, None)
+            self._test_case_tasks.pop(test_case_id, None)
+            self._test_case_agents.pop(test_case_id, None)
+            batch_execution_id = self._test_case_batch_mapping.pop(test_case_id, None)
+            if batch_execution_id and batch_execution_id in self._batch_test_cases:
+                self._batch_test_cases[batch_execution_id].discard(test_case_id)
+            logging.info(f"已注销测试用例: {test_case_id}（批量任务: {batch_execution_id}）")
     
     async def cancel_batch_execution(self, batch_execution_id: int) -> bool:
-        """取消批量执行任务"""
-        # 先获取锁，收集需要处理的数据
-        test_case_ids = []
-        cancelled_count = 0
+        """
+        取消批量执行任务
+        
+        发出取消信号后：通知所有Agent停止、取消全部任务、并发关闭浏览器（有超时上限），
+        然后等待每个任务确认结束。整个过程不做固定时长的等待。
+        """
+        started = time.perf_counter()
         
+        # 在锁内收集快照并发出取消信号
         async with self._lock:
             if batch_execution_id not in self._batch_executors:
                 logging.warning(f"批量任务 {batch_execution_id} 不存在")
                 return False
             
-            logging.info(f"开始取消批量任务: {batch_execution_id}")
+            token = self._batch_tokens.setdefault(batch_execution_id, CancellationToken())
+            token.cancel()
             
-            # 获取该批量任务下的所有测试用例
             test_case_ids = self._batch_test_cases.get(batch_execution_id, set()).copy()
-            logging.info(f"批量任务 {batch_execution_id} 下共有 {len(test_case_ids)} 个测试用例: {test_case_ids}")
+            agents = [self._test_case_agents[tc_id] for tc_id in test_case_ids if tc_id in self._test_case_agents]
+            browsers = [self._test_case_browsers[tc_id] for tc_id in test_case_ids if tc_id in self._test_case_browsers]
+            tasks = [self._test_case_tasks[tc_id] for tc_id in test_case_ids if tc_id in self._test_case_tasks]
+            tasks.extend(self._batch_tasks.get(batch_execution_id, set()))
+            logging.info(f"开始取消批量任务 {batch_execution_id}: {len(test_case_ids)} 个运行中用例, {len(tasks)} 个任务")
         
-        # 释放锁后，先取消所有相关的测试用例任务和关闭浏览器，但不立即注销
-        for test_case_id in test_case_ids:
-            logging.info(f"正在取消测试用例 {test_case_id}...")
-            if await self._cancel_test_case_without_unregister(test_case_id):
-                cancelled_count += 1
-                logging.info(f"测试用例 {test_case_id} 取消成功")
-            else:
-                logging.warning(f"测试用例 {test_case_id} 取消失败")
+        # 通知Agent停止，让其在下一个检查点自行退出
+        for agent in agents:
+            self._signal_agent(agent)
+        
+        # 取消所有未完成的任务
+        pending_tasks = [task for task in tasks if not task.done()]
+        for task in pending_tasks:
+            task.cancel()
+        
+        # 并发关闭浏览器
+        browsers_timed_out = await self._close_browsers(browsers)
+        
+        # 等待所有任务确认取消
+        unacknowledged = await self._wait_for_acknowledgement(pending_tasks)
         
-        # 现在统一注销所有测试用例（这些方法会自己获取锁）
-        logging.info(f"开始统一注销所有测试用例...")
         for test_case_id in test_case_ids:
             await self.unregister_test_case(test_case_id)
-        
-        # 注销批量任务执行器（这个方法会自己获取锁）
         await self.unregister_batch_executor(batch_execution_id)
         
-        logging.info(f"批量任务 {batch_execution_id} 已取消，共取消 {cancelled_count} 个测试用例")
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        report = {
+            "batch_execution_id": batch_execution_id,
+            "cancel_latency_ms": latency_ms,
+            "cancelled_tasks": len(pending_tasks),
+            "unacknowledged_tasks": unacknowledged,
+            "closed_browsers": len(browsers),
+            "browser_close_timeouts": browsers_timed_out,
+            "cancelled_at": beijing_now().isoformat()
+        }
+        self._cancel_reports[batch_execution_id] = report
+        self._cancel_reports.move_to_end(batch_execution_id)
+        while len(self._cancel_reports) > self.MAX_CANCEL_REPORTS:
+            self._cancel_reports.popitem(last=False)
+        metrics_registry.observe("batch_cancel.latency_ms", latency_ms)
+        metrics_registry.increment("batch_cancel.total")
+        if unacknowledged:
+            metrics_registry.increment("batch_cancel.unacknowledged_tasks", unacknowledged)
+        if browsers_timed_out:
+            metrics_registry.increment("batch_cancel.browser_close_timeouts", browsers_timed_out)
+        
+        logging.info(f"批量任务 {batch_execution_id} 已取消，耗时 {latency_ms}ms，未确认任务 {unacknowledged} 个")
         return True
     
-    async def _cancel_test_case(self, test_case_id: int) -> bool:
-        """取消单个测试用例（包含注销）"""
+    def get_cancel_report(self, batch_execution_id: int) -> Optional[Dict[str, Any]]:
+        """获取批量任务最近一次取消的耗时报告"""
+        return self._cancel_reports.get(batch_execution_id)
+    
+    @staticmethod
+    def _signal_agent(agent: Any):
+        """通知Agent停止执行"""
         try:
-            logging.info(f"开始取消测试用例 {test_case_id}...")
-            logging.info(f"测试用例 {test_case_id} 的任务状态: {test_case_id in self._test_case_tasks}")
-            logging.info(f"测试用例 {test_case_id} 的浏览器状态: {test_case_id in self._test_case_browsers}")
-            
-            # 取消任务
-            if test_case_id in self._test_case_tasks:
-                task = self._test_case_tasks[test_case_id]
-                logging.info(f"测试用例 {test_case_id} 的任务状态: done={task.done()}, cancelled={task.cancelled()}")
-                if not task.done():
-                    task.cancel()
-                    logging.info(f"已取消测试用例 {test_case_id} 的任务")
-                else:
-                    logging.info(f"测试用例 {test_case_id} 的任务已完成，无需取消")
-            else:
-                logging.warning(f"测试用例 {test_case_id} 的任务不在任务上下文中")
-            
-            # 关闭浏览器
-            if test_case_id in self._test_case_browsers:
-                browser = self._test_case_browsers[test_case_id]
-                logging.info(f"正在关闭测试用例 {test_case_id} 的浏览器...")
-                try:
-                    await browser.close()
-                    logging.info(f"已关闭测试用例 {test_case_id} 的浏览器")
-                except Exception as e:
-                    logging.warning(f"关闭测试用例 {test_case_id} 的浏览器时出错: {e}")
-            else:
-                logging.warning(f"测试用例 {test_case_id} 的浏览器不在任务上下文中")
-            
-            # 注销测试用例
-            await self.unregister_test_case(test_case_id)
-            logging.info(f"测试用例 {test_case_id} 已从任务上下文中注销")
+            stop = getattr(agent, 'stop', None)
+            if callable(stop):
+                stop()
+        except Exception as e:
+            logging.warning(f"通知Agent停止时出错: {e}")
+    
+    async def _close_browser(self, browser: Any) -> bool:
+        """在超时限制内关闭浏览器，返回是否超时"""
+        try:
+            await asyncio.wait_for(browser.close(), timeout=self.BROWSER_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning(f"关闭浏览器超时（>{self.BROWSER_CLOSE_TIMEOUT}s）")
             return True
-            
         except Exception as e:
-            logging.error(f"取消测试用例 {test_case_id} 时出错: {e}")
-            return False
+            logging.warning(f"关闭浏览器时出错: {e}")
+        return False
+    
+    async def _close_browsers(self, browsers: List[Any]) -> int:
+        """并发关闭浏览器，返回超时的数量"""
+        if not browsers:
+            return 0
+        results = await asyncio.gather(*(self._close_browser(browser) for browser in browsers))
+        return sum(1 for timed_out in results if timed_out)
+    
+    async def _wait_for_acknowledgement(self, tasks: List[Any]) -> int:
+        """等待任务结束，返回超时后仍未结束的任务数量"""
+        futures = [task for task in tasks if isinstance(task, asyncio.Future)]
+        if not futures:
+            return 0
+        _, pending = await asyncio.wait(futures, timeout=self.CANCEL_ACK_TIMEOUT)
+        if pending:
+            logging.warning(f"{len(pending)} 个任务在 {self.CANCEL_ACK_TIMEOUT}s 内未确认取消")
+        return len(pending)
+    
+    async def _cancel_test_case(self, test_case_id: int) -> bool:
+        """取消单个测试用例（包含注销）"""
+        cancelled = await self._cancel_test_case_without_unregister(test_case_id)
+        await self.unregister_test_case(test_case_id)
+        return cancelled
     
     async def _cancel_test_case_without_unregister(self, test_case_id: int) -> bool:
         """取消单个测试用例（不包含注销，仅取消任务和关闭浏览器）"""
         try:
-            logging.info(f"开始取消测试用例 {test_case_id}（不注销）...")
-            logging.info(f"测试用例 {test_case_id} 的任务状态: {test_case_id in self._test_case_tasks}")
-            logging.info(f"测试用例 {test_case_id} 的浏览器状态: {test_case_id in self._test_case_browsers}")
+            agent = self._test_case_agents.get(test_case_id)
+            if agent is not None:
+                self._signal_agent(agent)
             
-            # 取消任务
-            if test_case_id in self._test_case_tasks:
-                task = self._test_case_tasks[test_case_id]
-                logging.info(f"测试用例 {test_case_id} 的任务状态: done={task.done()}, cancelled={task.cancelled()}")
-                if not task.done():
-                    task.cancel()
-                    logging.info(f"已取消测试用例 {test_case_id} 的任务")
-                else:
-                    logging.info(f"测试用例 {test_case_id} 的任务已完成，无需取消")
-            else:
-                logging.warning(f"测试用例 {test_case_id} 的任务不在任务上下文中")
+            task = self._test_case_tasks.get(test_case_id)
+            if task is not None and not task.done():
+                task.cancel()
             
-            # 关闭浏览器
-            if test_case_id in self._test_case_browsers:
-                browser = self._test_case_browsers[test_case_id]
-                logging.info(f"正在关闭测试用例 {test_case_id} 的浏览器...")
-                try:
-                    await browser.close()
-                    logging.info(f"已关闭测试用例 {test_case_id} 的浏览器")
-                except Exception as e:
-                    logging.warning(f"关闭测试用例 {test_case_id} 的浏览器时出错: {e}")
-            else:
-                logging.warning(f"测试用例 {test_case_id} 的浏览器不在任务上下文中")
+            browser = self._test_case_browsers.get(test_case_id)
+            if browser is not None:
+                await self._close_browser(browser)
             
-            logging.info(f"测试用例 {test_case_id} 取消完成（未注销）")
+            if task is not None:
+                await self._wait_for_acknowledgement([task])
             return True
-            
         except Exception as e:
             logging.error(f"取消测试用例 {test_case_id} 时出错: {e}")
             return False
@@ -301,6 +325,41 @@ class TaskContext:
 # 全局任务上下文管理器
 task_context = TaskContext()
 
+
+class CustomPromptCache:
+    """自定义提示词缓存，配置文件的修改时间或大小变化时才重新读取"""
+    
+    def __init__(self, config_path: Optional[Path] = None):
+        self._config_path = config_path
+        self._stamp: Optional[tuple] = None
+        self._prompt = ""
+        self._lock = threading.Lock()
+    
+    def _get_config_path(self) -> Path:
+        if self._config_path is None:
+            from .config_manager import ConfigManager
+            self._config_path = ConfigManager().get_prompt_config_path()
+        return self._config_path
+    
+    def get(self) -> str:
+        """返回当前的自定义提示词，配置文件不存在时返回空字符串"""
+        config_path = self._get_config_path()
+        try:
+            stat = config_path.stat()
+        except FileNotFoundError:
+            self._stamp = None
+            return ""
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if stamp != self._stamp:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    self._prompt = json.load(f).get("custom_prompt", "")
+                self._stamp = stamp
+            return self._prompt
+
+# 全局自定义提示词缓存
+custom_prompt_cache = CustomPromptCache()
+
 # 测试结果模型
 class TestStepResult(BaseModel):
     """单个测试步骤的结果"""
@@ -395,7 +454,7 @@ class TestExecutor:
         self.config_manager = ConfigManager()
         
         # 设置 history 缓存目录
-        self.history_cache_dir = self.config_manager.get_history_directory()
+        self.history_cache_dir = history_cache.cache_dir
     
     def _load_config(self) -> dict:
         """从配置文件加载模型配置"""
@@ -662,7 +721,9 @@ class TestExecutor:
         
         async with async_playwright() as p:
             # 启动浏览器
-            browser = await p.chromium.launch(
+            browser = await browser_process_registry.launch(
+                p,
+                execution_id=execution.id,
                 headless=headless,
                 args=[
                     '--no-sandbox',
@@ -681,6 +742,7 @@ class TestExecutor:
                 ]
             )
             
+            event_collector = None
             try:
                 # 创建新页面
                 page = await browser.new_page()
@@ -733,7 +795,7 @@ class TestExecutor:
                     agent_task = asyncio.create_task(agent.run())
                     
                     # 注册到任务上下文
-                    await task_context.register_test_case(batch_execution_id, test_case.id, browser, agent_task)
+                    await task_context.register_test_case(batch_execution_id, test_case.id, browser, agent_task, agent=agent)
                     
                     try:
                         # 等待agent任务完成
@@ -975,6 +1037,14 @@ class TestExecutor:
                 }
                 
             finally:
+                # 确保步骤数据全部落库，并释放收集器
+                if event_collector is not None:
+                    try:
+                        await event_collector.flush()
+                    except Exception as e:
+                        self.logger.warning(f"写入剩余步骤数据时出错: {e}")
+                    event_manager.remove_collector(test_case.id, execution.id)
+                
                 # 确保浏览器被关闭
                 try:
                     await browser.close()
@@ -982,17 +1052,9 @@ class TestExecutor:
                     self.logger.warning(f"关闭浏览器时出错: {e}")
     
     def _load_custom_prompt(self) -> str:
-        """加载自定义提示词"""
+        """加载自定义提示词（按配置文件修改时间缓存）"""
         try:
-            from .config_manager import ConfigManager
-            config_manager = ConfigManager()
-            config_path = config_manager.get_prompt_config_path()
-            
-            if config_path.exists():
-                with open(config_path, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-                    return config.get("custom_prompt", "")
-            return ""
+            return custom_prompt_cache.get()
         except Exception as e:
             self.logger.warning(f"加载自定义提示词失败: {e}")
             return ""
@@ -1000,7 +1062,7 @@ class TestExecutor:
             return ""
 
     def _save_screenshots(self, history, execution_id: int) -> List[str]:
-        """保存截图到指定目录"""
+        """保存截图到制品存储，返回制品引用列表"""
         # 处理 ActionResult 列表
         if isinstance(history, list):
             # 从所有 ActionResult 中收集截图
@@ -1020,155 +1082,49 @@ class TestExecutor:
         if not screenshots:
             return []
         
-        # 创建输出目录
-        output_dir = self.config_manager.get_screenshots_directory() / f"execution_{execution_id}"
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        saved_paths = []
-        timestamp = beijing_now().strftime("%Y%m%d_%H%M%S")
-        
+        saved_refs = []
         for i, screenshot in enumerate(screenshots):
             if screenshot and isinstance(screenshot, str):
                 try:
-                    # 如果是base64编码的图片
-                    if screenshot.startswith('data:image'):
-                        # 提取base64数据
-                        header, data = screenshot.split(',', 1)
-                        image_data = base64.b64decode(data)
-                        
-                        # 确定文件扩展名
-                        if 'png' in header:
-                            ext = 'png'
-                        elif 'jpeg' in header or 'jpg' in header:
-                            ext = 'jpg'
-                        else:
-                            ext = 'png'
-                        
-                        filename = f"screenshot_{timestamp}_{i+1:03d}.{ext}"
-                        filepath = output_dir / filename
-                        
-                        with open(filepath, 'wb') as f:
-                            f.write(image_data)
-                        
-                        saved_paths.append(str(filepath))
-                    
-                    elif screenshot.startswith('/') or ':' in screenshot:
-                        # 如果是文件路径，直接复制
-                        source_path = Path(screenshot)
-                        if source_path.exists():
-                            filename = f"screenshot_{timestamp}_{i+1:03d}{source_path.suffix}"
-                            dest_path = output_dir / filename
-                            
-                            import shutil
-                            shutil.copy2(source_path, dest_path)
-                            saved_paths.append(str(dest_path))
-                
+                    image_data, content_type = decode_image(screenshot)
+                    if image_data is None:
+                        continue
+                    artifact = artifact_store.put(image_data, content_type, execution_id=execution_id)
+                    saved_refs.append(artifact.ref)
                 except Exception as e:
                     self.logger.error(f"保存截图 {i+1} 失败: {e}")
                     continue
         
-        return saved_paths
+        return saved_refs
 
-    def _get_history_path(self, test_case_id: int) -> Path:
-        """获取测试用例的 history 文件路径"""
-        return self.history_cache_dir / f"test_case_{test_case_id}_history.json"
+    def _get_history_key(self, test_case: TestCase) -> str:
+        """计算测试用例的 history 缓存键（操作步骤 + 预期结果 + 提示词配置）"""
+        prompt = f"{TEST_SYSTEM_PROMPT}\n\n{self._load_custom_prompt()}"
+        return history_cache.compute_key(test_case.task_content, test_case.expected_result, prompt)
     
     def _get_history_path_from_relative(self, relative_path: str) -> Optional[Path]:
         """根据相对路径获取完整的 history 文件路径"""
-        self.logger.info(f"=== 开始解析 history 路径 ===")
-        self.logger.info(f"输入的相对路径: {relative_path}")
-        self.logger.info(f"配置根目录: {self.config_manager.data_dir}")
-        
         if not relative_path:
-            self.logger.warning("输入的相对路径为空")
             return None
         
         # 如果已经是绝对路径，直接返回
         if Path(relative_path).is_absolute():
-            self.logger.info(f"输入路径已经是绝对路径: {relative_path}")
             return Path(relative_path)
         
         # 如果是相对路径，相对于配置根目录构建完整路径
-        full_path = self.config_manager.data_dir / relative_path
-        self.logger.info(f"构建的完整路径: {full_path}")
-        self.logger.info(f"=== history 路径解析完成 ===")
-        return full_path
+        return self.config_manager.data_dir / relative_path
     
     def _is_history_valid(self, test_case: TestCase) -> bool:
-        """检查 history 是否有效"""
-        self.logger.info(f"=== 开始验证测试用例 {test_case.id} 的 history 缓存 ===")
-        self.logger.info(f"测试用例 {test_case.id} 的 history_path: {test_case.history_path}")
-        self.logger.info(f"测试用例 {test_case.id} 的 history_updated_at: {test_case.history_updated_at}")
-        
-        if not test_case.history_path:
-            self.logger.info(f"测试用例 {test_case.id} 没有 history_path，缓存无效")
-            return False
-        
-        # 根据相对路径获取完整路径
-        history_path = self._get_history_path_from_relative(test_case.history_path)
-        self.logger.info(f"测试用例 {test_case.id} 的完整 history 路径: {history_path}")
-        
-        if not history_path or not history_path.exists():
-            self.logger.warning(f"测试用例 {test_case.id} 的 history 文件不存在或路径无效: {history_path}")
-            return False
-        
-        # 检查文件是否为空或损坏
-        try:
-            file_size = history_path.stat().st_size
-            self.logger.info(f"测试用例 {test_case.id} 的 history 文件大小: {file_size} 字节")
-            
-            if file_size == 0:
-                self.logger.warning(f"测试用例 {test_case.id} 的 history 文件为空")
-                return False
-            
-            # 尝试解析 JSON 文件
-            with open(history_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                json.loads(content)
-                self.logger.info(f"测试用例 {test_case.id} 的 history 文件 JSON 格式验证通过")
-            return True
-        except Exception as e:
-            self.logger.warning(f"测试用例 {test_case.id} 的 history 文件 {history_path} 无效: {e}")
-            return False
-        finally:
-            self.logger.info(f"=== 测试用例 {test_case.id} 的 history 缓存验证完成 ===")
+        """检查 history 是否有效（内存索引查找，不解析文件）"""
+        return history_cache.lookup(self._get_history_key(test_case)) is not None
     
     def _should_use_history(self, test_case: TestCase) -> bool:
-        """判断是否应该使用 history 缓存"""
-        self.logger.info(f"=== 开始判断测试用例 {test_case.id} 是否应该使用 history 缓存 ===")
-        
-        # 如果没有 history 文件，直接返回 False
+        """判断是否应该使用 history 缓存（过期判断由缓存索引完成）"""
         if not self._is_history_valid(test_case):
-            self.logger.info(f"测试用例 {test_case.id} 的 history 缓存无效，将重新执行")
+            self.logger.info(f"测试用例 {test_case.id} 没有可用的 history 缓存，将重新执行")
             return False
         
-        # 检查 history 是否过期（比如超过7天）
-        if test_case.history_updated_at:
-            from datetime import timedelta
-            try:
-                # 确保时区一致性
-                history_time = ensure_timezone_aware(test_case.history_updated_at)
-                current_time = beijing_now()
-                time_diff = current_time - history_time
-                days_diff = time_diff.days
-                
-                self.logger.info(f"测试用例 {test_case.id} 的 history 更新时间: {history_time}")
-                self.logger.info(f"当前时间: {current_time}")
-                self.logger.info(f"时间差: {time_diff} (共 {days_diff} 天)")
-                
-                if time_diff > timedelta(days=7):
-                    self.logger.info(f"测试用例 {test_case.id} 的 history 已过期 ({days_diff} 天 > 7 天)，将重新执行")
-                    return False
-                else:
-                    self.logger.info(f"测试用例 {test_case.id} 的 history 未过期 ({days_diff} 天 <= 7 天)，可以使用缓存")
-            except Exception as e:
-                self.logger.warning(f"测试用例 {test_case.id} 的 history 时间计算出错: {e}")
-                return False
-        else:
-            self.logger.warning(f"测试用例 {test_case.id} 的 history_updated_at 为空，将重新执行")
-            return False
-        
-        self.logger.info(f"=== 测试用例 {test_case.id} 可以使用 history 缓存 ===")
+        self.logger.info(f"测试用例 {test_case.id} 命中 history 缓存")
         return True
     
     async def _try_replay_from_history(self, test_case: TestCase, execution: TestExecution, headless: bool) -> Optional[Dict[str, Any]]:
@@ -1189,7 +1145,9 @@ class TestExecutor:
             
             async with async_playwright() as p:
                 self.logger.info(f"启动浏览器实例，headless: {headless}")
-                browser = await p.chromium.launch(
+                browser = await browser_process_registry.launch(
+                    p,
+                    execution_id=execution.id,
                     headless=False,
                     args=[
                         '--no-sandbox',
@@ -1252,25 +1210,24 @@ class TestExecutor:
                     try:
                         # 根据相对路径获取完整路径
                         self.logger.info(f"解析 history 文件路径...")
-                        full_history_path = self._get_history_path_from_relative(test_case.history_path)
+                        full_history_path = history_cache.materialize(self._get_history_key(test_case))
                         self.logger.info(f"解析后的完整 history 路径: {full_history_path}")
                         
                         if not full_history_path:
-                            self.logger.warning(f"无法解析 history 路径: {test_case.history_path}")
-                            return None
-                        
-                        if not full_history_path.exists():
-                            self.logger.warning(f"History 文件不存在: {full_history_path}")
+                            self.logger.warning(f"测试用例 {test_case.id} 的 history 缓存不存在")
                             return None
                         
                         self.logger.info(f"开始调用增强的 agent.load_and_rerun_with_events() 进行回放...")
                         # 使用增强的 agent.load_and_rerun_with_events() 方法回放，支持事件监听
-                        history_result = await agent.load_and_rerun_with_events(
-                            str(full_history_path),
-                            max_retries=3,
-                            skip_failures=True,
-                            delay_between_actions=2.0
-                        )
+                        try:
+                            history_result = await agent.load_and_rerun_with_events(
+                                str(full_history_path),
+                                max_retries=3,
+                                skip_failures=True,
+                                delay_between_actions=2.0
+                            )
+                        finally:
+                            full_history_path.unlink(missing_ok=True)
                         self.logger.info(f"agent.load_and_rerun_with_events() 调用完成，返回结果类型: {type(history_result)}")
                         
                         if history_result:
@@ -1399,36 +1356,27 @@ class TestExecutor:
             return None
     
     def _save_history_to_cache(self, test_case_id: int, agent, db) -> str:
-        """保存 history 到缓存并更新数据库"""
+        """保存 history 到制品存储并更新数据库"""
         try:
-            self.logger.info(f"=== 开始保存测试用例 {test_case_id} 的 history 到缓存 ===")
-            
-            # 生成 history 文件路径
-            history_path = self._get_history_path(test_case_id)
-            self.logger.info(f"生成的 history 文件路径: {history_path}")
-            
-            # 使用 agent.save_history() 方法保存，这是正确的方式
-            self.logger.info("开始调用 agent.save_history() 保存历史记录...")
-            agent.save_history(str(history_path))
-            self.logger.info("agent.save_history() 调用完成")
-            
-            # 将绝对路径转换为相对路径（相对于配置根目录）
-            relative_path = f"history/test_case_{test_case_id}_history.json"
-            self.logger.info(f"转换后的相对路径: {relative_path}")
-            
-            # 更新数据库中的 history 路径和时间
             test_case = db.query(TestCase).filter(TestCase.id == test_case_id).first()
-            if test_case:
-                test_case.history_path = relative_path
-                test_case.history_updated_at = beijing_now()
-                db.commit()
-                self.logger.info(f"✅ 已保存测试用例 {test_case_id} 的 history 到 {relative_path}")
-                self.logger.info(f"数据库更新时间: {test_case.history_updated_at}")
-            else:
-                self.logger.warning(f"未找到测试用例 {test_case_id}，无法更新数据库")
+            if not test_case:
+                self.logger.warning(f"未找到测试用例 {test_case_id}，无法保存 history")
+                return ""
+            
+            key = self._get_history_key(test_case)
+            tmp_path = history_cache.temp_path(key)
+            try:
+                # 使用 agent.save_history() 写出临时文件，校验后存入制品存储
+                agent.save_history(str(tmp_path))
+                history_ref = history_cache.store_file(key, tmp_path, test_case_id)
+            finally:
+                tmp_path.unlink(missing_ok=True)
             
-            self.logger.info(f"=== 测试用例 {test_case_id} 的 history 缓存保存完成 ===")
-            return relative_path
+            test_case.history_path = history_ref
+            test_case.history_updated_at = beijing_now()
+            db.commit()
+            self.logger.info(f"✅ 已保存测试用例 {test_case_id} 的 history 到 {history_ref}")
+            return history_ref
         except Exception as e:
             self.logger.error(f"保存 history 失败: {e}")
             import traceback
@@ -1436,41 +1384,31 @@ class TestExecutor:
             return ""
     
     def _invalidate_history(self, test_case_id: int, db) -> None:
-        """使 history 失效"""
+        """使 history 失效（内容相同的测试用例共享缓存，会一并失效）"""
         try:
-            self.logger.info(f"=== 开始使测试用例 {test_case_id} 的 history 失效 ===")
             test_case = db.query(TestCase).filter(TestCase.id == test_case_id).first()
             if test_case:
-                old_history_path = test_case.history_path
-                old_updated_at = test_case.history_updated_at
+                history_cache.invalidate(self._get_history_key(test_case))
                 
                 test_case.history_path = None
                 test_case.history_updated_at = None
                 db.commit()
                 
                 self.logger.info(f"✅ 已使测试用例 {test_case_id} 的 history 失效")
-                self.logger.info(f"原 history_path: {old_history_path}")
-                self.logger.info(f"原 history_updated_at: {old_updated_at}")
             else:
                 self.logger.warning(f"未找到测试用例 {test_case_id}，无法使 history 失效")
         except Exception as e:
             self.logger.error(f"使 history 失效失败: {e}")
             import traceback
             self.logger.error(f"使 history 失效详细错误: {traceback.format_exc()}")
-        finally:
-            self.logger.info(f"=== 测试用例 {test_case_id} 的 history 失效操作完成 ===")
     
     def force_refresh_history(self, test_case_id: int) -> bool:
         """强制刷新指定测试用例的 history 缓存"""
         try:
-            self.logger.info(f"=== 开始强制刷新测试用例 {test_case_id} 的 history 缓存 ===")
             db = SessionLocal()
             try:
                 test_case = db.query(TestCase).filter(TestCase.id == test_case_id).first()
                 if test_case:
-                    self.logger.info(f"找到测试用例 {test_case_id}，当前 history_path: {test_case.history_path}")
-                    self.logger.info(f"当前 history_updated_at: {test_case.history_updated_at}")
-                    
                     self._invalidate_history(test_case_id, db)
                     self.logger.info(f"✅ 已强制刷新测试用例 {test_case_id} 的 history 缓存")
                     return True
@@ -1484,55 +1422,29 @@ class TestExecutor:
             import traceback
             self.logger.error(f"强制刷新 history 缓存详细错误: {traceback.format_exc()}")
             return False
-        finally:
-            self.logger.info(f"=== 测试用例 {test_case_id} 的 history 缓存强制刷新操作完成 ===")
     
     def cleanup_expired_history(self, max_days: int = 30) -> int:
         """清理过期的 history 文件"""
         try:
-            self.logger.info(f"=== 开始清理过期的 history 文件，最大保留天数: {max_days} ===")
+            cleaned_count = history_cache.remove_expired(max_days)
+            
             db = SessionLocal()
             try:
                 from datetime import timedelta
                 cutoff_date = beijing_now() - timedelta(days=max_days)
-                self.logger.info(f"清理截止日期: {cutoff_date}")
-                
-                # 查找过期的测试用例
-                expired_test_cases = db.query(TestCase).filter(
+                db.query(TestCase).filter(
                     TestCase.history_path.isnot(None),
                     TestCase.history_updated_at < cutoff_date
-                ).all()
-                
-                self.logger.info(f"找到 {len(expired_test_cases)} 个过期的测试用例")
-                
-                cleaned_count = 0
-                for test_case in expired_test_cases:
-                    try:
-                        self.logger.info(f"清理测试用例 {test_case.id} 的过期 history")
-                        self.logger.info(f"history_path: {test_case.history_path}")
-                        self.logger.info(f"history_updated_at: {test_case.history_updated_at}")
-                        
-                        # 删除文件
-                        full_history_path = self._get_history_path_from_relative(test_case.history_path)
-                        if full_history_path and full_history_path.exists():
-                            full_history_path.unlink()
-                            self.logger.info(f"已删除过期文件: {full_history_path}")
-                        
-                        # 更新数据库
-                        test_case.history_path = None
-                        test_case.history_updated_at = None
-                        cleaned_count += 1
-                        
-                        self.logger.info(f"✅ 已清理过期的 history 文件: {test_case.history_path}")
-                    except Exception as e:
-                        self.logger.warning(f"清理 history 文件失败 {test_case.history_path}: {e}")
-                
+                ).update({
+                    "history_path": None,
+                    "history_updated_at": None
+                }, synchronize_session=False)
                 db.commit()
-                self.logger.info(f"=== 过期 history 文件清理完成，共清理 {cleaned_count} 个 ===")
-                return cleaned_count
-                
             finally:
                 db.close()
+            
+            self.logger.info(f"过期 history 文件清理完成，共清理 {cleaned_count} 个")
+            return cleaned_count
         except Exception as e:
             self.logger.error(f"清理过期的 history 文件失败: {e}")
             import traceback
@@ -1550,16 +1462,16 @@ class TestExecutor:
                     TestCase.is_deleted == False
                 ).count()
                 
-                # 获取缓存大小
-                cache_size = 0
-                if self.history_cache_dir.exists():
-                    for file_path in self.history_cache_dir.glob("*.json"):
-                        cache_size += file_path.stat().st_size
+                # 缓存大小直接从索引汇总，无需遍历目录
+                cache_stats = history_cache.stats()
+                cache_size = cache_stats["size_bytes"]
                 
                 return {
                     "total_cases": total_cases,
                     "cached_cases": cached_cases,
                     "cache_hit_rate": (cached_cases / total_cases * 100) if total_cases > 0 else 0,
+                    "cache_entries": cache_stats["entries"],
+                    "shared_cache_entries": cache_stats["shared_entries"],
                     "cache_size_bytes": cache_size,
                     "cache_size_mb": round(cache_size / (1024 * 1024), 2)
                 }
@@ -1584,6 +1496,7 @@ class BatchTestExecutor:
         self.max_concurrent = max_concurrent
         self.logger = logging.getLogger(__name__)
         self.batch_execution_id = None  # 当前批量任务的ID
+        self.progress: Optional[BatchProgress] = None  # 当前批量任务的进度计数
     
     async def register_to_context(self, batch_execution_id: int):
         """注册到任务上下文"""
@@ -1606,6 +1519,9 @@ class BatchTestExecutor:
         """
         执行批量测试用例
         
+        准备阶段使用一个异步会话创建批量任务记录；每个用例在自己的短生命周期会话中执行，
+        任务之间不共享会话，数据库访问不阻塞事件循环。
+        
         Args:
             test_case_ids: 测试用例ID列表
             headless: 是否无头模式
@@ -1615,18 +1531,18 @@ class BatchTestExecutor:
         Returns:
             执行结果
         """
-        db = SessionLocal()
+        db = AsyncWriterSessionLocal()
         try:
             if batch_execution_id is not None:
                 # 使用现有的批量执行任务
-                batch_execution = db.query(BatchExecution).filter(BatchExecution.id == batch_execution_id).first()
+                batch_execution = await db.get(BatchExecution, batch_execution_id)
                 if not batch_execution:
                     raise ValueError(f"批量执行任务 {batch_execution_id} 不存在")
                 
                 # 检查是否已经有测试用例记录
-                existing_test_cases = db.query(BatchExecutionTestCase).filter(
+                existing_test_cases = (await db.scalars(select(BatchExecutionTestCase).where(
                     BatchExecutionTestCase.batch_execution_id == batch_execution_id
-                ).all()
+                ))).all()
                 
                 if not existing_test_cases:
                     # 创建批量执行任务中的测试用例记录
@@ -1639,11 +1555,11 @@ class BatchTestExecutor:
                         )
                         db.add(batch_test_case)
                         batch_test_cases.append(batch_test_case)
-                    db.commit()
+                    await db.commit()
                 else:
                     batch_test_cases = existing_test_cases
             else:
-                # 创建新的批量执行任务记录
+                # 创建新的批量执行任务记录及其测试用例记录，一次提交
                 batch_execution = BatchExecution(
                     name=batch_name,
                     status="running",
@@ -1652,10 +1568,8 @@ class BatchTestExecutor:
                     started_at=beijing_now()
                 )
                 db.add(batch_execution)
-                db.commit()
-                db.refresh(batch_execution)
+                await db.flush()
                 
-                # 创建批量执行任务中的测试用例记录
                 batch_test_cases = []
                 for test_case_id in test_case_ids:
                     batch_test_case = BatchExecutionTestCase(
@@ -1665,45 +1579,66 @@ class BatchTestExecutor:
                     )
                     db.add(batch_test_case)
                     batch_test_cases.append(batch_test_case)
-                db.commit()
-            
-            self.logger.info(f"开始批量执行任务: {batch_execution.name} (ID: {batch_execution.id})，最大并发数: {self.max_concurrent}")
-            self.logger.info(f"批量任务 {batch_execution.id} 下的测试用例数量: {len(batch_test_cases)}")
-            
+                await db.commit()
+            
+            # 开始前对账一次，之后计数只在内存中按状态迁移更新
+            self.progress = BatchProgress(len(batch_test_cases), await self._group_batch_test_case_counts(db, batch_execution.id))
+            for field, value in self.progress.counter_fields().items():
+                setattr(batch_execution, field, value)
+            await db.commit()
+            
+            # 只把ID交给并发任务，ORM对象留在准备阶段的会话中
+            batch_id = batch_execution.id
+            batch_name = batch_execution.name
+            pending_cases = [
+                (batch_test_case.id, batch_test_case.test_case_id)
+                for batch_test_case in batch_test_cases
+                if batch_test_case.status == "pending"
+            ]
+            self.logger.info(f"开始批量执行任务: {batch_name} (ID: {batch_id})，最大并发数: {self.max_concurrent}")
+            self.logger.info(f"批量任务 {batch_id} 下的测试用例数量: {len(batch_test_cases)}")
+        except Exception as e:
+            self.logger.error(f"批量执行任务失败: {e}")
+            await db.rollback()
+            raise
+        finally:
+            await db.close()
+        
+        try:
             # 注册到任务上下文
-            self.logger.info(f"正在注册批量执行器 {batch_execution.id} 到任务上下文...")
-            await self.register_to_context(batch_execution.id)
-            self.logger.info(f"批量执行器 {batch_execution.id} 已成功注册到任务上下文")
+            self.logger.info(f"正在注册批量执行器 {batch_id} 到任务上下文...")
+            await self.register_to_context(batch_id)
+            self.logger.info(f"批量执行器 {batch_id} 已成功注册到任务上下文")
             
             try:
                 # 使用信号量控制并发执行测试用例
                 semaphore = asyncio.Semaphore(self.max_concurrent)
                 
-                async def execute_with_semaphore(batch_test_case):
+                async def execute_with_semaphore(batch_test_case_id: int, test_case_id: int):
                     async with semaphore:
-                        self.logger.info(f"开始执行测试用例 {batch_test_case.test_case_id} (当前并发数: {self.max_concurrent - semaphore._value})")
+                        # 排队期间收到取消信号则不再启动
+                        if task_context.is_batch_cancelled(batch_id):
+                            raise asyncio.CancelledError()
+                        self.logger.info(f"开始执行测试用例 {test_case_id} (当前并发数: {self.max_concurrent - semaphore._value})")
                         try:
-                            result = await self._execute_single_test_in_batch(batch_test_case, headless, db)
-                            self.logger.info(f"完成执行测试用例 {batch_test_case.test_case_id}")
+                            result = await self._execute_single_test_in_batch(batch_id, batch_test_case_id, test_case_id, headless)
+                            self.logger.info(f"完成执行测试用例 {test_case_id}")
                             return result
                         except asyncio.CancelledError:
-                            self.logger.info(f"测试用例 {batch_test_case.test_case_id} 被取消")
+                            self.logger.info(f"测试用例 {test_case_id} 被取消")
                             # 重新抛出取消异常
                             raise
                         except Exception as e:
-                            self.logger.error(f"执行测试用例 {batch_test_case.test_case_id} 时发生异常: {e}")
+                            self.logger.error(f"执行测试用例 {test_case_id} 时发生异常: {e}")
                             raise
                 
-                # 创建所有任务
+                # 只为pending状态的用例创建任务
                 tasks = []
-                self.logger.info(f"开始创建任务，测试用例数量: {len(batch_test_cases)}")
-                for batch_test_case in batch_test_cases:
-                    # 只为pending状态的用例创建任务
-                    if batch_test_case.status != "pending":
-                        continue
-                    
-                    self.logger.info(f"创建任务 for 测试用例 {batch_test_case.test_case_id}")
-                    task = asyncio.create_task(execute_with_semaphore(batch_test_case))
+                self.logger.info(f"开始创建任务，待执行测试用例数量: {len(pending_cases)}")
+                for batch_test_case_id, test_case_id in pending_cases:
+                    self.logger.info(f"创建任务 for 测试用例 {test_case_id}")
+                    task = asyncio.create_task(execute_with_semaphore(batch_test_case_id, test_case_id))
+                    task_context.track_batch_task(batch_id, task)
                     tasks.append(task)
                 
                 self.logger.info(f"创建了 {len(tasks)} 个任务")
@@ -1724,341 +1659,297 @@ class BatchTestExecutor:
                                 self.logger.error(f"任务执行异常: {e}")
                         
                     except Exception as e:
-                        self.logger.error(f"批量执行任务 {batch_execution.id} 执行过程中发生异常: {e}")
+                        self.logger.error(f"批量执行任务 {batch_id} 执行过程中发生异常: {e}")
                 
                 # 检查任务是否被取消（通过任务上下文检查）
-                if not task_context.is_batch_registered(batch_execution.id):
-                    self.logger.info(f"批量执行任务 {batch_execution.id} 已被取消")
-                    # 更新任务状态为已取消
-                    batch_execution.status = "cancelled"
-                    batch_execution.completed_at = beijing_now()
-                    batch_execution.updated_at = beijing_now()
-                    db.commit()
-                    
-                    # 推送 WebSocket 更新
-                    await websocket_manager.broadcast_batch_update(
-                        batch_execution.id,
-                        {
-                            "status": batch_execution.status,
-                            "success_count": batch_execution.success_count,
-                            "failed_count": batch_execution.failed_count,
-                            "running_count": batch_execution.running_count,
-                            "pending_count": batch_execution.pending_count,
-                            "total_count": batch_execution.total_count,
-                            "completed_at": batch_execution.completed_at.isoformat() if batch_execution.completed_at else None,
-                            "updated_at": batch_execution.updated_at.isoformat() if batch_execution.updated_at else None
-                        }
-                    )
-                    
-                    return {
-                        "success": False,
-                        "batch_execution_id": batch_execution.id,
-                        "batch_name": batch_execution.name,
-                        "status": "cancelled",
-                        "message": "批量执行任务已被取消"
-                    }
+                cancelled = task_context.is_batch_cancelled(batch_id)
             finally:
-                # 从任务上下文中注销
+                # 从任务上下文中注销并释放取消令牌
                 await self.unregister_from_context()
+                task_context.release_batch(batch_id)
             
-            # 更新批量执行任务状态为完成
-            batch_execution.status = "completed"
-            batch_execution.completed_at = beijing_now()
-            batch_execution.updated_at = beijing_now()
-            
-            # 统计执行结果
-            success_count = db.query(BatchExecutionTestCase).filter(
-                BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                BatchExecutionTestCase.status == "completed"
-            ).count()
-            
-            failed_count = db.query(BatchExecutionTestCase).filter(
-                BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                BatchExecutionTestCase.status == "failed"
-            ).count()
+            if cancelled:
+                # 已取消任务的最终状态和统计数据由停止接口统一写入，这里不再提交，避免两处并发覆盖
+                self.logger.info(f"批量执行任务 {batch_id} 已被取消")
+                return {
+                    "success": False,
+                    "batch_execution_id": batch_id,
+                    "batch_name": batch_name,
+                    "status": "cancelled",
+                    "message": "批量执行任务已被取消"
+                }
             
-            batch_execution.success_count = success_count
-            batch_execution.failed_count = failed_count
-            batch_execution.running_count = 0
-            batch_execution.pending_count = 0
+            # 最终状态与统计数据在一个事务中提交
+            summary = await self._finalize_batch_execution(batch_id, "completed")
             
-            db.commit()
-            
-            # 推送批量执行任务完成通知
+            # 推送 WebSocket 更新
             await websocket_manager.broadcast_batch_update(
-                batch_execution.id,
+                batch_id,
                 {
-                    "status": batch_execution.status,
-                    "success_count": batch_execution.success_count,
-                    "failed_count": batch_execution.failed_count,
-                    "running_count": batch_execution.running_count,
-                    "pending_count": batch_execution.pending_count,
-                    "total_count": batch_execution.total_count,
-                    "completed_at": batch_execution.completed_at.isoformat() if batch_execution.completed_at else None,
-                    "updated_at": batch_execution.updated_at.isoformat() if batch_execution.updated_at else None
+                    "status": summary["status"],
+                    "success_count": summary["success_count"],
+                    "failed_count": summary["failed_count"],
+                    "running_count": summary["running_count"],
+                    "pending_count": summary["pending_count"],
+                    "total_count": summary["total_count"],
+                    "completed_at": summary["completed_at"].isoformat(),
+                    "updated_at": summary["updated_at"].isoformat()
                 }
             )
             
             return {
                 "success": True,
-                "batch_execution_id": batch_execution.id,
-                "batch_name": batch_execution.name,
-                "total_count": batch_execution.total_count,
-                "success_count": batch_execution.success_count,
-                "failed_count": batch_execution.failed_count,
-                "status": batch_execution.status,
-                "started_at": batch_execution.started_at.isoformat(),
-                "completed_at": batch_execution.completed_at.isoformat() if batch_execution.completed_at else None
+                "batch_execution_id": batch_id,
+                "batch_name": batch_name,
+                "total_count": summary["total_count"],
+                "success_count": summary["success_count"],
+                "failed_count": summary["failed_count"],
+                "status": summary["status"],
+                "started_at": summary["started_at"].isoformat() if summary["started_at"] else None,
+                "completed_at": summary["completed_at"].isoformat()
             }
             
         except Exception as e:
             self.logger.error(f"批量执行任务失败: {e}")
-            # 如果使用了现有的批量执行任务，更新其状态为失败
-            if batch_execution_id is not None:
-                batch_execution = db.query(BatchExecution).filter(BatchExecution.id == batch_execution_id).first()
-                if batch_execution:
-                    batch_execution.status = "failed"
-                    batch_execution.completed_at = beijing_now()
-                    batch_execution.updated_at = beijing_now()
+            # 使用独立会话将批量执行任务标记为失败
+            try:
+                async with AsyncWriterSessionLocal() as db:
+                    now = beijing_now()
+                    await db.execute(
+                        update(BatchExecution).where(BatchExecution.id == batch_id).values(
+                            status="failed", completed_at=now, updated_at=now
+                        )
+                    )
+                    await db.commit()
+            except Exception as update_error:
+                self.logger.error(f"更新批量执行任务 {batch_id} 失败状态时出错: {update_error}")
             raise
-        finally:
-            db.close()
     
-    async def _execute_single_test_in_batch(self, batch_test_case: BatchExecutionTestCase, headless: bool, db):
+    @staticmethod
+    async def _group_batch_test_case_counts(db, batch_execution_id: int) -> Dict[str, int]:
+        """一次分组查询统计批量任务中各状态的用例数量，仅用于开始和结束时对账"""
+        result = await db.execute(
+            select(BatchExecutionTestCase.status, func.count(BatchExecutionTestCase.id)).where(
+                BatchExecutionTestCase.batch_execution_id == batch_execution_id
+            ).group_by(BatchExecutionTestCase.status)
+        )
+        return dict(result.all())
+    
+    async def _start_batch_test_case(self, batch_execution_id: int, batch_test_case_id: int, test_case_id: int) -> int:
         """
-        在批量执行中执行单个测试用例
+        单个事务内预先创建执行记录，将批量用例记录标记为运行中并写入批量任务计数
         
-        Args:
-            batch_test_case: 批量执行任务中的测试用例记录
-            headless: 是否无头模式
-            db: 数据库会话
+        Returns:
+            执行记录ID
         """
-        self.logger.info(f"🔍 [EXECUTION_DEBUG] 开始执行单个测试用例 {batch_test_case.test_case_id}，初始execution_id: {batch_test_case.execution_id}")
+        counters = self.progress.transition("pending", "running")
+        db = AsyncWriterSessionLocal()
         try:
-            # 检查任务是否被取消
-            if batch_executor_manager.is_batch_cancelled(batch_test_case.batch_execution_id):
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 批量执行任务 {batch_test_case.batch_execution_id} 已被取消，跳过测试用例 {batch_test_case.test_case_id}，execution_id: {batch_test_case.execution_id}")
-                batch_test_case.status = "cancelled"
-                batch_test_case.completed_at = beijing_now()
-                batch_test_case.updated_at = beijing_now()
-                db.commit()
-                return
-            
-            # 更新状态为运行中
-            batch_test_case.status = "running"
-            batch_test_case.started_at = beijing_now()
-            batch_test_case.updated_at = beijing_now()
-            db.commit()
-            self.logger.info(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 已标记为运行中，execution_id: {batch_test_case.execution_id}")
+            now = beijing_now()
+            execution = TestExecution(
+                test_case_id=test_case_id,
+                execution_name=f"批量执行_{now.strftime('%Y%m%d_%H%M%S')}",
+                status="running",
+                started_at=now
+            )
+            db.add(execution)
+            await db.flush()
+            execution_id = execution.id
             
-            # 再次检查任务是否被取消（在开始执行前）
-            if batch_executor_manager.is_batch_cancelled(batch_test_case.batch_execution_id):
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 批量执行任务 {batch_test_case.batch_execution_id} 在执行前被取消，停止测试用例 {batch_test_case.test_case_id}，execution_id: {batch_test_case.execution_id}")
-                batch_test_case.status = "cancelled"
-                batch_test_case.completed_at = beijing_now()
-                batch_test_case.updated_at = beijing_now()
-                db.commit()
-                return
+            await db.execute(
+                update(BatchExecutionTestCase).where(BatchExecutionTestCase.id == batch_test_case_id).values(
+                    status="running", execution_id=execution_id, started_at=now, updated_at=now
+                )
+            )
+            await db.execute(
+                update(BatchExecution).where(BatchExecution.id == batch_execution_id).values(**counters, updated_at=now)
+            )
+            await db.commit()
+            return execution_id
+        except BaseException:
+            await db.rollback()
+            self.progress.transition("running", "pending")
+            raise
+        finally:
+            await db.close()
+    
+    async def _complete_batch_test_case(self, batch_execution_id: int, batch_test_case_id: int, test_case_id: int,
+                                  status: str, previous_status: str, execution_id: Optional[int] = None,
+                                  error: Optional[Exception] = None) -> Dict[str, Any]:
+        """
+        单个事务内写入批量用例的最终状态，并用一条 UPDATE 写入内存中的批量任务计数
+        
+        Args:
+            batch_execution_id: 批量执行任务ID
+            batch_test_case_id: 批量执行任务中的测试用例记录ID
+            test_case_id: 测试用例ID
+            status: 最终状态（completed/failed/cancelled）
+            previous_status: 迁移前的状态（pending/running）
+            execution_id: 执行记录ID，失败且尚未创建执行记录时补建一条失败记录
+            error: 失败原因
             
-            # 执行测试用例
-            self.logger.info(f"🔍 [EXECUTION_DEBUG] 开始执行测试用例 {batch_test_case.test_case_id}，当前execution_id: {batch_test_case.execution_id}")
-            try:
-                # 为批量执行创建执行记录
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 开始为测试用例 {batch_test_case.test_case_id} 创建执行记录")
+        Returns:
+            批量执行任务的最新计数
+        """
+        counters = self.progress.transition(previous_status, status)
+        db = AsyncWriterSessionLocal()
+        try:
+            now = beijing_now()
+            if status == "failed" and execution_id is None:
                 execution = TestExecution(
-                    test_case_id=batch_test_case.test_case_id,
-                    execution_name=f"批量执行_{beijing_now().strftime('%Y%m%d_%H%M%S')}",
-                    status="running",
-                    started_at=beijing_now()
+                    test_case_id=test_case_id,
+                    execution_name=f"批量执行_失败_{now.strftime('%Y%m%d_%H%M%S')}",
+                    status="failed",
+                    overall_status="FAILED",
+                    error_message=str(error) if error else None,
+                    started_at=now,
+                    completed_at=now,
+                    total_steps=0,
+                    passed_steps=0,
+                    failed_steps=0,
+                    skipped_steps=0,
+                    summary=f"测试用例执行失败: {error}",
+                    recommendations="请检查测试用例配置或系统环境设置"
                 )
                 db.add(execution)
-                db.commit()
-                db.refresh(execution)
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 成功创建执行记录 {execution.id} 给测试用例 {batch_test_case.test_case_id}")
-                
-                # 更新批量测试用例记录的执行ID
-                old_execution_id = batch_test_case.execution_id
-                batch_test_case.execution_id = execution.id
-                db.commit()
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} execution_id 从 {old_execution_id} 更新为 {execution.id}")
-                
-                # 执行测试用例，使用已创建的执行记录
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 开始调用 execute_test_case，测试用例 {batch_test_case.test_case_id}，执行记录 {execution.id}")
-                result = await self.test_executor.execute_test_case(
-                    batch_test_case.test_case_id, 
-                    headless, 
-                    batch_test_case.batch_execution_id,
-                    execution.id
-                )
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] execute_test_case 返回结果： {result}")
-            except asyncio.CancelledError:
-                self.logger.info(f"测试用例 {batch_test_case.test_case_id} 被取消")
-                batch_test_case.status = "cancelled"
-                batch_test_case.completed_at = beijing_now()
-                batch_test_case.updated_at = beijing_now()
-                db.commit()
-                # 重新抛出取消异常
-                raise
-            except Exception as e:
-                self.logger.error(f"😨 [EXECUTION_DEBUG] 执行测试用例 {batch_test_case.test_case_id} 时发生异常: {e}")
-                self.logger.error(f"🔍 [EXECUTION_DEBUG] 异常时的execution_id: {batch_test_case.execution_id}")
-                
-                # 如果还没有创建执行记录，创建一个简单的失败记录
-                if not batch_test_case.execution_id:
-                    self.logger.warning(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 在异常时没有execution_id，尝试创建失败记录")
-                    try:
-                        execution = TestExecution(
-                            test_case_id=batch_test_case.test_case_id,
-                            execution_name=f"批量执行_失败_{beijing_now().strftime('%Y%m%d_%H%M%S')}",
-                            status="failed",
-                            overall_status="FAILED",
-                            error_message=str(e),
-                            started_at=beijing_now(),
-                            completed_at=beijing_now(),
-                            total_steps=0,
-                            passed_steps=0,
-                            failed_steps=0,
-                            skipped_steps=0,
-                            summary=f"测试用例执行失败: {str(e)}",
-                            recommendations="请检查测试用例配置或系统环境设置"
-                        )
-                        db.add(execution)
-                        db.commit()
-                        db.refresh(execution)
-                        
-                        batch_test_case.execution_id = execution.id
-                        self.logger.info(f"🔍 [EXECUTION_DEBUG] 为失败测试用例 {batch_test_case.test_case_id} 创建了执行记录 {execution.id}")
-                    except Exception as create_error:
-                        self.logger.error(f"😨 [EXECUTION_DEBUG] 创建失败执行记录失败: {create_error}")
-                else:
-                    self.logger.info(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 在异常时已经有execution_id: {batch_test_case.execution_id}")
-                
-                batch_test_case.status = "failed"
-                batch_test_case.completed_at = beijing_now()
-                batch_test_case.updated_at = beijing_now()
-                db.commit()
-                return
-            
-            # 检查任务是否被取消（在执行完成后）
-            if batch_executor_manager.is_batch_cancelled(batch_test_case.batch_execution_id):
-                self.logger.info(f"批量执行任务 {batch_test_case.batch_execution_id} 已被取消，标记测试用例 {batch_test_case.test_case_id} 为取消")
-                batch_test_case.status = "cancelled"
-                batch_test_case.completed_at = beijing_now()
-                batch_test_case.updated_at = beijing_now()
-                db.commit()
-                return
-            
-            # 更新执行记录ID
-            self.logger.info(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 执行完成，当前execution_id: {batch_test_case.execution_id}")
-            if "execution_id" in result:
-                old_id = batch_test_case.execution_id
-                batch_test_case.execution_id = result["execution_id"]
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 从结果中更新execution_id: {old_id} -> {result['execution_id']}")
-            else:
-                self.logger.warning(f"🔍 [EXECUTION_DEBUG] 结果中没有execution_id，保持原有值: {batch_test_case.execution_id}")
-            
-            # 更新状态
-            if result["success"]:
-                batch_test_case.status = "completed"
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 执行成功，最终execution_id: {batch_test_case.execution_id}")
-            else:
-                batch_test_case.status = "failed"
-                self.logger.warning(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 执行失败，最终execution_id: {batch_test_case.execution_id}")
-            
-            batch_test_case.completed_at = beijing_now()
-            batch_test_case.updated_at = beijing_now()
-            db.commit()
-            
-            # 更新批量执行任务的统计数据
-            batch_execution = db.query(BatchExecution).filter(
-                BatchExecution.id == batch_test_case.batch_execution_id
-            ).first()
-            
-            if batch_execution:
-                # 重新计算统计数据
-                completed_count = db.query(BatchExecutionTestCase).filter(
-                    BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                    BatchExecutionTestCase.status.in_(["completed", "failed"])
-                ).count()
-                
-                running_count = db.query(BatchExecutionTestCase).filter(
-                    BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                    BatchExecutionTestCase.status == "running"
-                ).count()
-                
-                pending_count = db.query(BatchExecutionTestCase).filter(
-                    BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                    BatchExecutionTestCase.status == "pending"
-                ).count()
-                
-                # 更新批量执行任务状态
-                batch_execution.success_count = completed_count - db.query(BatchExecutionTestCase).filter(
-                    BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                    BatchExecutionTestCase.status == "failed"
-                ).count()
-                
-                batch_execution.failed_count = db.query(BatchExecutionTestCase).filter(
-                    BatchExecutionTestCase.batch_execution_id == batch_execution.id,
-                    BatchExecutionTestCase.status == "failed"
-                ).count()
-                
-                batch_execution.running_count = running_count
-                batch_execution.pending_count = pending_count
-                batch_execution.updated_at = beijing_now()
-                db.commit()
-                
-                # 推送 WebSocket 更新
-                await websocket_manager.broadcast_batch_update(
-                    batch_execution.id,
-                    {
-                        "status": batch_execution.status,
-                        "success_count": batch_execution.success_count,
-                        "failed_count": batch_execution.failed_count,
-                        "running_count": batch_execution.running_count,
-                        "pending_count": batch_execution.pending_count,
-                        "total_count": batch_execution.total_count,
-                        "updated_at": batch_execution.updated_at.isoformat() if batch_execution.updated_at else None
-                    }
-                )
-                
+                await db.flush()
+                execution_id = execution.id
+                self.logger.info(f"为失败测试用例 {test_case_id} 创建了执行记录 {execution_id}")
+            
+            values = {"status": status, "completed_at": now, "updated_at": now}
+            if execution_id is not None:
+                values["execution_id"] = execution_id
+            await db.execute(
+                update(BatchExecutionTestCase).where(BatchExecutionTestCase.id == batch_test_case_id).values(**values)
+            )
+            await db.execute(
+                update(BatchExecution).where(BatchExecution.id == batch_execution_id).values(**counters, updated_at=now)
+            )
+            await db.commit()
+            return {**counters, "total_count": self.progress.total_count, "updated_at": now}
+        except BaseException:
+            await db.rollback()
+            self.progress.transition(status, previous_status)
+            raise
+        finally:
+            await db.close()
+    
+    async def _finalize_batch_execution(self, batch_execution_id: int, status: str) -> Dict[str, Any]:
+        """批量任务结束时，在一个事务中提交最终状态和统计数据"""
+        db = AsyncWriterSessionLocal()
+        try:
+            batch_execution = await db.get(BatchExecution, batch_execution_id)
+            now = beijing_now()
+            drift = self.progress.reconcile(await self._group_batch_test_case_counts(db, batch_execution_id))
+            if drift:
+                self.logger.warning(f"批量执行任务 {batch_execution_id} 的内存计数与数据库不一致，已按数据库校正: {drift}")
+            counters = self.progress.counter_fields()
+            if status == "completed":
+                counters.update(running_count=0, pending_count=0)
+            
+            batch_execution.status = status
+            batch_execution.completed_at = now
+            batch_execution.updated_at = now
+            for field, value in counters.items():
+                setattr(batch_execution, field, value)
+            summary = {
+                **counters,
+                "status": status,
+                "total_count": batch_execution.total_count,
+                "started_at": batch_execution.started_at,
+                "completed_at": now,
+                "updated_at": now
+            }
+            await db.commit()
+            return summary
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            await db.close()
+    
+    async def _complete_and_broadcast(self, batch_execution_id: int, batch_test_case_id: int, test_case_id: int,
+                                      status: str, previous_status: str, execution_id: Optional[int] = None,
+                                      error: Optional[Exception] = None):
+        """写入用例最终状态，并按内存计数推送批量任务进度"""
+        counters = await self._complete_batch_test_case(
+            batch_execution_id, batch_test_case_id, test_case_id, status, previous_status, execution_id, error
+        )
+        await websocket_manager.broadcast_batch_update(
+            batch_execution_id,
+            {
+                "status": "running",
+                "success_count": counters["success_count"],
+                "failed_count": counters["failed_count"],
+                "running_count": counters["running_count"],
+                "pending_count": counters["pending_count"],
+                "total_count": counters["total_count"],
+                "updated_at": counters["updated_at"].isoformat()
+            }
+        )
+    
+    async def _execute_single_test_in_batch(self, batch_execution_id: int, batch_test_case_id: int, test_case_id: int, headless: bool):
+        """
+        在批量执行中执行单个测试用例
+        
+        每个用例使用自己的短生命周期会话：开始时一个事务创建执行记录并标记运行中，
+        结束时一个事务写入最终状态并刷新批量任务计数。
+        
+        Args:
+            batch_execution_id: 批量执行任务ID
+            batch_test_case_id: 批量执行任务中的测试用例记录ID
+            test_case_id: 测试用例ID
+            headless: 是否无头模式
+        """
+        # 检查任务是否被取消
+        if batch_executor_manager.is_batch_cancelled(batch_execution_id):
+            self.logger.info(f"批量执行任务 {batch_execution_id} 已被取消，跳过测试用例 {test_case_id}")
+            await self._complete_batch_test_case(batch_execution_id, batch_test_case_id, test_case_id, "cancelled", "pending")
+            return
+        
+        execution_id = None
+        try:
+            execution_id = await self._start_batch_test_case(batch_execution_id, batch_test_case_id, test_case_id)
+            self.logger.info(f"测试用例 {test_case_id} 已标记为运行中，执行记录 {execution_id}")
+            
+            result = await self.test_executor.execute_test_case(
+                test_case_id,
+                headless,
+                batch_execution_id,
+                execution_id
+            )
+        except asyncio.CancelledError:
+            self.logger.info(f"测试用例 {test_case_id} 被取消")
+            previous_status = "running" if execution_id else "pending"
+            # 取消信号已送达，屏蔽后续取消以保证最终状态写入
+            await asyncio.shield(self._complete_batch_test_case(
+                batch_execution_id, batch_test_case_id, test_case_id, "cancelled", previous_status, execution_id
+            ))
+            # 重新抛出取消异常
+            raise
         except Exception as e:
-            self.logger.error(f"😨 [EXECUTION_DEBUG] 执行测试用例 {batch_test_case.test_case_id} 失败: {e}")
-            self.logger.error(f"🔍 [EXECUTION_DEBUG] 外层异常时的execution_id: {batch_test_case.execution_id}")
-            
-            # 如果还没有创建执行记录，创建一个简单的失败记录
-            if not batch_test_case.execution_id:
-                self.logger.warning(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 在外层异常时没有execution_id，尝试创建失败记录")
-                try:
-                    execution = TestExecution(
-                        test_case_id=batch_test_case.test_case_id,
-                        execution_name=f"批量执行_异常_{beijing_now().strftime('%Y%m%d_%H%M%S')}",
-                        status="failed",
-                        overall_status="FAILED",
-                        error_message=str(e),
-                        started_at=beijing_now(),
-                        completed_at=beijing_now(),
-                        total_steps=0,
-                        passed_steps=0,
-                        failed_steps=0,
-                        skipped_steps=0,
-                        summary=f"测试用例执行过程中发生异常: {str(e)}",
-                        recommendations="请检查测试用例配置、系统环境或网络连接"
-                    )
-                    db.add(execution)
-                    db.commit()
-                    db.refresh(execution)
-                    
-                    batch_test_case.execution_id = execution.id
-                    self.logger.info(f"🔍 [EXECUTION_DEBUG] 为异常测试用例 {batch_test_case.test_case_id} 创建了执行记录 {execution.id}")
-                except Exception as create_error:
-                    self.logger.error(f"😨 [EXECUTION_DEBUG] 创建异常执行记录失败: {create_error}")
-            else:
-                self.logger.info(f"🔍 [EXECUTION_DEBUG] 测试用例 {batch_test_case.test_case_id} 在外层异常时已经有execution_id: {batch_test_case.execution_id}")
-            
-            batch_test_case.status = "failed"
-            batch_test_case.completed_at = beijing_now()
-            batch_test_case.updated_at = beijing_now()
-            db.commit()
+            self.logger.error(f"执行测试用例 {test_case_id} 时发生异常: {e}")
+            previous_status = "running" if execution_id else "pending"
+            await self._complete_and_broadcast(batch_execution_id, batch_test_case_id, test_case_id, "failed", previous_status, execution_id, e)
+            return
+        
+        # 检查任务是否被取消（在执行完成后）
+        if batch_executor_manager.is_batch_cancelled(batch_execution_id):
+            self.logger.info(f"批量执行任务 {batch_execution_id} 已被取消，标记测试用例 {test_case_id} 为取消")
+            await self._complete_batch_test_case(batch_execution_id, batch_test_case_id, test_case_id, "cancelled", "running", execution_id)
+            return
+        
+        status = "completed" if result["success"] else "failed"
+        self.logger.info(f"测试用例 {test_case_id} 执行结束，状态 {status}，执行记录 {result.get('execution_id', execution_id)}")
+        await self._complete_and_broadcast(
+            batch_execution_id,
+            batch_test_case_id,
+            test_case_id,
+            status,
+            "running",
+            result.get("execution_id") or execution_id,
+            result.get("error")
+        )
     
     def get_batch_execution_status(self, batch_execution_id: int) -> Dict[str, Any]:
         """
@@ -2070,7 +1961,7 @@ class BatchTestExecutor:
         Returns:
             批量执行任务状态
         """
-        db = SessionLocal()
+        db = ReadSessionLocal()
         try:
             # 获取批量执行任务
             batch_execution = db.query(BatchExecution).filter(
@@ -2083,36 +1974,9 @@ class BatchTestExecutor:
                     "error": f"批量执行任务 {batch_execution_id} 不存在"
                 }
             
-            # 获取批量执行任务中的测试用例
-            batch_test_cases = db.query(BatchExecutionTestCase).filter(
-                BatchExecutionTestCase.batch_execution_id == batch_execution_id
-            ).all()
-            
-            test_case_details = []
-            for btc in batch_test_cases:
-                # 获取测试用例信息
-                test_case = db.query(TestCase).filter(
-                    TestCase.id == btc.test_case_id
-                ).first()
-                
-                # 获取执行记录信息
-                execution = None
-                if btc.execution_id:
-                    execution = db.query(TestExecution).filter(
-                        TestExecution.id == btc.execution_id
-                    ).first()
-                
-                test_case_details.append({
-                    "id": btc.id,
-                    "test_case_id": btc.test_case_id,
-                    "test_case_name": test_case.name if test_case else "未知",
-                    "execution_id": btc.execution_id,
-                    "status": btc.status,
-                    "overall_status": execution.overall_status if execution else None,
-                    "started_at": btc.started_at.isoformat() if btc.started_at else None,
-                    "completed_at": btc.completed_at.isoformat() if btc.completed_at else None,
-                    "error_message": execution.error_message if execution else None
-                })
+            # 一条关联查询获取批量执行任务中的测试用例详情
+            rows = db.execute(BatchQueryService.test_case_details_query(batch_execution_id)).all()
+            test_case_details = [BatchQueryService.to_dict(row, unknown_name="未知") for row in rows]
             
             return {
                 "success": True,
@@ -2179,7 +2043,7 @@ class BatchExecutorManager:
     
     def is_batch_cancelled(self, batch_execution_id: int) -> bool:
         """检查批量执行任务是否被取消"""
-        return not task_context.is_batch_registered(batch_execution_id)
+        return task_context.is_batch_cancelled(batch_execution_id)
 
 # 全局实例
 batch_executor_manager = BatchExecutorManager()
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+测试内容寻址的制品存储
+"""
+
+import base64
+import json
+import threading
+import time
+import pytest
+from src.autotest.artifact_store import ArtifactStore, LocalFileSystemBackend, decode_image, parse_ref, zstandard
+
+
+class TestArtifactStore:
+    """测试制品存储"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=10 * 1024 * 1024)
+
+    def test_put_and_get_roundtrip(self, store):
+        """测试写入后可原样读出"""
+        data = json.dumps({"steps": list(range(100))}).encode("utf-8")
+
+        artifact = store.put(data, "application/json")
+        content, metadata = store.get(artifact.digest)
+
+        assert content == data
+        assert metadata["content_type"] == "application/json"
+        assert parse_ref(artifact.ref) == artifact.digest
+
+    @pytest.mark.skipif(zstandard is None, reason="未安装 zstandard")
+    def test_json_is_compressed(self, store):
+        """测试 JSON 使用 zstd 压缩存储，图片原样存储"""
+        data = json.dumps({"steps": ["打开首页"] * 500}, ensure_ascii=False).encode("utf-8")
+
+        json_artifact = store.put(data, "application/json")
+        image_artifact = store.put(b"\x89PNG" + bytes(200), "image/png")
+
+        assert json_artifact.encoding == "zstd"
+        assert json_artifact.stored_size < json_artifact.size
+        assert image_artifact.encoding == "identity"
+
+    def test_identical_content_stored_once(self, store):
+        """测试相同内容只存储一份，并记录所有关联的执行"""
+        first = store.put(b"same", "image/png", execution_id=1)
+        second = store.put(b"same", "image/png", execution_id=2)
+
+        assert first.digest == second.digest
+        assert store.stats()["entries"] == 1
+        assert store.get_metadata(first.digest)["executions"] == [1, 2]
+
+    def test_lru_eviction_skips_referenced_artifacts(self, tmp_path):
+        """测试超过上限时淘汰最久未访问的无引用制品，最近执行或持有方引用的制品不被淘汰"""
+        store = ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=350)
+
+        referenced = store.put(b"r" * 100, "image/png", execution_id=1)
+        old = store.put(b"a" * 100, "image/png")
+        touched = store.put(b"b" * 100, "image/png")
+        store.get(old.digest)
+        held = store.put(b"c" * 100, "application/octet-stream", holder="history:key")
+
+        # 无引用的制品中 touched 最久未访问，被淘汰
+        assert store.exists(referenced.digest)
+        assert store.exists(held.digest)
+        assert store.exists(old.digest)
+        assert not store.exists(touched.digest)
+        assert store.stats()["referenced_entries"] == 2
+
+    def test_old_execution_artifacts_are_evicted(self, tmp_path):
+        """测试只固定 ID 最大的若干次执行，较早执行的截图超过上限后按 LRU 淘汰，固定集合重新加载后保持不变"""
+        store = ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=350, pinned_executions=2)
+
+        screenshots = {execution_id: store.put(bytes([execution_id]) * 100, "image/png", execution_id=execution_id)
+                       for execution_id in (1, 2, 3, 4)}
+        # 补写旧执行的截图不会挤掉最近的执行
+        backfilled = store.put(b"x" * 100, "image/png", execution_id=1)
+
+        assert store.stats()["pinned_executions"] == [3, 4]
+        assert not store.exists(screenshots[1].digest)
+        assert not store.exists(screenshots[2].digest)
+        assert store.exists(screenshots[3].digest) and store.exists(screenshots[4].digest)
+        assert store.exists(backfilled.digest)
+        assert store.stats()["stored_bytes"] <= 350
+
+        reloaded = ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=350, pinned_executions=2)
+        assert reloaded.stats()["pinned_executions"] == [3, 4]
+
+    def test_release_deletes_only_unreferenced(self, store):
+        """测试释放持有方后，只有没有其他引用的制品才会删除"""
+        shared = store.put(b"shared", "image/png", execution_id=1, holder="history:a")
+        owned = store.put(b"owned", "image/png", holder="history:a")
+        store.put(b"owned", "image/png", holder="history:b")
+
+        assert not store.release(shared.digest, "history:a")
+        assert store.exists(shared.digest)
+        assert not store.release(owned.digest, "history:a")
+        assert store.release(owned.digest, "history:b")
+        assert not store.exists(owned.digest)
+
+    def test_index_persisted_across_instances(self, store, tmp_path):
+        """测试索引持久化后新实例可以读取"""
+        artifact = store.put(b"persisted", "image/png", execution_id=1)
+
+        reloaded = ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=10 * 1024 * 1024)
+
+        assert reloaded.get(artifact.digest)[0] == b"persisted"
+        assert reloaded.get_metadata(artifact.digest)["executions"] == [1]
+
+    def test_writes_append_to_journal_and_compact(self, store, tmp_path):
+        """测试每次写入只追加一条日志，日志过长时压缩为快照，重新加载结果一致"""
+        store.COMPACT_MIN_RECORDS = 5
+        artifacts = [store.put(f"blob {index}".encode(), "image/png") for index in range(4)]
+
+        assert not (tmp_path / "index.json").exists()
+        assert len((tmp_path / "index.journal").read_text(encoding="utf-8").splitlines()) == 4
+
+        store.delete(artifacts[0].digest)
+        store.put(b"blob 4", "image/png")
+
+        assert (tmp_path / "index.json").exists()
+        assert (tmp_path / "index.journal").read_text(encoding="utf-8") == ""
+        store.put(b"blob 5", "image/png")
+
+        reloaded = ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=10 * 1024 * 1024)
+        assert reloaded.stats()["entries"] == 5
+        assert reloaded.get_metadata(artifacts[0].digest) is None
+
+    def test_concurrent_put_writes_once(self, tmp_path):
+        """测试同一内容并发写入时只写一次后端，其余按已存在处理"""
+        backend = LocalFileSystemBackend(tmp_path / "blobs")
+        store = ArtifactStore(backend, tmp_path / "index.json", max_bytes=10 * 1024 * 1024)
+        writes = []
+        original_put = backend.put
+
+        def slow_put(digest, data):
+            # 放大写入耗时，让其他线程在写入期间到达
+            writes.append(digest)
+            time.sleep(0.05)
+            original_put(digest, data)
+
+        barrier = threading.Barrier(8)
+        backend.put = slow_put
+
+        def worker(execution_id):
+            barrier.wait()
+            store.put(b"same", "image/png", execution_id=execution_id)
+
+        threads = [threading.Thread(target=worker, args=(execution_id,)) for execution_id in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        digest = parse_ref(store.put(b"same", "image/png").ref)
+        assert len(writes) == 1
+        assert store.get_metadata(digest)["executions"] == list(range(8))
+
+    def test_decode_image_formats(self, tmp_path):
+        """测试解码 data URI、裸 base64 和文件路径形式的截图"""
+        png = b"\x89PNG\r\n\x1a\n" + bytes(16)
+        encoded = base64.b64encode(png).decode("ascii")
+        image_path = tmp_path / "shot.png"
+        image_path.write_bytes(png)
+
+        assert decode_image(f"data:image/png;base64,{encoded}") == (png, "image/png")
+        assert decode_image(encoded) == (png, "image/png")
+        assert decode_image(str(image_path)) == (png, "image/png")
+        assert decode_image("不是图片") == (None, None)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
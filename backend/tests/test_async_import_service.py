@@ -0,0 +1,107 @@
+"""
+测试异步导入服务的异步数据库访问
+"""
+
+import pandas as pd
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, ImportTask, TestCase
+from src.autotest.services import async_import_service as import_module
+from src.autotest.services.async_import_service import AsyncImportService
+
+
+class TestAsyncImportService:
+    """测试异步导入服务"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """同步引擎，用于准备数据和断言"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+        Base.metadata.create_all(engine)
+        return engine
+
+    @pytest.fixture
+    def session_factory(self, tmp_path, engine, monkeypatch):
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'import.db'}", poolclass=NullPool)
+        factory = async_sessionmaker(async_engine, expire_on_commit=False)
+        monkeypatch.setattr(import_module, "AsyncSessionLocal", factory)
+        monkeypatch.setattr(AsyncImportService, "_send_progress_update", AsyncMock())
+        return factory
+
+    def _add_task(self, engine, **fields):
+        session = sessionmaker(bind=engine)()
+        try:
+            task = ImportTask(name="导入", file_name="cases.xlsx", **fields)
+            session.add(task)
+            session.commit()
+            return task.id
+        finally:
+            session.close()
+
+    @pytest.mark.asyncio
+    async def test_process_import_task(self, engine, session_factory, tmp_path):
+        """测试导入任务在异步会话中分批写入测试用例"""
+        file_path = tmp_path / "cases.xlsx"
+        pd.DataFrame({
+            "测试用例名称": [f"用例 {index}" for index in range(3)],
+            "测试步骤": ["打开首页"] * 3,
+            "预期结果": ["页面正常"] * 3,
+            "标签": ["冒烟"] * 3,
+        }).to_excel(file_path, index=False)
+        task_id = self._add_task(
+            engine, file_path=str(file_path), import_mode="standard", total_rows=3, total_batches=2,
+            batch_size=2, import_options={"defaultCategory": "导入"}, error_log=[]
+        )
+
+        await AsyncImportService()._process_import_task(task_id)
+
+        session = sessionmaker(bind=engine)()
+        try:
+            task = session.get(ImportTask, task_id)
+            assert (task.status, task.success_rows, task.current_batch) == ("completed", 3, 2)
+            assert session.query(TestCase).count() == 3
+        finally:
+            session.close()
+        assert not file_path.exists()
+
+    @pytest.mark.asyncio
+    async def test_process_csv_corrects_estimated_rows(self, engine, session_factory, tmp_path):
+        """测试 CSV 导入按块读取，校验失败的行逐行记录，完成后总行数以实际读取的数据为准"""
+        file_path = tmp_path / "cases.csv"
+        file_path.write_text(
+            "测试用例名称,测试步骤,预期结果,标签\n用例 1,打开首页,页面正常,冒烟\n\n用例 2,打开首页,页面正常,\n用例 3,打开首页,,\n", encoding="utf-8-sig"
+        )
+        task_id = self._add_task(
+            engine, file_path=str(file_path), import_mode="standard", total_rows=5, total_batches=5,
+            batch_size=1, import_options={}, error_log=[]
+        )
+
+        await AsyncImportService()._process_import_task(task_id)
+
+        session = sessionmaker(bind=engine)()
+        try:
+            task = session.get(ImportTask, task_id)
+            assert (task.status, task.success_rows, task.failed_rows, task.total_rows, task.total_batches) == ("completed", 2, 1, 3, 3)
+            assert [(error["type"], error["errors"]) for error in task.error_log] == [("validation_error", ["预期结果不能为空"])]
+        finally:
+            session.close()
+
+    @pytest.mark.asyncio
+    async def test_running_task_and_cancel(self, engine, session_factory):
+        """测试查询运行中任务和取消任务"""
+        service = AsyncImportService()
+        task_id = self._add_task(engine, status="running")
+
+        async with session_factory() as db:
+            assert await service.has_running_task(db)
+            assert await service.cancel_task(task_id, db)
+            assert not await service.has_running_task(db)
+            assert [task.status for task in await service.list_tasks(db)] == ["cancelled"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,105 @@
+"""
+测试按筛选条件创建批量执行任务
+"""
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+from src.autotest.database import Base, BatchExecution, BatchExecutionTestCase, Category, TestCase
+from src.autotest.migrations import build_category_closure
+from src.autotest.models import BatchSelectionRequest
+from src.autotest.services.batch_creation_service import BatchCreationService
+
+
+class TestBatchCreationService:
+    """测试批量执行任务创建"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        """登录（含子分类“登录-短信”）和搜索两个分类下的用例"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+        Base.metadata.create_all(engine)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        with Session(engine) as session:
+            session.add_all([
+                Category(id=1, name="登录", level=0),
+                Category(id=2, name="登录-短信", parent_id=1, level=1),
+                Category(id=3, name="搜索", level=0),
+            ])
+            session.flush()
+            build_category_closure(session.connection())
+            session.add_all([
+                TestCase(id=1, name="账号登录", task_content="无", category_id=1, priority="high", tags=["冒烟", "登录"]),
+                TestCase(id=2, name="短信登录", task_content="无", category_id=2, priority="medium", tags=["冒烟"]),
+                TestCase(id=3, name="验证码过期", task_content="无", category_id=2, priority="low", status="draft"),
+                TestCase(id=4, name="关键词搜索", task_content="无", category_id=3, priority="high", tags=["搜索"]),
+                TestCase(id=5, name="已删除", task_content="无", category_id=1, is_deleted=True, tags=["冒烟"]),
+            ])
+            session.commit()
+            session.statements = statements
+            yield session
+
+    def _case_ids(self, db, result):
+        batch = db.get(BatchExecution, result["batch_execution_id"])
+        case_ids = db.scalars(select(BatchExecutionTestCase.test_case_id).where(
+            BatchExecutionTestCase.batch_execution_id == batch.id
+        ).order_by(BatchExecutionTestCase.id)).all()
+        assert batch.total_count == batch.pending_count == len(case_ids)
+        return case_ids
+
+    def test_category_subtree_single_insert_select(self, db):
+        """测试分类子树筛选用一条 INSERT ... SELECT 生成任务用例"""
+        db.statements.clear()
+        result = BatchCreationService(db).create(BatchSelectionRequest(category_id=1, name="登录回归"))
+        inserts = [sql for sql in db.statements if sql.startswith("INSERT INTO batch_execution_test_case")]
+
+        assert self._case_ids(db, result) == [1, 2, 3]
+        assert len(inserts) == 1 and "SELECT" in inserts[0]
+        assert db.get(BatchExecution, result["batch_execution_id"]).name == "登录回归"
+
+        result = BatchCreationService(db).create(BatchSelectionRequest(category_id=1, include_children=False))
+        assert self._case_ids(db, result) == [1]
+
+    def test_filters(self, db):
+        """测试标签（任一匹配）、优先级和状态条件"""
+        service = BatchCreationService(db)
+
+        assert self._case_ids(db, service.create(BatchSelectionRequest(tags=["冒烟", "搜索"]))) == [1, 2, 4]
+        assert self._case_ids(db, service.create(BatchSelectionRequest(tags=["冒烟"], priority=["high"]))) == [1]
+        assert self._case_ids(db, service.create(BatchSelectionRequest(category_id=1, status=["active"]))) == [1, 2]
+
+        with pytest.raises(HTTPException) as error:
+            service.create(BatchSelectionRequest(tags=["不存在"]))
+        assert error.value.status_code == 400
+        assert db.scalar(select(BatchExecution.id).order_by(BatchExecution.id.desc())) == 3
+
+    def test_explicit_ids(self, db):
+        """测试指定用例ID按给定顺序写入并去重，不存在或已删除的ID整体失败"""
+        service = BatchCreationService(db)
+
+        assert self._case_ids(db, service.create(BatchSelectionRequest(test_case_ids=[4, 1, 4]))) == [4, 1]
+
+        with pytest.raises(HTTPException) as error:
+            service.create(BatchSelectionRequest(test_case_ids=[1, 5, 99]))
+        assert error.value.status_code == 404 and "[5, 99]" in error.value.detail
+        assert db.scalar(select(BatchExecution.id).order_by(BatchExecution.id.desc())) == 1
+
+    def test_invalid_selection(self, db):
+        """测试缺少条件、ID与筛选条件混用、空列表筛选条件、分类不存在"""
+        service = BatchCreationService(db)
+        for request, status_code in (
+            (BatchSelectionRequest(), 400),
+            (BatchSelectionRequest(test_case_ids=[1], category_id=1), 400),
+            (BatchSelectionRequest(tags=[]), 400),
+            (BatchSelectionRequest(category_id=1, priority=[]), 400),
+            (BatchSelectionRequest(category_id=99), 404),
+        ):
+            with pytest.raises(HTTPException) as error:
+                service.create(request)
+            assert error.value.status_code == status_code
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
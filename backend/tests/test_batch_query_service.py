@@ -0,0 +1,71 @@
+"""
+测试批量执行任务详情的关联查询
+"""
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from src.autotest.database import Base, BatchExecution, BatchExecutionTestCase, TestCase, TestExecution
+from src.autotest.services.batch_query_service import BatchQueryService
+
+
+class TestBatchQueryService:
+    """测试批量执行任务查询服务"""
+
+    @pytest.fixture
+    def engine(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            batch = BatchExecution(name="批量", total_count=30)
+            session.add(batch)
+            session.flush()
+            for index in range(30):
+                test_case = TestCase(name=f"登录 {index}" if index % 2 else f"下单 {index}", task_content="步骤")
+                session.add(test_case)
+                session.flush()
+                execution = None
+                if index % 3 == 0:
+                    execution = TestExecution(test_case_id=test_case.id, status="failed", overall_status="FAILED", error_message=f"错误 {index}")
+                    session.add(execution)
+                    session.flush()
+                session.add(BatchExecutionTestCase(
+                    batch_execution_id=batch.id, test_case_id=test_case.id,
+                    execution_id=execution.id if execution else None, status="completed"
+                ))
+            # 引用已不存在的测试用例
+            session.add(BatchExecutionTestCase(batch_execution_id=batch.id, test_case_id=9999, status="pending"))
+            session.commit()
+        return engine
+
+    @pytest.fixture
+    def statements(self, engine):
+        executed = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: executed.append(statement))
+        return executed
+
+    def test_details_in_single_query(self, engine, statements):
+        """测试用例详情只用一条查询获取，不随行数增长"""
+        with Session(engine) as session:
+            rows = [BatchQueryService.to_dict(row) for row in session.execute(BatchQueryService.test_case_details_query(1))]
+
+        assert len(statements) == 1
+        assert len(rows) == 31
+        assert rows[0]["test_case_name"] == "下单 0"
+        assert (rows[0]["overall_status"], rows[0]["error_message"]) == ("FAILED", "错误 0")
+        assert rows[1]["overall_status"] is None
+        assert rows[-1]["test_case_name"] == "未知测试用例"
+
+    def test_search_is_pushed_into_sql(self, engine, statements):
+        """测试搜索通过关联在 SQL 中过滤，分页和计数一致"""
+        with Session(engine) as session:
+            total = session.scalar(BatchQueryService.test_case_count_query(1, "登录"))
+            rows = session.execute(BatchQueryService.test_case_details_query(1, "登录").offset(5).limit(5)).all()
+
+        assert len(statements) == 2
+        assert total == 15
+        assert [row.test_case_name for row in rows] == [f"登录 {index}" for index in range(11, 21, 2)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,201 @@
+"""
+测试批量执行的会话隔离与工作单元
+"""
+
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.autotest import test_executor as executor_module
+from src.autotest.batch_progress import BatchProgress, counter_fields_from_counts
+from src.autotest.database import Base, BatchExecution, BatchExecutionTestCase, TestCase, TestExecution
+from src.autotest.services import execution_service as execution_module
+from src.autotest.services.execution_service import ExecutionService
+from src.autotest.test_executor import BatchTestExecutor, task_context
+
+
+class TestBatchUnitOfWork:
+    """测试批量执行的数据库写入"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """同步引擎，用于准备数据和断言"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        for index in range(3):
+            session.add(TestCase(name=f"用例 {index}", task_content="打开首页", status="active"))
+        session.commit()
+        session.close()
+        return engine
+
+    @pytest.fixture
+    def async_engine(self, tmp_path, engine, monkeypatch):
+        """批量执行器使用的异步引擎"""
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'batch.db'}", poolclass=NullPool)
+        monkeypatch.setattr(executor_module, "AsyncWriterSessionLocal", async_sessionmaker(async_engine, expire_on_commit=False))
+        monkeypatch.setattr(executor_module.websocket_manager, "broadcast_batch_update", AsyncMock())
+        return async_engine
+
+    @pytest.fixture
+    def sessions(self, async_engine, monkeypatch):
+        """记录创建的会话"""
+        created = []
+        factory = executor_module.AsyncWriterSessionLocal
+
+        def tracking_factory():
+            session = factory()
+            created.append(session)
+            return session
+
+        monkeypatch.setattr(executor_module, "AsyncWriterSessionLocal", tracking_factory)
+        return created
+
+    async def _create_batch(self, engine, executor):
+        """创建只含一个待执行用例的批量任务，并注册到任务上下文"""
+        session = sessionmaker(bind=engine)()
+        batch_execution = BatchExecution(name="批量", status="running", total_count=1, pending_count=1)
+        session.add(batch_execution)
+        session.flush()
+        batch_test_case = BatchExecutionTestCase(batch_execution_id=batch_execution.id, test_case_id=1, status="pending")
+        session.add(batch_test_case)
+        session.commit()
+        batch_id, batch_test_case_id = batch_execution.id, batch_test_case.id
+        session.close()
+        await executor.register_to_context(batch_id)
+        executor.progress = BatchProgress(1, {"pending": 1})
+        return batch_id, batch_test_case_id
+
+    def _query(self, engine, model):
+        session = sessionmaker(bind=engine)()
+        try:
+            return session.query(model).order_by(model.id).all()
+        finally:
+            session.close()
+
+    @pytest.mark.asyncio
+    async def test_each_case_uses_its_own_session(self, engine, sessions):
+        """测试每个用例使用独立会话，执行记录在开始事务中预先创建"""
+        executor = BatchTestExecutor(max_concurrent=3)
+
+        async def fake_execute(test_case_id, headless, batch_execution_id, execution_id):
+            return {"success": test_case_id != 2, "execution_id": execution_id}
+
+        executor.test_executor.execute_test_case = AsyncMock(side_effect=fake_execute)
+
+        result = await executor.execute_batch_test([1, 2, 3], headless=True)
+
+        assert result["success"] is True
+        assert (result["success_count"], result["failed_count"]) == (2, 1)
+        # 准备 1 个 + 每个用例开始和结束各 1 个 + 收尾 1 个
+        assert len(sessions) == 1 + 3 * 2 + 1
+        assert not task_context.is_batch_registered(result["batch_execution_id"])
+
+        batch_test_cases = self._query(engine, BatchExecutionTestCase)
+        executions = self._query(engine, TestExecution)
+        assert [case.status for case in batch_test_cases] == ["completed", "failed", "completed"]
+        assert sorted(case.execution_id for case in batch_test_cases) == [execution.id for execution in executions]
+
+        batch_execution = self._query(engine, BatchExecution)[0]
+        assert (batch_execution.status, batch_execution.running_count, batch_execution.pending_count) == ("completed", 0, 0)
+
+    @pytest.mark.asyncio
+    async def test_case_start_and_finish_commit_once(self, engine, async_engine):
+        """测试用例开始和结束各只提交一次"""
+        commits = []
+        event.listen(async_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+        executor = BatchTestExecutor()
+        executor.test_executor.execute_test_case = AsyncMock(side_effect=lambda *args: {"success": True, "execution_id": args[3]})
+        batch_id, batch_test_case_id = await self._create_batch(engine, executor)
+        commits.clear()
+
+        await executor._execute_single_test_in_batch(batch_id, batch_test_case_id, 1, True)
+        await executor.unregister_from_context()
+
+        assert len(commits) == 2
+        batch_execution = self._query(engine, BatchExecution)[0]
+        assert (batch_execution.success_count, batch_execution.pending_count) == (1, 0)
+
+    @pytest.mark.asyncio
+    async def test_progress_counters_replace_count_queries(self, engine, async_engine):
+        """测试用例状态迁移不再统计查询，每次迁移只写一条批量任务 UPDATE"""
+        statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        executor = BatchTestExecutor()
+        executor.test_executor.execute_test_case = AsyncMock(side_effect=lambda *args: {"success": False, "execution_id": args[3]})
+        batch_id, batch_test_case_id = await self._create_batch(engine, executor)
+        statements.clear()
+
+        await executor._execute_single_test_in_batch(batch_id, batch_test_case_id, 1, True)
+        await executor.unregister_from_context()
+
+        assert not any("count(" in sql.lower() for sql in statements)
+        assert sum(1 for sql in statements if sql.startswith("UPDATE batch_execution ")) == 2
+        payload = executor_module.websocket_manager.broadcast_batch_update.call_args[0][1]
+        assert (payload["failed_count"], payload["running_count"], payload["pending_count"]) == (1, 0, 0)
+
+    def test_batch_progress_transition_and_reconcile(self):
+        """测试进度计数的状态迁移与对账"""
+        progress = BatchProgress(3, {"pending": 3})
+
+        progress.transition("pending", "running")
+        counters = progress.transition("running", "completed")
+        assert counters == {"success_count": 1, "failed_count": 0, "running_count": 0, "pending_count": 2}
+
+        drift = progress.reconcile({"completed": 1, "cancelled": 2})
+        assert drift == {"pending": -2, "cancelled": 2}
+        assert progress.counter_fields()["pending_count"] == 0
+        assert progress.counter_fields()["failed_count"] == 2
+
+    def test_cancelled_cases_count_as_failed(self):
+        """测试已取消的用例统一计入失败数，各计数之和等于用例总数"""
+        counters = counter_fields_from_counts({"completed": 2, "failed": 1, "cancelled": 3})
+
+        assert counters == {"success_count": 2, "failed_count": 4, "running_count": 0, "pending_count": 0}
+
+    @pytest.mark.asyncio
+    async def test_stop_recounts_cancelled_batch(self, engine, monkeypatch):
+        """测试停止接口按分组统计重算最终计数，而不是在已有计数上累加"""
+        monkeypatch.setattr(execution_module.batch_executor_manager, "cancel_executor", AsyncMock(return_value=False))
+        monkeypatch.setattr(execution_module.websocket_manager, "broadcast_batch_update", AsyncMock())
+        session = sessionmaker(bind=engine)()
+        try:
+            # 计数字段已被执行器写过一次失败，停止时不应重复累加
+            batch_execution = BatchExecution(name="批量", status="running", total_count=3, failed_count=1, running_count=1, pending_count=1)
+            session.add(batch_execution)
+            session.flush()
+            for test_case_id, status in ((1, "failed"), (2, "running"), (3, "pending")):
+                session.add(BatchExecutionTestCase(batch_execution_id=batch_execution.id, test_case_id=test_case_id, status=status))
+            session.commit()
+
+            result = await ExecutionService.stop_batch_execution(batch_execution.id, session)
+
+            session.refresh(batch_execution)
+            assert result["cancelled_count"] == 2
+            assert batch_execution.status == "cancelled"
+            assert (batch_execution.success_count, batch_execution.failed_count, batch_execution.running_count,
+                    batch_execution.pending_count) == (0, 3, 0, 0)
+        finally:
+            session.close()
+
+    @pytest.mark.asyncio
+    async def test_failure_creates_execution_record(self, engine, async_engine):
+        """测试开始前出错的用例补建失败执行记录"""
+        executor = BatchTestExecutor()
+        executor._start_batch_test_case = AsyncMock(side_effect=RuntimeError("数据库不可用"))
+        batch_id, batch_test_case_id = await self._create_batch(engine, executor)
+
+        await executor._execute_single_test_in_batch(batch_id, batch_test_case_id, 1, True)
+        await executor.unregister_from_context()
+
+        batch_test_case = self._query(engine, BatchExecutionTestCase)[0]
+        execution = self._query(engine, TestExecution)[0]
+        assert batch_test_case.status == "failed"
+        assert batch_test_case.execution_id == execution.id
+        assert execution.error_message == "数据库不可用"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
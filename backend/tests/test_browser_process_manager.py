@@ -0,0 +1,141 @@
+"""
+测试浏览器进程登记与孤儿进程回收
+"""
+
+import subprocess
+import sys
+import time
+import pytest
+import psutil
+from unittest.mock import patch
+from src.autotest.browser_process_manager import BrowserProcessRegistry
+from src.autotest.metrics import metrics_registry
+
+
+def _spawn_fake_browser(launch_args):
+    """启动一个带有启动标记的占位进程代替浏览器"""
+    return subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)", *launch_args])
+
+
+def _dead_pid():
+    """获取一个已退出的进程PID"""
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+class TestBrowserProcessRegistry:
+    """测试浏览器进程登记表"""
+
+    @pytest.fixture
+    def registry(self, tmp_path):
+        registry = BrowserProcessRegistry(registry_path=tmp_path / "browser_processes.json")
+        registry.TERMINATE_TIMEOUT = 1.0
+        return registry
+
+    @pytest.fixture
+    def fake_browser(self, registry):
+        launch_id, launch_args = registry.new_launch_args(["--no-sandbox"])
+        proc = _spawn_fake_browser(launch_args)
+        # 等待进程的命令行可见
+        for _ in range(50):
+            if registry._find_launched_process(launch_id):
+                break
+            time.sleep(0.02)
+        yield launch_id, proc
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+    def test_register_and_unregister(self, registry, fake_browser):
+        """测试登记和注销浏览器进程"""
+        launch_id, proc = fake_browser
+
+        entry = registry.register_launch(launch_id, execution_id=1)
+
+        assert entry["pid"] == proc.pid
+        assert registry.get_entries()[launch_id]["execution_id"] == 1
+
+        registry.unregister(launch_id)
+        assert launch_id not in registry.get_entries()
+
+    def test_reap_browser_of_finished_execution(self, registry, fake_browser):
+        """测试回收所属执行已结束的浏览器"""
+        launch_id, proc = fake_browser
+        registry.register_launch(launch_id, execution_id=1)
+        registry.REAP_GRACE_SECONDS = 0
+        reclaimed_before = metrics_registry.get_counter("browser_reaper.reclaimed_bytes")
+
+        with patch.object(BrowserProcessRegistry, "_load_active_execution_ids", return_value=set()):
+            report = registry.reap()
+
+        assert report["killed_browsers"] == 1
+        assert proc.wait(timeout=5) is not None
+        assert launch_id not in registry.get_entries()
+        assert metrics_registry.get_counter("browser_reaper.reclaimed_bytes") > reclaimed_before
+
+    def test_keep_browser_of_running_execution(self, registry, fake_browser):
+        """测试保留所属执行仍在运行的浏览器"""
+        launch_id, proc = fake_browser
+        registry.register_launch(launch_id, execution_id=1)
+        registry.REAP_GRACE_SECONDS = 0
+
+        with patch.object(BrowserProcessRegistry, "_load_active_execution_ids", return_value={1}):
+            report = registry.reap()
+
+        assert report["killed_browsers"] == 0
+        assert proc.poll() is None
+        assert launch_id in registry.get_entries()
+
+    def test_reap_leftover_from_dead_owner(self, registry, fake_browser):
+        """测试回收上次运行遗留（登记进程已退出）的浏览器"""
+        launch_id, proc = fake_browser
+        registry.register_launch(launch_id, execution_id=1)
+        entries = registry.get_entries()
+        entries[launch_id]["owner_pid"] = _dead_pid()
+        registry._save(entries)
+
+        report = registry.reap(startup=True)
+
+        assert report["killed_browsers"] == 1
+        assert proc.wait(timeout=5) is not None
+
+    def test_startup_reaps_untracked_marked_process(self, registry):
+        """测试启动时回收带有标记、未登记且所属服务进程已退出的浏览器"""
+        _, launch_args = registry.new_launch_args(["--no-sandbox"], owner_pid=_dead_pid())
+        proc = _spawn_fake_browser(launch_args)
+        try:
+            for _ in range(50):
+                if any(proc.pid == candidate.pid for candidate in registry._scan_untracked(set())):
+                    break
+                time.sleep(0.02)
+
+            report = registry.reap(startup=True)
+
+            assert report["killed_browsers"] >= 1
+            assert proc.wait(timeout=5) is not None
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    def test_startup_keeps_untracked_process_of_live_owner(self, registry, fake_browser):
+        """测试所属服务进程仍存活的未登记浏览器不会被回收"""
+        launch_id, proc = fake_browser
+
+        registry.reap(startup=True)
+
+        assert proc.poll() is None
+
+    def test_owner_pid_reuse_counts_as_gone(self, registry):
+        """测试所属进程PID已被晚于浏览器启动的进程复用时视为已退出"""
+        owner_create_time = psutil.Process().create_time()
+
+        assert not registry._is_owner_gone(psutil.Process().pid, owner_create_time + 10)
+        assert registry._is_owner_gone(psutil.Process().pid, owner_create_time - 10)
+        assert registry._is_owner_gone(_dead_pid(), owner_create_time)
+        assert not registry._is_owner_gone(None, owner_create_time)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+"""
+测试测试用例批量操作
+"""
+
+import time
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from src.autotest.database import Base, Category, TestCase
+from src.autotest.services.bulk_service import BulkTestCaseService
+
+
+class TestBulkTestCaseService:
+    """测试批量新增、修改、删除"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+        Base.metadata.create_all(engine)
+        return engine
+
+    @pytest.fixture
+    def db(self, engine):
+        session = sessionmaker(bind=engine)()
+        session.add(Category(id=1, name="登录"))
+        session.commit()
+        yield session
+        session.close()
+
+    def _count_statements(self, engine):
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        return statements
+
+    def test_create_reports_per_item_results(self, engine, db):
+        """测试校验失败的项单独报告，其余项一次写入"""
+        statements = self._count_statements(engine)
+        result = BulkTestCaseService(db).create([
+            {"name": "登录", "task_content": "打开登录页", "category_id": 1},
+            {"name": "缺少任务内容"},
+            {"name": "分类不存在", "task_content": "无", "category_id": 99},
+            {"name": "搜索", "task_content": "输入关键词", "tags": ["搜索"]},
+        ])
+
+        assert (result.succeeded, result.failed) == (2, 2)
+        assert [item.success for item in result.results] == [True, False, False, True]
+        assert "task_content" in result.results[1].error
+        assert result.results[2].error == "分类不存在: 99"
+        assert [(case.id, case.name, case.tags) for case in db.query(TestCase).order_by(TestCase.id)] == [
+            (result.results[0].id, "登录", None), (result.results[3].id, "搜索", ["搜索"])
+        ]
+        assert len([sql for sql in statements if sql.startswith("INSERT INTO test_case ")]) == 1
+
+    def test_atomic_create(self, db):
+        """测试 atomic 模式下任一项失败则全部不写入"""
+        result = BulkTestCaseService(db).create([{"name": "登录", "task_content": "打开登录页"}, {"name": "缺少任务内容"}], atomic=True)
+
+        assert (result.succeeded, result.failed) == (0, 2)
+        assert result.results[0].error == "其他项校验失败，未执行"
+        assert db.query(TestCase).count() == 0
+
+    def test_update(self, db):
+        """测试按主键批量更新，修改操作步骤时清除 history 缓存"""
+        service = BulkTestCaseService(db)
+        ids = [item.id for item in service.create([{"name": f"用例 {index}", "task_content": "步骤"} for index in range(3)]).results]
+        db.execute(TestCase.__table__.update().values(history_path="history/1.json"))
+        db.commit()
+
+        result = service.update([
+            {"id": ids[0], "status": "inactive"},
+            {"id": ids[1], "task_content": "新的步骤", "priority": "high"},
+            {"id": ids[1], "status": "draft"},
+            {"id": 999, "status": "draft"},
+            {"id": ids[2], "task_content": "步骤"},
+        ])
+
+        assert [item.success for item in result.results] == [True, True, False, False, True]
+        assert result.results[2].error == "同一测试用例在请求中重复出现"
+        rows = db.execute(select(TestCase.status, TestCase.priority, TestCase.task_content, TestCase.history_path).order_by(TestCase.id)).all()
+        assert [tuple(row) for row in rows] == [
+            ("inactive", "medium", "步骤", "history/1.json"),
+            ("active", "high", "新的步骤", None),
+            ("active", "medium", "步骤", "history/1.json"),
+        ]
+
+    def test_delete(self, db):
+        """测试批量软删除，不存在和已删除的项单独报告"""
+        service = BulkTestCaseService(db)
+        ids = [item.id for item in service.create([{"name": f"用例 {index}", "task_content": "步骤"} for index in range(3)]).results]
+        service.delete([ids[0]])
+
+        result = service.delete([ids[0], ids[1], ids[2], ids[2]])
+
+        assert [item.success for item in result.results] == [False, True, True, False]
+        assert db.query(TestCase).filter(TestCase.is_deleted == False).count() == 0
+
+    def test_ten_thousand_rows(self, db):
+        """测试 1 万条数据的新增、修改、删除"""
+        service = BulkTestCaseService(db)
+        started = time.perf_counter()
+        created = service.create([{"name": f"用例 {index}", "task_content": "步骤", "category_id": 1} for index in range(10000)])
+        ids = [item.id for item in created.results]
+        updated = service.update([{"id": test_case_id, "status": "inactive"} for test_case_id in ids])
+        deleted = service.delete(ids)
+        elapsed = time.perf_counter() - started
+
+        assert (created.succeeded, updated.succeeded, deleted.succeeded) == (10000, 10000, 10000)
+        assert db.query(TestCase).filter(TestCase.status == "inactive", TestCase.is_deleted == True).count() == 10000
+        assert elapsed < 10
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,111 @@
+"""
+测试分类闭包表的维护与子树查询
+"""
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from src.autotest.database import Base, Category, CategoryClosure, TestCase
+from src.autotest.migrations import build_category_closure
+from src.autotest.models import CategoryCreate, CategoryUpdate
+from src.autotest.services.category_service import CategoryService
+
+
+class TestCategoryClosure:
+    """测试分类层级"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'category.db'}")
+        Base.metadata.create_all(engine)
+        return engine
+
+    @pytest.fixture
+    def db(self, engine):
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
+    @pytest.fixture
+    def tree(self, db):
+        """根 -> 子 -> 孙，以及另一个根；每个分类下一个用例"""
+        service = CategoryService(db)
+        root = service.create_category(CategoryCreate(name="根"))
+        child = service.create_category(CategoryCreate(name="子", parent_id=root.id))
+        grandchild = service.create_category(CategoryCreate(name="孙", parent_id=child.id))
+        other = service.create_category(CategoryCreate(name="其他"))
+        for category in (root, child, grandchild, other):
+            db.add(TestCase(name=f"{category.name}用例", task_content="打开首页", category_id=category.id))
+        db.commit()
+        return {"root": root.id, "child": child.id, "grandchild": grandchild.id, "other": other.id}
+
+    def _closure(self, db):
+        return sorted(db.execute(select(CategoryClosure.ancestor_id, CategoryClosure.descendant_id, CategoryClosure.depth)).all())
+
+    def _count_queries(self, engine):
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        return statements
+
+    def test_subtree_queries(self, db, tree):
+        """测试子树用例、子树用例数和树结构"""
+        service = CategoryService(db)
+
+        assert sorted(service.get_category_test_cases(tree["root"])) == [1, 2, 3]
+        assert service.get_category_test_cases(tree["root"], include_children=False) == [1]
+        assert sorted(service._get_all_descendant_ids(tree["root"])) == [tree["child"], tree["grandchild"]]
+
+        root = service.get_category(tree["root"])
+        assert (root.test_case_count, root.total_test_case_count) == (1, 3)
+        subtree = service.get_category_with_children(tree["child"])
+        assert [(subtree.name, subtree.total_test_case_count), [(c.name, c.total_test_case_count) for c in subtree.children]] == [
+            ("子", 2), [("孙", 1)]
+        ]
+
+    def test_tree_uses_constant_queries(self, engine, db, tree):
+        """测试分类树只需一次分类查询和一次分组统计"""
+        for index in range(30):
+            CategoryService(db).create_category(CategoryCreate(name=f"叶子 {index}", parent_id=tree["grandchild"]))
+        statements = self._count_queries(engine)
+
+        roots = CategoryService(db).get_category_tree()
+
+        assert len(statements) == 2
+        assert [(root.name, root.total_test_case_count) for root in roots] == [("其他", 1), ("根", 3)]
+        assert len(roots[1].children[0].children[0].children) == 30
+
+    @pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+    def test_move_and_cycle_check(self, db, tree):
+        """测试移动子树更新闭包和层级，不能移动到自己的子树下"""
+        service = CategoryService(db)
+
+        with pytest.raises(ValueError, match="循环"):
+            service.update_category(tree["root"], CategoryUpdate(parent_id=tree["grandchild"]))
+
+        moved = service.update_category(tree["child"], CategoryUpdate(parent_id=tree["other"]))
+
+        assert (moved.parent_id, moved.level, moved.total_test_case_count) == (tree["other"], 1, 2)
+        assert db.get(Category, tree["grandchild"]).level == 2
+        assert sorted(service.get_category_test_cases(tree["other"])) == [2, 3, 4]
+        assert service.get_category_test_cases(tree["root"]) == [1]
+
+        # 增量维护的闭包与按 parent_id 重建的结果一致
+        maintained = self._closure(db)
+        build_category_closure(db.connection())
+        assert self._closure(db) == maintained
+
+    def test_force_delete_cascades(self, db, tree):
+        """测试强制删除标记整个子树删除，并清空子树下用例的分类"""
+        service = CategoryService(db)
+        with pytest.raises(ValueError):
+            service.delete_category(tree["root"])
+
+        assert service.delete_category(tree["root"], force=True)
+
+        assert [category.name for category in db.query(Category).filter(Category.is_deleted == False)] == ["其他"]
+        assert [case.category_id for case in db.query(TestCase).order_by(TestCase.id)] == [None, None, None, tree["other"]]
+        assert [root.name for root in service.get_category_tree()] == ["其他"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
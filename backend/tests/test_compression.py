@@ -0,0 +1,91 @@
+"""
+测试响应压缩中间件和 JSON 序列化
+"""
+
+import gzip
+import json
+import zlib
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+from src.autotest.compression import CompressionMiddleware, choose_encoding
+from src.autotest.responses import FastJSONResponse, dumps
+
+
+class TestCompression:
+    """测试响应压缩"""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+        @app.get("/large")
+        async def large():
+            return FastJSONResponse([{"step": index, "status": "PASSED"} for index in range(200)])
+
+        @app.get("/small")
+        async def small():
+            return {"ok": True}
+
+        @app.get("/image")
+        async def image():
+            return Response(b"\x89PNG" * 100, media_type="image/png")
+
+        @app.get("/stream")
+        async def stream():
+            async def chunks():
+                for index in range(3):
+                    yield f"第 {index} 行\n".encode("utf-8") * 50
+            return StreamingResponse(chunks(), media_type="text/csv")
+
+        return TestClient(app)
+
+    def test_compresses_large_json(self, client):
+        """测试超过阈值的 JSON 响应被 gzip 压缩"""
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(response.content)
+        assert response.json()[199] == {"step": 199, "status": "PASSED"}
+
+    def test_skips_small_binary_and_unaccepted(self, client):
+        """测试小响应、图片和不接受压缩的客户端不压缩"""
+        assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+        assert "content-encoding" not in client.get("/image", headers={"Accept-Encoding": "gzip"}).headers
+        assert "content-encoding" not in client.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+    def test_streaming_response(self, client):
+        """测试流式响应逐块压缩，解压后内容完整"""
+        with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            assert response.headers["content-encoding"] == "gzip"
+            assert "content-length" not in response.headers
+            raw = b"".join(response.iter_raw())
+
+        expected = "".join(f"第 {index} 行\n" * 50 for index in range(3))
+        assert gzip.decompress(raw).decode("utf-8") == expected
+        # 每块都做了同步刷新，第一块数据单独即可解压
+        first_block = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(raw[:len(raw) // 2])
+        assert first_block.decode("utf-8", errors="ignore").startswith("第 0 行")
+
+    def test_choose_encoding(self):
+        """测试 Accept-Encoding 解析"""
+        assert choose_encoding("gzip, deflate") == "gzip"
+        assert choose_encoding("gzip;q=0, deflate") is None
+        assert choose_encoding("*") in ("br", "gzip")
+        assert choose_encoding("") is None
+
+    def test_dumps_matches_default_encoder(self):
+        """测试 orjson 序列化结果与默认编码器一致"""
+        content = {"name": "登录", "started_at": datetime(2024, 1, 2, 3, 4, 5, 6000), "actions": [{"click": 1}], "duration": None}
+
+        assert json.loads(dumps(content)) == jsonable_encoder(content)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
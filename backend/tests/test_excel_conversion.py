@@ -0,0 +1,72 @@
+"""
+测试 Excel 规则转换和标准模版解析
+"""
+
+import pandas as pd
+import pytest
+from src.autotest.services.excel_template_service import ExcelTemplateService
+from src.autotest.services.excel_utils import convert_excel_to_test_cases
+
+
+class TestExcelConversion:
+    """测试按列向量化的转换逻辑"""
+
+    def test_convert_rules(self):
+        """测试列名别名、分类/优先级/状态按规则顺序取第一个命中项、标签按关键词生成"""
+        df = pd.DataFrame({
+            "名称": ["会员首页核心流程", "组合商品草稿", "普通用例"],
+            "Task": ["搜索后删除", "登录 审核 发布", "打开页面"],
+            "期望结果": ["成功", "", 1],
+        })
+
+        cases = convert_excel_to_test_cases(df, {"defaultCategory": "默认", "defaultStatus": "inactive"})
+
+        assert [(case["category"], case["priority"], case["status"]) for case in cases] == [
+            ("会员管理", "critical", "inactive"), ("组合商品功能", "medium", "draft"), ("默认", "medium", "inactive")
+        ]
+        assert [case["tags"] for case in cases] == [["搜索功能", "删除功能"], ["登录功能", "审核功能", "发布功能"], []]
+        assert [case["expected_result"] for case in cases] == ["成功", "", "1"]
+
+    def test_convert_without_name_column(self):
+        """测试没有名称列时按行序号命名，空表返回空列表"""
+        df = pd.DataFrame({"内容": ["步骤一", "步骤二"]}, index=[10, 11])
+
+        assert [case["name"] for case in convert_excel_to_test_cases(df, {})] == ["测试用例_1", "测试用例_2"]
+        assert convert_excel_to_test_cases(df.iloc[:0], {}) == []
+
+    def test_parse_standard_template_rows(self):
+        """测试逐行错误列表，错误行号与表格行号一致，缺少可选列时使用默认值"""
+        df = pd.DataFrame({
+            "测试用例名称": ["登录", "", "搜索", "下单"],
+            "测试步骤": ["打开登录页", "", " ", "提交订单"],
+            "预期结果": ["成功", "", None, "生成订单"],
+            "优先级": ["HIGH", "", "low", "urgent"],
+        }, index=[100, 101, 102, 103])
+
+        test_cases, errors = ExcelTemplateService.parse_standard_template_rows(df)
+
+        assert [(case["name"], case["priority"], case["tags"], case["category"], case["status"]) for case in test_cases] == [
+            ("登录", "high", [], "导入", "active"), ("下单", "medium", [], "导入", "active")
+        ]
+        assert errors == [{"row": 104, "errors": ["测试步骤不能为空", "预期结果不能为空"], "message": "第104行：测试步骤不能为空；预期结果不能为空"}]
+        with pytest.raises(ValueError, match="第104行"):
+            ExcelTemplateService.parse_standard_template(df)
+
+    def test_parse_standard_template_tags(self):
+        """测试标签拆分去掉空白和空项"""
+        df = pd.DataFrame({
+            "测试用例名称": ["登录", "搜索"],
+            "测试步骤": ["步骤", "步骤"],
+            "预期结果": ["结果", "结果"],
+            "标签": [" 登录功能, 核心流程,,", None],
+            "分类": [" 用户管理 ", None],
+        })
+
+        test_cases = ExcelTemplateService.parse_standard_template(df)
+
+        assert [case["tags"] for case in test_cases] == [["登录功能", "核心流程"], []]
+        assert [case["category"] for case in test_cases] == ["用户管理", "导入"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,127 @@
+"""
+测试流式数据导出
+"""
+
+import csv
+import io
+import json
+import threading
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+from openpyxl import load_workbook
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, Category, TestCase, TestExecution, TestStep
+from src.autotest.migrations import build_category_closure
+from src.autotest.services import export_service as export_module
+from src.autotest.services.export_service import ExportService
+
+
+class TestExportService:
+    """测试数据导出"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        """登录（含子分类“登录-短信”）和搜索两个分类，每个用例两次执行"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add_all([
+                Category(id=1, name="登录", level=0),
+                Category(id=2, name="登录-短信", parent_id=1, level=1),
+                Category(id=3, name="搜索", level=0),
+            ])
+            session.flush()
+            build_category_closure(session.connection())
+            for case_id, category_id in ((1, 1), (2, 2), (3, 3)):
+                session.add(TestCase(id=case_id, name=f"用例 {case_id}", task_content="打开首页\n点击,登录", category_id=category_id))
+                for day, status in ((1, "passed"), (2, "failed")):
+                    created = datetime(2024, 5, day, 12, 0)
+                    session.add(TestExecution(test_case_id=case_id, status=status, started_at=created, created_at=created,
+                                              error_message="\x1b[31m超时\x1b[0m" if status == "failed" else None))
+            session.add(TestCase(name="已删除", task_content="无", category_id=1, is_deleted=True))
+            session.flush()
+            session.add(TestStep(execution_id=1, step_name="打开首页", step_order=1, status="PASSED", started_at=datetime(2024, 5, 1)))
+            session.commit()
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'export.db'}", poolclass=NullPool)
+        return ExportService(async_sessionmaker(async_engine))
+
+    async def _collect(self, service, dataset, export_format, **filters):
+        export = service.get_dataset(dataset)
+        chunks = [chunk async for chunk in service.export(export, service.build_query(export, **filters), export_format)]
+        return chunks, b"".join(chunks)
+
+    @pytest.mark.asyncio
+    async def test_ndjson_filters(self, service):
+        """测试按分类子树、日期和状态过滤"""
+        _, body = await self._collect(service, "executions", "ndjson", category_id=1, start_date=date(2024, 5, 2),
+                                      end_date=date(2024, 5, 2), status="failed")
+        rows = [json.loads(line) for line in body.splitlines()]
+
+        assert [(row["test_case_id"], row["status"], row["created_at"]) for row in rows] == [
+            (1, "failed", "2024-05-02T12:00:00"), (2, "failed", "2024-05-02T12:00:00")
+        ]
+
+        _, cases = await self._collect(service, "test_cases", "ndjson", category_id=1)
+        assert [json.loads(line)["name"] for line in cases.splitlines()] == ["用例 1", "用例 2"]
+
+        _, steps = await self._collect(service, "steps", "ndjson", category_id=3)
+        assert steps == b""
+
+    @pytest.mark.asyncio
+    async def test_csv_streams_in_chunks(self, service, monkeypatch):
+        """测试 CSV 分批输出，内容中的换行和逗号正确转义"""
+        monkeypatch.setattr(export_module, "EXPORT_CHUNK_SIZE", 2)
+
+        chunks, body = await self._collect(service, "test_cases", "csv")
+        rows = list(csv.reader(io.StringIO(body.decode("utf-8-sig"))))
+
+        # 表头 + 3 个用例，每批 2 行
+        assert len(chunks) == 3
+        assert rows[0][:3] == ["id", "name", "task_content"]
+        assert [row[2] for row in rows[1:]] == ["打开首页\n点击,登录"] * 3
+
+    @pytest.mark.asyncio
+    async def test_xlsx(self, service):
+        """测试 XLSX 导出，去掉 Excel 不允许的控制字符"""
+        _, body = await self._collect(service, "executions", "xlsx", status="failed")
+        sheet = load_workbook(io.BytesIO(body), read_only=True).worksheets[0]
+        rows = list(sheet.iter_rows(values_only=True))
+
+        assert rows[0][:4] == ("id", "test_case_id", "execution_name", "status")
+        assert len(rows) == 4
+        assert rows[1][10] == "[31m超时[0m"
+
+    @pytest.mark.asyncio
+    async def test_xlsx_rows_written_off_event_loop(self, service, monkeypatch):
+        """测试 XLSX 的行在工作线程中写入，超过工作表行数上限时写入新的工作表"""
+        monkeypatch.setattr(export_module, "XLSX_ROWS_PER_SHEET", 4)
+        threads = []
+        append_rows = export_module.XlsxSheetWriter.append_rows
+
+        def record_thread(writer, rows):
+            threads.append(threading.get_ident())
+            append_rows(writer, rows)
+
+        monkeypatch.setattr(export_module.XlsxSheetWriter, "append_rows", record_thread)
+
+        _, body = await self._collect(service, "executions", "xlsx")
+        sheets = load_workbook(io.BytesIO(body), read_only=True).worksheets
+
+        assert threads and threading.get_ident() not in threads
+        assert [sheet.title for sheet in sheets] == ["执行记录1", "执行记录2"]
+        assert [len(list(sheet.iter_rows(values_only=True))) for sheet in sheets] == [5, 3]
+
+    def test_unknown_dataset(self):
+        """测试不支持的数据返回 404"""
+        with pytest.raises(HTTPException) as error:
+            ExportService.get_dataset("users")
+        assert error.value.status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,89 @@
+"""
+测试列表接口的字段投影
+"""
+
+import json
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, TestCase, TestExecution, TestStep
+from src.autotest.routers.test_executions import (
+    get_test_case_executions, get_test_execution_step, get_test_execution_steps, get_test_executions
+)
+from src.autotest.services.projection_service import STEP_PROJECTION
+
+
+class TestFieldProjection:
+    """测试字段投影"""
+
+    @pytest.fixture
+    def session_factory(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'projection.db'}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(TestCase(name="登录", task_content="登录"))
+            session.add(TestExecution(test_case_id=1, execution_name="执行", summary="很长的总结" * 100, recommendations="建议"))
+            session.add_all([
+                TestStep(execution_id=1, step_name=f"步骤 {order}", step_order=order, screenshot_data="base64" * 1000,
+                         memory="记忆", actions=[{"click": order}])
+                for order in (2, 1)
+            ])
+            session.commit()
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'projection.db'}", poolclass=NullPool)
+        statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        factory = async_sessionmaker(async_engine)
+        factory.statements = statements
+        return factory
+
+    @pytest.mark.asyncio
+    async def test_step_list_excludes_heavy_fields(self, session_factory):
+        """测试步骤列表默认不查询大字段，单个步骤接口返回完整信息"""
+        async with session_factory() as db:
+            steps = json.loads((await get_test_execution_steps(1, db=db)).body)
+            step = await get_test_execution_step(1, steps[0]["id"], db=db)
+
+        assert [item["step_name"] for item in steps] == ["步骤 1", "步骤 2"]
+        assert not {"screenshot_data", "memory", "actions"} & set(steps[0])
+        assert "screenshot_data" not in session_factory.statements[0]
+        assert (step.memory, step.actions) == ("记忆", [{"click": 1}])
+
+    @pytest.mark.asyncio
+    async def test_fields_and_exclude(self, session_factory):
+        """测试 fields 只查询指定列，exclude 传空字符串返回全部字段"""
+        async with session_factory() as db:
+            steps = json.loads((await get_test_execution_steps(1, fields="step_name,status", db=db)).body)
+            full = json.loads((await get_test_execution_steps(1, exclude="", db=db)).body)
+
+        assert steps[0] == {"step_name": "步骤 1", "status": None}
+        select_clause = session_factory.statements[0].split("FROM")[0]
+        assert "step_name" in select_clause and "description" not in select_clause
+        assert full[0]["memory"] == "记忆"
+
+    @pytest.mark.asyncio
+    async def test_execution_lists(self, session_factory):
+        """测试执行记录列表默认不返回总结和建议，分页信息在响应体中返回"""
+        async with session_factory() as db:
+            listed = await get_test_executions(cursor="", limit=1, include_total=True, db=db)
+            history = json.loads((await get_test_case_executions(1, fields="id,summary", db=db)).body)
+
+        page = json.loads(listed.body)
+        executions = page["test_executions"]
+        assert executions[0]["execution_name"] == "执行"
+        assert "summary" not in executions[0] and "recommendations" not in executions[0]
+        assert (page["total"], page["skip"], page["limit"], page["next_cursor"]) == (1, 0, 1, None)
+        assert history == [{"id": 1, "summary": "很长的总结" * 100}]
+
+    def test_unknown_field(self):
+        """测试未知字段返回 400"""
+        with pytest.raises(HTTPException) as error:
+            STEP_PROJECTION.resolve(fields="step_name,password")
+        assert error.value.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
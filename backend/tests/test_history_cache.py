@@ -0,0 +1,174 @@
+"""
+测试内容寻址的 history 缓存
+"""
+
+import json
+import os
+import time
+import pytest
+from unittest.mock import patch
+from src.autotest.artifact_store import ArtifactStore, LocalFileSystemBackend
+from src.autotest.history_cache import HistoryCache
+from src.autotest.test_executor import CustomPromptCache
+
+
+class TestHistoryCache:
+    """测试 history 缓存"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "artifacts.json", max_bytes=10 * 1024 * 1024)
+
+    @pytest.fixture
+    def cache(self, tmp_path, store):
+        return HistoryCache(tmp_path / "history", store)
+
+    def _write_history(self, cache, key, content=None):
+        tmp_path = cache.temp_path(key)
+        tmp_path.write_text(json.dumps(content or {"history": []}), encoding="utf-8")
+        return tmp_path
+
+    def test_key_ignores_whitespace_differences(self):
+        """测试缓存键对空白和换行差异不敏感"""
+        key1 = HistoryCache.compute_key("1. 打开首页\r\n2. 点击登录 ", "显示登录页", "prompt")
+        key2 = HistoryCache.compute_key("1.  打开首页\n2. 点击登录\n", "显示登录页", "prompt")
+        assert key1 == key2
+
+    def test_key_changes_with_content_and_prompt(self):
+        """测试操作步骤、预期结果或提示词变化时缓存键变化"""
+        base = HistoryCache.compute_key("步骤", "结果", "prompt")
+        assert HistoryCache.compute_key("步骤2", "结果", "prompt") != base
+        assert HistoryCache.compute_key("步骤", "结果2", "prompt") != base
+        assert HistoryCache.compute_key("步骤", "结果", "prompt2") != base
+
+    def test_store_and_lookup_shared_entry(self, cache, store):
+        """测试内容相同的测试用例共享同一缓存项"""
+        key = HistoryCache.compute_key("步骤", "结果")
+
+        history_ref = cache.store_file(key, self._write_history(cache, key), test_case_id=1)
+        cache.store_file(key, self._write_history(cache, key), test_case_id=2)
+
+        digest = cache.lookup(key)
+        assert history_ref == f"artifact://{digest}"
+        assert cache.stats()["entries"] == 1
+        assert cache.stats()["shared_entries"] == 1
+        assert store.stats()["entries"] == 1
+
+    def test_index_persisted_across_instances(self, cache, tmp_path, store):
+        """测试索引持久化后新实例可直接命中"""
+        key = HistoryCache.compute_key("步骤", "结果")
+        cache.store_file(key, self._write_history(cache, key), test_case_id=1)
+
+        reloaded = HistoryCache(tmp_path / "history", store)
+        assert reloaded.lookup(key) is not None
+
+    def test_store_rejects_invalid_json(self, cache):
+        """测试写入时校验 JSON 格式"""
+        key = HistoryCache.compute_key("步骤", "结果")
+        tmp_path = cache.temp_path(key)
+        tmp_path.write_text("{broken", encoding="utf-8")
+
+        with pytest.raises(json.JSONDecodeError):
+            cache.store_file(key, tmp_path)
+        assert cache.lookup(key) is None
+
+    def test_lookup_misses_evicted_artifact(self, cache, store):
+        """测试 history 制品被淘汰后不再命中"""
+        key = HistoryCache.compute_key("步骤", "结果")
+        cache.store_file(key, self._write_history(cache, key))
+
+        store.delete(cache.lookup(key))
+
+        assert cache.lookup(key) is None
+
+    def test_materialize_restores_content(self, cache):
+        """测试还原出的 history 文件与原内容一致"""
+        key = HistoryCache.compute_key("步骤", "结果")
+        cache.store_file(key, self._write_history(cache, key, {"history": [1, 2, 3]}))
+
+        path = cache.materialize(key)
+
+        assert json.loads(path.read_text(encoding="utf-8")) == {"history": [1, 2, 3]}
+        path.unlink()
+
+    def test_lookup_respects_ttl(self, cache):
+        """测试过期缓存不再命中"""
+        key = HistoryCache.compute_key("步骤", "结果")
+        cache.store_file(key, self._write_history(cache, key))
+        cache._index[key]["stored_at"] = time.time() - cache.ttl_seconds - 1
+
+        assert cache.lookup(key) is None
+
+    def test_invalidate_and_remove_expired(self, cache):
+        """测试失效和过期清理会删除文件"""
+        key1 = HistoryCache.compute_key("步骤1", "结果")
+        key2 = HistoryCache.compute_key("步骤2", "结果")
+        cache.store_file(key1, self._write_history(cache, key1, {"history": [1]}))
+        cache.store_file(key2, self._write_history(cache, key2, {"history": [2]}))
+        digest1 = cache.lookup(key1)
+
+        assert cache.invalidate(key1)
+        assert not cache.store.exists(digest1)
+
+        cache._index[key2]["stored_at"] = 0
+        assert cache.remove_expired(max_days=30) == 1
+        assert cache.stats()["entries"] == 0
+
+    def test_invalidate_keeps_artifact_referenced_elsewhere(self, cache, store):
+        """测试失效时不删除仍被执行记录或其他缓存项引用的制品"""
+        key1 = HistoryCache.compute_key("步骤1", "结果")
+        key2 = HistoryCache.compute_key("步骤2", "结果")
+        cache.store_file(key1, self._write_history(cache, key1, {"history": [1]}))
+        cache.store_file(key2, self._write_history(cache, key2, {"history": [1]}))
+        digest = cache.lookup(key1)
+
+        assert cache.invalidate(key1)
+        assert store.exists(digest)
+        assert cache.invalidate(key2)
+        assert not store.exists(digest)
+
+        key3 = HistoryCache.compute_key("步骤3", "结果")
+        cache.store_file(key3, self._write_history(cache, key3, {"history": [3]}), execution_id=7)
+        digest = cache.lookup(key3)
+        cache._index[key3]["stored_at"] = 0
+        assert cache.remove_expired(max_days=30) == 1
+        assert store.exists(digest)
+
+    def test_existing_entries_are_retained_on_load(self, cache, store, tmp_path):
+        """测试加载索引时为已有缓存项登记引用"""
+        key = HistoryCache.compute_key("步骤", "结果")
+        cache.store_file(key, self._write_history(cache, key))
+        digest = cache.lookup(key)
+        # 模拟引用计数之前写入的制品索引项
+        store._index[digest]["holders"] = []
+
+        HistoryCache(tmp_path / "history", store).lookup(key)
+
+        assert store.get_metadata(digest)["holders"] == [HistoryCache.holder(key)]
+
+
+class TestCustomPromptCache:
+    """测试自定义提示词缓存"""
+
+    def test_reload_only_when_file_changes(self, tmp_path):
+        """测试配置文件未变化时不重复读取，修改后重新读取"""
+        config_path = tmp_path / "prompt_config.json"
+        config_path.write_text(json.dumps({"custom_prompt": "第一版"}), encoding="utf-8")
+        cache = CustomPromptCache(config_path)
+
+        with patch("src.autotest.test_executor.json.load", wraps=json.load) as load:
+            assert [cache.get() for _ in range(3)] == ["第一版"] * 3
+            assert load.call_count == 1
+
+            config_path.write_text(json.dumps({"custom_prompt": "第二版"}), encoding="utf-8")
+            stat = config_path.stat()
+            os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            assert cache.get() == "第二版"
+            assert load.call_count == 2
+
+        config_path.unlink()
+        assert cache.get() == ""
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
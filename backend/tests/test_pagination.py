@@ -0,0 +1,113 @@
+"""
+测试游标分页与维护的计数器
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, EntityCounter, TestCase, TestExecution
+from src.autotest.migrations import run_migrations
+from src.autotest.services.pagination_service import PaginationService
+
+
+class TestPagination:
+    """测试游标分页"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """同步引擎，已执行迁移并准备数据"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'pagination.db'}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(TestCase(name="用例", task_content="打开首页"))
+            session.flush()
+            # 前 4 条创建时间相同，验证以 id 区分先后
+            created_at = datetime(2025, 1, 1, 12, 0, 0)
+            for index in range(7):
+                session.add(TestExecution(
+                    test_case_id=1, status="passed",
+                    created_at=created_at if index < 4 else created_at + timedelta(minutes=index)
+                ))
+            session.commit()
+        run_migrations(engine)
+        return engine
+
+    @pytest.fixture
+    def session_factory(self, tmp_path, engine):
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'pagination.db'}", poolclass=NullPool)
+        return async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def _counter(self, engine, name):
+        with Session(engine) as session:
+            return session.scalar(select(EntityCounter.value).where(EntityCounter.name == name))
+
+    @pytest.mark.asyncio
+    async def test_keyset_pages_cover_all_rows_once(self, session_factory):
+        """测试游标逐页遍历不重复、不遗漏，顺序与 (created_at, id) 倒序一致"""
+        seen, cursor = [], ""
+        async with session_factory() as db:
+            while cursor is not None:
+                statement = PaginationService.keyset(select(TestExecution), TestExecution.created_at, TestExecution.id, cursor)
+                items, cursor = await PaginationService.fetch_page(db, statement, 3)
+                seen.extend(items)
+
+        assert [item.id for item in seen] == [7, 6, 5, 4, 3, 2, 1]
+
+    def test_invalid_cursor(self):
+        """测试格式错误的游标返回 400"""
+        with pytest.raises(HTTPException) as error:
+            PaginationService.decode_cursor("不是游标")
+        assert error.value.status_code == 400
+
+    def test_triggers_maintain_counters(self, engine):
+        """测试触发器在插入、软删除、恢复和删除时维护计数"""
+        assert (self._counter(engine, "test_case"), self._counter(engine, "test_execution")) == (1, 7)
+
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO test_case (name, task_content, is_deleted) VALUES ('新用例', '内容', 0)"))
+            connection.execute(text("INSERT INTO test_case (name, task_content, is_deleted) VALUES ('已删除', '内容', 1)"))
+        assert self._counter(engine, "test_case") == 2
+
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE test_case SET is_deleted = 1 WHERE name = '新用例'"))
+        assert self._counter(engine, "test_case") == 1
+
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE test_case SET is_deleted = 0 WHERE name = '已删除'"))
+            connection.execute(text("DELETE FROM test_execution WHERE id <= 2"))
+        assert (self._counter(engine, "test_case"), self._counter(engine, "test_execution")) == (2, 5)
+
+    @pytest.mark.asyncio
+    async def test_total_reads_counter_without_count(self, session_factory):
+        """测试不带过滤条件的总数读取计数器，不执行 COUNT 查询"""
+        async with session_factory() as db:
+            statements = []
+            event.listen(db.bind.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+            assert await PaginationService.count_total(db, select(TestExecution), "test_execution") == 7
+            assert not any("count(" in sql.lower() for sql in statements)
+
+            filtered = select(TestExecution).where(TestExecution.id > 5)
+            assert await PaginationService.count_total(db, filtered) == 2
+            assert await PaginationService.count_total(db, select(TestExecution), "未初始化") == 7
+
+    def test_keyset_query_uses_index(self, engine):
+        """测试测试用例的游标分页走创建时间部分索引，不需要额外排序"""
+        statement = PaginationService.keyset(
+            select(TestCase).where(TestCase.is_deleted == False),
+            TestCase.created_at, TestCase.id, PaginationService.encode_cursor(datetime(2025, 1, 1), 10)
+        ).limit(20)
+        compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+        with engine.connect() as connection:
+            plan = "\n".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+        assert "ix_test_case_live_created" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,124 @@
+"""
+测试结构迁移与热点查询的执行计划
+"""
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+from src.autotest.database import Base, BatchExecutionTestCase, Category, TestCase, TestExecution, TestStep
+from src.autotest.migrations import MIGRATIONS, Migration, get_applied_versions, run_migrations
+
+
+def _explain(engine, statement) -> str:
+    """返回 SQLite 执行计划文本"""
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as connection:
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.fixture(scope="module")
+def plan_engine(tmp_path_factory):
+    """热点查询测试共用的数据库，整个模块只创建一次"""
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}")
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    with Session(engine) as session:
+        session.add_all([
+            TestCase(name=f"用例 {index}", task_content="步骤", status=("active", "inactive", "draft")[index % 3],
+                     category_id=index % 20, is_deleted=index % 10 == 0)
+            for index in range(200)
+        ])
+        session.commit()
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    return engine
+
+
+class TestMigrations:
+    """测试结构迁移"""
+
+    @pytest.fixture
+    def legacy_engine(self, tmp_path):
+        """模拟升级前的数据库：只有表，没有热点索引"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            for table in Base.metadata.tables.values():
+                for index in table.indexes:
+                    if not any(column.primary_key for column in index.columns):
+                        connection.execute(text(f"DROP INDEX {index.name}"))
+        return engine
+
+    def test_migrations_add_indexes_to_existing_database(self, legacy_engine):
+        """测试迁移为已有数据库补建索引，重复执行不再应用"""
+        assert "ix_test_step_execution_order" not in {index["name"] for index in inspect(legacy_engine).get_indexes("test_step")}
+
+        applied = run_migrations(legacy_engine)
+
+        assert applied == [migration.version for migration in MIGRATIONS]
+        assert "ix_test_step_execution_order" in {index["name"] for index in inspect(legacy_engine).get_indexes("test_step")}
+        assert run_migrations(legacy_engine) == []
+
+    def test_migrations_run_in_version_order(self, tmp_path):
+        """测试迁移按版本号顺序执行并记录版本"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'ordered.db'}")
+        calls = []
+        migrations = [
+            Migration(2, "second", lambda connection: calls.append(2)),
+            Migration(1, "first", lambda connection: calls.append(1)),
+        ]
+
+        run_migrations(engine, migrations)
+
+        assert calls == [1, 2]
+        assert get_applied_versions(engine) == [1, 2]
+
+    def test_failed_migration_is_retried(self, tmp_path):
+        """测试失败的迁移不记录版本，下次运行时重试，后续迁移不执行"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'failed.db'}")
+        attempts = []
+
+        def flaky(connection):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("迁移失败")
+
+        migrations = [Migration(1, "flaky", flaky), Migration(2, "after", lambda connection: None)]
+        with pytest.raises(RuntimeError):
+            run_migrations(engine, migrations)
+        assert get_applied_versions(engine) == []
+
+        assert run_migrations(engine, migrations) == [1, 2]
+        assert len(attempts) == 2
+
+
+class TestHotQueryPlans:
+    """测试热点查询使用索引"""
+
+    @pytest.mark.parametrize("statement, index_name", [
+        (select(TestExecution).where(TestExecution.test_case_id == 1).order_by(TestExecution.created_at.desc()),
+         "ix_test_execution_test_case_created"),
+        (select(TestExecution).order_by(TestExecution.created_at.desc()).limit(20),
+         "ix_test_execution_created_at"),
+        (select(TestStep).where(TestStep.execution_id == 1).order_by(TestStep.step_order),
+         "ix_test_step_execution_order"),
+        (select(BatchExecutionTestCase).where(BatchExecutionTestCase.batch_execution_id == 1, BatchExecutionTestCase.status == "pending"),
+         "ix_batch_execution_test_case_batch_status"),
+        (select(TestCase).where(TestCase.is_deleted == False, TestCase.category_id == 3),
+         "ix_test_case_live_category_id"),
+        (select(TestCase).where(TestCase.is_deleted == False, TestCase.status == "active"),
+         "ix_test_case_live_status"),
+        (select(Category).where(Category.parent_id == 1),
+         "ix_category_parent_id"),
+    ])
+    def test_hot_query_uses_index(self, plan_engine, statement, index_name):
+        """测试热点查询命中对应索引，且不做临时排序"""
+        plan = _explain(plan_engine, statement)
+
+        assert index_name in plan, plan
+        assert "USE TEMP B-TREE" not in plan, plan
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,104 @@
+"""
+测试批量执行报告生成
+"""
+
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, BatchExecution, BatchExecutionTestCase, TestCase, TestExecution, TestStep
+from src.autotest.services import report_service as report_module
+from src.autotest.services.report_service import ReportService
+
+
+class TestReportService:
+    """测试批量执行报告"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        """一个批量任务：通过、失败（步骤报错）、执行出错、未执行各一个用例"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'report.db'}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(BatchExecution(id=1, name="回归 <夜间>", status="completed", total_count=4))
+            cases = [("登录", "passed", "completed"), ("搜索", "failed", "completed"), ("下单", "error", "failed"), ("支付", None, "cancelled")]
+            for index, (name, execution_status, case_status) in enumerate(cases, start=1):
+                session.add(TestCase(id=index, name=name, task_content=name, category="主流程"))
+                execution_id = None
+                if execution_status:
+                    session.add(TestExecution(id=index, test_case_id=index, status=execution_status, total_duration=float(index),
+                                              error_message="浏览器崩溃\x1b[0m" if execution_status == "error" else None))
+                    execution_id = index
+                session.add(BatchExecutionTestCase(batch_execution_id=1, test_case_id=index, execution_id=execution_id, status=case_status))
+            session.flush()
+            session.add_all([
+                TestStep(execution_id=1, step_name="打开首页", step_order=1, status="PASSED", duration_seconds=1.0),
+                TestStep(execution_id=1, step_name="点击登录", step_order=2, status="PASSED", duration_seconds=0.5),
+                TestStep(execution_id=2, step_name="输入关键词", step_order=1, status="FAILED", error_message="找不到搜索框"),
+            ])
+            session.commit()
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'report.db'}", poolclass=NullPool)
+        statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        service = ReportService(async_sessionmaker(async_engine, expire_on_commit=False), cache_dir=tmp_path / "reports")
+        service.cache_dir.mkdir()
+        service.statements = statements
+        return service
+
+    async def _batch(self, service):
+        async with service.session_factory() as db:
+            return await db.get(BatchExecution, 1)
+
+    async def _render(self, service, report_format):
+        batch = await self._batch(service)
+        service.statements.clear()
+        return b"".join([chunk async for chunk in service.render(batch, report_format)]).decode("utf-8")
+
+    @pytest.mark.asyncio
+    async def test_junit(self, service, monkeypatch):
+        """测试 JUnit 报告的汇总和用例结果，只执行汇总和明细两条查询"""
+        monkeypatch.setattr(report_module, "REPORT_FLUSH_CASES", 1)
+        root = ElementTree.fromstring(await self._render(service, "junit"))
+
+        suite = root.find("testsuite")
+        assert suite.get("name") == "回归 <夜间>"
+        assert [suite.get(key) for key in ("tests", "failures", "errors", "skipped", "time")] == ["4", "1", "1", "1", "6.000"]
+        cases = {case.get("name"): case for case in suite.iter("testcase")}
+        assert cases["登录"].find("failure") is None and "[PASSED] 2. 点击登录" in cases["登录"].find("system-out").text
+        assert cases["搜索"].find("failure").get("message") == "找不到搜索框"
+        assert cases["下单"].find("error").get("message") == "浏览器崩溃[0m"
+        assert cases["支付"].find("skipped") is not None
+        assert len(service.statements) == 2
+
+    @pytest.mark.asyncio
+    async def test_html(self, service):
+        """测试 HTML 报告转义用例内容"""
+        report = await self._render(service, "html")
+
+        assert "<title>回归 &lt;夜间&gt;</title>" in report
+        assert report.count("<tr><td>") == 4
+        assert "找不到搜索框" in report and "2 个步骤" in report
+
+    @pytest.mark.asyncio
+    async def test_cached_report(self, service):
+        """测试已结束任务的报告生成一次后复用，任务更新后重新生成"""
+        batch = await self._batch(service)
+        path = await service.cached_report(batch, "junit")
+        service.statements.clear()
+
+        assert await service.cached_report(batch, "junit") == path
+        assert service.statements == []
+
+        batch.name = "回归（重命名）"
+        batch.updated_at = batch.updated_at.replace(year=batch.updated_at.year + 1)
+        new_path = await service.cached_report(batch, "junit")
+
+        assert new_path != path and not path.exists()
+        assert "回归（重命名）" in new_path.read_text(encoding="utf-8")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,106 @@
+"""
+测试版本化响应缓存
+"""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, BatchExecution, TestCase
+from src.autotest.services.response_cache import ResponseCache, response_cache
+
+
+class TestResponseCache:
+    """测试响应缓存"""
+
+    @pytest.fixture
+    def cache(self):
+        return ResponseCache(max_entries=2)
+
+    @pytest.fixture
+    def client(self, cache):
+        """一个使用缓存的最小应用，记录构建次数"""
+        app = FastAPI()
+        builds = []
+
+        @app.get("/items")
+        async def items(request: Request):
+            async def build(response):
+                builds.append(request.url.query)
+                response.headers["X-Total-Count"] = "1"
+                return {"items": [len(builds)]}
+            return await cache.respond(request, ("test_case",), build)
+
+        client = TestClient(app)
+        client.builds = builds
+        return client
+
+    def test_conditional_get_and_hits(self, cache, client):
+        """测试缓存命中、If-None-Match 返回 304，写入后失效"""
+        first = client.get("/items?a=1&b=2")
+        assert first.status_code == 200
+        assert first.json() == {"items": [1]}
+        assert first.headers["X-Total-Count"] == "1"
+
+        # 参数顺序不同视为同一请求
+        assert client.get("/items?b=2&a=1").json() == {"items": [1]}
+        not_modified = client.get("/items?a=1&b=2", headers={"If-None-Match": first.headers["ETag"]})
+        assert not_modified.status_code == 304
+        assert len(client.builds) == 1
+
+        cache.invalidate("test_case")
+        refreshed = client.get("/items?a=1&b=2", headers={"If-None-Match": first.headers["ETag"]})
+        assert refreshed.status_code == 200
+        assert refreshed.json() == {"items": [2]}
+        assert refreshed.headers["ETag"] != first.headers["ETag"]
+
+    def test_lru_bound(self, cache, client):
+        """测试缓存条目数有上限，淘汰最久未使用的条目"""
+        for query in ("a=1", "a=2", "a=1", "a=3"):
+            client.get(f"/items?{query}")
+
+        assert cache.stats()["entries"] == 2
+        client.get("/items?a=1")
+        client.get("/items?a=2")
+        assert client.builds == ["a=1", "a=2", "a=3", "a=2"]
+
+    def test_session_commits_bump_generations(self, tmp_path):
+        """测试会话提交（包括批量 UPDATE）使对应实体版本号递增，回滚不递增"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        before = response_cache.generation("test_case"), response_cache.generation("batch_execution")
+
+        session.add(TestCase(name="用例", task_content="打开首页"))
+        session.flush()
+        session.rollback()
+        assert response_cache.generation("test_case") == before[0]
+
+        session.add(TestCase(name="用例", task_content="打开首页"))
+        session.commit()
+        session.execute(update(BatchExecution).values(status="completed"))
+        session.commit()
+        session.close()
+
+        assert response_cache.generation("test_case") == before[0] + 1
+        assert response_cache.generation("batch_execution") == before[1] + 1
+
+    @pytest.mark.asyncio
+    async def test_async_session_commits_bump_generations(self, tmp_path):
+        """测试异步会话（后台任务使用）同样触发失效"""
+        Base.metadata.create_all(create_engine(f"sqlite:///{tmp_path / 'cache.db'}"))
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}", poolclass=NullPool)
+        before = response_cache.generation("batch_execution")
+
+        async with async_sessionmaker(async_engine)() as db:
+            db.add(BatchExecution(name="批量"))
+            await db.commit()
+
+        assert response_cache.generation("batch_execution") == before + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,111 @@
+"""
+测试步骤截图迁移与读取
+"""
+
+import base64
+import io
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from starlette.requests import Request
+from src.autotest.artifact_store import ArtifactStore, LocalFileSystemBackend, parse_ref
+from src.autotest.database import Base, TestStep
+from src.autotest.routers.test_executions import get_test_step_screenshot
+from src.autotest.services import screenshot_service
+from src.autotest.services.screenshot_service import ScreenshotService, Image
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(64)
+
+
+class TestScreenshotService:
+    """测试截图服务"""
+
+    @pytest.fixture
+    def store(self, tmp_path, monkeypatch):
+        store = ArtifactStore(LocalFileSystemBackend(tmp_path / "blobs"), tmp_path / "index.json", max_bytes=10 * 1024 * 1024)
+        monkeypatch.setattr(screenshot_service, "artifact_store", store)
+        return store
+
+    @pytest.fixture
+    def db(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+
+    def _add_step(self, db, step_order, **fields):
+        step = TestStep(execution_id=1, step_name=f"步骤 {step_order}", step_order=step_order, status="PASSED", **fields)
+        db.add(step)
+        db.commit()
+        return step
+
+    def test_migrate_inline_screenshots(self, db, store):
+        """测试行内截图迁移为制品引用，重复执行无副作用"""
+        data_uri = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode("ascii")
+        step1 = self._add_step(db, 1, screenshot_path=data_uri, screenshot_data=data_uri)
+        step2 = self._add_step(db, 2, screenshot_data=data_uri)
+        step3 = self._add_step(db, 3)
+
+        result = ScreenshotService.migrate_inline_screenshots(db, batch_size=1)
+
+        assert result["migrated"] == 2
+        assert result["freed_bytes"] > 0
+        for step in (step1, step2):
+            db.refresh(step)
+            assert step.screenshot_data is None
+            assert store.get(parse_ref(step.screenshot_path))[0] == PNG_BYTES
+        assert step3.screenshot_path is None
+        assert store.stats()["entries"] == 1
+
+        assert ScreenshotService.migrate_inline_screenshots(db)["migrated"] == 0
+
+    def test_load_step_screenshot(self, db, store):
+        """测试读取制品引用和未迁移的行内截图"""
+        artifact = store.put(PNG_BYTES, "image/png", execution_id=1)
+        migrated_step = self._add_step(db, 1, screenshot_path=artifact.ref)
+        legacy_step = self._add_step(db, 2, screenshot_data=base64.b64encode(PNG_BYTES).decode("ascii"))
+
+        assert ScreenshotService.load_step_screenshot(migrated_step) == (PNG_BYTES, "image/png", artifact.digest)
+        assert ScreenshotService.load_step_screenshot(legacy_step)[0] == PNG_BYTES
+        assert ScreenshotService.load_step_screenshot(self._add_step(db, 3)) is None
+
+    @pytest.mark.asyncio
+    async def test_screenshot_route_uses_async_session(self, tmp_path, store):
+        """测试截图接口通过异步会话读取步骤，步骤不属于该执行时返回 404"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'steps.db'}")
+        Base.metadata.create_all(engine)
+        artifact = store.put(PNG_BYTES, "image/png", execution_id=1)
+        db = sessionmaker(bind=engine)()
+        step_id = self._add_step(db, 1, screenshot_path=artifact.ref).id
+        db.close()
+        session_factory = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'steps.db'}", poolclass=NullPool))
+        request = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+        async with session_factory() as async_db:
+            response = await get_test_step_screenshot(1, step_id, request, db=async_db)
+            with pytest.raises(HTTPException) as error:
+                await get_test_step_screenshot(2, step_id, request, db=async_db)
+
+        assert response.body == PNG_BYTES
+        assert response.headers["ETag"] == f'"{artifact.digest}"'
+        assert error.value.status_code == 404
+
+    @pytest.mark.skipif(Image is None, reason="未安装 Pillow")
+    def test_make_thumbnail(self):
+        """测试生成指定宽度的缩略图"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (1280, 720), "white").save(buffer, format="PNG")
+
+        data, content_type = ScreenshotService.make_thumbnail(buffer.getvalue(), "image/png", "digest", 320)
+
+        assert content_type == "image/jpeg"
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            assert thumbnail.size == (320, 180)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
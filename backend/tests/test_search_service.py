@@ -0,0 +1,108 @@
+"""
+测试全文检索服务
+"""
+
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, TestCase, TestExecution
+from src.autotest.migrations import run_migrations
+from src.autotest.services.search_service import SearchService
+
+
+class TestSearchService:
+    """测试全文检索"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """同步引擎，已执行迁移"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.add(TestCase(name="登录页面校验", task_content="打开登录页面，输入用户名和密码", expected_result="进入首页"))
+            session.add(TestCase(name="购物车结算", task_content="添加商品到购物车并结算", expected_result="订单创建成功"))
+            session.add(TestCase(name="已删除的登录用例", task_content="登录页面", is_deleted=True))
+            session.flush()
+            session.add(TestExecution(test_case_id=1, status="failed", error_message="TimeoutError: 登录按钮未出现"))
+            session.commit()
+        run_migrations(engine)
+        return engine
+
+    @pytest.fixture
+    def session_factory(self, tmp_path, engine):
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'search.db'}", poolclass=NullPool)
+        return async_sessionmaker(async_engine, expire_on_commit=False)
+
+    async def _search(self, session_factory, query, scope="test_cases", **kwargs):
+        async with session_factory() as db:
+            return await SearchService().search(db, scope, query, **kwargs)
+
+    @pytest.mark.asyncio
+    async def test_ranked_search_skips_deleted(self, session_factory):
+        """测试返回命中用例及摘要，不包括已删除用例"""
+        result = await self._search(session_factory, "登录页面")
+
+        assert result["total"] == 1
+        item = result["items"][0]
+        assert (item["id"], item["name"]) == (1, "登录页面校验")
+        assert item["snippet"] == "【登录页面】校验"
+
+    @pytest.mark.asyncio
+    async def test_short_terms_and_executions(self, session_factory):
+        """测试少于三个字的词按包含过滤，以及执行记录错误信息检索"""
+        assert [item["id"] for item in (await self._search(session_factory, "订单"))["items"]] == [2]
+        assert [item["id"] for item in (await self._search(session_factory, "购物车 订单"))["items"]] == [2]
+
+        executions = await self._search(session_factory, "TimeoutError", scope="executions")
+        assert [item["test_case_id"] for item in executions["items"]] == [1]
+
+    @pytest.mark.asyncio
+    async def test_index_follows_updates_and_soft_delete(self, engine, session_factory):
+        """测试触发器在修改、软删除、恢复和导入（批量插入）时同步索引"""
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE test_case SET name = '注册流程' WHERE id = 2"))
+            connection.execute(text("UPDATE test_case SET is_deleted = 1 WHERE id = 1"))
+            connection.execute(text("UPDATE test_case SET is_deleted = 0 WHERE id = 3"))
+        with Session(engine) as session:
+            session.add_all([TestCase(name=f"导入用例 {index}", task_content="检查注册流程") for index in range(3)])
+            session.commit()
+
+        assert (await self._search(session_factory, "购物车结算"))["total"] == 0
+        assert [item["id"] for item in (await self._search(session_factory, "已删除的登录"))["items"]] == [3]
+        assert (await self._search(session_factory, "登录页面校验"))["total"] == 0
+        result = await self._search(session_factory, "注册流程", limit=2)
+        assert (result["total"], len(result["items"]), result["items"][0]["id"]) == (4, 2, 2)
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_like_without_index(self, engine, session_factory):
+        """测试没有全文索引时退化为 LIKE 检索"""
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE test_case_fts"))
+
+        result = await self._search(session_factory, "50%")
+        assert result["total"] == 0
+        assert [item["id"] for item in (await self._search(session_factory, "购物车"))["items"]] == [2]
+
+    @pytest.mark.asyncio
+    async def test_search_over_many_cases(self, engine, session_factory):
+        """测试大量用例时检索仍然很快"""
+        with engine.begin() as connection:
+            connection.execute(TestCase.__table__.insert(), [
+                {"name": f"用例 {index}", "task_content": f"打开页面 {index} 并检查表单字段 field{index}", "is_deleted": False}
+                for index in range(20000)
+            ])
+
+        started = time.perf_counter()
+        result = await self._search(session_factory, "field12345")
+        elapsed = time.perf_counter() - started
+
+        assert [item["name"] for item in result["items"]] == ["用例 12345"]
+        assert elapsed < 0.5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,80 @@
+"""
+测试表格文件流式读取
+"""
+
+import io
+
+import pytest
+from openpyxl import Workbook
+from src.autotest.services.spreadsheet_reader import SpreadsheetReader
+
+
+class TestSpreadsheetReader:
+    """测试 xlsx/csv 流式读取"""
+
+    @pytest.fixture
+    def workbook_path(self, tmp_path):
+        """表头 + 5 行数据，第 4 行数据前有一个空行"""
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["测试用例名称", "测试步骤", None])
+        for index in range(5):
+            if index == 3:
+                sheet.append([None, None, None])
+            sheet.append([f"用例 {index}", "打开首页", None if index % 2 else index])
+        path = tmp_path / "cases.xlsx"
+        workbook.save(path)
+        return path
+
+    def test_xlsx_chunks(self, workbook_path):
+        """测试按块读取，跳过空行，索引保持与表格行号对应"""
+        chunks = list(SpreadsheetReader(workbook_path).iter_chunks(2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        assert list(chunks[0].columns) == ["测试用例名称", "测试步骤", "Unnamed: 2"]
+        assert [list(chunk.index) for chunk in chunks] == [[0, 1], [2, 4], [5]]
+        assert chunks[2].iloc[0].tolist() == ["用例 4", "打开首页", 4]
+        assert chunks[0].iloc[1, 2] == ""
+
+    def test_xlsx_count_and_preview_do_not_scan_rows(self, workbook_path, monkeypatch):
+        """测试总行数取自工作表尺寸，预览只读取需要的行"""
+        reader = SpreadsheetReader(workbook_path)
+        scanned = []
+        original = reader._xlsx_rows
+
+        def rows():
+            for row in original():
+                scanned.append(row)
+                yield row
+
+        monkeypatch.setattr(reader, "_xlsx_rows", rows)
+
+        # 尺寸信息包含空行
+        assert reader.count_rows() == 6
+        assert scanned == []
+        assert reader.preview(2)["测试用例名称"].tolist() == ["用例 0", "用例 1"]
+        assert len(scanned) == 3
+
+    def test_csv(self):
+        """测试 GBK 编码的 CSV 上传文件，字段内换行和逗号"""
+        content = "标题,步骤描述\n登录,\"打开首页\n点击,登录\"\n\n搜索,输入关键词\n".encode("gb18030")
+        reader = SpreadsheetReader(io.BytesIO(content), "cases.csv")
+        chunks = list(reader.iter_chunks(1))
+
+        assert reader.count_rows() == 2
+        assert [chunk["步骤描述"].iloc[0] for chunk in chunks] == ["打开首页\n点击,登录", "输入关键词"]
+        assert reader.preview()["标题"].tolist() == ["登录", "搜索"]
+
+    def test_format_detected_from_content(self, tmp_path):
+        """测试扩展名为 xlsx 的 CSV 文件按内容读取，不支持的扩展名报错"""
+        path = tmp_path / "cases.xlsx"
+        path.write_text("标题,步骤描述\n登录,打开首页\n", encoding="utf-8-sig")
+
+        assert SpreadsheetReader(path).preview()["标题"].tolist() == ["登录"]
+        assert list(SpreadsheetReader(io.BytesIO(b""), "empty.csv").iter_chunks(10)) == []
+        with pytest.raises(ValueError):
+            SpreadsheetReader(io.BytesIO(b""), "cases.txt")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,52 @@
+"""
+测试 SQLite 生产配置
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from src.autotest.database import Base, SQLITE_BUSY_TIMEOUT_MS, create_sqlite_engine
+
+
+class TestSQLiteProfile:
+    """测试 SQLite 引擎参数"""
+
+    @pytest.fixture
+    def url(self, tmp_path):
+        return f"sqlite:///{tmp_path / 'profile.db'}"
+
+    def test_pragmas_applied(self, url):
+        """测试新连接启用 WAL 和忙等待超时"""
+        engine = create_sqlite_engine(url)
+        with engine.connect() as connection:
+            assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+            assert connection.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_BUSY_TIMEOUT_MS
+        engine.dispose()
+
+    def test_writer_takes_write_lock_at_begin(self, url):
+        """测试写入引擎的事务以 BEGIN IMMEDIATE 开始"""
+        engine = create_sqlite_engine(url, role="writer")
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(text("SELECT 1"))
+            # IMMEDIATE 事务在第一条语句前已持有保留锁
+            assert connection.connection.dbapi_connection.in_transaction
+        assert engine.pool.size() == 1
+        engine.dispose()
+
+    def test_reader_rejects_writes(self, url):
+        """测试只读连接池拒绝写入"""
+        writer = create_sqlite_engine(url, role="writer")
+        Base.metadata.create_all(writer)
+        reader = create_sqlite_engine(url, role="reader")
+        with reader.connect() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM test_case")).scalar() == 0
+            with pytest.raises(OperationalError):
+                connection.execute(text("INSERT INTO test_case (name, task_content) VALUES ('a', 'b')"))
+        reader.dispose()
+        writer.dispose()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
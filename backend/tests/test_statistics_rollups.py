@@ -0,0 +1,130 @@
+"""
+测试统计汇总表的增量维护与查询
+"""
+
+import pytest
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+from src.autotest.database import (
+    Base, Category, ExecutionDailyStat, ExecutionDurationStat, TestCase, TestCaseStat, TestExecution, beijing_now
+)
+from src.autotest.migrations import run_migrations
+from src.autotest.services.statistics_service import StatisticsService, estimate_percentile, rebuild
+
+
+class TestStatisticsRollups:
+    """测试统计汇总"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """同步引擎，已执行迁移并准备数据"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'statistics.db'}")
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        with Session(engine) as session:
+            session.add(Category(name="登录"))
+            session.flush()
+            session.add_all([
+                TestCase(name="登录", task_content="登录", category_id=1),
+                TestCase(name="搜索", task_content="搜索", status="draft"),
+                TestCase(name="已删除", task_content="已删除", is_deleted=True),
+            ])
+            session.commit()
+        return engine
+
+    @pytest.fixture
+    def session_factory(self, tmp_path, engine):
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'statistics.db'}", poolclass=NullPool)
+        return async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def _execute(self, engine, test_case_id, status, duration):
+        """模拟执行器：先插入运行中的记录，结束时更新状态和耗时"""
+        with Session(engine) as session:
+            execution = TestExecution(test_case_id=test_case_id, status="running")
+            session.add(execution)
+            session.commit()
+            execution.status, execution.total_duration = status, duration
+            session.commit()
+
+    def _rollups(self, engine):
+        """汇总表中计数不为 0 的行（增量维护会留下计数为 0 的行）"""
+        with Session(engine) as session:
+            return [
+                session.execute(select(TestCaseStat.status, TestCaseStat.case_count).where(TestCaseStat.case_count != 0).order_by(TestCaseStat.status)).all(),
+                session.execute(select(*ExecutionDailyStat.__table__.c).where(ExecutionDailyStat.execution_count != 0).order_by(
+                    ExecutionDailyStat.category_id, ExecutionDailyStat.status
+                )).all(),
+                session.execute(select(*ExecutionDurationStat.__table__.c).where(ExecutionDurationStat.execution_count != 0).order_by(
+                    ExecutionDurationStat.category_id, ExecutionDurationStat.bucket
+                )).all(),
+            ]
+
+    @pytest.mark.asyncio
+    async def test_summary_reads_rollups(self, engine, session_factory):
+        """测试总体统计随用例和执行变化增量更新，且只查询汇总表"""
+        self._execute(engine, 1, "passed", 3.0)
+        self._execute(engine, 1, "failed", 20.0)
+        self._execute(engine, 2, "error", 8.0)
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE test_case SET is_deleted = 1 WHERE id = 2"))
+            connection.execute(text("UPDATE test_case SET status = 'active', is_deleted = 0 WHERE id = 3"))
+
+        async with session_factory() as db:
+            statements = []
+            event.listen(db.bind.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+            summary = await StatisticsService.get_summary(db)
+
+        assert summary == {
+            "total_test_cases": 2, "active_test_cases": 2, "total_executions": 3,
+            "passed_executions": 1, "failed_executions": 2, "success_rate": 33.33,
+        }
+        assert not any("test_execution" in sql or "FROM test_case " in sql for sql in statements)
+
+    @pytest.mark.asyncio
+    async def test_trends(self, engine, session_factory):
+        """测试按天通过率、按分类统计和执行时间分位数"""
+        for duration in (1.0, 2.0, 3.0, 4.0):
+            self._execute(engine, 1, "passed", duration)
+        self._execute(engine, 2, "failed", 700.0)
+        self._execute(engine, 2, "running", None)
+
+        async with session_factory() as db:
+            pass_rate = await StatisticsService.get_pass_rate_trend(db, days=7)
+            categories = await StatisticsService.get_category_trend(db, days=7)
+            durations = await StatisticsService.get_duration_percentiles(db, days=7, category_id=1)
+
+        today = beijing_now().date().isoformat()
+        assert pass_rate == [{"day": today, "total": 6, "passed": 4, "failed": 1, "pass_rate": 80.0}]
+        assert [(item["category_name"], item["total"], item["pass_rate"], item["average_duration"]) for item in categories] == [
+            ("未分类", 2, 0.0, 700.0), ("登录", 4, 100.0, 2.5)
+        ]
+        assert durations == {"count": 4, "p50": 2.5, "p90": 4.5, "p95": 4.75, "p99": 4.95}
+
+    def test_rebuild_matches_incremental(self, engine):
+        """测试重建结果与增量维护结果一致"""
+        self._execute(engine, 1, "passed", 12.0)
+        self._execute(engine, 2, "failed", 700.0)
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM test_execution WHERE id = 1"))
+            connection.execute(text("UPDATE test_case SET status = 'inactive' WHERE id = 2"))
+        incremental = self._rollups(engine)
+
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM execution_daily_stat"))
+        rebuild(engine)
+
+        assert self._rollups(engine) == incremental
+        assert [tuple(row) for row in incremental[0]] == [("active", 1), ("inactive", 1)]
+        assert len(incremental[1]) == 1
+
+    def test_estimate_percentile(self):
+        """测试直方图分位数估算"""
+        assert estimate_percentile([0] * 8, 50) is None
+        assert estimate_percentile([2, 2, 0, 0, 0, 0, 0, 0], 50) == 5.0
+        assert estimate_percentile([0, 0, 0, 0, 0, 0, 0, 1], 99) == 600.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,161 @@
+"""
+测试步骤批量写入器
+"""
+
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from src.autotest.database import Base, TestStep
+from src.autotest.step_writer import StepWriter
+
+
+class TestStepWriter:
+    """测试步骤写入器"""
+
+    @pytest.fixture
+    def engine(self, tmp_path):
+        """同步引擎，用于准备数据和断言"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'steps.db'}")
+        Base.metadata.create_all(engine)
+        return engine
+
+    @pytest.fixture
+    def async_engine(self, tmp_path, engine):
+        """写入器使用的异步引擎"""
+        return create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'steps.db'}", poolclass=NullPool)
+
+    @pytest.fixture
+    def statements(self, async_engine):
+        """记录写入器执行的 SQL 语句"""
+        executed = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: executed.append(statement))
+        return executed
+
+    @pytest.fixture
+    def session_factory(self, async_engine):
+        return async_sessionmaker(async_engine, expire_on_commit=False)
+
+    @pytest.fixture
+    def writer(self, session_factory):
+        return StepWriter(flush_interval_ms=50, max_batch_rows=100, session_factory=session_factory)
+
+    def _steps(self, engine):
+        session = sessionmaker(bind=engine)()
+        try:
+            return session.query(TestStep).order_by(TestStep.execution_id, TestStep.step_order).all()
+        finally:
+            session.close()
+
+    def _values(self, **fields):
+        return {"step_name": "步骤", "status": "RUNNING", **fields}
+
+    @pytest.mark.asyncio
+    async def test_coalesces_updates_to_same_step(self, writer, engine, statements):
+        """测试同一步骤的多次更新合并为一次写入"""
+        now = datetime.now()
+        writer.enqueue(1, 1, self._values(url="https://a"), started_at=now)
+        writer.enqueue(1, 1, self._values(status="PASSED"), started_at=now)
+        writer.enqueue(1, 2, self._values(), started_at=now)
+
+        await writer.flush()
+
+        steps = self._steps(engine)
+        assert [(s.step_order, s.status, s.url) for s in steps] == [(1, "PASSED", "https://a"), (2, "RUNNING", None)]
+        assert sum(1 for sql in statements if sql.startswith("INSERT")) == 2
+
+    @pytest.mark.asyncio
+    async def test_updates_use_cached_ids_without_select(self, writer, engine, statements):
+        """测试已写入步骤的更新直接按ID更新，不再查询"""
+        writer.enqueue(1, 1, self._values(), started_at=datetime.now())
+        await writer.flush()
+        step_id = writer.get_step_id(1, 1)
+        statements.clear()
+
+        writer.enqueue(1, 1, self._values(status="FAILED", error_message="出错"))
+        await writer.flush()
+
+        assert not any(sql.startswith("SELECT") for sql in statements)
+        step = self._steps(engine)[0]
+        assert (step.id, step.status, step.error_message) == (step_id, "FAILED", "出错")
+
+    @pytest.mark.asyncio
+    async def test_new_steps_of_known_execution_skip_select(self, writer, engine, statements):
+        """测试执行的第一批写入查询一次已有步骤，之后新增的步骤直接插入，不再查询"""
+        now = datetime.now()
+        writer.enqueue(1, 1, self._values(), started_at=now)
+        await writer.flush()
+        assert sum(1 for sql in statements if sql.startswith("SELECT")) == 1
+        statements.clear()
+
+        for step_order in range(2, 5):
+            writer.enqueue(1, step_order, self._values(), started_at=now)
+            writer.enqueue(1, step_order - 1, self._values(status="PASSED"))
+            await writer.flush()
+
+        assert not any(sql.startswith("SELECT") for sql in statements)
+        assert [(step.step_order, step.status) for step in self._steps(engine)] == [
+            (1, "PASSED"), (2, "PASSED"), (3, "PASSED"), (4, "RUNNING")
+        ]
+
+    @pytest.mark.asyncio
+    async def test_group_commit_for_many_collectors(self, writer, engine, async_engine):
+        """测试多个执行的步骤在一次事务中提交"""
+        commits = []
+        event.listen(async_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+        now = datetime.now()
+        for execution_id in range(1, 11):
+            for step_order in range(1, 4):
+                writer.enqueue(execution_id, step_order, self._values(), started_at=now)
+
+        await writer.flush()
+
+        assert len(self._steps(engine)) == 30
+        assert len(commits) == 1
+
+    @pytest.mark.asyncio
+    async def test_resolves_ids_of_existing_rows(self, engine, session_factory):
+        """测试内存中没有ID的已有步骤只查询一次后更新"""
+        session = sessionmaker(bind=engine)()
+        session.add(TestStep(execution_id=1, step_order=1, step_name="步骤 1", status="RUNNING", started_at=datetime.now()))
+        session.commit()
+        session.close()
+
+        writer = StepWriter(flush_interval_ms=50, session_factory=session_factory)
+        writer.enqueue(1, 1, self._values(status="PASSED"))
+        await writer.flush()
+        await writer.stop()
+
+        steps = self._steps(engine)
+        assert len(steps) == 1
+        assert steps[0].status == "PASSED"
+
+
+    @pytest.mark.asyncio
+    async def test_flush_raises_when_commit_fails(self, engine, session_factory):
+        """测试提交失败时 flush 抛出异常，数据保留在队列中，下次成功提交后写入"""
+        failures = []
+
+        def failing_factory():
+            if not failures:
+                failures.append(1)
+                raise RuntimeError("数据库不可用")
+            return session_factory()
+
+        writer = StepWriter(flush_interval_ms=50, session_factory=failing_factory)
+        writer.enqueue(1, 1, self._values(status="PASSED"), started_at=datetime.now())
+
+        with pytest.raises(RuntimeError, match="数据库不可用"):
+            await writer.flush()
+        assert not self._steps(engine)
+
+        await writer.flush()
+        await writer.stop()
+
+        assert [step.status for step in self._steps(engine)] == ["PASSED"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -21,6 +21,10 @@ class TestTaskContext:
         task_context._test_case_browsers.clear()
         task_context._test_case_tasks.clear()
         task_context._test_case_batch_mapping.clear()
+        task_context._test_case_agents.clear()
+        task_context._batch_tokens.clear()
+        task_context._batch_tasks.clear()
+        task_context._cancel_reports.clear()
     
     @pytest.mark.asyncio
     async def test_register_batch_executor(self):
@@ -101,6 +105,64 @@ class TestTaskContext:
         # 验证浏览器被关闭
         browser.close.assert_called_once()
     
+    @pytest.mark.asyncio
+    async def test_cancel_signals_agent_and_records_report(self):
+        """测试取消时通知Agent停止、设置取消令牌并记录耗时"""
+        batch_id = 1
+        agent = Mock()
+        browser = AsyncMock()
+        task = Mock()
+        task.done.return_value = False
+        
+        await task_context.register_batch_executor(batch_id, Mock())
+        await task_context.register_test_case(batch_id, 100, browser, task, agent=agent)
+        token = task_context.get_cancellation_token(batch_id)
+        
+        assert not task_context.is_batch_cancelled(batch_id)
+        assert await task_context.cancel_batch_execution(batch_id)
+        
+        agent.stop.assert_called_once()
+        assert token.is_cancelled
+        assert task_context.is_batch_cancelled(batch_id)
+        report = task_context.get_cancel_report(batch_id)
+        assert report["cancelled_tasks"] == 1
+        assert report["cancel_latency_ms"] >= 0
+    
+    @pytest.mark.asyncio
+    async def test_cancel_bounds_hanging_browser_close(self):
+        """测试浏览器关闭卡住时取消仍在超时内完成，且多个浏览器并发关闭"""
+        batch_id = 1
+        
+        async def hanging_close():
+            await asyncio.sleep(10)
+        
+        browsers = [Mock(close=hanging_close) for _ in range(3)]
+        await task_context.register_batch_executor(batch_id, Mock())
+        for index, browser in enumerate(browsers):
+            await task_context.register_test_case(batch_id, 100 + index, browser, Mock())
+        
+        with patch.object(task_context, "BROWSER_CLOSE_TIMEOUT", 0.1):
+            start = time.perf_counter()
+            await task_context.cancel_batch_execution(batch_id)
+            elapsed = time.perf_counter() - start
+        
+        assert elapsed < 1.0
+        assert task_context.get_cancel_report(batch_id)["browser_close_timeouts"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_cancel_reports_are_capped_and_tokens_released(self):
+        """测试取消报告只保留最近的若干个，执行器收尾后释放取消令牌"""
+        with patch.object(task_context, "MAX_CANCEL_REPORTS", 2):
+            for batch_id in (1, 2, 3):
+                await task_context.register_batch_executor(batch_id, Mock())
+                await task_context.cancel_batch_execution(batch_id)
+        
+        assert list(task_context._cancel_reports) == [2, 3]
+        assert task_context.get_cancellation_token(3).is_cancelled
+        task_context.release_batch(3)
+        assert task_context.get_cancellation_token(3) is None
+        assert task_context.is_batch_cancelled(3)
+    
     @pytest.mark.asyncio
     async def test_cancel_nonexistent_batch(self):
         """测试取消不存在的批量任务"""
@@ -120,6 +182,10 @@ class TestBatchTestExecutor:
         task_context._test_case_browsers.clear()
         task_context._test_case_tasks.clear()
         task_context._test_case_batch_mapping.clear()
+        task_context._test_case_agents.clear()
+        task_context._batch_tokens.clear()
+        task_context._batch_tasks.clear()
+        task_context._cancel_reports.clear()
     
     @pytest.mark.asyncio
     async def test_register_to_context(self):
@@ -158,6 +224,10 @@ class TestTaskCancellationIntegration:
         task_context._test_case_browsers.clear()
         task_context._test_case_tasks.clear()
         task_context._test_case_batch_mapping.clear()
+        task_context._test_case_agents.clear()
+        task_context._batch_tokens.clear()
+        task_context._batch_tasks.clear()
+        task_context._cancel_reports.clear()
     
     @pytest.mark.asyncio
     async def test_batch_execution_cancellation_flow(self):
@@ -1,5 +1,5 @@
 import axios from 'axios'
-import type { TestCase, TestExecution, Statistics, ModelConfig, ModelConfigResponse, TestConfigResult, PromptConfig, PromptConfigResponse, BatchExecution, Category, CategoryCreate, CategoryUpdate, ImportTask, ImportTaskCreate, ImportTaskStatus, ImportTaskListResponse } from '@/types/api'
+import type { TestCase, TestExecution, Statistics, ModelConfig, ModelConfigResponse, TestConfigResult, PromptConfig, PromptConfigResponse, BatchExecution, Category, CategoryCreate, CategoryUpdate, ImportTask, ImportTaskCreate, ImportTaskStatus, ImportTaskListResponse, PageInfo, TestExecutionListResponse, BatchExecutionListResponse } from '@/types/api'
 
 // 动态获取API基础URL
 function getApiBaseUrl(): string {
@@ -55,11 +55,8 @@ api.interceptors.response.use(
 )
 
 // 定义分页响应类型
-export interface PaginatedResponse<T> {
+export interface PaginatedResponse<T> extends PageInfo {
   test_cases: T[];
-  total: number;
-  skip: number;
-  limit: number;
 }
 
 // 批量执行任务中的测试用例类型定义（提前定义）
@@ -97,6 +94,16 @@ export const testCaseApi = {
   // 批量删除测试用例
   batchDelete: (ids: number[]) => api.delete('/test-cases/batch/delete/', { data: ids }) as unknown as Promise<{message: string; deleted_count: number; requested_count: number; deleted_names: string[]}>,
   
+  // 批量创建、更新、删除测试用例（逐项返回结果，atomic 为 true 时任一项失败则全部不写入）
+  bulkCreate: (items: Partial<TestCase>[], atomic: boolean = false) =>
+    api.post('/test-cases/bulk', items, { params: { atomic } }) as unknown as Promise<BulkOperationResponse>,
+  
+  bulkUpdate: (items: (Partial<TestCase> & { id: number })[], atomic: boolean = false) =>
+    api.put('/test-cases/bulk', items, { params: { atomic } }) as unknown as Promise<BulkOperationResponse>,
+  
+  bulkDelete: (ids: number[]) =>
+    api.delete('/test-cases/bulk', { data: ids }) as unknown as Promise<BulkOperationResponse>,
+  
   // 预览Excel文件
   previewExcel: (formData: FormData) => 
     api.post('/test-cases/preview-excel/', formData, {
@@ -117,13 +124,14 @@ export const testCaseApi = {
 // 测试执行相关API
 export const testExecutionApi = {
   // 获取执行记录列表
-  getList: () => api.get<TestExecution[]>('/test-executions/') as unknown as Promise<TestExecution[]>,
+  getList: (params?: { skip?: number; limit?: number; status?: string; include_total?: boolean }) =>
+    api.get<TestExecutionListResponse>('/test-executions/', { params }) as unknown as Promise<TestExecutionListResponse>,
   
   // 获取单个执行记录
   getById: (id: number) => api.get<TestExecution>(`/test-executions/${id}/`) as unknown as Promise<TestExecution>,
   
   // 获取特定测试用例的执行记录
-  getByTestCaseId: (testCaseId: number) => api.get<TestExecution[]>(`/test-executions/?test_case_id=${testCaseId}`) as unknown as Promise<TestExecution[]>,
+  getByTestCaseId: (testCaseId: number) => api.get<TestExecutionListResponse>(`/test-executions/?test_case_id=${testCaseId}`) as unknown as Promise<TestExecutionListResponse>,
   
   // 执行单个测试用例
   execute: (testCaseId: number, headless: boolean = true) => 
@@ -134,7 +142,12 @@ export const testExecutionApi = {
     api.post<TestExecution[]>('/test-executions/batch/', { test_case_ids: testCaseIds, headless }) as unknown as Promise<TestExecution[]>,
   
   // 获取执行步骤详情
-  getSteps: (executionId: number) => api.get(`/test-executions/${executionId}/steps/`) as unknown as Promise<any>
+  getSteps: (executionId: number, params?: { fields?: string; exclude?: string }) =>
+    api.get(`/test-executions/${executionId}/steps/`, { params }) as unknown as Promise<any>,
+  
+  // 获取单个步骤的完整信息（包含截图数据、Agent 记忆和动作列表）
+  getStep: (executionId: number, stepId: number) =>
+    api.get(`/test-executions/${executionId}/steps/${stepId}`) as unknown as Promise<any>
 }
 
 // 批量执行任务相关API
@@ -143,9 +156,13 @@ export const batchExecutionApi = {
   create: (testCaseIds: number[], headless: boolean = true) =>
     api.post<{ success: boolean; batch_execution_id: number; message: string }>('/test-executions/batch-executions/', { test_case_ids: testCaseIds, headless }) as unknown as Promise<{ success: boolean; batch_execution_id: number; message: string }>,
   
+  // 按分类、标签、优先级、状态筛选或指定用例ID创建批量执行任务
+  createFromSelector: (selection: BatchSelection & { name?: string; headless?: boolean }) =>
+    api.post('/test-executions/batch-executions/from-selector', selection) as unknown as Promise<{ success: boolean; batch_execution_id: number; total_count: number; message: string }>,
+  
   // 获取批量执行任务列表
-  getList: (params?: { skip?: number; limit?: number; status?: string }) => 
-    api.get<BatchExecution[]>('/test-executions/batch-executions/', { params }) as unknown as Promise<BatchExecution[]>,
+  getList: (params?: { skip?: number; limit?: number; status?: string; include_total?: boolean }) => 
+    api.get<BatchExecutionListResponse>('/test-executions/batch-executions/', { params }) as unknown as Promise<BatchExecutionListResponse>,
   
   // 获取特定批量执行任务的详细信息
   getById: (id: number) => api.get<BatchExecution>(`/test-executions/batch-executions/${id}/`) as unknown as Promise<BatchExecution>,
@@ -163,13 +180,29 @@ export const batchExecutionApi = {
     api.post<{ success: boolean; message: string }>(`/test-executions/batch-executions/${id}/stop/`) as unknown as Promise<{ success: boolean; message: string }>,
   
   // 获取批量执行任务的状态
-  getStatus: (id: number) => api.get<BatchExecution>(`/test-executions/batch-executions/${id}/status/`) as unknown as Promise<BatchExecution>
+  getStatus: (id: number) => api.get<BatchExecution>(`/test-executions/batch-executions/${id}/status/`) as unknown as Promise<BatchExecution>,
+  
+  // 批量执行报告的下载地址（JUnit XML 或 HTML）
+  getReportUrl: (id: number, format: 'junit' | 'html' = 'junit'): string =>
+    `${getApiBaseUrl()}/test-executions/batch-executions/${id}/report?format=${format}`
 }
 
 // 统计信息API
 export const statisticsApi = {
   // 获取统计信息
-  getStatistics: () => api.get<Statistics>('/statistics/') as unknown as Promise<Statistics>
+  getStatistics: () => api.get<Statistics>('/statistics/') as unknown as Promise<Statistics>,
+
+  // 获取按天的通过率趋势
+  getPassRateTrend: (params?: { days?: number; category_id?: number }) =>
+    api.get('/statistics/trends/pass-rate', { params }) as unknown as Promise<Array<{ day: string; total: number; passed: number; failed: number; pass_rate: number }>>,
+
+  // 获取按分类的统计
+  getCategoryTrend: (params?: { days?: number }) =>
+    api.get('/statistics/trends/categories', { params }) as unknown as Promise<Array<{ category_id: number | null; category_name: string; total: number; passed: number; failed: number; pass_rate: number; average_duration: number | null }>>,
+
+  // 获取执行时间分位数
+  getDurationPercentiles: (params?: { days?: number; category_id?: number }) =>
+    api.get('/statistics/trends/duration', { params }) as unknown as Promise<{ count: number; p50: number | null; p90: number | null; p95: number | null; p99: number | null }>
 }
 
 // 分类管理相关API
@@ -270,4 +303,65 @@ export const importTaskApi = {
     api.get<{ has_running_task: boolean }>('/import-tasks/has-running/') as unknown as Promise<{ has_running_task: boolean }>
 }
 
-export default api
\ No newline at end of file
+export default api
+// 全文检索结果
+export interface SearchHit {
+  id: number;
+  score: number;
+  snippet: string | null;
+  [key: string]: unknown;
+}
+
+export interface SearchResponse {
+  query: string;
+  scope: 'test_cases' | 'executions';
+  total: number;
+  items: SearchHit[];
+}
+
+// 批量执行任务的用例选择条件，test_case_ids 与其余筛选条件互斥
+export interface BatchSelection {
+  test_case_ids?: number[];
+  category_id?: number;
+  include_children?: boolean;
+  tags?: string[];
+  priority?: string[];
+  status?: string[];
+}
+
+// 批量操作结果
+export interface BulkOperationResponse {
+  total: number;
+  succeeded: number;
+  failed: number;
+  results: { index: number; id?: number; success: boolean; error?: string }[];
+}
+
+// 全文检索API
+export const searchApi = {
+  // 检索测试用例或执行记录
+  search: (params: { q: string; scope?: 'test_cases' | 'executions'; limit?: number; offset?: number }): Promise<SearchResponse> =>
+    api.get('/search/', { params }) as unknown as Promise<SearchResponse>,
+};
+
+export interface ExportParams {
+  format?: 'ndjson' | 'csv' | 'xlsx';
+  category_id?: number;
+  start_date?: string;
+  end_date?: string;
+  status?: string;
+}
+
+// 数据导出API：导出为流式下载，直接返回下载地址交给浏览器处理
+export const exportApi = {
+  getUrl: (dataset: 'test_cases' | 'executions' | 'steps', params: ExportParams = {}): string => {
+    const query = new URLSearchParams()
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        query.append(key, String(value))
+      }
+    })
+    const suffix = query.toString() ? `?${query.toString()}` : ''
+    return `${getApiBaseUrl()}/exports/${dataset}${suffix}`
+  },
+};
@@ -55,8 +55,9 @@ export interface TestExecution {
   failed_steps: number
   skipped_steps: number
   total_duration: number
-  summary: string
-  recommendations: string
+  // 列表接口默认不返回，详情接口返回
+  summary?: string
+  recommendations?: string
   error_message?: string
   started_at: string
   completed_at?: string
@@ -168,6 +169,23 @@ export interface BatchExecution {
   test_cases?: BatchExecutionTestCase[]
 }
 
+// 列表分页信息，各列表接口统一在响应体中返回
+// total 只在请求 include_total=true 时计算，否则为 null；next_cursor 只在游标分页时返回
+export interface PageInfo {
+  total?: number | null
+  skip: number
+  limit: number
+  next_cursor?: string | null
+}
+
+export interface TestExecutionListResponse extends PageInfo {
+  test_executions: TestExecution[]
+}
+
+export interface BatchExecutionListResponse extends PageInfo {
+  batch_executions: BatchExecution[]
+}
+
 // 批量执行任务中的测试用例类型定义
 export interface BatchExecutionTestCase {
   id: number